@@ -1,40 +1,115 @@
+from typing import Dict
+
+from django.conf import settings
 from django.core.cache import cache
 
 import autograder.core.models as ag_models
 from autograder.core.submission_feedback import SubmissionResultFeedback
+from autograder.utils.cache_versions import bump_cache_version, get_cache_version
 
 
 def clear_submission_results_cache(project_pk: int) -> None:
-    keys = cache.client.iter_keys(f'project_{project_pk}_submission_normal_results_*',
-                                  itersize=5000)
-    cache.delete_many(list(keys))
+    """
+    Invalidates the cached feedback for all of the given project's
+    submissions by bumping the project's results cache version.
+    The invalidated entries expire after
+    settings.SUBMISSION_RESULTS_CACHE_TIMEOUT seconds.
+    """
+    bump_cache_version(_results_cache_version_key(project_pk))
 
 
 def delete_cached_submission_result(submission: ag_models.Submission) -> None:
-    cache_key = submission_fdbk_cache_key(
-        project_pk=submission.group.project.pk, submission_pk=submission.pk)
-    cache.delete(cache_key)
+    """
+    Removes the cached feedback for every feedback category for the
+    given submission.
+    """
+    project_pk = submission.group.project.pk
+    version = get_cache_version(_results_cache_version_key(project_pk))
+    cache.delete_many([
+        _submission_fdbk_cache_key(project_pk, version, submission.pk, fdbk_category)
+        for fdbk_category in ag_models.FeedbackCategory
+    ])
 
 
 def get_cached_submission_feedback(submission: ag_models.Submission,
                                    feedback: SubmissionResultFeedback) -> dict:
     """
-    Loads the serialized normal feedback for the given submission from
-    the cache and returns it.
+    Loads the serialized feedback for the given submission from the
+    cache and returns it. The feedback category is that of feedback.
     If the serialized feedback is not cached, adds it to the cache
     before returning it.
     """
     cache_key = submission_fdbk_cache_key(
         project_pk=submission.group.project.pk,
-        submission_pk=submission.pk)
+        submission_pk=submission.pk,
+        fdbk_category=feedback.fdbk_category)
 
     result = cache.get(cache_key)
     if result is None:
+        _increment_counter(_fdbk_cache_counter_key('misses', feedback.fdbk_category))
         result = feedback.to_dict()
-        cache.set(cache_key, result, timeout=None)
+        cache.set(cache_key, result, timeout=settings.SUBMISSION_RESULTS_CACHE_TIMEOUT)
+    else:
+        _increment_counter(_fdbk_cache_counter_key('hits', feedback.fdbk_category))
 
     return result
 
 
-def submission_fdbk_cache_key(*, project_pk: int, submission_pk: int) -> str:
-    return f'project_{project_pk}_submission_normal_results_{submission_pk}'
+def submission_fdbk_cache_key(
+    *, project_pk: int, submission_pk: int,
+    fdbk_category: ag_models.FeedbackCategory=ag_models.FeedbackCategory.normal
+) -> str:
+    """
+    Returns the key that the submission's feedback is currently cached
+    under. The key changes whenever clear_submission_results_cache is
+    called for the project.
+    """
+    version = get_cache_version(_results_cache_version_key(project_pk))
+    return _submission_fdbk_cache_key(project_pk, version, submission_pk, fdbk_category)
+
+
+def _submission_fdbk_cache_key(project_pk: int, version: int, submission_pk: int,
+                               fdbk_category: ag_models.FeedbackCategory) -> str:
+    return (f'project_{project_pk}_v{version}'
+            f'_submission_{fdbk_category.value}_results_{submission_pk}')
+
+
+def _results_cache_version_key(project_pk: int) -> str:
+    return f'project_{project_pk}_submission_results_version'
+
+
+def get_submission_fdbk_cache_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Returns the number of submission feedback cache hits and misses
+    for each feedback category, e.g.:
+    {
+        "normal": {"hits": 42, "misses": 3},
+        ...
+    }
+    """
+    keys = {
+        (fdbk_category.value, counter): _fdbk_cache_counter_key(counter, fdbk_category)
+        for fdbk_category in ag_models.FeedbackCategory
+        for counter in ('hits', 'misses')
+    }
+    counts = cache.get_many(list(keys.values()))
+
+    stats = {}  # type: Dict[str, Dict[str, int]]
+    for (fdbk_category, counter), key in keys.items():
+        stats.setdefault(fdbk_category, {})[counter] = counts.get(key, 0)
+
+    return stats
+
+
+def _fdbk_cache_counter_key(counter: str, fdbk_category: ag_models.FeedbackCategory) -> str:
+    return f'submission_fdbk_cache_{counter}_{fdbk_category.value}'
+
+
+def _increment_counter(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The counter doesn't exist yet. add() is a no-op if another
+        # process created it in the meantime.
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
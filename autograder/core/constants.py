@@ -30,6 +30,10 @@ PROJECT_SUBMISSIONS_DIRNAME = 'submission_groups'
 FILESYSTEM_ROOT_COURSES_DIRNAME = 'courses'
 FILESYSTEM_RESULT_OUTPUT_DIRNAME = 'output'
 
+# The subdirectory of settings.MEDIA_ROOT where the contents of
+# submitted files are stored. See autograder/core/submitted_file_blobs.py
+SUBMITTED_FILE_BLOBS_DIRNAME = 'submitted_file_blobs'
+
 MAX_COMMAND_LENGTH = 1000
 
 # Sandbox resource limit settings
@@ -0,0 +1,829 @@
+"""
+An in-process replacement for the GNU diff invocation used by
+autograder.core.utils.get_diff.
+
+get_diff used to fork
+
+    diff --text --new-line-format '+ %L\\n' --old-line-format '- %L\\n'
+         --unchanged-line-format '  %L\\n' [-i] [-w] [-b] [-B] FIRST SECOND
+
+for every comparison. This module produces the same output (byte for
+byte) and the same pass/fail result without starting a process. It
+follows the steps GNU diffutils takes for that command line:
+
+    1. Trim the identical prefix and suffix of the two files.
+    2. Assign each remaining line an equivalence class, taking the
+       ignore_* flags into account.
+    3. Discard lines that can't match anything in the other file
+       ("discard_confusing_lines").
+    4. Run Myers' O(ND) algorithm on what's left ("compareseq"),
+       giving up on finding a minimal diff when it gets too expensive.
+    5. Slide runs of changes to merge them and make them prettier
+       ("shift_boundaries").
+    6. Print the hunks, skipping blank-line-only hunks when
+       ignore_blank_lines is set.
+
+Getting any of these subtly different from GNU diff would change which
+lines are reported as added or removed, so see the diffutils sources
+(src/analyze.c, src/io.c, src/ifdef.c, lib/diffseq.h) before
+"simplifying" anything here.
+
+When the files are equivalent, which is the common case when grading,
+none of the above is needed: lines_equivalent() compares the files a
+line at a time without building a diff.
+"""
+
+import collections
+import io
+import mmap
+import re
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Files are either given by name or as their contents.
+DiffSource = Union[str, bytes]
+
+# The characters that isspace() accepts in the C locale.
+_WHITESPACE = b' \t\n\v\f\r'
+_WHITESPACE_RUN_REGEX = re.compile(b'[' + re.escape(_WHITESPACE) + b']+')
+
+# Files at least this large are memory-mapped rather than read.
+MMAP_THRESHOLD = 1 << 20
+
+# Comparing files a chunk at a time keeps memory use low for large files.
+_CHUNK_SIZE = 1 << 20
+
+# Whitespace handling, in increasing order of leniency.
+_IGNORE_NO_WHITE_SPACE = 0
+_IGNORE_SPACE_CHANGE = 1
+_IGNORE_ALL_SPACE = 2
+
+_OFFSET_MAX = float('inf')
+_NEWLINE = ord('\n')
+# Maps the values used by _discard_confusing_lines to changed flags.
+_DISCARD_TO_CHANGED = bytes([0, 1, 1]) + bytes(253)
+
+
+class DiffTooExpensive(Exception):
+    """
+    Raised by diff_bytes when computing the diff would take more than
+    max_cost steps.
+    """
+
+
+@contextmanager
+def open_diff_source(source: DiffSource) -> Iterator[Union[bytes, mmap.mmap]]:
+    """
+    Yields the contents of source. Files at least MMAP_THRESHOLD bytes
+    long are memory-mapped instead of being read into memory.
+    """
+    if isinstance(source, bytes):
+        yield source
+        return
+
+    with open(source, 'rb') as f:
+        f.seek(0, 2)
+        if f.tell() < MMAP_THRESHOLD:
+            f.seek(0)
+            yield f.read()
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+def lines_equivalent(first: Union[bytes, mmap.mmap], second: Union[bytes, mmap.mmap], *,
+                     ignore_case: bool,
+                     ignore_whitespace: bool,
+                     ignore_whitespace_changes: bool) -> bool:
+    """
+    Returns True if GNU diff would find no differences at all between
+    first and second. Note that this ignores ignore_blank_lines:
+    when ignore_blank_lines is set and this function returns False,
+    the files may still be considered equivalent.
+
+    Both arguments are scanned a line (or chunk) at a time, so they can
+    be memory-mapped files of any size.
+    """
+    whitespace_mode = _get_whitespace_mode(ignore_whitespace, ignore_whitespace_changes)
+    if whitespace_mode == _IGNORE_NO_WHITE_SPACE:
+        # Without whitespace normalization, lines (including whether
+        # the last line has a newline) match exactly when their bytes
+        # do, modulo case.
+        if len(first) != len(second):
+            return False
+
+        for start in range(0, len(first), _CHUNK_SIZE):
+            first_chunk = first[start:start + _CHUNK_SIZE]
+            second_chunk = second[start:start + _CHUNK_SIZE]
+            if ignore_case:
+                first_chunk = first_chunk.lower()
+                second_chunk = second_chunk.lower()
+            if first_chunk != second_chunk:
+                return False
+
+        return True
+
+    first_lines = iter_lines(first)
+    second_lines = iter_lines(second)
+    while True:
+        first_line = next(first_lines, None)
+        second_line = next(second_lines, None)
+        if first_line is None or second_line is None:
+            return first_line is None and second_line is None
+
+        first_key = _normalize(first_line[0], ignore_case, whitespace_mode)
+        second_key = _normalize(second_line[0], ignore_case, whitespace_mode)
+        if first_key != second_key:
+            return False
+
+
+def iter_lines(buf: Union[bytes, mmap.mmap]) -> Iterator[Tuple[bytes, bool]]:
+    """
+    Yields (line_without_newline, has_newline) for each line in buf.
+    """
+    start = 0
+    end = len(buf)
+    while start < end:
+        newline = buf.find(b'\n', start)
+        if newline == -1:
+            yield buf[start:end], False
+            return
+
+        yield buf[start:newline], True
+        start = newline + 1
+
+
+def diff_bytes(first: bytes, second: bytes, *,
+               ignore_case: bool,
+               ignore_whitespace: bool,
+               ignore_whitespace_changes: bool,
+               ignore_blank_lines: bool,
+               max_cost: Optional[int] = None) -> Tuple[bool, bytes]:
+    """
+    Returns a tuple (files_are_equivalent, diff_output), where
+    diff_output is exactly what the GNU diff command described in the
+    module docstring prints.
+
+    Raises DiffTooExpensive if computing the diff takes more than
+    max_cost steps.
+    """
+    whitespace_mode = _get_whitespace_mode(ignore_whitespace, ignore_whitespace_changes)
+    buffers = [_with_trailing_newline(first), _with_trailing_newline(second)]
+    missing_newline = [len(buffers[0]) != len(first), len(buffers[1]) != len(second)]
+    prefix_end, suffix_begin = _find_identical_ends(buffers, missing_newline)
+
+    # Lines of each file, including their newlines.
+    lines = [_split_lines(first), _split_lines(second)]
+    num_prefix_lines = buffers[0].count(b'\n', 0, prefix_end[0])
+
+    equiv_classes = {}  # type: dict
+    equivs = []  # type: List[List[int]]
+    for f in range(2):
+        num_middle_lines = buffers[f].count(b'\n', prefix_end[f], suffix_begin[f])
+        middle_lines = lines[f][num_prefix_lines:num_prefix_lines + num_middle_lines]
+        equivs.append([
+            equiv_classes.setdefault(key, len(equiv_classes) + 1)
+            for key in _get_equivalence_keys(middle_lines, ignore_case, whitespace_mode)
+        ])
+
+    changed = _compare(equivs[0], equivs[1], max_cost)
+    _shift_boundaries(equivs, changed)
+
+    output = []  # type: List[bytes]
+    found_differences = False
+    next_line = [0, 0]
+    for line0, line1, deleted, inserted in _build_script(changed, equivs):
+        first0 = num_prefix_lines + line0
+        first1 = num_prefix_lines + line1
+        hunk_lines0 = lines[0][first0:first0 + deleted]
+        hunk_lines1 = lines[1][first1:first1 + inserted]
+        if ignore_blank_lines and all(
+                _is_blank(line, whitespace_mode) for line in hunk_lines0 + hunk_lines1):
+            continue
+
+        found_differences = True
+        _format_lines(output, b'  ', lines[0][next_line[0]:first0])
+        _format_lines(output, b'- ', hunk_lines0)
+        _format_lines(output, b'+ ', hunk_lines1)
+        next_line = [first0 + deleted, first1 + inserted]
+
+    if next_line[0] < len(lines[0]) or next_line[1] < len(lines[1]):
+        _format_lines(output, b'  ', lines[0][next_line[0]:])
+
+    return not found_differences, b''.join(output)
+
+
+def _get_whitespace_mode(ignore_whitespace: bool, ignore_whitespace_changes: bool) -> int:
+    # Like GNU diff, -w takes precedence over -b.
+    if ignore_whitespace:
+        return _IGNORE_ALL_SPACE
+    if ignore_whitespace_changes:
+        return _IGNORE_SPACE_CHANGE
+    return _IGNORE_NO_WHITE_SPACE
+
+
+def _normalize(content: bytes, ignore_case: bool, whitespace_mode: int) -> bytes:
+    if ignore_case:
+        content = content.lower()
+
+    if whitespace_mode == _IGNORE_ALL_SPACE:
+        content = content.translate(None, _WHITESPACE)
+    elif whitespace_mode == _IGNORE_SPACE_CHANGE:
+        content = _WHITESPACE_RUN_REGEX.sub(b' ', content)
+        if content.endswith(b' '):
+            content = content[:-1]
+
+    return content
+
+
+def _get_equivalence_keys(lines: List[bytes], ignore_case: bool,
+                          whitespace_mode: int) -> Iterable[object]:
+    """
+    Returns a key for each line such that two lines have the same key
+    exactly when GNU diff considers them to be the same.
+    """
+    if whitespace_mode == _IGNORE_NO_WHITE_SPACE:
+        # Keeping the newline means that a last line that's missing its
+        # newline never matches a line that has one.
+        return [line.lower() for line in lines] if ignore_case else lines
+
+    # When whitespace changes are ignored, so is a missing newline.
+    return [
+        _normalize(line[:-1] if line.endswith(b'\n') else line, ignore_case, whitespace_mode)
+        for line in lines
+    ]
+
+
+def _is_blank(line: bytes, whitespace_mode: int) -> bool:
+    content = line[:-1] if line.endswith(b'\n') else line
+    if whitespace_mode >= _IGNORE_SPACE_CHANGE:
+        return not content.translate(None, _WHITESPACE)
+    return not content
+
+
+def _format_lines(output: List[bytes], prefix: bytes, lines: Sequence[bytes]) -> None:
+    # Each line becomes prefix + line + b'\n'.
+    if lines:
+        output += [prefix, (b'\n' + prefix).join(lines), b'\n']
+
+
+def _with_trailing_newline(buf: bytes) -> bytes:
+    if buf and not buf.endswith(b'\n'):
+        return buf + b'\n'
+    return buf
+
+
+def _split_lines(buf: bytes) -> List[bytes]:
+    # Unlike bytes.splitlines(), this only splits on b'\n'.
+    return io.BytesIO(buf).readlines()
+
+
+def _common_prefix_length(first: bytes, second: bytes) -> int:
+    length = min(len(first), len(second))
+    if first[:length] == second[:length]:
+        return length
+
+    # Binary search for the first mismatch.
+    low = 0
+    high = length
+    while high - low > 1:
+        mid = (low + high) // 2
+        if first[low:mid] == second[low:mid]:
+            low = mid
+        else:
+            high = mid
+    return low
+
+
+def _common_suffix_length(first: bytes, second: bytes, limit: int) -> int:
+    """
+    Returns the length of the longest common suffix of first and second
+    that is at most limit bytes long.
+    """
+    n0 = len(first)
+    n1 = len(second)
+    if first[n0 - limit:] == second[n1 - limit:]:
+        return limit
+
+    low = 0
+    high = limit
+    while high - low > 1:
+        mid = (low + high) // 2
+        if first[n0 - mid:n0 - low] == second[n1 - mid:n1 - low]:
+            low = mid
+        else:
+            high = mid
+    return low
+
+
+def _find_identical_ends(buffers: List[bytes],
+                         missing_newline: List[bool]) -> Tuple[List[int], List[int]]:
+    """
+    Returns ([prefix_end0, prefix_end1], [suffix_begin0, suffix_begin1]),
+    the offsets of the end of the identical prefix and the start of the
+    identical suffix of each buffer. Lines outside of that range are
+    never considered to be changed.
+
+    Each buffer must end with a newline (see _with_trailing_newline).
+    See find_identical_ends in diffutils' src/io.c.
+    """
+    buf0, buf1 = buffers
+    n0 = len(buf0)
+    n1 = len(buf1)
+
+    # Find the identical prefix.
+    prefix = _common_prefix_length(buf0, buf1)
+    # Don't count a missing newline as part of the prefix.
+    if (n0 - missing_newline[0] < prefix) != (n1 - missing_newline[1] < prefix):
+        prefix -= 1
+
+    # Back up to the beginning of a line.
+    while prefix != 0 and buf0[prefix - 1] != _NEWLINE:
+        prefix -= 1
+
+    # Find the identical suffix.
+    suffix0 = n0
+    suffix1 = n1
+    if missing_newline[0] == missing_newline[1]:
+        # Stop when we reach the end of the prefix in either file.
+        suffix = _common_suffix_length(buf0, buf1, min(n0, n1) - prefix)
+        suffix0 -= suffix
+        suffix1 -= suffix
+
+        # If we stopped in the middle of a line, the rest of that line
+        # isn't part of the suffix.
+        if suffix0 != n0 and not ((suffix0 == 0 or buf0[suffix0 - 1] == _NEWLINE)
+                                  and (suffix1 == 0 or buf1[suffix1 - 1] == _NEWLINE)):
+            line_end = buf0.index(b'\n', suffix0) + 1
+            suffix1 += line_end - suffix0
+            suffix0 = line_end
+
+    return [prefix, prefix], [suffix0, suffix1]
+
+
+def _compare(equivs0: List[int], equivs1: List[int],
+             max_cost: Optional[int]) -> List[bytearray]:
+    """
+    Returns a pair of arrays that indicate which lines of each file were
+    deleted or inserted, respectively. Each array has an extra element
+    at the start and end that's always 0, so the flag for line i is at
+    index i + 1.
+    """
+    changed = [bytearray(len(equivs0) + 2), bytearray(len(equivs1) + 2)]
+    (undiscarded0, realindexes0), (undiscarded1, realindexes1) = _discard_confusing_lines(
+        [equivs0, equivs1], changed)
+
+    comparer = _SequenceComparer(undiscarded0, undiscarded1, max_cost)
+    deleted, inserted = comparer.compare()
+    for x in deleted:
+        changed[0][realindexes0[x] + 1] = 1
+    for y in inserted:
+        changed[1][realindexes1[y] + 1] = 1
+
+    return changed
+
+
+def _discard_confusing_lines(
+        equivs: List[List[int]],
+        changed: List[bytearray]) -> List[Tuple[List[int], List[int]]]:
+    """
+    Marks as changed the lines that match no line in the other file,
+    along with some of the lines that match many lines in the other
+    file. Those lines are then left out of the (expensive) search for
+    the shortest edit script.
+
+    Returns a pair (undiscarded_equivs, real_indexes) for each file.
+    See discard_confusing_lines in diffutils' src/analyze.c.
+    """
+    counts = [collections.Counter(equivs[0]), collections.Counter(equivs[1])]
+
+    # 0: keep, 1: discard, 2: provisionally discard.
+    discarded = []  # type: List[bytearray]
+    for f in range(2):
+        end = len(equivs[f])
+        other_counts = counts[1 - f]
+
+        # Lines that match more than approximately the square root of
+        # the number of lines are provisionally discardable.
+        many = 5
+        tem = end // 64
+        tem >>= 2
+        while tem > 0:
+            many *= 2
+            tem >>= 2
+
+        discarded.append(bytearray(
+            1 if num_matches == 0 else 2 if num_matches > many else 0
+            for num_matches in map(other_counts.__getitem__, equivs[f])
+        ))
+
+    # Only discard provisional lines that are in the middle of a run of
+    # discardable lines.
+    for discards in discarded:
+        end = len(discards)
+        i = 0
+        while i < end:
+            # Cancel provisional discards up to the next nonprovisional one.
+            run_start = discards.find(1, i)
+            if run_start == -1:
+                run_start = end
+            discards[i:run_start] = bytes(run_start - i)
+            i = run_start
+            if i < end:
+                # Find the end of this run of discardable lines and count
+                # how many are provisionally discardable.
+                provisional = 0
+                j = i
+                while j < end and discards[j] != 0:
+                    if discards[j] == 2:
+                        provisional += 1
+                    j += 1
+
+                # Cancel provisional discards at the end of the run.
+                while j > i and discards[j - 1] == 2:
+                    j -= 1
+                    discards[j] = 0
+                    provisional -= 1
+
+                length = j - i
+                if provisional * 4 > length:
+                    # Too many of the lines in the run are provisional.
+                    while j > i:
+                        j -= 1
+                        if discards[j] == 2:
+                            discards[j] = 0
+                else:
+                    # Cancel any subrun of at least approximately
+                    # sqrt(length / 4) provisional lines.
+                    minimum = 1
+                    tem = length >> 2
+                    tem >>= 2
+                    while tem > 0:
+                        minimum <<= 1
+                        tem >>= 2
+                    minimum += 1
+
+                    j = 0
+                    consec = 0
+                    while j < length:
+                        if discards[i + j] != 2:
+                            consec = 0
+                        else:
+                            consec += 1
+                            if consec == minimum:
+                                # Back up to the start of the subrun so
+                                # that all of it gets cancelled.
+                                j -= consec
+                            elif consec > minimum:
+                                discards[i + j] = 0
+                        j += 1
+
+                    # Cancel provisional discards at the start of the run
+                    # until we find 3 nonprovisional discards in a row or
+                    # a nonprovisional discard at least 8 lines in.
+                    _cancel_leading_provisional_discards(discards, i, length, 1)
+
+                    i += length - 1
+
+                    # Same thing from the end.
+                    _cancel_leading_provisional_discards(discards, i, length, -1)
+            i += 1
+
+    result = []
+    for f in range(2):
+        discards = discarded[f]
+        changed[f][1:len(discards) + 1] = discards.translate(_DISCARD_TO_CHANGED)
+        realindexes = [i for i, discard in enumerate(discards) if not discard]
+        result.append(([equivs[f][i] for i in realindexes], realindexes))
+
+    return result
+
+
+def _cancel_leading_provisional_discards(discards: bytearray, start: int,
+                                         length: int, step: int) -> None:
+    consec = 0
+    for j in range(length):
+        index = start + j * step
+        if j >= 8 and discards[index] == 1:
+            break
+
+        if discards[index] == 2:
+            consec = 0
+            discards[index] = 0
+        elif discards[index] == 0:
+            consec = 0
+        else:
+            consec += 1
+
+        if consec == 3:
+            break
+
+
+class _SequenceComparer:
+    """
+    Finds a short edit script between two sequences of equivalence
+    classes using Myers' O(ND) algorithm, like compareseq and diag in
+    gnulib's lib/diffseq.h (without the "speed_large_files" heuristic,
+    which diff doesn't enable by default).
+    """
+
+    def __init__(self, xvec: List[int], yvec: List[int], max_cost: Optional[int]):
+        self.xvec = xvec
+        self.yvec = yvec
+        self.max_cost = max_cost
+        self.cost = 0
+
+        num_diags = len(xvec) + len(yvec) + 3
+        # Diagonal d is stored at index d + self.diag_offset.
+        self.diag_offset = len(yvec) + 1
+        self.fdiag = [0] * num_diags  # type: List[float]
+        self.bdiag = [0] * num_diags  # type: List[float]
+
+        # Give up on finding a minimal edit script after approximately
+        # sqrt(num_diags) steps.
+        too_expensive = 1
+        while num_diags != 0:
+            too_expensive <<= 1
+            num_diags >>= 2
+        self.too_expensive = max(4096, too_expensive)
+
+    def compare(self) -> Tuple[List[int], List[int]]:
+        """
+        Returns (deleted_indexes, inserted_indexes).
+        """
+        xv = self.xvec
+        yv = self.yvec
+        deleted = []  # type: List[int]
+        inserted = []  # type: List[int]
+
+        # The order in which subproblems are solved doesn't affect the
+        # result, so we use a stack instead of recursion.
+        stack = [(0, len(xv), 0, len(yv), False)]
+        while stack:
+            xoff, xlim, yoff, ylim, find_minimal = stack.pop()
+
+            # Slide down the bottom initial diagonal.
+            while xoff < xlim and yoff < ylim and xv[xoff] == yv[yoff]:
+                xoff += 1
+                yoff += 1
+
+            # Slide up the top initial diagonal.
+            while xoff < xlim and yoff < ylim and xv[xlim - 1] == yv[ylim - 1]:
+                xlim -= 1
+                ylim -= 1
+
+            if xoff == xlim:
+                inserted += range(yoff, ylim)
+            elif yoff == ylim:
+                deleted += range(xoff, xlim)
+            else:
+                xmid, ymid, lo_minimal, hi_minimal = self._diag(
+                    xoff, xlim, yoff, ylim, find_minimal)
+                stack.append((xmid, xlim, ymid, ylim, hi_minimal))
+                stack.append((xoff, xmid, yoff, ymid, lo_minimal))
+
+        return deleted, inserted
+
+    def _diag(self, xoff: int, xlim: int, yoff: int, ylim: int,
+              find_minimal: bool) -> Tuple[int, int, bool, bool]:
+        """
+        Finds the midpoint of the shortest edit script for the given
+        parts of the sequences. Returns (xmid, ymid, lo_minimal, hi_minimal).
+        """
+        fd = self.fdiag
+        bd = self.bdiag
+        xv = self.xvec
+        yv = self.yvec
+        o = self.diag_offset
+
+        dmin = xoff - ylim  # Minimum valid diagonal.
+        dmax = xlim - yoff  # Maximum valid diagonal.
+        fmid = xoff - yoff  # Center diagonal of the top-down search.
+        bmid = xlim - ylim  # Center diagonal of the bottom-up search.
+        fmin = fmax = fmid
+        bmin = bmax = bmid
+        # True if the southeast corner is on an odd diagonal with
+        # respect to the northwest.
+        odd = (fmid - bmid) & 1
+
+        fd[fmid + o] = xoff
+        bd[bmid + o] = xlim
+
+        c = 0
+        while True:
+            c += 1
+            self._add_cost(fmax - fmin + bmax - bmin + 4)
+
+            # Extend the top-down search by an edit step in each diagonal.
+            if fmin > dmin:
+                fmin -= 1
+                fd[fmin - 1 + o] = -1
+            else:
+                fmin += 1
+            if fmax < dmax:
+                fmax += 1
+                fd[fmax + 1 + o] = -1
+            else:
+                fmax -= 1
+            for d in range(fmax, fmin - 1, -2):
+                tlo = fd[d - 1 + o]
+                thi = fd[d + 1 + o]
+                x0 = thi if tlo < thi else tlo + 1
+                x = int(x0)
+                y = x - d
+                while x < xlim and y < ylim and xv[x] == yv[y]:
+                    x += 1
+                    y += 1
+                self._add_cost(x - x0)
+                fd[d + o] = x
+                if odd and bmin <= d <= bmax and bd[d + o] <= x:
+                    return x, y, True, True
+
+            # Similarly extend the bottom-up search.
+            if bmin > dmin:
+                bmin -= 1
+                bd[bmin - 1 + o] = _OFFSET_MAX
+            else:
+                bmin += 1
+            if bmax < dmax:
+                bmax += 1
+                bd[bmax + 1 + o] = _OFFSET_MAX
+            else:
+                bmax -= 1
+            for d in range(bmax, bmin - 1, -2):
+                tlo = bd[d - 1 + o]
+                thi = bd[d + 1 + o]
+                x0 = tlo if tlo < thi else thi - 1
+                x = int(x0)
+                y = x - d
+                while xoff < x and yoff < y and xv[x - 1] == yv[y - 1]:
+                    x -= 1
+                    y -= 1
+                self._add_cost(x0 - x)
+                bd[d + o] = x
+                if not odd and fmin <= d <= fmax and x <= fd[d + o]:
+                    return x, y, True, True
+
+            if find_minimal or c < self.too_expensive:
+                continue
+
+            # We've gone well beyond the call of duty. Give up and report
+            # halfway between our best results so far.
+
+            # Find the forward diagonal that maximizes x + y.
+            fxybest = -1
+            fxbest = 0
+            for d in range(fmax, fmin - 1, -2):
+                x = int(min(fd[d + o], xlim))
+                y = x - d
+                if ylim < y:
+                    x = ylim + d
+                    y = ylim
+                if fxybest < x + y:
+                    fxybest = x + y
+                    fxbest = x
+
+            # Find the backward diagonal that minimizes x + y.
+            bxybest = _OFFSET_MAX
+            bxbest = 0
+            for d in range(bmax, bmin - 1, -2):
+                x = int(max(xoff, bd[d + o]))
+                y = x - d
+                if y < yoff:
+                    x = yoff + d
+                    y = yoff
+                if x + y < bxybest:
+                    bxybest = x + y
+                    bxbest = x
+
+            # Use the better of the two diagonals.
+            if (xlim + ylim) - bxybest < fxybest - (xoff + yoff):
+                return fxbest, fxybest - fxbest, True, False
+            return bxbest, int(bxybest) - bxbest, False, True
+
+    def _add_cost(self, cost: float) -> None:
+        self.cost += cost
+        if self.max_cost is not None and self.cost > self.max_cost:
+            raise DiffTooExpensive
+
+
+def _shift_boundaries(equivs: List[List[int]], changed: List[bytearray]) -> None:
+    """
+    Slides runs of changed lines up or down where doing so doesn't
+    change the meaning of the diff, in order to merge adjacent runs and
+    line them up with runs of changes in the other file.
+
+    As in _compare, the flag for line i is at index i + 1.
+    See shift_boundaries in diffutils' src/analyze.c.
+    """
+    for f in range(2):
+        ch = changed[f]
+        other = changed[1 - f]
+        eq = equivs[f]
+        i_end = len(eq)
+        i = 0
+        j = 0
+
+        while True:
+            # Scan forwards to find the beginning of another run of
+            # changes, keeping track of the corresponding point in the
+            # other file.
+            while i < i_end and not ch[i + 1]:
+                while other[j + 1]:
+                    j += 1
+                j += 1
+                i += 1
+
+            if i == i_end:
+                break
+
+            start = i
+
+            # Find the end of this run of changes.
+            i += 1
+            while ch[i + 1]:
+                i += 1
+            while other[j + 1]:
+                j += 1
+
+            while True:
+                # Record the length of this run of changes, so that we
+                # can later determine whether the run has grown.
+                runlength = i - start
+
+                # Move the changed region back, so long as the previous
+                # unchanged line matches the last changed one. This
+                # merges with previous changed regions.
+                while start and eq[start - 1] == eq[i - 1]:
+                    start -= 1
+                    ch[start + 1] = 1
+                    i -= 1
+                    ch[i + 1] = 0
+                    while ch[start]:
+                        start -= 1
+                    j -= 1
+                    while other[j + 1]:
+                        j -= 1
+
+                # The end of the changed run, at the last point where it
+                # corresponds to a changed run in the other file. i_end
+                # means no such point has been found.
+                corresponding = i if other[j] else i_end
+
+                # Move the changed region forward, so long as the first
+                # changed line matches the following unchanged one. This
+                # merges with following changed regions.
+                while i != i_end and eq[start] == eq[i]:
+                    ch[start + 1] = 0
+                    start += 1
+                    ch[i + 1] = 1
+                    i += 1
+                    while ch[i + 1]:
+                        i += 1
+                    j += 1
+                    while other[j + 1]:
+                        corresponding = i
+                        j += 1
+
+                if runlength == i - start:
+                    break
+
+            # If possible, move the fully-merged run of changes back to a
+            # corresponding run in the other file.
+            while corresponding < i:
+                start -= 1
+                ch[start + 1] = 1
+                i -= 1
+                ch[i + 1] = 0
+                j -= 1
+                while other[j + 1]:
+                    j -= 1
+
+
+def _build_script(changed: List[bytearray],
+                  equivs: List[List[int]]) -> List[Tuple[int, int, int, int]]:
+    """
+    Returns a list of (line0, line1, num_deleted, num_inserted) tuples
+    describing each run of changes, in order.
+    """
+    ch0, ch1 = changed
+    i0 = len(equivs[0])
+    i1 = len(equivs[1])
+    script = []
+    while i0 >= 0 or i1 >= 0:
+        if ch0[i0] or ch1[i1]:
+            line0 = i0
+            line1 = i1
+            while ch0[i0]:
+                i0 -= 1
+            while ch1[i1]:
+                i1 -= 1
+            script.append((i0, i1, line0 - i0, line1 - i1))
+
+        # We've reached lines in the two files that match each other.
+        i0 -= 1
+        i1 -= 1
+
+    script.reverse()
+    return script
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+import autograder.core.models as ag_models
+import autograder.core.utils as core_ut
+from autograder.core.result_output import compress_output, compress_outputs_in_dir
+
+
+class Command(BaseCommand):
+    help = """Compresses the output of grading commands that was recorded
+              before output was stored compressed. Output that is already
+              compressed is skipped, so this command can safely be
+              interrupted and run again."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--project', type=int, default=None,
+            help='Only compress the output of submissions in the project with this ID.')
+
+    def handle(self, *args, **options):
+        submissions = ag_models.Submission.objects.order_by('pk')
+        if options['project'] is not None:
+            submissions = submissions.filter(project=options['project'])
+
+        num_compressed = 0
+        submission_pks = submissions.values_list(
+            'pk', 'group_id', 'project_id', 'project__course_id')
+        for submission_pk, group_pk, project_pk, course_pk in submission_pks.iterator():
+            num_compressed += compress_outputs_in_dir(core_ut.get_result_output_dir_from_pks(
+                course_pk=course_pk, project_pk=project_pk,
+                group_pk=group_pk, submission_pk=submission_pk))
+
+        # The output of mutation test suite setup and test discovery
+        # commands is stored outside of the submissions' directories.
+        if options['project'] is None:
+            num_compressed += compress_outputs_in_dir(core_ut.misc_cmd_output_dir())
+        else:
+            mutation_test_suite_results = ag_models.MutationTestSuiteResult.objects.filter(
+                submission__project=options['project']
+            ).select_related('setup_result', 'get_test_names_result')
+            for result in mutation_test_suite_results.iterator():
+                cmd_results = [result.setup_result, result.get_test_names_result]
+                for cmd_result in cmd_results:
+                    if cmd_result is None:
+                        continue
+
+                    for filename in [cmd_result.stdout_filename, cmd_result.stderr_filename]:
+                        if compress_output(filename):
+                            num_compressed += 1
+
+        self.stdout.write(f'Compressed {num_compressed} output files')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+import autograder.core.models as ag_models
+from autograder.core.submitted_file_blobs import delete_orphaned_blobs
+
+
+class Command(BaseCommand):
+    help = """Deletes blobs in the submitted file blob store that no
+              submission refers to, such as blobs whose submissions
+              have been deleted."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min_age', type=float, default=24 * 60 * 60,
+            help="""Only delete blobs that were last written more than this many
+                    seconds ago. This should be longer than it could take to
+                    create a submission. Defaults to one day.""")
+
+    def handle(self, *args, **options):
+        referenced_digests = set()
+        hashes_queryset = ag_models.Submission.objects.exclude(
+            submitted_file_hashes={}
+        ).values_list('submitted_file_hashes', flat=True)
+        for hashes in hashes_queryset.iterator():
+            referenced_digests.update(hashes.values())
+
+        num_deleted = delete_orphaned_blobs(referenced_digests, min_age=options['min_age'])
+        self.stdout.write(f'Deleted {num_deleted} blobs')
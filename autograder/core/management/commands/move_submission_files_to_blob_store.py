@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+
+import autograder.core.models as ag_models
+from autograder.core.submitted_file_blobs import (delete_legacy_submission_files,
+                                                  move_submission_files_to_blob_store)
+
+
+class Command(BaseCommand):
+    help = """Moves the files of submissions made before the submitted file
+              blob store was added into the blob store. Submissions whose
+              files are already in the blob store are skipped, so this
+              command can safely be interrupted and run again.
+
+              The original files are kept so that graders and downloads
+              that started before the move can still read them. Once
+              those have finished, run this command again with
+              --delete_legacy_files to delete them."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--project', type=int, default=None,
+            help='Only move the files of submissions in the project with this ID.')
+        parser.add_argument(
+            '--delete_legacy_files', action='store_true',
+            help='Instead of moving files, delete the original copies of files that '
+                 'were already moved.')
+
+    def handle(self, *args, **options):
+        if options['delete_legacy_files']:
+            self._delete_legacy_files(options['project'])
+            return
+
+        submissions = ag_models.Submission.objects.filter(
+            submitted_file_hashes={}
+        ).exclude(
+            submitted_filenames=[]
+        ).select_related('project').order_by('pk')
+        if options['project'] is not None:
+            submissions = submissions.filter(project=options['project'])
+
+        num_moved = 0
+        for submission in submissions.iterator():
+            if move_submission_files_to_blob_store(submission):
+                num_moved += 1
+                if num_moved % 1000 == 0:
+                    self.stdout.write(f'Moved the files of {num_moved} submissions')
+
+        self.stdout.write(f'Moved the files of {num_moved} submissions')
+
+    def _delete_legacy_files(self, project_pk):
+        submissions = ag_models.Submission.objects.exclude(
+            submitted_file_hashes={}
+        ).select_related('project').order_by('pk')
+        if project_pk is not None:
+            submissions = submissions.filter(project=project_pk)
+
+        num_deleted = 0
+        for submission in submissions.iterator():
+            num_deleted += delete_legacy_submission_files(submission)
+
+        self.stdout.write(f'Deleted {num_deleted} moved submission files')
@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-18 04:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0088_auto_20200924_1311'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agtestsuite',
+            name='run_test_cases_in_parallel',
+            field=models.BooleanField(default=False, help_text="When True, this suite's test cases will be run concurrently in the same\n                     sandbox after the setup command finishes. Only enable this if the\n                     test cases do not interfere with each other (e.g., by writing to the\n                     same files)."),
+        ),
+    ]
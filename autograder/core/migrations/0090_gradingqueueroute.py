@@ -0,0 +1,32 @@
+# Generated by Django 3.1 on 2026-10-18 04:32
+
+import autograder.core.fields
+import autograder.core.models.ag_model_base
+import autograder.core.models.grading_queue_route
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0089_agtestsuite_run_test_cases_in_parallel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradingQueueRoute',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='grading_queue_route', serialize=False, to='core.project')),
+                ('worst_case_grading_time', models.IntegerField(default=0, help_text="The sum of the time limits, in seconds, of the project's non-deferred\n                     tests.")),
+                ('median_grading_time', models.FloatField(blank=True, default=None, help_text="The median time, in seconds, spent grading the non-deferred tests of\n                     the project's most recently graded submissions.", null=True)),
+                ('num_grading_time_samples', models.IntegerField(default=0, help_text='The number of submissions used to compute median_grading_time.')),
+                ('queue_class', autograder.core.fields.EnumField(default=autograder.core.models.grading_queue_route.GradingQueueClass['fast'], enum_type=autograder.core.models.grading_queue_route.GradingQueueClass)),
+                ('last_modified', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+            bases=(autograder.core.models.ag_model_base.ToDictMixin, models.Model),
+        ),
+    ]
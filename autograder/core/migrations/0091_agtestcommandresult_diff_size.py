@@ -0,0 +1,23 @@
+# Generated by Django 3.1 on 2026-10-18 04:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0090_gradingqueueroute'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agtestcommandresult',
+            name='stderr_diff_size',
+            field=models.IntegerField(blank=True, default=None, help_text='The size of the diff stored in stderr_diff_filename, or None if\n                     no diff was stored when this result was graded.', null=True),
+        ),
+        migrations.AddField(
+            model_name='agtestcommandresult',
+            name='stdout_diff_size',
+            field=models.IntegerField(blank=True, default=None, help_text='The size of the diff stored in stdout_diff_filename, or None if\n                     no diff was stored when this result was graded.', null=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.1 on 2026-10-18 05:06
+
+import autograder.core.fields
+import autograder.core.models.ag_model_base
+import autograder.core.models.project.project
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0091_agtestcommandresult_diff_size'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UltimateSubmissionEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_modified', models.DateTimeField(auto_now=True)),
+                ('username', models.CharField(blank=True, help_text="The username of the group member this entry is for. An empty\n                     string indicates the ultimate submission for the whole group.\n                     These can differ when a submission doesn't count for some of\n                     the group's members.", max_length=150)),
+                ('policy', autograder.core.fields.EnumField(enum_type=autograder.core.models.project.project.UltimateSubmissionPolicy)),
+                ('project_version', models.BigIntegerField()),
+                ('group_version', models.BigIntegerField()),
+                ('group', models.ForeignKey(help_text='The group whose ultimate submission this entry stores.', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.group')),
+                ('submission', models.ForeignKey(blank=True, default=None, help_text='The ultimate submission, or None if the group (or user) has no\n                     submission that is eligible to be ultimate.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.submission')),
+            ],
+            options={
+                'unique_together': {('group', 'username', 'policy')},
+            },
+            bases=(autograder.core.models.ag_model_base.ToDictMixin, models.Model),
+        ),
+    ]
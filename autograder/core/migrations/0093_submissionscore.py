@@ -0,0 +1,36 @@
+# Generated by Django 3.1 on 2026-10-18 05:10
+
+import autograder.core.fields
+import autograder.core.models.ag_model_base
+import autograder.core.models.ag_test.feedback_category
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0092_ultimatesubmissionentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionScore',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_modified', models.DateTimeField(auto_now=True)),
+                ('fdbk_category', autograder.core.fields.EnumField(enum_type=autograder.core.models.ag_test.feedback_category.FeedbackCategory)),
+                ('total_points', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('total_points_possible', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('ag_test_suite_totals', django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict, help_text='Maps the pk of each AG test suite visible under fdbk_category\n                     to a [total_points, total_points_possible] pair. The point\n                     values are stored as strings.')),
+                ('mutation_test_suite_totals', django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict, help_text='Maps the pk of each mutation test suite visible under\n                     fdbk_category to a [total_points, total_points_possible] pair.\n                     The point values are stored as strings.')),
+                ('project_version', models.BigIntegerField()),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scores', to='core.submission')),
+            ],
+            options={
+                'unique_together': {('submission', 'fdbk_category')},
+            },
+            bases=(autograder.core.models.ag_model_base.ToDictMixin, models.Model),
+        ),
+    ]
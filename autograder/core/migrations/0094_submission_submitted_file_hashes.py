@@ -0,0 +1,19 @@
+# Generated by Django 3.1 on 2026-10-18 05:20
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0093_submissionscore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='submitted_file_hashes',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict, help_text="Maps the name of each submitted file to the SHA-256 hash of its\n                     contents, which identifies the blob in the blob store that holds\n                     the file (see autograder/core/submitted_file_blobs.py).\n                     When this is empty, the submitted files are stored in the\n                     submission's directory instead. This is the case for submissions\n                     made before the blob store was added that haven't been moved\n                     to it yet."),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.1 on 2026-10-18 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0094_submission_submitted_file_hashes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agtestsuite',
+            name='deterministic',
+            field=models.BooleanField(default=False, help_text='When True, indicates that the results of this suite depend only on\n                     its configuration, its sandbox image, the contents of the files\n                     added to the sandbox, and the usernames of the group being graded.\n                     When a submission is graded with exactly the same inputs as an\n                     earlier one, the earlier results are copied instead of running the\n                     suite again. Leave this False for suites whose results can vary\n                     between runs (e.g., tests that are timing-dependent or random).'),
+        ),
+        migrations.AddField(
+            model_name='agtestsuiteresult',
+            name='inputs_hash',
+            field=models.CharField(blank=True, help_text='When the suite is marked as deterministic, a hash of the inputs\n                     this result was graded with. Empty while the suite is being graded.\n                     See autograder/grading_tasks/tasks/ag_test_result_reuse.py', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='agtestsuiteresult',
+            index=models.Index(fields=['ag_test_suite', 'inputs_hash'], name='core_agtest_ag_test_9feda5_idx'),
+        ),
+    ]
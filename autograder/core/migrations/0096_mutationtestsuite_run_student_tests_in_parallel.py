@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-18 05:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0095_ag_test_result_reuse'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mutationtestsuite',
+            name='run_student_tests_in_parallel',
+            field=models.BooleanField(default=False, help_text='When True, student test validity checks and buggy implementation\n                     commands will be run concurrently in the same sandbox. Only enable\n                     this if those commands do not interfere with each other (e.g., by\n                     writing to the same files).'),
+        ),
+    ]
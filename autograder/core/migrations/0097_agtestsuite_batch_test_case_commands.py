@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-18 05:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0096_mutationtestsuite_run_student_tests_in_parallel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agtestsuite',
+            name='batch_test_case_commands',
+            field=models.BooleanField(default=False, help_text="When True, the commands in each of this suite's test cases are sent to\n                     the sandbox together and run one after another by a single process\n                     inside the sandbox, instead of starting a separate process in the\n                     sandbox for each command. This reduces the overhead of running many\n                     short commands. Each command still has its own time limit, resource\n                     limits, and stdin."),
+        ),
+    ]
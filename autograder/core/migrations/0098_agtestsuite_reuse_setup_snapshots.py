@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-18 05:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0097_agtestsuite_batch_test_case_commands'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agtestsuite',
+            name='reuse_setup_snapshots',
+            field=models.BooleanField(default=False, help_text="When True, the contents of the sandbox's working directory after this\n                     suite's setup command finishes are cached along with the setup\n                     command's results. When this suite or another suite with this field\n                     set to True is graded with the same setup command, sandbox image,\n                     files, and group members (e.g., another suite that compiles the same\n                     code, or a rerun), the working directory is restored from the cache\n                     instead of running the setup command again. Only enable this if the\n                     setup command only changes files in the working directory and its\n                     results depend only on those inputs."),
+        ),
+    ]
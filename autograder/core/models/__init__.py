@@ -12,7 +12,8 @@ from .ag_test.ag_test_suite import AGTestSuite, AGTestSuiteFeedbackConfig
 from .ag_test.ag_test_suite_result import AGTestSuiteResult
 from .ag_test.feedback_category import FeedbackCategory
 from .course import Course, LateDaysRemaining, Semester
-from .group import Group, GroupInvitation
+from .grading_queue_route import GradingQueueClass, GradingQueueRoute
+from .group import Group, GroupInvitation, annotate_submission_counts
 from .mutation_test_suite import (BugsExposedFeedbackLevel, MutationTestSuite,
                                   MutationTestSuiteFeedbackConfig, MutationTestSuiteResult)
 from .project import Project, UltimateSubmissionPolicy
@@ -23,4 +24,6 @@ from .rerun_submissions_task import RerunSubmissionsTask
 from .sandbox_docker_image import BuildImageStatus, BuildSandboxDockerImageTask, SandboxDockerImage
 from .submission import (Submission, get_mutation_test_suite_results_queryset,
                          get_submissions_with_results_queryset)
+from .submission_score import SubmissionScore
 from .task import Task
+from .ultimate_submission_entry import UltimateSubmissionEntry
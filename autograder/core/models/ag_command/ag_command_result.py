@@ -1,9 +1,11 @@
+import io
 import os
 
 from django.db import models
 from django.db import transaction
 
 import autograder.core.utils as core_ut
+from autograder.core.result_output import write_output
 from .ag_command_result_base import AGCommandResultBase
 
 
@@ -35,8 +37,8 @@ class AGCommandResult(AGCommandResultBase):
 
             if is_create:
                 os.makedirs(core_ut.misc_cmd_output_dir(), exist_ok=True)
-                open(self.stdout_filename, 'w').close()
-                open(self.stderr_filename, 'w').close()
+                write_output(io.BytesIO(), self.stdout_filename)
+                write_output(io.BytesIO(), self.stderr_filename)
 
                 self.save()
 
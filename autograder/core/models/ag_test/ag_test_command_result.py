@@ -33,17 +33,62 @@ class AGTestCommandResult(AGCommandResultBase):
     stdout_correct = models.NullBooleanField(null=True, default=None)
     stderr_correct = models.NullBooleanField(null=True, default=None)
 
+    stdout_diff_size = models.IntegerField(
+        blank=True, null=True, default=None,
+        help_text="""The size of the diff stored in stdout_diff_filename, or None if
+                     no diff was stored when this result was graded.""")
+    stderr_diff_size = models.IntegerField(
+        blank=True, null=True, default=None,
+        help_text="""The size of the diff stored in stderr_diff_filename, or None if
+                     no diff was stored when this result was graded.""")
+
     @property
     def stdout_filename(self):
-        result_output_dir = core_ut.get_result_output_dir(
-            self.ag_test_case_result.ag_test_suite_result.submission)
-        return os.path.join(result_output_dir, 'cmd_result_{}_stdout'.format(self.pk))
+        return self.get_stdout_filename(self._result_output_dir, self.pk)
 
     @property
     def stderr_filename(self):
-        result_output_dir = core_ut.get_result_output_dir(
+        return self.get_stderr_filename(self._result_output_dir, self.pk)
+
+    @property
+    def stdout_diff_filename(self):
+        """
+        The JSON-encoded diff between the expected and actual stdout,
+        computed when this result was graded.
+        """
+        return self.get_stdout_diff_filename(self._result_output_dir, self.pk)
+
+    @property
+    def stderr_diff_filename(self):
+        """
+        The JSON-encoded diff between the expected and actual stderr,
+        computed when this result was graded.
+        """
+        return self.get_stderr_diff_filename(self._result_output_dir, self.pk)
+
+    @property
+    def _result_output_dir(self):
+        return core_ut.get_result_output_dir(
             self.ag_test_case_result.ag_test_suite_result.submission)
-        return os.path.join(result_output_dir, 'cmd_result_{}_stderr'.format(self.pk))
+
+    # For callers that already know the submission's result output
+    # directory and don't want to load this result's related objects.
+
+    @staticmethod
+    def get_stdout_filename(result_output_dir: str, cmd_result_pk: int) -> str:
+        return os.path.join(result_output_dir, 'cmd_result_{}_stdout'.format(cmd_result_pk))
+
+    @staticmethod
+    def get_stderr_filename(result_output_dir: str, cmd_result_pk: int) -> str:
+        return os.path.join(result_output_dir, 'cmd_result_{}_stderr'.format(cmd_result_pk))
+
+    @staticmethod
+    def get_stdout_diff_filename(result_output_dir: str, cmd_result_pk: int) -> str:
+        return AGTestCommandResult.get_stdout_filename(result_output_dir, cmd_result_pk) + '_diff'
+
+    @staticmethod
+    def get_stderr_diff_filename(result_output_dir: str, cmd_result_pk: int) -> str:
+        return AGTestCommandResult.get_stderr_filename(result_output_dir, cmd_result_pk) + '_diff'
 
     # Serializing AGTestCommandResults should be used for DENORMALIZATION
     # ONLY.
@@ -63,4 +108,7 @@ class AGTestCommandResult(AGCommandResultBase):
 
         'stdout_truncated',
         'stderr_truncated',
+
+        'stdout_diff_size',
+        'stderr_diff_size',
     )
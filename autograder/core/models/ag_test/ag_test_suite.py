@@ -144,6 +144,44 @@ class AGTestSuite(AutograderModel):
                      have yet to be graded do not prevent members of a group from submitting
                      again.''')
 
+    run_test_cases_in_parallel = models.BooleanField(
+        default=False,
+        help_text='''When True, this suite's test cases will be run concurrently in the same
+                     sandbox after the setup command finishes. Only enable this if the
+                     test cases do not interfere with each other (e.g., by writing to the
+                     same files).''')
+
+    batch_test_case_commands = models.BooleanField(
+        default=False,
+        help_text='''When True, the commands in each of this suite's test cases are sent to
+                     the sandbox together and run one after another by a single process
+                     inside the sandbox, instead of starting a separate process in the
+                     sandbox for each command. This reduces the overhead of running many
+                     short commands. Each command still has its own time limit, resource
+                     limits, and stdin.''')
+
+    reuse_setup_snapshots = models.BooleanField(
+        default=False,
+        help_text='''When True, the contents of the sandbox's working directory after this
+                     suite's setup command finishes are cached along with the setup
+                     command's results. When this suite or another suite with this field
+                     set to True is graded with the same setup command, sandbox image,
+                     files, and group members (e.g., another suite that compiles the same
+                     code, or a rerun), the working directory is restored from the cache
+                     instead of running the setup command again. Only enable this if the
+                     setup command only changes files in the working directory and its
+                     results depend only on those inputs.''')
+
+    deterministic = models.BooleanField(
+        default=False,
+        help_text='''When True, indicates that the results of this suite depend only on
+                     its configuration, its sandbox image, the contents of the files
+                     added to the sandbox, and the usernames of the group being graded.
+                     When a submission is graded with exactly the same inputs as an
+                     earlier one, the earlier results are copied instead of running the
+                     suite again. Leave this False for suites whose results can vary
+                     between runs (e.g., tests that are timing-dependent or random).''')
+
     normal_fdbk_config = ag_fields.ValidatedJSONField(
         AGTestSuiteFeedbackConfig, default=AGTestSuiteFeedbackConfig)
     ultimate_submission_fdbk_config = ag_fields.ValidatedJSONField(
@@ -241,6 +279,10 @@ class AGTestSuite(AutograderModel):
         'sandbox_docker_image',
         'allow_network_access',
         'deferred',
+        'run_test_cases_in_parallel',
+        'batch_test_case_commands',
+        'reuse_setup_snapshots',
+        'deterministic',
 
         'normal_fdbk_config',
         'ultimate_submission_fdbk_config',
@@ -270,6 +312,10 @@ class AGTestSuite(AutograderModel):
 
         'allow_network_access',
         'deferred',
+        'run_test_cases_in_parallel',
+        'batch_test_case_commands',
+        'reuse_setup_snapshots',
+        'deterministic',
         'sandbox_docker_image',
 
         'normal_fdbk_config',
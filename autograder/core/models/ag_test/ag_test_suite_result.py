@@ -3,6 +3,7 @@ import os
 from django.db import models
 
 import autograder.core.utils as core_ut
+from autograder.core.result_output import open_output
 from ..ag_model_base import AutograderModel
 from .ag_test_suite import AGTestSuite
 
@@ -11,6 +12,7 @@ class AGTestSuiteResult(AutograderModel):
     class Meta:
         unique_together = ('ag_test_suite', 'submission')
         ordering = ('ag_test_suite___order',)
+        indexes = [models.Index(fields=['ag_test_suite', 'inputs_hash'])]
 
     ag_test_suite = models.ForeignKey(
         AGTestSuite, on_delete=models.CASCADE,
@@ -33,21 +35,42 @@ class AGTestSuiteResult(AutograderModel):
     setup_stderr_truncated = models.BooleanField(
         blank=True, default=False, help_text="Whether the setup command's stderr was truncated")
 
+    inputs_hash = models.CharField(
+        max_length=64, blank=True,
+        help_text="""When the suite is marked as deterministic, a hash of the inputs
+                     this result was graded with. Empty while the suite is being graded.
+                     See autograder/grading_tasks/tasks/ag_test_result_reuse.py""")
+
     def open_setup_stdout(self, mode='rb'):
-        return open(self.setup_stdout_filename, mode)
+        return open_output(self.setup_stdout_filename, mode)
 
     @property
     def setup_stdout_filename(self):
-        return os.path.join(core_ut.get_result_output_dir(self.submission),
-                            'suite_result_{}_setup_stdout'.format(self.pk))
+        return self.get_setup_stdout_filename(
+            core_ut.get_result_output_dir(self.submission), self.pk)
 
     def open_setup_stderr(self, mode='rb'):
-        return open(self.setup_stderr_filename, mode)
+        return open_output(self.setup_stderr_filename, mode)
 
     @property
     def setup_stderr_filename(self):
-        return os.path.join(core_ut.get_result_output_dir(self.submission),
-                            'suite_result_{}_setup_stderr'.format(self.pk))
+        return self.get_setup_stderr_filename(
+            core_ut.get_result_output_dir(self.submission), self.pk)
+
+    # The get_*_filename static methods compute the same paths as the
+    # properties above from the result's primary key and the result
+    # output directory of the submission it belongs to, without
+    # loading any related objects.
+
+    @staticmethod
+    def get_setup_stdout_filename(result_output_dir: str, suite_result_pk: int) -> str:
+        return os.path.join(result_output_dir,
+                            'suite_result_{}_setup_stdout'.format(suite_result_pk))
+
+    @staticmethod
+    def get_setup_stderr_filename(result_output_dir: str, suite_result_pk: int) -> str:
+        return os.path.join(result_output_dir,
+                            'suite_result_{}_setup_stderr'.format(suite_result_pk))
 
     # Serializing AGTestSuiteResults should be used for DENORMALIZATION
     # ONLY.
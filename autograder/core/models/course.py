@@ -1,6 +1,7 @@
 import enum
 import os
 
+from django.conf import settings
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
@@ -14,6 +15,8 @@ from .ag_model_base import AutograderModel
 
 import autograder.core.fields as ag_fields
 import autograder.core.utils as core_ut
+from autograder.utils.cache_versions import bump_cache_version, get_cache_version
+from autograder.utils.local_cache import LocalLRUCache
 
 
 class Semester(enum.Enum):
@@ -134,18 +137,22 @@ class Course(AutograderModel):
         if hasattr(self, user_roles_attr):
             return getattr(self, user_roles_attr)
 
-        cache_key = f'course_{self.pk}_user_{user.pk}'
-        user_roles = cache.get(cache_key)
-
+        user_roles = _local_user_roles_cache.get((self.pk, user.pk))
         if user_roles is None:
-            is_admin = self.admins.filter(pk=user.pk).exists()
-            user_roles = {
-                'is_admin': is_admin,
-                'is_staff': is_admin or self.staff.filter(pk=user.pk).exists(),
-                'is_handgrader': self.handgraders.filter(pk=user.pk).exists(),
-                'is_student': self.students.filter(pk=user.pk).exists(),
-            }
-            cache.set(cache_key, user_roles, timeout=None)
+            cache_key = _user_roles_cache_key(self.pk, user.pk)
+            user_roles = cache.get(cache_key)
+
+            if user_roles is None:
+                is_admin = self.admins.filter(pk=user.pk).exists()
+                user_roles = {
+                    'is_admin': is_admin,
+                    'is_staff': is_admin or self.staff.filter(pk=user.pk).exists(),
+                    'is_handgrader': self.handgraders.filter(pk=user.pk).exists(),
+                    'is_student': self.students.filter(pk=user.pk).exists(),
+                }
+                cache.set(cache_key, user_roles, timeout=settings.USER_ROLES_CACHE_TIMEOUT)
+
+            _local_user_roles_cache.set((self.pk, user.pk), user_roles)
 
         setattr(self, user_roles_attr, user_roles)
 
@@ -243,5 +250,26 @@ class LateDaysRemaining(AutograderModel):
 
 
 def clear_cached_user_roles(course_pk: int) -> None:
-    keys = cache.client.iter_keys(f'course_{course_pk}_user_*', itersize=5000)
-    cache.delete_many(list(keys))
+    """
+    Invalidates the cached roles of every user in the given course by
+    bumping the course's user roles cache version.
+    """
+    bump_cache_version(_user_roles_cache_version_key(course_pk))
+    # Other processes' local caches expire on their own after
+    # USER_ROLES_LOCAL_CACHE_TIMEOUT seconds.
+    _local_user_roles_cache.clear()
+
+
+# Roles that were recently loaded from the shared cache, keyed by
+# (course pk, user pk).
+_local_user_roles_cache = LocalLRUCache(
+    settings.USER_ROLES_LOCAL_CACHE_SIZE, settings.USER_ROLES_LOCAL_CACHE_TIMEOUT)
+
+
+def _user_roles_cache_key(course_pk: int, user_pk: int) -> str:
+    version = get_cache_version(_user_roles_cache_version_key(course_pk))
+    return f'course_{course_pk}_v{version}_user_{user_pk}'
+
+
+def _user_roles_cache_version_key(course_pk: int) -> str:
+    return f'course_{course_pk}_user_roles_version'
@@ -1,5 +1,5 @@
 import warnings
-from typing import Iterator, Optional, List, Sequence
+from typing import Dict, Iterator, Optional, List, Sequence
 
 from django.contrib.auth.models import User
 from django.db.models import Prefetch
@@ -10,32 +10,171 @@ from .project import Project, UltimateSubmissionPolicy
 from .ag_test.feedback_category import FeedbackCategory
 from .group import Group
 from .submission import Submission, get_submissions_with_results_queryset
+from .submission_score import SubmissionScore, get_submission_scores_version
+from .ultimate_submission_entry import (
+    UltimateSubmissionEntry, get_ultimate_submission_versions,
+    invalidate_group_ultimate_submissions)
 
 
 def get_ultimate_submission(group: Group, user: Optional[User]=None) -> Optional[Submission]:
+    """
+    Returns the given group's ultimate submission, or, if user is not
+    None, the ultimate submission for that member of the group.
+    The result is read from the group's UltimateSubmissionEntry when
+    that entry is up to date. Otherwise, the ultimate submission is
+    computed from the group's finished submissions and stored.
+    """
     project = group.project
-    [group] = _prefetch_submissions(project, [group])
-    if project.ultimate_submission_policy == UltimateSubmissionPolicy.most_recent:
+    policy = project.ultimate_submission_policy
+    username = '' if user is None else user.username
+    [(project_version, group_version)] = get_ultimate_submission_versions(
+        project.pk, [group.pk]).values()
+
+    entry = UltimateSubmissionEntry.objects.select_related('submission').filter(
+        group=group, username=username, policy=policy,
+        project_version=project_version, group_version=group_version
+    ).first()
+    if entry is not None:
+        if entry.submission is not None:
+            entry.submission.group = group
+        return entry.submission
+
+    [submission_pk] = _compute_ultimate_submission_pks(
+        project, [group], user,
+        ag_test_preloader=AGTestPreLoader(project),
+        mutation_test_suite_preloader=MutationTestSuitePreLoader(project)).values()
+    UltimateSubmissionEntry.objects.update_or_create(
+        group=group, username=username, policy=policy,
+        defaults={
+            'submission_id': submission_pk,
+            'project_version': project_version,
+            'group_version': group_version,
+        })
+    if submission_pk is None:
+        return None
+
+    submission = Submission.objects.get(pk=submission_pk)
+    submission.group = group
+    return submission
+
+
+def refresh_ultimate_submission(group: Group) -> None:
+    """
+    Invalidates the stored ultimate submissions for the given group and
+    its members, then recomputes and stores the group's ultimate
+    submission so that the next request for it doesn't have to.
+    """
+    invalidate_group_ultimate_submissions(group.pk)
+    get_ultimate_submission(group)
+
+
+def _compute_ultimate_submission_pks(
+    project: Project, groups: Sequence[Group], user: Optional[User]=None, *,
+    ag_test_preloader: AGTestPreLoader,
+    mutation_test_suite_preloader: MutationTestSuitePreLoader
+) -> Dict[int, Optional[int]]:
+    """
+    Computes the ultimate submission for each of the given groups (or
+    for user in each group) and returns a dictionary mapping the group
+    pks to the pks of their ultimate submissions (or None).
+    For the "best" policies, the stored SubmissionScores are used for
+    every group whose finished submissions all have up-to-date scores.
+    The remaining groups' submissions are loaded with their results.
+    """
+    policy = project.ultimate_submission_policy
+    if policy == UltimateSubmissionPolicy.best_with_normal_fdbk:
+        warnings.warn('best_with_normal_fdbk is currently untested and may be deprecated soon.',
+                      PendingDeprecationWarning)
+
+    ultimate_submission_pks = {}  # type: Dict[int, Optional[int]]
+    if policy in _BEST_SUBMISSION_FDBK_CATEGORIES:
+        ultimate_submission_pks = _get_best_submission_pks_from_scores(
+            project, groups, _BEST_SUBMISSION_FDBK_CATEGORIES[policy], user)
+
+    remaining = [group for group in groups if group.pk not in ultimate_submission_pks]
+    if remaining:
+        for group in _with_prefetched_submissions(project.groups.filter(pk__in=remaining)):
+            submission = _compute_ultimate_submission(
+                group, user,
+                ag_test_preloader=ag_test_preloader,
+                mutation_test_suite_preloader=mutation_test_suite_preloader)
+            ultimate_submission_pks[group.pk] = (
+                submission.pk if submission is not None else None)
+
+    return ultimate_submission_pks
+
+
+_BEST_SUBMISSION_FDBK_CATEGORIES = {
+    UltimateSubmissionPolicy.best: FeedbackCategory.max,
+    UltimateSubmissionPolicy.best_with_normal_fdbk: FeedbackCategory.normal,
+}
+
+
+def _compute_ultimate_submission(
+    group: Group, user: Optional[User]=None, *,
+    ag_test_preloader: AGTestPreLoader,
+    mutation_test_suite_preloader: MutationTestSuitePreLoader
+) -> Optional[Submission]:
+    """
+    Computes the ultimate submission for the given group (or member of
+    the group) from the group's submissions, which must be prefetched
+    with _with_prefetched_submissions.
+    """
+    policy = group.project.ultimate_submission_policy
+    if policy == UltimateSubmissionPolicy.most_recent:
         return _get_most_recent_submission(group, user)
-    elif project.ultimate_submission_policy == UltimateSubmissionPolicy.best_with_normal_fdbk:
+    elif policy in _BEST_SUBMISSION_FDBK_CATEGORIES:
         best = _get_best_submission(
             group,
-            FeedbackCategory.normal,
-            ag_test_preloader=AGTestPreLoader(project),
-            mutation_test_suite_preloader=MutationTestSuitePreLoader(project),
-            user=user
-        )
-        return best.submission if best is not None else None
-    elif project.ultimate_submission_policy == UltimateSubmissionPolicy.best:
-        best = _get_best_submission(
-            group,
-            FeedbackCategory.max,
-            ag_test_preloader=AGTestPreLoader(project),
-            mutation_test_suite_preloader=MutationTestSuitePreLoader(project),
+            _BEST_SUBMISSION_FDBK_CATEGORIES[policy],
+            ag_test_preloader=ag_test_preloader,
+            mutation_test_suite_preloader=mutation_test_suite_preloader,
             user=user
         )
         return best.submission if best is not None else None
 
+    assert False
+
+
+def _get_best_submission_pks_from_scores(
+    project: Project, groups: Sequence[Group], fdbk_category: FeedbackCategory,
+    user: Optional[User]=None
+) -> Dict[int, Optional[int]]:
+    """
+    Chooses the best submission of each of the given groups (or for
+    user in each group) using the groups' stored SubmissionScores.
+    Groups with a finished submission that doesn't have an up-to-date
+    score are left out of the returned dictionary.
+    """
+    finished_submissions = Submission.objects.filter(
+        group__in=groups, status=Submission.GradingStatus.finished_grading)
+    finished_submission_groups = dict(finished_submissions.values_list('pk', 'group_id'))
+
+    # Ties go to the most recent submission, as in _get_best_submission.
+    scores = SubmissionScore.objects.filter(
+        submission__in=finished_submission_groups.keys(),
+        fdbk_category=fdbk_category,
+        project_version=get_submission_scores_version(project.pk),
+    ).order_by(
+        '-total_points', '-submission_id'
+    ).values_list('submission_id', 'submission__does_not_count_for')
+
+    best_submission_pks = {group.pk: None for group in groups}  # type: Dict[int, Optional[int]]
+    for submission_pk, does_not_count_for in scores:
+        group_pk = finished_submission_groups.pop(submission_pk)
+        if best_submission_pks[group_pk] is not None:
+            continue
+
+        if user is None or user.username not in does_not_count_for:
+            best_submission_pks[group_pk] = submission_pk
+
+    # Any submissions left in finished_submission_groups don't have
+    # up-to-date scores.
+    for group_pk in finished_submission_groups.values():
+        best_submission_pks.pop(group_pk, None)
+
+    return best_submission_pks
+
 
 def get_ultimate_submissions(
     project: Project,
@@ -49,61 +188,97 @@ def get_ultimate_submissions(
     :param ag_test_preloader: An instance of AGTestPreloader that can be
         used to efficiently fetch test case data for project.
     :return: An iterator of feedback results for ultimate submissions
-        belonging to project.
+        belonging to project. Groups are processed GROUP_CHUNK_SIZE at
+        a time as the iterator is consumed. Up-to-date
+        UltimateSubmissionEntries are used where available, and
+        entries are stored for the groups that didn't have one.
     """
-    filter_groups = _prefetch_submissions(project, filter_groups)
+    group_queryset = project.groups.all()
+    if filter_groups is not None:
+        group_queryset = group_queryset.filter(pk__in=[group.pk for group in filter_groups])
 
     mutation_test_suite_preloader = MutationTestSuitePreLoader(project)
 
-    if project.ultimate_submission_policy == UltimateSubmissionPolicy.most_recent:
-        return (
-            SubmissionResultFeedback(
-                group.submissions.first(),
-                FeedbackCategory.max,
-                ag_test_preloader,
-                mutation_test_suite_preloader
-            )
-            for group in filter_groups if group.submissions.count()
-        )
-    elif project.ultimate_submission_policy == UltimateSubmissionPolicy.best_with_normal_fdbk:
-        warnings.warn('best_with_normal_fdbk is currently untested and may be deprecated soon.',
-                      PendingDeprecationWarning)
+    group_pks = list(group_queryset.values_list('pk', flat=True))
+    for i in range(0, len(group_pks), GROUP_CHUNK_SIZE):
+        groups = list(group_queryset.filter(pk__in=group_pks[i:i + GROUP_CHUNK_SIZE]))
+        ultimate_submission_pks = _get_ultimate_submission_pks(
+            project, groups, ag_test_preloader, mutation_test_suite_preloader)
 
-        # We need to generate best submissions with normal feedback
-        # but return SubmissionResultFeedbacks with max feedback.
-        best_submissions_fdbks = (
-            _get_best_submission(
-                group, FeedbackCategory.normal, ag_test_preloader, mutation_test_suite_preloader)
-            for group in filter_groups
-        )
-        best_submissions = (fdbk.submission for fdbk in best_submissions_fdbks
-                            if fdbk is not None)
-        return (
-            SubmissionResultFeedback(
-                submission, FeedbackCategory.max, ag_test_preloader, mutation_test_suite_preloader)
-            for submission in best_submissions)
-    elif project.ultimate_submission_policy == UltimateSubmissionPolicy.best:
-        best_submissions_fdbks = (
-            _get_best_submission(
-                group, FeedbackCategory.max, ag_test_preloader, mutation_test_suite_preloader)
-            for group in filter_groups
-        )
-        return (fdbk for fdbk in best_submissions_fdbks if fdbk is not None)
+        submissions = get_submissions_with_results_queryset(
+            base_manager=Submission.objects.filter(
+                pk__in=[pk for pk in ultimate_submission_pks.values() if pk is not None]))
+        submissions_by_pk = {submission.pk: submission for submission in submissions}
+
+        for group in groups:
+            submission_pk = ultimate_submission_pks[group.pk]
+            if submission_pk is None:
+                continue
+
+            submission = submissions_by_pk[submission_pk]
+            submission.group = group
+            yield SubmissionResultFeedback(
+                submission, FeedbackCategory.max, ag_test_preloader,
+                mutation_test_suite_preloader)
 
-    assert False
 
+# The number of groups whose ultimate submissions are loaded into
+# memory at once by get_ultimate_submissions.
+GROUP_CHUNK_SIZE = 50
+
+
+def _get_ultimate_submission_pks(
+    project: Project, groups: List[Group],
+    ag_test_preloader: AGTestPreLoader,
+    mutation_test_suite_preloader: MutationTestSuitePreLoader
+) -> Dict[int, Optional[int]]:
+    """
+    Returns a dictionary mapping the pk of each of the given groups to
+    the pk of that group's ultimate submission (or None).
+    """
+    policy = project.ultimate_submission_policy
+    versions = get_ultimate_submission_versions(project.pk, [group.pk for group in groups])
 
-def _prefetch_submissions(project: Project, groups: Optional[Sequence[Group]]) -> List[Group]:
+    entries = UltimateSubmissionEntry.objects.filter(
+        group__in=groups, username='', policy=policy)
+    ultimate_submission_pks = {
+        entry.group_id: entry.submission_id for entry in entries
+        if (entry.project_version, entry.group_version) == versions[entry.group_id]
+    }  # type: Dict[int, Optional[int]]
+
+    out_of_date = [group for group in groups if group.pk not in ultimate_submission_pks]
+    if not out_of_date:
+        return ultimate_submission_pks
+
+    ultimate_submission_pks.update(_compute_ultimate_submission_pks(
+        project, out_of_date,
+        ag_test_preloader=ag_test_preloader,
+        mutation_test_suite_preloader=mutation_test_suite_preloader))
+
+    # Replace the out of date entries. ignore_conflicts is needed in
+    # case another process stored an entry for one of these groups in
+    # the meantime.
+    UltimateSubmissionEntry.objects.filter(
+        group__in=out_of_date, username='', policy=policy).delete()
+    UltimateSubmissionEntry.objects.bulk_create([
+        UltimateSubmissionEntry(
+            group=group, username='', policy=policy,
+            submission_id=ultimate_submission_pks[group.pk],
+            project_version=versions[group.pk][0],
+            group_version=versions[group.pk][1])
+        for group in out_of_date
+    ], ignore_conflicts=True)
+
+    return ultimate_submission_pks
+
+
+def _with_prefetched_submissions(group_queryset) -> List[Group]:
     finished_submissions_queryset = Submission.objects.filter(
         status=Submission.GradingStatus.finished_grading)
 
-    base_group_queryset = project.groups
-    if groups is not None:
-        base_group_queryset = base_group_queryset.filter(pk__in=[group.pk for group in groups])
-
     submissions_queryset = get_submissions_with_results_queryset(
         base_manager=finished_submissions_queryset)
-    return base_group_queryset.prefetch_related(Prefetch('submissions', submissions_queryset))
+    return group_queryset.prefetch_related(Prefetch('submissions', submissions_queryset))
 
 
 def _get_most_recent_submission(group: Group, user: Optional[User]=None) -> Optional[Submission]:
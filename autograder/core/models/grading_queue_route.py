@@ -0,0 +1,253 @@
+import enum
+import statistics
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import DurationField, ExpressionWrapper, F, Sum
+from django.utils import timezone
+
+from autograder.core.fields import EnumField
+
+from .ag_model_base import AutograderModel
+from .ag_test.ag_test_command import AGTestCommand
+from .mutation_test_suite import MutationTestSuite
+from .project import Project
+from .submission import Submission
+
+
+class GradingQueueClass(enum.Enum):
+    # Submissions are sent to the queue given by settings.FAST_QUEUE_TMPL
+    fast = 'fast'
+    # Submissions are sent to the queue given by settings.SUBMISSION_QUEUE_TMPL
+    slow = 'slow'
+
+
+class GradingQueueRoute(AutograderModel):
+    """
+    Stores the information used to decide which queue a project's
+    submissions are sent to for grading.
+
+    Once at least settings.GRADING_TIME_MIN_SAMPLES submissions to the
+    project have been graded, the median time it actually took to grade
+    the non-deferred tests of recent submissions is used. Until then,
+    the worst-case grading time (computed from the tests' time limits)
+    is used.
+    """
+
+    project = models.OneToOneField(
+        Project, primary_key=True, on_delete=models.CASCADE,
+        related_name='grading_queue_route')
+
+    worst_case_grading_time = models.IntegerField(
+        default=0,
+        help_text="""The sum of the time limits, in seconds, of the project's non-deferred
+                     tests.""")
+    median_grading_time = models.FloatField(
+        blank=True, null=True, default=None,
+        help_text="""The median time, in seconds, spent grading the non-deferred tests of
+                     the project's most recently graded submissions.""")
+    num_grading_time_samples = models.IntegerField(
+        default=0,
+        help_text="The number of submissions used to compute median_grading_time.")
+
+    queue_class = EnumField(GradingQueueClass, default=GradingQueueClass.fast)
+
+    last_modified = models.DateTimeField(auto_now=True)
+
+    def update_queue_class(self) -> None:
+        """
+        Sets self.queue_class based on the grading time fields.
+        """
+        grading_time = self.worst_case_grading_time  # type: float
+        if (self.median_grading_time is not None
+                and self.num_grading_time_samples >= settings.GRADING_TIME_MIN_SAMPLES):
+            grading_time = self.median_grading_time
+
+        if grading_time > settings.SLOW_QUEUE_GRADING_TIME_THRESHOLD:
+            self.queue_class = GradingQueueClass.slow
+        else:
+            self.queue_class = GradingQueueClass.fast
+
+    @staticmethod
+    def get_queue_class(project_pk: int) -> GradingQueueClass:
+        """
+        Returns the GradingQueueClass that submissions to the given
+        project should be sent to, creating the project's
+        GradingQueueRoute if it doesn't exist yet.
+        """
+        cached = cache.get(_queue_class_cache_key(project_pk))
+        if cached is not None:
+            return GradingQueueClass(cached)
+
+        route = GradingQueueRoute.objects.filter(project=project_pk).first()
+        if route is None:
+            route = GradingQueueRoute.update_worst_case_grading_time(project_pk)
+        _cache_queue_class(route)
+
+        return route.queue_class
+
+    @staticmethod
+    @transaction.atomic
+    def update_worst_case_grading_time(project_pk: int) -> 'GradingQueueRoute':
+        """
+        Recomputes worst_case_grading_time for the given project.
+        """
+        route = _load_route_for_update(project_pk)
+        route.worst_case_grading_time = compute_worst_case_grading_time(project_pk)
+        route.update_queue_class()
+        # update_median_grading_time() doesn't lock the route, so we
+        # leave the fields it updates alone.
+        route.save(update_fields=['worst_case_grading_time', 'queue_class', 'last_modified'])
+        _cache_queue_class_on_commit(route)
+        return route
+
+    @staticmethod
+    @transaction.atomic
+    def refresh_worst_case_grading_time(project_pk: int) -> None:
+        """
+        Like update_worst_case_grading_time, but does nothing if the
+        project doesn't have a GradingQueueRoute yet. Use this in
+        signal handlers that may run while a project is being deleted.
+        """
+        route = GradingQueueRoute.objects.select_for_update().filter(project=project_pk).first()
+        if route is None:
+            cache.delete(_queue_class_cache_key(project_pk))
+            return
+
+        route.worst_case_grading_time = compute_worst_case_grading_time(project_pk)
+        route.update_queue_class()
+        # If the project is being deleted, the route may already be gone,
+        # in which case save() would try to insert it again.
+        GradingQueueRoute.objects.filter(project=project_pk).update(
+            worst_case_grading_time=route.worst_case_grading_time,
+            queue_class=route.queue_class,
+            last_modified=timezone.now())
+        _cache_queue_class_on_commit(route)
+
+    @staticmethod
+    def update_median_grading_time(project_pk: int) -> 'GradingQueueRoute':
+        """
+        Recomputes median_grading_time from the most recently graded
+        settings.GRADING_TIME_NUM_SAMPLES submissions to the given project.
+
+        This is called every time a submission finishes grading, so the
+        route isn't locked, which keeps workers that finish grading
+        submissions to the same project at the same time from waiting
+        on each other. If two workers update the median at once, the
+        last one wins. If worst_case_grading_time keeps changing while
+        we try to save, we give up after _MAX_MEDIAN_UPDATE_ATTEMPTS
+        tries and save the route while holding a lock on it instead.
+        """
+        durations = Submission.objects.filter(
+            project=project_pk,
+            grading_start_time__isnull=False,
+            non_deferred_grading_end_time__isnull=False,
+        ).annotate(
+            grading_time=ExpressionWrapper(
+                F('non_deferred_grading_end_time') - F('grading_start_time'),
+                output_field=DurationField())
+        ).order_by('-pk').values_list('grading_time', flat=True)[
+            :settings.GRADING_TIME_NUM_SAMPLES]
+
+        # A submission that is being regraded can have a grading start
+        # time that is after its (old) end time.
+        samples = [
+            duration.total_seconds() for duration in durations
+            if duration.total_seconds() >= 0
+        ]
+
+        median_grading_time = statistics.median(samples) if samples else None
+        for i in range(_MAX_MEDIAN_UPDATE_ATTEMPTS):
+            route = GradingQueueRoute.objects.get_or_create(project_id=project_pk)[0]
+            route.median_grading_time = median_grading_time
+            route.num_grading_time_samples = len(samples)
+            route.update_queue_class()
+            route.last_modified = timezone.now()
+
+            # queue_class also depends on worst_case_grading_time, so we
+            # only save our queue_class if worst_case_grading_time hasn't
+            # changed since we loaded the route.
+            num_updated = GradingQueueRoute.objects.filter(
+                project=project_pk,
+                worst_case_grading_time=route.worst_case_grading_time
+            ).update(
+                median_grading_time=route.median_grading_time,
+                num_grading_time_samples=route.num_grading_time_samples,
+                queue_class=route.queue_class,
+                last_modified=route.last_modified)
+            if num_updated:
+                _cache_queue_class_on_commit(route)
+                return route
+
+        with transaction.atomic():
+            route = _load_route_for_update(project_pk)
+            route.median_grading_time = median_grading_time
+            route.num_grading_time_samples = len(samples)
+            route.update_queue_class()
+            route.save(update_fields=[
+                'median_grading_time', 'num_grading_time_samples', 'queue_class', 'last_modified'
+            ])
+            _cache_queue_class_on_commit(route)
+        return route
+
+    SERIALIZABLE_FIELDS = (
+        'project',
+        'worst_case_grading_time',
+        'median_grading_time',
+        'num_grading_time_samples',
+        'queue_class',
+        'last_modified',
+    )
+
+
+# The number of times update_median_grading_time() tries to save the
+# route without locking it before falling back to locking it.
+_MAX_MEDIAN_UPDATE_ATTEMPTS = 3
+
+
+def compute_worst_case_grading_time(project_pk: int) -> int:
+    """
+    Returns the sum of the time limits, in seconds, of the given
+    project's non-deferred AGTestCommands and mutation test suite
+    student test validity checks.
+    """
+    ag_test_time_max = AGTestCommand.objects.filter(
+        ag_test_case__ag_test_suite__project=project_pk
+    ).exclude(
+        ag_test_case__ag_test_suite__deferred=True
+    ).aggregate(total=Sum('time_limit'))['total'] or 0
+
+    mutation_test_suite_time_max = sum(
+        suite.student_test_validity_check_command.time_limit * suite.max_num_student_tests
+        for suite in
+        MutationTestSuite.objects.filter(project=project_pk).exclude(deferred=True)
+    )
+
+    return ag_test_time_max + mutation_test_suite_time_max
+
+
+def _load_route_for_update(project_pk: int) -> GradingQueueRoute:
+    GradingQueueRoute.objects.get_or_create(project_id=project_pk)
+    return GradingQueueRoute.objects.select_for_update().get(project=project_pk)
+
+
+def _cache_queue_class(route: GradingQueueRoute) -> None:
+    cache.set(_queue_class_cache_key(route.project_id), route.queue_class.value, timeout=None)
+
+
+def _cache_queue_class_on_commit(route: GradingQueueRoute) -> None:
+    """
+    Caches route's queue class once the current transaction (if any)
+    commits, so that the cache never holds a queue class that was
+    rolled back. The old value is removed right away so that it isn't
+    used in the meantime.
+    """
+    cache_key = _queue_class_cache_key(route.project_id)
+    queue_class = route.queue_class.value
+    cache.delete(cache_key)
+    transaction.on_commit(lambda: cache.set(cache_key, queue_class, timeout=None))
+
+
+def _queue_class_cache_key(project_pk: int) -> str:
+    return f'project_{project_pk}_grading_queue_class'
@@ -1,2 +1,2 @@
-from .group import Group
+from .group import Group, annotate_submission_counts
 from .group_invitation import GroupInvitation
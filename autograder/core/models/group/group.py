@@ -1,16 +1,17 @@
 import os
-from typing import List
+from datetime import datetime
+from typing import List, Tuple
 
 import django.contrib.postgres.fields as pg_fields
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.db import models, transaction
+from django.db.models import Count, Q, QuerySet
 from django.db.models.expressions import F
 from django.utils import timezone
 
 import autograder.core.utils as core_ut
-from autograder import utils
 from autograder.core import constants
 
 from .. import ag_model_base
@@ -145,6 +146,9 @@ class Group(ag_model_base.AutograderModel):
 
     @property
     def num_submissions(self) -> int:
+        if hasattr(self, '_annotated_num_submissions'):
+            return self._annotated_num_submissions
+
         return self.submissions.count()
 
     @property
@@ -153,17 +157,15 @@ class Group(ag_model_base.AutograderModel):
         The number of submissions this group has made in the current 24
         hour period that are counted towards the daily submission limit.
         """
-        # We put the filtering logic here so that we can prefetch all
-        # submissions in the list groups view.
-        start_datetime, end_datetime = core_ut.get_24_hour_period(
-            self.project.submission_limit_reset_time,
-            timezone.now().astimezone(self.project.submission_limit_reset_timezone))
-
-        def _is_towards_limit(submission):
-            return (start_datetime <= submission.timestamp < end_datetime
-                    and submission.status in Submission.GradingStatus.count_towards_limit_statuses)
+        if hasattr(self, '_annotated_num_submits_towards_limit'):
+            return self._annotated_num_submits_towards_limit
 
-        return utils.count_if(self.submissions.all(), _is_towards_limit)
+        start_datetime, end_datetime = _get_submission_limit_period(self.project)
+        return self.submissions.filter(
+            timestamp__gte=start_datetime,
+            timestamp__lt=end_datetime,
+            status__in=Submission.GradingStatus.count_towards_limit_statuses
+        ).count()
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
@@ -234,3 +236,30 @@ class Group(ag_model_base.AutograderModel):
         result = super().to_dict()
         result['members'].sort(key=lambda user: user['username'])
         return result
+
+
+def annotate_submission_counts(queryset: QuerySet, project: Project) -> QuerySet:
+    """
+    Annotates the groups in queryset, which must belong to the given
+    project, with the values of num_submissions and
+    num_submits_towards_limit so that listing groups doesn't require
+    loading their submissions or running one query per group.
+    """
+    start_datetime, end_datetime = _get_submission_limit_period(project)
+    return queryset.annotate(
+        _annotated_num_submissions=Count('submissions'),
+        _annotated_num_submits_towards_limit=Count(
+            'submissions',
+            filter=Q(
+                submissions__timestamp__gte=start_datetime,
+                submissions__timestamp__lt=end_datetime,
+                submissions__status__in=Submission.GradingStatus.count_towards_limit_statuses
+            )
+        ),
+    )
+
+
+def _get_submission_limit_period(project: Project) -> Tuple[datetime, datetime]:
+    return core_ut.get_24_hour_period(
+        project.submission_limit_reset_time,
+        timezone.now().astimezone(project.submission_limit_reset_timezone))
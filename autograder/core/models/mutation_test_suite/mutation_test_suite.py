@@ -290,6 +290,13 @@ class MutationTestSuite(AutograderModel):
         help_text='''Specifies whether the sandbox should allow commands run inside of it to
                      make network calls outside of the sandbox.''')
 
+    run_student_tests_in_parallel = models.BooleanField(
+        default=False,
+        help_text='''When True, student test validity checks and buggy implementation
+                     commands will be run concurrently in the same sandbox. Only enable
+                     this if those commands do not interfere with each other (e.g., by
+                     writing to the same files).''')
+
     normal_fdbk_config = ag_fields.ValidatedJSONField(
         MutationTestSuiteFeedbackConfig,
         default=MutationTestSuiteFeedbackConfig,
@@ -386,6 +393,7 @@ class MutationTestSuite(AutograderModel):
         'deferred',
         'sandbox_docker_image',
         'allow_network_access',
+        'run_student_tests_in_parallel',
 
         'normal_fdbk_config',
         'ultimate_submission_fdbk_config',
@@ -416,6 +424,7 @@ class MutationTestSuite(AutograderModel):
         'deferred',
         'sandbox_docker_image',
         'allow_network_access',
+        'run_student_tests_in_parallel',
 
         'normal_fdbk_config',
         'ultimate_submission_fdbk_config',
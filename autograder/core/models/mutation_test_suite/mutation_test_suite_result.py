@@ -1,3 +1,4 @@
+import io
 import os
 from decimal import Decimal
 from typing import BinaryIO, List, Optional
@@ -6,6 +7,7 @@ from django.db import models
 
 import autograder.core.fields as ag_fields
 import autograder.core.utils as core_ut
+from autograder.core.result_output import get_output_size, open_output, write_output
 
 from ..ag_command import AGCommandResult
 from ..ag_model_base import AutograderModel, ToDictMixin
@@ -82,10 +84,10 @@ class MutationTestSuiteResult(AutograderModel):
 
         if is_create:
             # The result output dir is created by self.submission
-            open(self.validity_check_stdout_filename, 'w').close()
-            open(self.validity_check_stderr_filename, 'w').close()
-            open(self.grade_buggy_impls_stdout_filename, 'w').close()
-            open(self.grade_buggy_impls_stderr_filename, 'w').close()
+            write_output(io.BytesIO(), self.validity_check_stdout_filename)
+            write_output(io.BytesIO(), self.validity_check_stderr_filename)
+            write_output(io.BytesIO(), self.grade_buggy_impls_stdout_filename)
+            write_output(io.BytesIO(), self.grade_buggy_impls_stderr_filename)
 
     def get_fdbk(
         self,
@@ -182,13 +184,13 @@ class MutationTestSuiteResult(AutograderModel):
             if not self._show_setup_stdout:
                 return None
 
-            return open(self._mutation_test_suite_result.setup_result.stdout_filename, 'rb')
+            return open_output(self._mutation_test_suite_result.setup_result.stdout_filename)
 
         def get_setup_stdout_size(self) -> Optional[int]:
             if not self._show_setup_stdout:
                 return None
 
-            return os.path.getsize(self._mutation_test_suite_result.setup_result.stdout_filename)
+            return get_output_size(self._mutation_test_suite_result.setup_result.stdout_filename)
 
         @property
         def _show_setup_stdout(self):
@@ -200,13 +202,13 @@ class MutationTestSuiteResult(AutograderModel):
             if not self._show_setup_stderr:
                 return None
 
-            return open(self._mutation_test_suite_result.setup_result.stderr_filename, 'rb')
+            return open_output(self._mutation_test_suite_result.setup_result.stderr_filename)
 
         def get_setup_stderr_size(self) -> Optional[int]:
             if not self._show_setup_stderr:
                 return None
 
-            return os.path.getsize(self._mutation_test_suite_result.setup_result.stderr_filename)
+            return get_output_size(self._mutation_test_suite_result.setup_result.stderr_filename)
 
         @property
         def _show_setup_stderr(self):
@@ -254,14 +256,14 @@ class MutationTestSuiteResult(AutograderModel):
             if not self._fdbk.show_get_test_names_stdout:
                 return None
 
-            return open(
-                self._mutation_test_suite_result.get_test_names_result.stdout_filename, 'rb')
+            return open_output(
+                self._mutation_test_suite_result.get_test_names_result.stdout_filename)
 
         def get_student_test_names_stdout_size(self) -> Optional[int]:
             if not self._fdbk.show_get_test_names_stdout:
                 return None
 
-            return os.path.getsize(
+            return get_output_size(
                 self._mutation_test_suite_result.get_test_names_result.stdout_filename)
 
         @property
@@ -269,14 +271,14 @@ class MutationTestSuiteResult(AutograderModel):
             if not self._fdbk.show_get_test_names_stderr:
                 return None
 
-            return open(
-                self._mutation_test_suite_result.get_test_names_result.stderr_filename, 'rb')
+            return open_output(
+                self._mutation_test_suite_result.get_test_names_result.stderr_filename)
 
         def get_student_test_names_stderr_size(self) -> Optional[int]:
             if not self._fdbk.show_get_test_names_stderr:
                 return None
 
-            return os.path.getsize(
+            return get_output_size(
                 self._mutation_test_suite_result.get_test_names_result.stderr_filename)
 
         @property
@@ -305,26 +307,26 @@ class MutationTestSuiteResult(AutograderModel):
             if not self._fdbk.show_validity_check_stdout:
                 return None
 
-            return open(self._mutation_test_suite_result.validity_check_stdout_filename, 'rb')
+            return open_output(self._mutation_test_suite_result.validity_check_stdout_filename)
 
         def get_validity_check_stdout_size(self) -> Optional[int]:
             if not self._fdbk.show_validity_check_stdout:
                 return None
 
-            return os.path.getsize(self._mutation_test_suite_result.validity_check_stdout_filename)
+            return get_output_size(self._mutation_test_suite_result.validity_check_stdout_filename)
 
         @property
         def validity_check_stderr(self) -> Optional[BinaryIO]:
             if not self._fdbk.show_validity_check_stderr:
                 return None
 
-            return open(self._mutation_test_suite_result.validity_check_stderr_filename, 'rb')
+            return open_output(self._mutation_test_suite_result.validity_check_stderr_filename)
 
         def get_validity_check_stderr_size(self) -> Optional[int]:
             if not self._fdbk.show_validity_check_stderr:
                 return None
 
-            return os.path.getsize(
+            return get_output_size(
                 self._mutation_test_suite_result.validity_check_stderr_filename)
 
         @property
@@ -332,13 +334,13 @@ class MutationTestSuiteResult(AutograderModel):
             if not self._fdbk.show_grade_buggy_impls_stdout:
                 return None
 
-            return open(self._mutation_test_suite_result.grade_buggy_impls_stdout_filename, 'rb')
+            return open_output(self._mutation_test_suite_result.grade_buggy_impls_stdout_filename)
 
         def get_grade_buggy_impls_stdout_size(self) -> Optional[int]:
             if not self._fdbk.show_grade_buggy_impls_stdout:
                 return None
 
-            return os.path.getsize(
+            return get_output_size(
                 self._mutation_test_suite_result.grade_buggy_impls_stdout_filename)
 
         @property
@@ -346,13 +348,13 @@ class MutationTestSuiteResult(AutograderModel):
             if not self._fdbk.show_grade_buggy_impls_stderr:
                 return None
 
-            return open(self._mutation_test_suite_result.grade_buggy_impls_stderr_filename, 'rb')
+            return open_output(self._mutation_test_suite_result.grade_buggy_impls_stderr_filename)
 
         def get_grade_buggy_impls_stderr_size(self) -> Optional[int]:
             if not self._fdbk.show_grade_buggy_impls_stderr:
                 return None
 
-            return os.path.getsize(
+            return get_output_size(
                 self._mutation_test_suite_result.grade_buggy_impls_stderr_filename)
 
         @property
@@ -3,7 +3,7 @@ import enum
 from django.db import models
 
 from autograder.core.fields import EnumField
-from ..task import Task
+from ..task import Task, TaskProgressCounter
 from .project import Project
 
 
@@ -19,6 +19,23 @@ class DownloadTask(Task):
     download_type = EnumField(DownloadType)
     result_filename = models.TextField(blank=True)
 
+    @property
+    def live_progress(self) -> int:
+        """
+        The task's progress, including progress that hasn't been
+        written to the database yet.
+        """
+        live_value = download_progress_counter(self.pk).get()
+        if live_value is None:
+            return self.progress
+
+        return max(self.progress, live_value)
+
+    def to_dict(self):
+        result = super().to_dict()
+        result['progress'] = self.live_progress
+        return result
+
     SERIALIZABLE_FIELDS = (
         'pk',
         'project',
@@ -34,3 +51,18 @@ class DownloadTask(Task):
         'progress',
         'error_msg',
     )
+
+
+# The progress of a download is written to the database every this
+# many percentage points.
+DOWNLOAD_PROGRESS_FLUSH_INTERVAL = 10
+
+
+def download_progress_counter(download_task_pk: int) -> TaskProgressCounter:
+    """
+    Returns the counter that holds the live progress of the
+    DownloadTask with the given pk. See TaskProgressCounter.
+    """
+    return TaskProgressCounter(
+        DownloadTask, download_task_pk, 'progress',
+        flush_interval=DOWNLOAD_PROGRESS_FLUSH_INTERVAL)
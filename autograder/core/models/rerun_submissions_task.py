@@ -1,9 +1,10 @@
 from celery.result import GroupResult
 from django.contrib.postgres.fields import ArrayField, JSONField
 from django.core import exceptions
+from django.core.cache import cache
 from django.db import models
 
-from .task import Task
+from .task import Task, TaskProgressCounter
 from .submission import Submission
 from .project import Project
 from .ag_test.ag_test_suite import AGTestSuite
@@ -73,7 +74,14 @@ class RerunSubmissionsTask(Task):
         if self.total_num_subtasks == 0:
             return 100
 
-        return int(min((self.num_completed_subtasks / self.total_num_subtasks) * 100, 100))
+        num_completed_subtasks = self.num_completed_subtasks
+        if self.pk is not None:
+            # Include progress that hasn't been written to the database yet.
+            live_value = num_completed_subtasks_counter(self.pk).get()
+            if live_value is not None:
+                num_completed_subtasks = max(num_completed_subtasks, live_value)
+
+        return int(min((num_completed_subtasks / self.total_num_subtasks) * 100, 100))
 
     def save(self, *args, **kwargs):
         if self.pk is None:
@@ -101,7 +109,10 @@ class RerunSubmissionsTask(Task):
 
             self.total_num_subtasks = num_submissions * (num_ag_test_suites + num_mutation_suites)
 
-        return super().save(*args, **kwargs)
+        super().save(*args, **kwargs)
+
+        if self.is_cancelled:
+            cache.set(_cancelled_cache_key(self.pk), True, timeout=RERUN_TASK_CACHE_TIMEOUT)
 
     def clean(self):
         super().clean()
@@ -177,3 +188,37 @@ class RerunSubmissionsTask(Task):
         'rerun_all_mutation_test_suites',
         'mutation_suite_pks',
     ]
+
+
+# Reruns finish well within this many seconds, so per-task state that
+# is kept in the cache while a rerun is in progress expires after it.
+RERUN_TASK_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+
+# The number of completed subtasks is written to the database every
+# this many subtasks.
+NUM_COMPLETED_SUBTASKS_FLUSH_INTERVAL = 50
+
+
+def num_completed_subtasks_counter(rerun_task_pk: int) -> TaskProgressCounter:
+    """
+    Returns the counter that rerun workers increment after rerunning
+    each suite for a submission. See TaskProgressCounter.
+    """
+    return TaskProgressCounter(
+        RerunSubmissionsTask, rerun_task_pk, 'num_completed_subtasks',
+        flush_interval=NUM_COMPLETED_SUBTASKS_FLUSH_INTERVAL)
+
+
+def rerun_task_is_cancelled(rerun_task_pk: int) -> bool:
+    """
+    Returns True if the RerunSubmissionsTask with the given pk has been
+    cancelled. Unlike refreshing the task from the database, this only
+    reads a flag from the cache, so it's cheap enough to check before
+    grading every suite. The flag is set when a cancelled task is saved.
+    """
+    return cache.get(_cancelled_cache_key(rerun_task_pk), False)
+
+
+def _cancelled_cache_key(rerun_task_pk: int) -> str:
+    return f'rerun_task_{rerun_task_pk}_cancelled'
@@ -1,5 +1,6 @@
 from typing import Optional
 from datetime import timedelta
+import copy
 import fnmatch
 import os
 
@@ -14,14 +15,12 @@ import autograder.core.constants as const
 import autograder.core.fields as ag_fields
 import autograder.core.utils as core_ut
 from autograder.core import constants
+from autograder.core.submitted_file_blobs import get_blob_path, store_blob
 from . import ag_model_base
 from .mutation_test_suite import MutationTestSuiteResult
-
-
-def _get_submission_file_upload_to_dir(submission, filename):
-    value = os.path.join(
-        core_ut.get_submission_dir(submission), filename)
-    return value
+from .submission_queue_index import (
+    add_to_queue_index, load_positions_in_queue, remove_from_queue_index)
+from .ultimate_submission_entry import invalidate_group_ultimate_submissions
 
 
 class _SubmissionManager(ag_model_base.AutograderModelManager):
@@ -62,11 +61,7 @@ class _SubmissionManager(ag_model_base.AutograderModelManager):
                     continue
 
                 submission.submitted_filenames.append(file_.name)
-                write_dest = _get_submission_file_upload_to_dir(
-                    submission, file_.name)
-                with open(write_dest, 'wb') as f:
-                    for chunk in file_.chunks():
-                        f.write(chunk)
+                submission.submitted_file_hashes[file_.name] = store_blob(file_)
 
             self.check_for_missing_files(submission)
             submission.save()
@@ -191,6 +186,16 @@ class Submission(ag_model_base.AutograderModel):
         help_text="""The names of files that were submitted,
                      excluding those that were discarded.""")
 
+    submitted_file_hashes = pg_fields.JSONField(
+        default=dict, blank=True,
+        help_text="""Maps the name of each submitted file to the SHA-256 hash of its
+                     contents, which identifies the blob in the blob store that holds
+                     the file (see autograder/core/submitted_file_blobs.py).
+                     When this is empty, the submitted files are stored in the
+                     submission's directory instead. This is the case for submissions
+                     made before the blob store was added that haven't been moved
+                     to it yet.""")
+
     discarded_files = ag_fields.StringArrayField(
         default=list, blank=True,
         help_text="""The names of files that were discarded when this Submission was created.""")
@@ -287,11 +292,10 @@ class Submission(ag_model_base.AutograderModel):
         if self.status != Submission.GradingStatus.queued:
             return 0
 
-        return Submission.objects.filter(
-            status=Submission.GradingStatus.queued,
-            group__project=self.group.project,
-            pk__lte=self.pk
-        ).count()
+        if not hasattr(self, '_position_in_queue'):
+            load_positions_in_queue([self])
+
+        return self._position_in_queue
 
     @property
     def _time_spent_in_queue(self) -> Optional[timedelta]:
@@ -317,23 +321,84 @@ class Submission(ag_model_base.AutograderModel):
         open() function).
         If the file doesn't exist, ObjectDoesNotExist will be raised.
         """
+        return File(open(self.get_file_path(filename), mode), name=os.path.basename(filename))
+
+    def get_file_path(self, filename: str) -> str:
+        """
+        Returns the absolute path of the submitted file with the given
+        name. The path's basename is NOT necessarily the same as
+        filename. Callers that need the file under its submitted name
+        should use submitted_file_blobs.named_submitted_file_paths().
+        If the file doesn't exist, ObjectDoesNotExist will be raised.
+        """
         self._check_file_exists(filename)
-        return File(
-            open(self._get_submitted_file_dir(filename), mode),
-            name=os.path.basename(filename))
+        if self.submitted_file_hashes:
+            return get_blob_path(self.submitted_file_hashes[filename])
+
+        return os.path.join(core_ut.get_submission_dir(self), filename)
 
     def _check_file_exists(self, filename):
         if filename not in self.submitted_filenames:
             raise exceptions.ObjectDoesNotExist()
 
-    def _get_submitted_file_dir(self, filename):
-        return os.path.join(core_ut.get_submission_dir(self), filename)
-
     def get_submitted_file_basenames(self):
         return self.submitted_filenames
 
+    # The queue index and the stored ultimate submissions depend on
+    # these fields. We keep their values as of the last load or save
+    # so that save() only updates those when the fields change.
+    _TRACKED_FIELDS = ('status', 'does_not_count_for')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        submission = super().from_db(db, field_names, values)
+        submission._record_saved_values(field_names)
+        return submission
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._record_saved_values(self._TRACKED_FIELDS if fields is None else fields)
+
+    def _record_saved_values(self, field_names):
+        saved_values = self.__dict__.setdefault('_saved_values', {})
+        for field_name in self._TRACKED_FIELDS:
+            # Deferred fields aren't recorded and always count as changed.
+            if field_name in field_names and field_name in self.__dict__:
+                saved_values[field_name] = copy.copy(self.__dict__[field_name])
+
+    def _field_changed(self, field_name: str, update_fields) -> bool:
+        if update_fields is not None and field_name not in update_fields:
+            return False
+
+        saved_values = self.__dict__.get('_saved_values', {})
+        return (field_name not in saved_values
+                or getattr(self, field_name) != saved_values[field_name])
+
     def save(self, *args, **kwargs):
+        adding = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        status_changed = self._field_changed('status', update_fields)
+        does_not_count_for_changed = self._field_changed('does_not_count_for', update_fields)
+
         super().save(*args, **kwargs)
+        self._record_saved_values(self._TRACKED_FIELDS if update_fields is None else update_fields)
+
+        if hasattr(self, '_position_in_queue'):
+            del self._position_in_queue
+
+        if status_changed:
+            if self.status == Submission.GradingStatus.queued:
+                add_to_queue_index(self.project_id, [self.pk])
+            elif not adding:
+                remove_from_queue_index(self.project_id, [self.pk])
+
+        # A submission finishing grading or changing which users it
+        # counts for may change which submission is ultimate. Changes to
+        # the results of a finished submission are handled by
+        # update_denormalized_ag_test_results().
+        if (self.status == Submission.GradingStatus.finished_grading
+                and (status_changed or does_not_count_for_changed)):
+            invalidate_group_ultimate_submissions(self.group_id)
 
         # result_output_dir is a subdir of the submission dir
         result_output_dir = core_ut.get_result_output_dir(self)
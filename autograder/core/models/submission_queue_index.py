@@ -0,0 +1,199 @@
+"""
+A per-project index of queued submissions, stored in a Redis sorted
+set, that lets positions in the grading queue be looked up without
+counting rows in the submission table.
+
+Submissions are added to their project's index when their status is
+changed to "queued" and removed when it changes to anything else.
+If a submission whose status is "queued" is missing from the index
+(e.g. because the cache was cleared), the project's index is rebuilt
+from the database.
+
+A submission that is no longer queued can be left in the index if it's
+removed before the transaction that dequeues it commits and the index
+is rebuilt in the meantime. Since such entries would inflate the
+positions of every submission after them, the periodic
+queue_submissions task removes them with prune_queue_indexes(). The
+projects that have an index are recorded in a Redis set so that
+prune_queue_indexes() doesn't have to scan the keyspace for them.
+"""
+
+from typing import Dict, Iterable, List, Sequence, TYPE_CHECKING, Union
+
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import WatchError
+
+if TYPE_CHECKING:
+    from .submission import Submission
+
+
+def add_to_queue_index(project_pk: int, submission_pks: Iterable[int]) -> None:
+    members = {submission_pk: submission_pk for submission_pk in submission_pks}
+    if members:
+        pipeline = get_redis_connection('default').pipeline(transaction=True)
+        pipeline.zadd(_queue_index_key(project_pk), members)
+        pipeline.sadd(_indexed_projects_key(), project_pk)
+        pipeline.execute()
+
+
+def remove_from_queue_index(project_pk: int, submission_pks: Iterable[int]) -> None:
+    submission_pks = list(submission_pks)
+    if submission_pks:
+        get_redis_connection('default').zrem(_queue_index_key(project_pk), *submission_pks)
+
+
+def rebuild_queue_index(project_pk: int) -> None:
+    """
+    Replaces the given project's queue index with the pks of the
+    project's submissions that currently have status "queued".
+    """
+    from .submission import Submission
+
+    queued_pks = list(Submission.objects.filter(
+        project=project_pk, status=Submission.GradingStatus.queued
+    ).values_list('pk', flat=True))
+
+    key = _queue_index_key(project_pk)
+    pipeline = get_redis_connection('default').pipeline(transaction=True)
+    pipeline.delete(key)
+    if queued_pks:
+        pipeline.zadd(key, {submission_pk: submission_pk for submission_pk in queued_pks})
+        pipeline.sadd(_indexed_projects_key(), project_pk)
+    pipeline.execute()
+
+    # Submissions that were dequeued (and removed from the index) after
+    # we loaded queued_pks were just added back, so we remove them again.
+    dequeued_pks = Submission.objects.filter(
+        pk__in=queued_pks
+    ).exclude(
+        status=Submission.GradingStatus.queued
+    ).values_list('pk', flat=True)
+    remove_from_queue_index(project_pk, dequeued_pks)
+
+
+def prune_queue_indexes() -> None:
+    """
+    Removes submissions that are no longer queued from every project's
+    queue index.
+    """
+    from .submission import Submission
+
+    redis = get_redis_connection('default')
+    project_pks = [int(project_pk) for project_pk in redis.smembers(_indexed_projects_key())]
+    if not project_pks:
+        return
+
+    pipeline = redis.pipeline(transaction=False)
+    for project_pk in project_pks:
+        pipeline.zrange(_queue_index_key(project_pk), 0, -1)
+    members_by_project = {
+        project_pk: [int(member) for member in members]
+        for project_pk, members in zip(project_pks, pipeline.execute())
+    }
+
+    # A submission that's queued after this query is only added to the
+    # index after its status is committed, so it can't be removed here.
+    queued_pks = set(Submission.objects.filter(
+        pk__in=[pk for members in members_by_project.values() for pk in members],
+        status=Submission.GradingStatus.queued
+    ).values_list('pk', flat=True))
+
+    pipeline = redis.pipeline(transaction=False)
+    for project_pk, members in members_by_project.items():
+        stale = [pk for pk in members if pk not in queued_pks]
+        if stale:
+            pipeline.zrem(_queue_index_key(project_pk), *stale)
+    pipeline.execute()
+
+    # Redis deletes sorted sets when their last member is removed.
+    for project_pk, members in members_by_project.items():
+        if not members:
+            _untrack_if_empty(redis, project_pk)
+
+
+def get_positions_in_queue(submissions: Sequence['Submission']) -> Dict[int, int]:
+    """
+    Returns a dictionary mapping the pk of each of the given
+    submissions to its position in its project's grading queue
+    (starting at 1), or to 0 if the submission isn't queued.
+    All of the positions are looked up with one Redis request.
+    """
+    from .submission import Submission
+
+    positions = {submission.pk: 0 for submission in submissions}
+    queued = [submission for submission in submissions
+              if submission.status == Submission.GradingStatus.queued]
+    if not queued:
+        return positions
+
+    missing = _load_ranks(queued, positions)
+    if missing:
+        for project_pk in {submission.project_id for submission in missing}:
+            rebuild_queue_index(project_pk)
+
+        # Any submissions that are still missing were dequeued after
+        # they were loaded.
+        _load_ranks(missing, positions)
+
+    return positions
+
+
+def load_positions_in_queue(submissions: Sequence['Submission']) -> None:
+    """
+    Looks up the queue positions of the given submissions in bulk so
+    that Submission.position_in_queue doesn't have to look them up
+    one at a time.
+    """
+    positions = get_positions_in_queue(submissions)
+    for submission in submissions:
+        submission._position_in_queue = positions[submission.pk]
+
+
+def _load_ranks(submissions: Sequence['Submission'],
+                positions: Dict[int, int]) -> List['Submission']:
+    """
+    Stores the positions of the given submissions that are in the
+    queue index in positions and returns the submissions that aren't.
+    """
+    pipeline = get_redis_connection('default').pipeline(transaction=False)
+    for submission in submissions:
+        pipeline.zrank(_queue_index_key(submission.project_id), submission.pk)
+
+    missing = []
+    for submission, rank in zip(submissions, pipeline.execute()):
+        if rank is None:
+            missing.append(submission)
+        else:
+            positions[submission.pk] = rank + 1
+
+    return missing
+
+
+def _untrack_if_empty(redis, project_pk: int) -> None:
+    """
+    Removes project_pk from the set of indexed projects if the
+    project's queue index is empty. A submission added to the index
+    concurrently makes the transaction fail, so the project stays in
+    the set.
+    """
+    key = _queue_index_key(project_pk)
+    with redis.pipeline(transaction=True) as pipeline:
+        try:
+            pipeline.watch(key)
+            if pipeline.exists(key):
+                return
+
+            pipeline.multi()
+            pipeline.srem(_indexed_projects_key(), project_pk)
+            pipeline.execute()
+        except WatchError:
+            pass
+
+
+def _queue_index_key(project_pk: Union[int, str]) -> str:
+    return cache.make_key(f'project_{project_pk}_submission_queue_index')
+
+
+def _indexed_projects_key() -> str:
+    return cache.make_key('submission_queue_indexed_projects')
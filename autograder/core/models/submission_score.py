@@ -0,0 +1,65 @@
+import django.contrib.postgres.fields as pg_fields
+from django.db import models
+
+from autograder.core.fields import EnumField
+from autograder.utils.cache_versions import bump_cache_version, get_cache_version
+
+from .ag_model_base import AutograderModel
+from .ag_test.feedback_category import FeedbackCategory
+
+
+class SubmissionScore(AutograderModel):
+    """
+    Stores the point totals of a finished submission under one
+    feedback category so that they can be queried and sorted on
+    without building a SubmissionResultFeedback. Scores are written by
+    the functions in autograder/core/submission_scores.py.
+
+    A score is only up to date if its project_version is the current
+    version returned by get_submission_scores_version(). Changing test
+    cases or their feedback settings must call
+    invalidate_project_submission_scores.
+    """
+
+    class Meta:
+        unique_together = ('submission', 'fdbk_category')
+
+    submission = models.ForeignKey(
+        'core.Submission', related_name='scores', on_delete=models.CASCADE)
+    fdbk_category = EnumField(FeedbackCategory)
+
+    total_points = models.DecimalField(max_digits=12, decimal_places=2)
+    total_points_possible = models.DecimalField(max_digits=12, decimal_places=2)
+
+    ag_test_suite_totals = pg_fields.JSONField(
+        default=dict, blank=True,
+        help_text="""Maps the pk of each AG test suite visible under fdbk_category
+                     to a [total_points, total_points_possible] pair. The point
+                     values are stored as strings.""")
+    mutation_test_suite_totals = pg_fields.JSONField(
+        default=dict, blank=True,
+        help_text="""Maps the pk of each mutation test suite visible under
+                     fdbk_category to a [total_points, total_points_possible] pair.
+                     The point values are stored as strings.""")
+
+    project_version = models.BigIntegerField()
+
+
+def invalidate_project_submission_scores(project_pk: int) -> None:
+    """
+    Marks the stored scores of every submission in the given project
+    as out of date.
+    """
+    bump_cache_version(_project_version_key(project_pk))
+
+
+def get_submission_scores_version(project_pk: int) -> int:
+    """
+    Returns the project_version that up-to-date scores for submissions
+    in the given project have.
+    """
+    return get_cache_version(_project_version_key(project_pk))
+
+
+def _project_version_key(project_pk: int) -> str:
+    return f'project_{project_pk}_submission_scores_version'
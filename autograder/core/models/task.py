@@ -1,6 +1,10 @@
+from typing import Optional, Type
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
+from django.db.models.functions import Greatest
 
 from .ag_model_base import AutograderModel
 
@@ -20,3 +24,93 @@ class Task(AutograderModel):
     @property
     def has_error(self) -> bool:
         return self.error_msg != ''
+
+
+# Tasks finish well within this many seconds, so live progress values
+# can expire from the cache after it.
+TASK_PROGRESS_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+
+class TaskProgressCounter:
+    """
+    Keeps the live value of one of a Task's integer progress fields in
+    the cache.
+
+    Updating the task's row after every unit of work makes every
+    process working on the task wait on that row's lock. Instead, the
+    live value is updated atomically in the cache and only written to
+    the database every flush_interval units of progress and whenever
+    flush() is called. Values written to the database never decrease.
+
+    :param task_class: The Task subclass whose field this counter tracks.
+    :param task_pk: The primary key of the task.
+    :param field_name: The name of the task's integer progress field.
+    :param flush_interval: The live value is written to the database
+        whenever it crosses a multiple of this number.
+    """
+
+    def __init__(self, task_class: Type[Task], task_pk: int, field_name: str, *,
+                 flush_interval: int):
+        self.task_class = task_class
+        self.task_pk = task_pk
+        self.field_name = field_name
+        self.flush_interval = max(flush_interval, 1)
+
+    def get(self) -> Optional[int]:
+        """
+        Returns the live value, or None if there's no live value in
+        the cache (e.g., because no progress has been recorded yet).
+        """
+        return cache.get(self._cache_key)
+
+    def increment(self, amount: int = 1) -> int:
+        """
+        Atomically adds amount to the live value and returns the
+        result. Safe to call from any number of processes at once.
+        """
+        try:
+            value = cache.incr(self._cache_key, amount)
+        except ValueError:
+            # The live value expired or was evicted, so we pick up from
+            # the last value written to the database. add() is a no-op
+            # if another process restored the value in the meantime.
+            cache.add(self._cache_key, self._load_flushed_value(),
+                      timeout=TASK_PROGRESS_CACHE_TIMEOUT)
+            value = cache.incr(self._cache_key, amount)
+
+        if value // self.flush_interval != (value - amount) // self.flush_interval:
+            self._write(value)
+
+        return value
+
+    def set(self, value: int) -> None:
+        """
+        Sets the live value. Meant for tasks whose progress is only
+        updated by one process.
+        """
+        previous = self.get()
+        cache.set(self._cache_key, value, timeout=TASK_PROGRESS_CACHE_TIMEOUT)
+        if previous is None or value // self.flush_interval != previous // self.flush_interval:
+            self._write(value)
+
+    def flush(self) -> None:
+        """
+        Writes the live value to the database.
+        """
+        value = self.get()
+        if value is not None:
+            self._write(value)
+
+    def _write(self, value: int) -> None:
+        # A single UPDATE that doesn't lock the row beforehand. Greatest
+        # keeps a flush that was delayed from overwriting a newer one.
+        self.task_class.objects.filter(pk=self.task_pk).update(
+            **{self.field_name: Greatest(models.F(self.field_name), value)})
+
+    def _load_flushed_value(self) -> int:
+        return self.task_class.objects.values_list(
+            self.field_name, flat=True).get(pk=self.task_pk)
+
+    @property
+    def _cache_key(self) -> str:
+        return f'{self.task_class.__name__}_{self.task_pk}_{self.field_name}'
@@ -0,0 +1,91 @@
+from typing import Dict, Sequence, Tuple
+
+from django.db import models
+
+from autograder.core import constants
+from autograder.core.fields import EnumField
+from autograder.utils.cache_versions import bump_cache_version, get_cache_versions
+
+from .ag_model_base import AutograderModel
+from .project import UltimateSubmissionPolicy
+
+
+class UltimateSubmissionEntry(AutograderModel):
+    """
+    Stores the ultimate submission of a group, or of one of the group's
+    members, under one ultimate submission policy so that it doesn't
+    have to be recomputed from all of the group's submissions every
+    time it's needed. Entries are read and written by the functions in
+    get_ultimate_submissions.py.
+
+    An entry is only up to date if its project_version and
+    group_version are the current versions returned by
+    get_ultimate_submission_versions(). Anything that could change
+    which submission is ultimate (a submission finishing grading,
+    results being rerun, test case or feedback settings changing)
+    must call invalidate_group_ultimate_submissions or
+    invalidate_project_ultimate_submissions.
+    """
+
+    class Meta:
+        unique_together = ('group', 'username', 'policy')
+
+    group = models.ForeignKey(
+        'core.Group', related_name='+', on_delete=models.CASCADE,
+        help_text='The group whose ultimate submission this entry stores.')
+    username = models.CharField(
+        max_length=constants.MAX_USERNAME_LEN, blank=True,
+        help_text="""The username of the group member this entry is for. An empty
+                     string indicates the ultimate submission for the whole group.
+                     These can differ when a submission doesn't count for some of
+                     the group's members.""")
+    policy = EnumField(UltimateSubmissionPolicy)
+
+    submission = models.ForeignKey(
+        'core.Submission', related_name='+', on_delete=models.CASCADE,
+        blank=True, null=True, default=None,
+        help_text="""The ultimate submission, or None if the group (or user) has no
+                     submission that is eligible to be ultimate.""")
+
+    project_version = models.BigIntegerField()
+    group_version = models.BigIntegerField()
+
+
+def invalidate_project_ultimate_submissions(project_pk: int) -> None:
+    """
+    Marks the stored ultimate submissions of every group in the given
+    project as out of date.
+    """
+    bump_cache_version(_project_version_key(project_pk))
+
+
+def invalidate_group_ultimate_submissions(group_pk: int) -> None:
+    """
+    Marks the stored ultimate submissions for the given group and its
+    members as out of date.
+    """
+    bump_cache_version(_group_version_key(group_pk))
+
+
+def get_ultimate_submission_versions(project_pk: int,
+                                     group_pks: Sequence[int]) -> Dict[int, Tuple[int, int]]:
+    """
+    Returns a dictionary mapping each of the given group pks to the
+    (project_version, group_version) that up-to-date entries for that
+    group have.
+    """
+    project_version_key = _project_version_key(project_pk)
+    versions = get_cache_versions(
+        [project_version_key] + [_group_version_key(group_pk) for group_pk in group_pks])
+    return {
+        group_pk: (versions[project_version_key], versions[_group_version_key(group_pk)])
+        for group_pk in group_pks
+    }
+
+
+def _project_version_key(project_pk: int) -> str:
+    return f'project_{project_pk}_ultimate_submissions_version'
+
+
+def _group_version_key(group_pk: int) -> str:
+    return f'group_{group_pk}_ultimate_submissions_version'
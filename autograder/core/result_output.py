@@ -0,0 +1,213 @@
+"""
+Storage for the output of commands run while grading submissions.
+
+Output is stored gzip-compressed, in a file named after the output's
+filename (e.g. AGTestCommandResult.stdout_filename) plus
+COMPRESSED_SUFFIX. Output recorded before compression was added is
+stored uncompressed under the output's filename until it's
+compressed with compress_output(). The functions in this module
+accept the output's filename and work with output stored either way.
+"""
+
+import gzip
+import io
+import os
+import shutil
+import struct
+import tempfile
+from typing import BinaryIO, IO
+
+from .diff import DiffSource
+
+COMPRESSED_SUFFIX = '.gz'
+
+# Output is written once but may be read many times, so we use a
+# compression level that favors size without slowing grading down
+# noticeably.
+COMPRESSION_LEVEL = 6
+
+
+class CompressedOutputFile(gzip.GzipFile):
+    """
+    A read-only file object that decompresses compressed output as
+    it's read.
+    """
+
+    def __init__(self, filename: str):
+        self.output_filename = filename
+        self.compressed_filename = filename + COMPRESSED_SUFFIX
+        super().__init__(self.compressed_filename, 'rb')
+
+    @property
+    def size(self) -> int:
+        """
+        The size of the decompressed output, in bytes.
+        """
+        return _get_compressed_output_size(self.compressed_filename)
+
+
+def write_output(source: BinaryIO, filename: str) -> None:
+    """
+    Compresses the contents of source, starting from its current
+    position, and stores them as the output at filename, replacing
+    any output already stored there.
+    """
+    _write_compressed_output(source, filename, replace=True)
+
+
+def open_output(filename: str, mode: str = 'rb') -> IO:
+    """
+    Opens the output stored at filename. When mode is a read mode,
+    compressed output is decompressed as it's read. When mode is a
+    write mode, any output already stored at filename is removed and
+    the returned file object compresses the data written to it.
+    """
+    if 'a' in mode or '+' in mode:
+        raise ValueError('Output can only be opened for reading or for writing from scratch')
+
+    if 'r' not in mode:
+        _remove_if_exists(filename)
+        if 'b' not in mode and 't' not in mode:
+            mode += 't'
+        return gzip.open(filename + COMPRESSED_SUFFIX, mode, compresslevel=COMPRESSION_LEVEL)
+
+    try:
+        output = CompressedOutputFile(filename)
+    except FileNotFoundError:
+        return open(filename, mode)
+
+    if 'b' in mode:
+        return output
+
+    return io.TextIOWrapper(output)
+
+
+def get_output_size(filename: str) -> int:
+    """
+    Returns the size of the decompressed output stored at filename
+    without decompressing it.
+    """
+    try:
+        return _get_compressed_output_size(filename + COMPRESSED_SUFFIX)
+    except FileNotFoundError:
+        return os.path.getsize(filename)
+
+
+def get_output_diff_source(filename: str) -> DiffSource:
+    """
+    Returns the output stored at filename in a form that can be
+    passed to autograder.core.utils.get_diff(). Uncompressed output
+    is diffed straight from its file.
+    """
+    try:
+        with CompressedOutputFile(filename) as f:
+            return f.read()
+    except FileNotFoundError:
+        return filename
+
+
+def remove_output(filename: str) -> None:
+    """
+    Removes the output stored at filename, if any.
+    """
+    _remove_if_exists(filename + COMPRESSED_SUFFIX)
+    _remove_if_exists(filename)
+
+
+def copy_output(source_filename: str, dest_filename: str) -> None:
+    """
+    Copies the output stored at source_filename, as it's stored, to
+    dest_filename, replacing any output already stored there. If
+    there's no output at source_filename, any output stored at
+    dest_filename is removed.
+    """
+    remove_output(dest_filename)
+    for suffix in [COMPRESSED_SUFFIX, '']:
+        try:
+            shutil.copyfile(source_filename + suffix, dest_filename + suffix)
+            return
+        except FileNotFoundError:
+            pass
+
+
+def compress_output(filename: str) -> bool:
+    """
+    Compresses the output stored uncompressed at filename. Returns
+    False if there's no uncompressed output at filename. If the output
+    at filename is replaced while this function is running, the new
+    output is kept.
+    """
+    try:
+        with open(filename, 'rb') as f:
+            _write_compressed_output(f, filename, replace=False)
+    except FileNotFoundError:
+        return False
+
+    return True
+
+
+def compress_outputs_in_dir(dirname: str) -> int:
+    """
+    Compresses all the uncompressed stdout, stderr, and diff output
+    stored in dirname. Returns the number of outputs compressed.
+    """
+    num_compressed = 0
+    try:
+        entries = list(os.scandir(dirname))
+    except FileNotFoundError:
+        return num_compressed
+
+    for entry in entries:
+        if not entry.name.endswith(('_stdout', '_stderr', '_diff')) or not entry.is_file():
+            continue
+
+        if compress_output(entry.path):
+            num_compressed += 1
+
+    return num_compressed
+
+
+def _write_compressed_output(source: BinaryIO, filename: str, *, replace: bool) -> None:
+    # The output is compressed into a temporary file that is then
+    # renamed (or linked) into place, so that readers never see
+    # partially-written output.
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(filename), delete=False) as tmp_file:
+        try:
+            # Passing an empty filename and mtime keeps the name and
+            # modification time of the temporary file out of the gzip
+            # header, so identical output compresses identically.
+            with gzip.GzipFile(filename='', mode='wb', fileobj=tmp_file,
+                               compresslevel=COMPRESSION_LEVEL, mtime=0) as compressed:
+                shutil.copyfileobj(source, compressed)
+        except BaseException:
+            os.remove(tmp_file.name)
+            raise
+
+    # NamedTemporaryFile creates files that only the owner can read.
+    os.chmod(tmp_file.name, 0o644)
+    if replace:
+        os.replace(tmp_file.name, filename + COMPRESSED_SUFFIX)
+    else:
+        try:
+            os.link(tmp_file.name, filename + COMPRESSED_SUFFIX)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_file.name)
+
+    _remove_if_exists(filename)
+
+
+def _get_compressed_output_size(compressed_filename: str) -> int:
+    # The last 4 bytes of a gzip file are the size of the uncompressed
+    # data modulo 2^32. Recorded output is much smaller than 4GiB.
+    with open(compressed_filename, 'rb') as f:
+        f.seek(-4, os.SEEK_END)
+        return struct.unpack('<I', f.read(4))[0]
+
+
+def _remove_if_exists(filename: str) -> None:
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
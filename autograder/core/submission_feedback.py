@@ -1,7 +1,7 @@
 from __future__ import annotations
 
-import os
-import tempfile
+import io
+import json
 from decimal import Decimal
 from typing import BinaryIO, Dict, Iterable, List, Optional, Sequence, Union
 
@@ -23,6 +23,8 @@ from autograder.core.models.ag_test.ag_test_suite_result import AGTestSuiteResul
 from autograder.core.models.ag_test.feedback_category import FeedbackCategory
 from autograder.core.models.project import Project
 from autograder.core.models.mutation_test_suite import MutationTestSuite
+from autograder.core.models.ultimate_submission_entry import invalidate_group_ultimate_submissions
+from autograder.core.result_output import get_output_diff_source, get_output_size, open_output
 
 
 class AGTestPreLoader:
@@ -112,8 +114,9 @@ class DenormalizedAGTestCaseResult:
 
 
 class SerializedAGTestSuiteResultWrapper:
-    def __init__(self, suite_result_dict):
+    def __init__(self, suite_result_dict, submission: Submission):
         self._suite_result_dict = suite_result_dict
+        self._submission = submission
 
     @property
     def pk(self):
@@ -146,22 +149,20 @@ class SerializedAGTestSuiteResultWrapper:
     # ------------------------------------------------------------------
 
     def open_setup_stdout(self, mode='rb'):
-        return self._ag_test_suite_result.open_setup_stdout(mode=mode)
+        return open_output(self.setup_stdout_filename, mode)
 
     @property
     def setup_stdout_filename(self):
-        return self._ag_test_suite_result.setup_stdout_filename
+        return AGTestSuiteResult.get_setup_stdout_filename(
+            core_ut.get_result_output_dir(self._submission), self.pk)
 
     def open_setup_stderr(self, mode='rb'):
-        return self._ag_test_suite_result.open_setup_stderr(mode=mode)
+        return open_output(self.setup_stderr_filename, mode)
 
     @property
     def setup_stderr_filename(self):
-        return self._ag_test_suite_result.setup_stderr_filename
-
-    @cached_property
-    def _ag_test_suite_result(self) -> AGTestSuiteResult:
-        return AGTestSuiteResult.objects.get(pk=self.pk)
+        return AGTestSuiteResult.get_setup_stderr_filename(
+            core_ut.get_result_output_dir(self._submission), self.pk)
 
 
 class SerializedAGTestCaseResultWrapper:
@@ -182,8 +183,9 @@ class SerializedAGTestCaseResultWrapper:
 
 
 class SerializedAGTestCommandResultWrapper:
-    def __init__(self, cmd_result_dict):
+    def __init__(self, cmd_result_dict, submission: Submission):
         self._cmd_result_dict = cmd_result_dict
+        self._submission = submission
 
     @property
     def pk(self):
@@ -225,19 +227,36 @@ class SerializedAGTestCommandResultWrapper:
     def stderr_truncated(self):
         return self._cmd_result_dict['stderr_truncated']
 
+    # Results denormalized before these fields were added won't have them.
+    @property
+    def stdout_diff_size(self):
+        return self._cmd_result_dict.get('stdout_diff_size')
+
+    @property
+    def stderr_diff_size(self):
+        return self._cmd_result_dict.get('stderr_diff_size')
+
     # ------------------------------------------------------------------
 
     @property
     def stdout_filename(self):
-        return self._ag_test_command_result.stdout_filename
+        return AGTestCommandResult.get_stdout_filename(self._result_output_dir, self.pk)
 
     @property
     def stderr_filename(self):
-        return self._ag_test_command_result.stderr_filename
+        return AGTestCommandResult.get_stderr_filename(self._result_output_dir, self.pk)
 
-    @cached_property
-    def _ag_test_command_result(self) -> AGTestCommandResult:
-        return AGTestCommandResult.objects.get(pk=self.pk)
+    @property
+    def stdout_diff_filename(self):
+        return AGTestCommandResult.get_stdout_diff_filename(self._result_output_dir, self.pk)
+
+    @property
+    def stderr_diff_filename(self):
+        return AGTestCommandResult.get_stderr_diff_filename(self._result_output_dir, self.pk)
+
+    @property
+    def _result_output_dir(self):
+        return core_ut.get_result_output_dir(self._submission)
 
 
 def _deserialize_denormed_ag_test_results(
@@ -245,10 +264,11 @@ def _deserialize_denormed_ag_test_results(
 ) -> List[DenormalizedAGTestSuiteResult]:
     result = []
     for serialized_suite_result in submission.denormalized_ag_test_results.values():
-        deserialized_suite_result = SerializedAGTestSuiteResultWrapper(serialized_suite_result)
+        deserialized_suite_result = SerializedAGTestSuiteResultWrapper(
+            serialized_suite_result, submission)
 
         case_results = [
-            _deserialize_denormed_ag_test_case_result(case_result)
+            _deserialize_denormed_ag_test_case_result(case_result, submission)
             for case_result in serialized_suite_result['ag_test_case_results'].values()
         ]
 
@@ -257,11 +277,12 @@ def _deserialize_denormed_ag_test_results(
     return result
 
 
-def _deserialize_denormed_ag_test_case_result(case_result: dict) -> DenormalizedAGTestCaseResult:
+def _deserialize_denormed_ag_test_case_result(
+        case_result: dict, submission: Submission) -> DenormalizedAGTestCaseResult:
     deserialized_case_result = SerializedAGTestCaseResultWrapper(case_result)
 
     cmd_results = [
-        _deserialize_denormed_ag_test_cmd_result(cmd_result)
+        _deserialize_denormed_ag_test_cmd_result(cmd_result, submission)
         for cmd_result in case_result['ag_test_command_results'].values()
     ]
 
@@ -269,8 +290,8 @@ def _deserialize_denormed_ag_test_case_result(case_result: dict) -> Denormalized
 
 
 def _deserialize_denormed_ag_test_cmd_result(
-        cmd_result: dict) -> SerializedAGTestCommandResultWrapper:
-    return SerializedAGTestCommandResultWrapper(cmd_result)
+        cmd_result: dict, submission: Submission) -> SerializedAGTestCommandResultWrapper:
+    return SerializedAGTestCommandResultWrapper(cmd_result, submission)
 
 
 @transaction.atomic()
@@ -302,6 +323,11 @@ def update_denormalized_ag_test_results(submission_pk: int) -> Submission:
     }
 
     submission.save()
+    # The results of a finished submission can change, e.g. when a
+    # deferred suite finishes, which may change which submission is
+    # ultimate.
+    if submission.status == Submission.GradingStatus.finished_grading:
+        invalidate_group_ultimate_submissions(submission.group_id)
     return submission
 
 
@@ -336,6 +362,10 @@ class SubmissionResultFeedback(ToDictMixin):
     def submission(self):
         return self._submission
 
+    @property
+    def fdbk_category(self) -> FeedbackCategory:
+        return self._fdbk_category
+
     @cached_property
     def total_points(self) -> Union[int, Decimal]:
         ag_suite_points = sum((
@@ -498,7 +528,7 @@ class AGTestSuiteResultFeedback(ToDictMixin):
         if not self._fdbk.show_setup_stderr:
             return None
 
-        return os.path.getsize(self._ag_test_suite_result.setup_stdout_filename)
+        return get_output_size(self._ag_test_suite_result.setup_stdout_filename)
 
     @property
     def setup_stdout_truncated(self) -> Optional[bool]:
@@ -518,7 +548,7 @@ class AGTestSuiteResultFeedback(ToDictMixin):
         if not self._fdbk.show_setup_stderr:
             return None
 
-        return os.path.getsize(self._ag_test_suite_result.setup_stderr_filename)
+        return get_output_size(self._ag_test_suite_result.setup_stderr_filename)
 
     @property
     def setup_stderr_truncated(self) -> Optional[bool]:
@@ -833,13 +863,13 @@ class AGTestCommandResultFeedback(ToDictMixin):
     @property
     def stdout(self) -> Optional[BinaryIO]:
         if self._show_actual_stdout:
-            return open(self._ag_test_command_result.stdout_filename, 'rb')
+            return open_output(self._ag_test_command_result.stdout_filename)
 
         return None
 
     def get_stdout_size(self) -> Optional[int]:
         if self._show_actual_stdout:
-            return os.path.getsize(self._ag_test_command_result.stdout_filename)
+            return get_output_size(self._ag_test_command_result.stdout_filename)
 
         return None
 
@@ -855,13 +885,45 @@ class AGTestCommandResultFeedback(ToDictMixin):
 
         return None
 
+    @property
+    def _show_stdout_diff(self) -> bool:
+        return (self._cmd.expected_stdout_source != ExpectedOutputSource.none
+                and self._fdbk.stdout_fdbk_level == ValueFeedbackLevel.expected_and_actual)
+
     @property
     def stdout_diff(self) -> Optional[core_ut.DiffResult]:
-        if (self._cmd.expected_stdout_source == ExpectedOutputSource.none
-                or self._fdbk.stdout_fdbk_level != ValueFeedbackLevel.expected_and_actual):
+        if not self._show_stdout_diff:
+            return None
+
+        stored_diff = self._open_stored_diff(
+            self._ag_test_command_result.stdout_correct,
+            self._ag_test_command_result.stdout_diff_filename)
+        if stored_diff is not None:
+            with stored_diff:
+                return core_ut.DiffResult(False, json.load(stored_diff))
+
+        return self._compute_stdout_diff()
+
+    def get_stdout_diff_json(self) -> Optional[BinaryIO]:
+        """
+        Returns stdout_diff.diff_content encoded as a JSON array.
+        When the diff was stored at grading time, the stored file is
+        returned (opened with open_output()) without loading it into
+        memory.
+        """
+        if not self._show_stdout_diff:
             return None
 
-        stdout_filename = self._ag_test_command_result.stdout_filename
+        stored_diff = self._open_stored_diff(
+            self._ag_test_command_result.stdout_correct,
+            self._ag_test_command_result.stdout_diff_filename)
+        if stored_diff is not None:
+            return stored_diff
+
+        return io.BytesIO(json.dumps(self._compute_stdout_diff().diff_content).encode())
+
+    def _compute_stdout_diff(self) -> core_ut.DiffResult:
+        actual_stdout = get_output_diff_source(self._ag_test_command_result.stdout_filename)
         diff_whitespace_kwargs = {
             'ignore_blank_lines': self._cmd.ignore_blank_lines,
             'ignore_case': self._cmd.ignore_case,
@@ -871,25 +933,24 @@ class AGTestCommandResultFeedback(ToDictMixin):
 
         # check source and return diff
         if self._cmd.expected_stdout_source == ExpectedOutputSource.text:
-            with tempfile.NamedTemporaryFile('w') as expected_stdout:
-                expected_stdout.write(self._cmd.expected_stdout_text)
-                expected_stdout.flush()
-                return core_ut.get_diff(expected_stdout.name, stdout_filename,
-                                        **diff_whitespace_kwargs)
+            return core_ut.get_diff(self._cmd.expected_stdout_text.encode(), actual_stdout,
+                                    **diff_whitespace_kwargs)
         elif self._cmd.expected_stdout_source == ExpectedOutputSource.instructor_file:
             return core_ut.get_diff(self._cmd.expected_stdout_instructor_file.abspath,
-                                    stdout_filename,
+                                    actual_stdout,
                                     **diff_whitespace_kwargs)
         else:
             raise ValueError(
                 'Invalid expected stdout source: {}'.format(self._cmd.expected_stdout_source))
 
     def get_stdout_diff_size(self) -> Optional[int]:
-        diff = self.stdout_diff
-        if diff is None:
+        if not self._show_stdout_diff:
             return None
 
-        return sum((len(line) for line in diff.diff_content))
+        if self._ag_test_command_result.stdout_diff_size is not None:
+            return self._ag_test_command_result.stdout_diff_size
+
+        return core_ut.get_diff_size(self._compute_stdout_diff())
 
     @property
     def stdout_points(self) -> int:
@@ -919,13 +980,13 @@ class AGTestCommandResultFeedback(ToDictMixin):
     @property
     def stderr(self) -> Optional[BinaryIO]:
         if self._show_actual_stderr:
-            return open(self._ag_test_command_result.stderr_filename, 'rb')
+            return open_output(self._ag_test_command_result.stderr_filename)
 
         return None
 
     def get_stderr_size(self) -> Optional[int]:
         if self._show_actual_stderr:
-            return os.path.getsize(self._ag_test_command_result.stderr_filename)
+            return get_output_size(self._ag_test_command_result.stderr_filename)
 
         return None
 
@@ -941,13 +1002,45 @@ class AGTestCommandResultFeedback(ToDictMixin):
 
         return None
 
+    @property
+    def _show_stderr_diff(self) -> bool:
+        return (self._cmd.expected_stderr_source != ExpectedOutputSource.none
+                and self._fdbk.stderr_fdbk_level == ValueFeedbackLevel.expected_and_actual)
+
     @property
     def stderr_diff(self) -> Optional[core_ut.DiffResult]:
-        if (self._cmd.expected_stderr_source == ExpectedOutputSource.none
-                or self._fdbk.stderr_fdbk_level != ValueFeedbackLevel.expected_and_actual):
+        if not self._show_stderr_diff:
+            return None
+
+        stored_diff = self._open_stored_diff(
+            self._ag_test_command_result.stderr_correct,
+            self._ag_test_command_result.stderr_diff_filename)
+        if stored_diff is not None:
+            with stored_diff:
+                return core_ut.DiffResult(False, json.load(stored_diff))
+
+        return self._compute_stderr_diff()
+
+    def get_stderr_diff_json(self) -> Optional[BinaryIO]:
+        """
+        Returns stderr_diff.diff_content encoded as a JSON array.
+        When the diff was stored at grading time, the stored file is
+        returned (opened with open_output()) without loading it into
+        memory.
+        """
+        if not self._show_stderr_diff:
             return None
 
-        stderr_filename = self._ag_test_command_result.stderr_filename
+        stored_diff = self._open_stored_diff(
+            self._ag_test_command_result.stderr_correct,
+            self._ag_test_command_result.stderr_diff_filename)
+        if stored_diff is not None:
+            return stored_diff
+
+        return io.BytesIO(json.dumps(self._compute_stderr_diff().diff_content).encode())
+
+    def _compute_stderr_diff(self) -> core_ut.DiffResult:
+        actual_stderr = get_output_diff_source(self._ag_test_command_result.stderr_filename)
         diff_whitespace_kwargs = {
             'ignore_blank_lines': self._cmd.ignore_blank_lines,
             'ignore_case': self._cmd.ignore_case,
@@ -956,25 +1049,38 @@ class AGTestCommandResultFeedback(ToDictMixin):
         }
 
         if self._cmd.expected_stderr_source == ExpectedOutputSource.text:
-            with tempfile.NamedTemporaryFile('w') as expected_stderr:
-                expected_stderr.write(self._cmd.expected_stderr_text)
-                expected_stderr.flush()
-                return core_ut.get_diff(expected_stderr.name, stderr_filename,
-                                        **diff_whitespace_kwargs)
+            return core_ut.get_diff(self._cmd.expected_stderr_text.encode(), actual_stderr,
+                                    **diff_whitespace_kwargs)
         elif self._cmd.expected_stderr_source == ExpectedOutputSource.instructor_file:
             return core_ut.get_diff(self._cmd.expected_stderr_instructor_file.abspath,
-                                    stderr_filename,
+                                    actual_stderr,
                                     **diff_whitespace_kwargs)
         else:
             raise ValueError(
                 'Invalid expected stderr source: {}'.format(self._cmd.expected_stdout_source))
 
+    def _open_stored_diff(self, correct: Optional[bool], diff_filename: str) -> Optional[BinaryIO]:
+        """
+        Opens the diff stored at grading time, or returns None if there
+        isn't one. Only failing diffs are stored.
+        """
+        if correct is None or correct:
+            return None
+
+        try:
+            return open_output(diff_filename)
+        except FileNotFoundError:
+            # Results recorded before diffs were stored.
+            return None
+
     def get_stderr_diff_size(self) -> Optional[int]:
-        diff = self.stderr_diff
-        if diff is None:
+        if not self._show_stderr_diff:
             return None
 
-        return sum((len(line) for line in diff.diff_content))
+        if self._ag_test_command_result.stderr_diff_size is not None:
+            return self._ag_test_command_result.stderr_diff_size
+
+        return core_ut.get_diff_size(self._compute_stderr_diff())
 
     @property
     def stderr_points(self) -> int:
@@ -0,0 +1,98 @@
+"""
+Computes and stores the SubmissionScores of finished submissions.
+"""
+
+from typing import List, Sequence, Tuple
+
+from django.db import transaction
+
+import autograder.core.models as ag_models
+from autograder.core.models.submission_score import get_submission_scores_version
+from autograder.core.submission_feedback import (
+    AGTestPreLoader, MutationTestSuitePreLoader, SubmissionResultFeedback)
+
+
+def update_submission_scores(project: ag_models.Project, submission_pks: Sequence[int]) -> None:
+    """
+    Computes and stores the scores, for every feedback category, of
+    the submissions in project with the given pks. Submissions that
+    haven't finished grading are skipped.
+    """
+    # The version must be loaded before the test and feedback settings
+    # are so that scores computed from stale settings are never stored
+    # under the current version.
+    version = get_submission_scores_version(project.pk)
+    _update_submission_scores(
+        submission_pks, version,
+        AGTestPreLoader(project), MutationTestSuitePreLoader(project))
+
+
+def update_project_submission_scores(project: ag_models.Project) -> None:
+    """
+    Computes and stores the scores of every finished submission in the
+    given project, SUBMISSION_CHUNK_SIZE submissions at a time.
+    Stops early if the project's scores are invalidated while this
+    function is running, since a newer call will recompute them.
+    """
+    version = get_submission_scores_version(project.pk)
+    ag_test_preloader = AGTestPreLoader(project)
+    mutation_test_suite_preloader = MutationTestSuitePreLoader(project)
+
+    submission_pks = list(
+        ag_models.Submission.objects.filter(
+            project=project, status=ag_models.Submission.GradingStatus.finished_grading
+        ).values_list('pk', flat=True))
+    for i in range(0, len(submission_pks), SUBMISSION_CHUNK_SIZE):
+        if get_submission_scores_version(project.pk) != version:
+            return
+
+        _update_submission_scores(
+            submission_pks[i:i + SUBMISSION_CHUNK_SIZE], version,
+            ag_test_preloader, mutation_test_suite_preloader)
+
+
+# The number of submissions (with results) that
+# update_project_submission_scores loads into memory at once.
+SUBMISSION_CHUNK_SIZE = 100
+
+
+def _update_submission_scores(submission_pks: Sequence[int], version: int,
+                              ag_test_preloader: AGTestPreLoader,
+                              mutation_test_suite_preloader: MutationTestSuitePreLoader) -> None:
+    submissions = ag_models.get_submissions_with_results_queryset(
+        base_manager=ag_models.Submission.objects.filter(
+            pk__in=submission_pks, status=ag_models.Submission.GradingStatus.finished_grading))
+
+    scores = []  # type: List[ag_models.SubmissionScore]
+    for submission in submissions:
+        for fdbk_category in ag_models.FeedbackCategory:
+            fdbk = SubmissionResultFeedback(
+                submission, fdbk_category, ag_test_preloader, mutation_test_suite_preloader)
+            scores.append(ag_models.SubmissionScore(
+                submission=submission,
+                fdbk_category=fdbk_category,
+                total_points=fdbk.total_points,
+                total_points_possible=fdbk.total_points_possible,
+                ag_test_suite_totals={
+                    str(suite_fdbk.ag_test_suite_pk): _serialize_totals(suite_fdbk)
+                    for suite_fdbk in fdbk.ag_test_suite_results
+                },
+                mutation_test_suite_totals={
+                    str(suite_fdbk.mutation_test_suite_pk): _serialize_totals(suite_fdbk)
+                    for suite_fdbk in fdbk.mutation_test_suite_results
+                },
+                project_version=version,
+            ))
+
+    # Scores stored under a newer version by another process are kept.
+    # ignore_conflicts skips the scores that conflict with them.
+    with transaction.atomic():
+        ag_models.SubmissionScore.objects.filter(
+            submission__in=submission_pks,
+            project_version__lte=version
+        ).delete()
+        ag_models.SubmissionScore.objects.bulk_create(scores, ignore_conflicts=True)
+
+
+def _serialize_totals(has_points) -> Tuple[str, str]:
+    return str(has_points.total_points), str(has_points.total_points_possible)
@@ -0,0 +1,246 @@
+"""
+A content-addressed store for submitted files.
+
+Each unique file is stored once, as a "blob" named after the SHA-256
+hash of its contents. Submissions record which blob holds each of
+their files in Submission.submitted_file_hashes. Blobs are never
+modified once written, and blobs that no submission refers to are
+deleted by delete_orphaned_blobs().
+
+Submissions created before this store was added keep their files in
+their submission directory until they are moved with
+move_submission_files_to_blob_store(). The original copies are left in
+place for graders and downloads that started before the move and are
+deleted later with delete_legacy_submission_files().
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Sequence, Set
+
+from django.conf import settings
+from django.core.files import File
+
+from autograder.core import constants
+from autograder.core import utils as core_ut
+
+
+def get_blob_store_dir() -> str:
+    """
+    Returns the absolute path of the directory where blobs are stored.
+    """
+    return os.path.join(settings.MEDIA_ROOT, constants.SUBMITTED_FILE_BLOBS_DIRNAME)
+
+
+def get_blob_path(digest: str) -> str:
+    """
+    Returns the absolute path of the blob with the given SHA-256 hex
+    digest. Blobs are spread across subdirectories named after the
+    first two characters of their digest to keep directories small.
+    """
+    return os.path.join(get_blob_store_dir(), digest[:2], digest)
+
+
+def store_blob(file_: File) -> str:
+    """
+    Writes the contents of file_ to the blob store, if a blob with the
+    same contents doesn't already exist, and returns the SHA-256 hex
+    digest of the contents.
+    """
+    tmp_dir = _get_tmp_dir()
+    hasher = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as tmp_file:
+        try:
+            for chunk in file_.chunks():
+                hasher.update(chunk)
+                tmp_file.write(chunk)
+        except BaseException:
+            os.remove(tmp_file.name)
+            raise
+
+    digest = hasher.hexdigest()
+    blob_path = get_blob_path(digest)
+    try:
+        # Refreshing the modification time of an existing blob makes
+        # delete_orphaned_blobs() treat it as new until the submission
+        # that refers to it has been saved.
+        os.utime(blob_path)
+        os.remove(tmp_file.name)
+    except FileNotFoundError:
+        # NamedTemporaryFile creates files that only the owner can read.
+        os.chmod(tmp_file.name, 0o644)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        # Renaming is atomic, so other processes never see a
+        # partially-written blob.
+        os.replace(tmp_file.name, blob_path)
+
+    return digest
+
+
+def link_blobs(filenames_to_digests: Dict[str, str], dest_dir: str) -> None:
+    """
+    Creates a file in dest_dir for each item in filenames_to_digests,
+    named after the key and with the contents of the blob whose digest
+    is the value. Files are hard-linked to their blobs when possible.
+    dest_dir must already exist.
+    """
+    linked_digests = set()  # type: Set[str]
+    for filename, digest in filenames_to_digests.items():
+        dest = os.path.join(dest_dir, filename)
+        # Files that share a blob are copied so that they don't share
+        # an inode, since tools like tarfile store additional hard
+        # links to a file as references to the first one.
+        if digest not in linked_digests:
+            try:
+                os.link(get_blob_path(digest), dest)
+                linked_digests.add(digest)
+                continue
+            except OSError:
+                pass
+
+        shutil.copyfile(get_blob_path(digest), dest)
+
+
+@contextmanager
+def named_submitted_file_paths(submission, filenames: Sequence[str]) -> Iterator[List[str]]:
+    """
+    A context manager that yields the absolute paths of the given
+    files from submission. Unlike Submission.get_file_path(), the
+    basename of each path is the name the file was submitted with, so
+    the paths can be passed to functions like
+    AutograderSandbox.add_files(). The paths are only valid inside
+    the with-statement.
+    """
+    if not submission.submitted_file_hashes:
+        yield [submission.get_file_path(filename) for filename in filenames]
+        return
+
+    for filename in filenames:
+        submission._check_file_exists(filename)
+
+    with tempfile.TemporaryDirectory(dir=_get_tmp_dir()) as tmp_dir:
+        link_blobs(
+            {filename: submission.submitted_file_hashes[filename] for filename in filenames},
+            tmp_dir)
+        yield [os.path.join(tmp_dir, filename) for filename in filenames]
+
+
+def move_submission_files_to_blob_store(submission) -> bool:
+    """
+    Moves the files of a submission that was created before the blob
+    store was added from the submission's directory into the blob
+    store. Returns False if the submission's files were already in
+    the blob store.
+
+    The original files are not deleted, since graders and downloads
+    that loaded the submission before it was moved may still be
+    reading them. Delete them with delete_legacy_submission_files()
+    once those have finished.
+    """
+    from autograder.core.models import Submission
+
+    if submission.submitted_file_hashes or not submission.submitted_filenames:
+        return False
+
+    legacy_paths = [submission.get_file_path(filename)
+                    for filename in submission.submitted_filenames]
+    hashes = {}
+    for filename, path in zip(submission.submitted_filenames, legacy_paths):
+        with open(path, 'rb') as f:
+            hashes[filename] = store_blob(File(f))
+
+    Submission.objects.filter(pk=submission.pk).update(submitted_file_hashes=hashes)
+    submission.submitted_file_hashes = hashes
+    return True
+
+
+def delete_legacy_submission_files(submission) -> int:
+    """
+    Deletes the original copies of files that were moved into the blob
+    store by move_submission_files_to_blob_store(). Does nothing if
+    the submission's files haven't been moved. Returns the number of
+    files deleted.
+    """
+    if not submission.submitted_file_hashes:
+        return 0
+
+    submission_dir = core_ut.get_submission_dir(submission)
+    num_deleted = 0
+    for filename in submission.submitted_filenames:
+        try:
+            os.remove(os.path.join(submission_dir, filename))
+            num_deleted += 1
+        except FileNotFoundError:
+            pass
+
+    return num_deleted
+
+
+def delete_orphaned_blobs(referenced_digests: Iterable[str], *, min_age: float) -> int:
+    """
+    Deletes blobs whose digests are not in referenced_digests and that
+    were last modified more than min_age seconds ago. Returns the
+    number of blobs deleted.
+
+    min_age should be longer than it could take to create a
+    submission, since new submissions refer to their blobs only once
+    they're committed to the database.
+
+    Each blob is moved into a quarantine directory before its
+    modification time is checked again. If store_blob() reuses the
+    blob before the move, the new modification time is seen and the
+    blob is put back. If it tries to reuse the blob after the move,
+    it doesn't find it and writes the blob again.
+    """
+    referenced_digests = set(referenced_digests)
+    cutoff = time.time() - min_age
+
+    num_deleted = 0
+    blob_store_dir = get_blob_store_dir()
+    if not os.path.isdir(blob_store_dir):
+        return num_deleted
+
+    quarantine_dir = os.path.join(blob_store_dir, _QUARANTINE_DIRNAME)
+    os.makedirs(quarantine_dir, exist_ok=True)
+    for entry in os.scandir(blob_store_dir):
+        # The tmp directory holds blobs that are still being written.
+        if not entry.is_dir() or entry.name in (_TMP_DIRNAME, _QUARANTINE_DIRNAME):
+            continue
+
+        for blob in os.scandir(entry.path):
+            if blob.name in referenced_digests or blob.stat().st_mtime > cutoff:
+                continue
+
+            quarantined = os.path.join(quarantine_dir, blob.name)
+            try:
+                os.rename(blob.path, quarantined)
+            except FileNotFoundError:
+                continue
+
+            if os.stat(quarantined).st_mtime > cutoff:
+                # If store_blob() wrote the blob again in the meantime,
+                # the contents are the same, so replacing it is safe.
+                os.replace(quarantined, blob.path)
+                continue
+
+            os.remove(quarantined)
+            num_deleted += 1
+
+    return num_deleted
+
+
+_TMP_DIRNAME = 'tmp'
+_QUARANTINE_DIRNAME = 'quarantine'
+
+
+def _get_tmp_dir() -> str:
+    # Temporary files are written inside the blob store so that
+    # they're on the same filesystem as the blobs and can be renamed
+    # into place.
+    tmp_dir = os.path.join(get_blob_store_dir(), _TMP_DIRNAME)
+    os.makedirs(tmp_dir, exist_ok=True)
+    return tmp_dir
@@ -0,0 +1,156 @@
+import random
+import tempfile
+from typing import List
+
+from django.test import SimpleTestCase, tag
+
+import autograder.core.utils as core_ut
+from autograder.core.diff import DiffTooExpensive, diff_bytes, lines_equivalent
+from autograder.utils.testing.misc import Timer
+
+_DIFF_OPTIONS = ('ignore_case', 'ignore_whitespace', 'ignore_whitespace_changes',
+                 'ignore_blank_lines')
+
+# Lines chosen to exercise all of the diff options.
+_LINES = [b'spam', b'SPAM', b'egg', b'', b' ', b'\t', b'spam egg', b'spam  egg', b' spam',
+          b'spam ', b'\r', b'\x80', b'\x00']
+
+
+class DiffBytesTestCase(SimpleTestCase):
+    def test_no_differences(self):
+        self.assertEqual((True, b''), diff_bytes(b'', b'', **_no_options()))
+        self.assertEqual(
+            (True, b'  spam\n\n  egg\n'),
+            diff_bytes(b'spam\negg', b'spam\negg', **_no_options()))
+
+    def test_blank_line_only_changes_ignored(self):
+        self.assertEqual(
+            (True, b'  spam\n\n  \n\n  egg\n\n'),
+            diff_bytes(b'spam\n\negg\n', b'spam\negg\n\n\n',
+                       **dict(_no_options(), ignore_blank_lines=True)))
+
+    def test_max_cost_exceeded(self):
+        with self.assertRaises(DiffTooExpensive):
+            diff_bytes(b'spam\negg\n', b'egg\nspam\n', max_cost=0, **_no_options())
+
+    def test_lines_equivalent(self):
+        self.assertTrue(lines_equivalent(
+            b'spam  egg \n', b'spam egg',
+            ignore_case=False, ignore_whitespace=False, ignore_whitespace_changes=True))
+        self.assertFalse(lines_equivalent(
+            b'spam  egg \n', b' spam egg',
+            ignore_case=False, ignore_whitespace=False, ignore_whitespace_changes=True))
+        self.assertTrue(lines_equivalent(
+            b'spam  egg \n', b' spamegg',
+            ignore_case=False, ignore_whitespace=True, ignore_whitespace_changes=True))
+        self.assertFalse(lines_equivalent(
+            b'SPAM\n', b'spam',
+            ignore_case=True, ignore_whitespace=False, ignore_whitespace_changes=False))
+        self.assertTrue(lines_equivalent(
+            b'SPAM\n', b'spam\n',
+            ignore_case=True, ignore_whitespace=False, ignore_whitespace_changes=False))
+
+
+class InProcessDiffMatchesGNUDiffTestCase(SimpleTestCase):
+    def test_random_files(self):
+        rng = random.Random(42)
+        for i in range(500):
+            first = _random_file(rng, rng.randrange(15))
+            second = _mutate(rng, first) if rng.random() < 0.7 else _random_file(
+                rng, rng.randrange(15))
+            options = {option: rng.random() < 0.3 for option in _DIFF_OPTIONS}
+            with self.subTest(first=first, second=second, **options):
+                self._check_diff(first, second, **options)
+
+    def test_large_files(self):
+        rng = random.Random(42)
+        for vocab_size in (20, 500, 100000):
+            first_lines = [b'%d' % rng.randrange(vocab_size) for i in range(2000)]
+            second_lines = [
+                line if rng.random() < 0.7 else b'%d' % rng.randrange(vocab_size)
+                for line in first_lines
+            ]
+            with self.subTest(vocab_size=vocab_size):
+                self._check_diff(b'\n'.join(first_lines), b'\n'.join(second_lines))
+
+    def _check_diff(self, first: bytes, second: bytes, **options):
+        expected = core_ut.get_gnu_diff(first, second, **options)
+        diff_pass, output = diff_bytes(first, second, **dict(_no_options(), **options))
+
+        self.assertEqual(expected.diff_pass, diff_pass)
+        self.assertEqual(expected.diff_content, core_ut._parse_diff_output(output))
+
+        actual = core_ut.get_diff(first, second, **options)
+        self.assertEqual(expected.diff_pass, actual.diff_pass)
+        self.assertEqual(expected.diff_content, actual.diff_content)
+        self.assertEqual(expected.diff_pass, core_ut.get_diff_pass(first, second, **options))
+
+
+@tag('slow')
+class DiffBenchmarkTestCase(SimpleTestCase):
+    """
+    Compares the time it takes get_diff and get_gnu_diff to diff
+    typical test output.
+    """
+
+    def test_benchmark(self):
+        rng = random.Random(42)
+        output_lines = [b'output line %d' % rng.randrange(1000) for i in range(10000)]
+        with_changes = list(output_lines)
+        for i in range(10):
+            with_changes[rng.randrange(len(with_changes))] = b'wrong'
+
+        cases = {
+            'small, equal': (output_lines[:20], output_lines[:20]),
+            'small, whitespace changes': (
+                output_lines[:20], [line.replace(b' ', b'  ') for line in output_lines[:20]]),
+            'small, different': (output_lines[:20], with_changes[:20] + [b'wrong']),
+            'large, equal': (output_lines, output_lines),
+            'large, different': (output_lines, with_changes),
+        }
+        for name, (first_lines, second_lines) in cases.items():
+            with tempfile.NamedTemporaryFile() as first, tempfile.NamedTemporaryFile() as second:
+                first.write(b'\n'.join(first_lines))
+                first.flush()
+                second.write(b'\n'.join(second_lines))
+                second.flush()
+
+                options = {'ignore_whitespace_changes': 'whitespace' in name}
+                with Timer('get_gnu_diff, {} x 20'.format(name)) as gnu_timer:
+                    for i in range(20):
+                        expected = core_ut.get_gnu_diff(first.name, second.name, **options)
+                with Timer('get_diff, {} x 20'.format(name)) as timer:
+                    for i in range(20):
+                        actual = core_ut.get_diff(first.name, second.name, **options)
+                with Timer('get_diff_pass, {} x 20'.format(name)):
+                    for i in range(20):
+                        core_ut.get_diff_pass(first.name, second.name, **options)
+
+                self.assertEqual(expected.diff_pass, actual.diff_pass)
+                self.assertEqual(expected.diff_content, actual.diff_content)
+
+
+def _no_options():
+    return {option: False for option in _DIFF_OPTIONS}
+
+
+def _random_file(rng: random.Random, num_lines: int) -> bytes:
+    lines = [rng.choice(_LINES) for i in range(num_lines)]
+    return b'\n'.join(lines) + (b'\n' if rng.random() < 0.7 else b'')
+
+
+def _mutate(rng: random.Random, content: bytes) -> bytes:
+    lines = content.split(b'\n')  # type: List[bytes]
+    for i in range(rng.randrange(6)):
+        index = rng.randrange(len(lines))
+        action = rng.randrange(3)
+        if action == 0:
+            lines.insert(index, rng.choice(_LINES))
+        elif action == 1:
+            del lines[index]
+        else:
+            lines[index] = rng.choice(_LINES)
+
+        if not lines:
+            lines = [b'']
+    return b'\n'.join(lines)
@@ -1,6 +1,7 @@
 import os
 
 import autograder.core.models as ag_models
+from autograder.core.result_output import open_output
 from autograder.utils.testing import UnitTestBase
 import autograder.core.utils as core_ut
 
@@ -25,16 +26,16 @@ class AGCommandResultTestCase(UnitTestBase):
         stdout = 'spaaaaam'
         stderr = 'egggggggg'
 
-        with open(result.stdout_filename, 'w') as f:
+        with open_output(result.stdout_filename, 'w') as f:
             f.write(stdout)
 
-        with open(result.stderr_filename, 'w') as f:
+        with open_output(result.stderr_filename, 'w') as f:
             f.write(stderr)
 
-        with open(result.stdout_filename) as f:
+        with open_output(result.stdout_filename, 'r') as f:
             self.assertEqual(stdout, f.read())
 
-        with open(result.stderr_filename) as f:
+        with open_output(result.stderr_filename, 'r') as f:
             self.assertEqual(stderr, f.read())
 
     def test_error_cmd_result_not_saved_stdout_and_stderr_filename(self):
@@ -48,6 +48,8 @@ class AGTestCommandResultTestCase(UnitTestBase):
         self.assertIsNone(cmd_res.stderr_correct)
         self.assertFalse(cmd_res.stdout_truncated)
         self.assertFalse(cmd_res.stderr_truncated)
+        self.assertIsNone(cmd_res.stdout_diff_size)
+        self.assertIsNone(cmd_res.stderr_diff_size)
 
     def test_create_cmd_result_no_defaults(self):
         cmd_res_kwargs = {
@@ -84,6 +86,9 @@ class AGTestCommandResultTestCase(UnitTestBase):
 
             'stdout_truncated',
             'stderr_truncated',
+
+            'stdout_diff_size',
+            'stderr_diff_size',
         ]
 
         cmd_res = ag_models.AGTestCommandResult.objects.validate_and_create(
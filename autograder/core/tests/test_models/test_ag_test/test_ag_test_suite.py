@@ -34,6 +34,10 @@ class AGTestSuiteTestCase(UnitTestBase):
         self.assertEqual(ag_models.SandboxDockerImage.objects.get(name='default'),
                          suite.sandbox_docker_image)
         self.assertFalse(suite.deferred)
+        self.assertFalse(suite.run_test_cases_in_parallel)
+        self.assertFalse(suite.batch_test_case_commands)
+        self.assertFalse(suite.reuse_setup_snapshots)
+        self.assertFalse(suite.deterministic)
 
         self.assertIsNotNone(suite.normal_fdbk_config)
         self.assertIsNotNone(suite.ultimate_submission_fdbk_config)
@@ -95,6 +99,10 @@ class AGTestSuiteTestCase(UnitTestBase):
             setup_suite_cmd_name='steve',
             allow_network_access=allow_network_access,
             deferred=deferred,
+            run_test_cases_in_parallel=True,
+            batch_test_case_commands=True,
+            reuse_setup_snapshots=True,
+            deterministic=True,
             sandbox_docker_image=sandbox_image.to_dict(),
             normal_fdbk_config={
                 'visible': False,
@@ -114,6 +122,10 @@ class AGTestSuiteTestCase(UnitTestBase):
         self.assertCountEqual(student_files_needed, suite.student_files_needed.all())
         self.assertEqual(allow_network_access, suite.allow_network_access)
         self.assertEqual(deferred, suite.deferred)
+        self.assertTrue(suite.run_test_cases_in_parallel)
+        self.assertTrue(suite.batch_test_case_commands)
+        self.assertTrue(suite.reuse_setup_snapshots)
+        self.assertTrue(suite.deterministic)
         self.assertEqual(sandbox_image, suite.sandbox_docker_image)
         self.assertFalse(suite.normal_fdbk_config.visible)
 
@@ -219,6 +231,10 @@ class AGTestSuiteTestCase(UnitTestBase):
             'sandbox_docker_image',
             'allow_network_access',
             'deferred',
+            'run_test_cases_in_parallel',
+            'batch_test_case_commands',
+            'reuse_setup_snapshots',
+            'deterministic',
 
             'normal_fdbk_config',
             'ultimate_submission_fdbk_config',
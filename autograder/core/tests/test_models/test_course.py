@@ -1,5 +1,6 @@
 import os
 
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 
 from autograder.core.models import Course, LateDaysRemaining, Semester
@@ -393,6 +394,21 @@ class CourseRolesTestCase(UnitTestBase):
         self.course = Course.objects.get(pk=self.course.pk)
         self.assertTrue(self.course.is_handgrader(self.user))
 
+    def test_user_roles_cached_in_process(self):
+        self.course.students.add(self.user)
+        self.assertTrue(self.course.is_student(self.user))
+
+        # Roles are still loaded without the shared cache or the database.
+        cache.clear()
+        course = Course.objects.get(pk=self.course.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(course.is_student(self.user))
+
+        self.course.students.remove(self.user)
+        clear_cached_user_roles(self.course.pk)
+        course = Course.objects.get(pk=self.course.pk)
+        self.assertFalse(course.is_student(self.user))
+
     def test_is_allowed_guest(self):
         self.course.validate_and_update(allowed_guest_domain='')
         self.assertTrue(self.course.is_allowed_guest(self.user))
@@ -435,3 +435,114 @@ class GetUltimateSubmissionForUserTestCase(UnitTestBase):
             self.group, user=self.does_not_count_for_user
         )
         self.assertIsNone(does_not_count_for_user_ultimate_submission)
+
+
+class UltimateSubmissionEntryTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.project = obj_build.make_project(
+            ultimate_submission_policy=ag_models.UltimateSubmissionPolicy.best)
+        self.group = obj_build.make_group(num_members=2, project=self.project)
+
+        suite = obj_build.make_ag_test_suite(self.project)
+        case = obj_build.make_ag_test_case(suite)
+        self.cmd1 = obj_build.make_full_ag_test_command(case)
+        self.cmd2 = obj_build.make_full_ag_test_command(case)
+
+        # Both submissions have the same score, so the more recent one
+        # is the best.
+        self.cmd1_correct_submission = obj_build.make_finished_submission(self.group)
+        obj_build.make_correct_ag_test_command_result(
+            self.cmd1, submission=self.cmd1_correct_submission)
+        obj_build.make_incorrect_ag_test_command_result(
+            self.cmd2, submission=self.cmd1_correct_submission)
+        update_denormalized_ag_test_results(self.cmd1_correct_submission.pk)
+
+        self.cmd2_correct_submission = obj_build.make_finished_submission(self.group)
+        obj_build.make_incorrect_ag_test_command_result(
+            self.cmd1, submission=self.cmd2_correct_submission)
+        obj_build.make_correct_ag_test_command_result(
+            self.cmd2, submission=self.cmd2_correct_submission)
+        update_denormalized_ag_test_results(self.cmd2_correct_submission.pk)
+
+    def test_entry_stored_and_reused(self):
+        self.assertEqual(self.cmd2_correct_submission, get_ultimate_submission(self.group))
+
+        entry = ag_models.UltimateSubmissionEntry.objects.get(group=self.group)
+        self.assertEqual('', entry.username)
+        self.assertEqual(self.project.ultimate_submission_policy, entry.policy)
+        self.assertEqual(self.cmd2_correct_submission, entry.submission)
+
+        group = ag_models.Group.objects.select_related('project').get(pk=self.group.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cmd2_correct_submission, get_ultimate_submission(group))
+
+    def test_get_ultimate_submissions_stores_and_reuses_entries(self):
+        other_group = obj_build.make_group(project=self.project)
+        other_submission = obj_build.make_finished_submission(other_group)
+
+        def _get_ultimate_submissions():
+            return [
+                fdbk.submission for fdbk in get_ultimate_submissions(
+                    self.project, filter_groups=None,
+                    ag_test_preloader=AGTestPreLoader(self.project))
+            ]
+
+        self.assertCountEqual([self.cmd2_correct_submission, other_submission],
+                              _get_ultimate_submissions())
+        self.assertEqual(2, ag_models.UltimateSubmissionEntry.objects.count())
+
+        # Stored entries are used by get_ultimate_submission too.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cmd2_correct_submission, get_ultimate_submission(self.group))
+
+        self.assertCountEqual([self.cmd2_correct_submission, other_submission],
+                              _get_ultimate_submissions())
+        self.assertEqual(2, ag_models.UltimateSubmissionEntry.objects.count())
+
+    def test_new_finished_submission_invalidates_entry(self):
+        self.project.validate_and_update(
+            ultimate_submission_policy=ag_models.UltimateSubmissionPolicy.most_recent)
+        self.assertEqual(self.cmd2_correct_submission, get_ultimate_submission(self.group))
+
+        # Submissions that aren't finished can't be ultimate.
+        obj_build.make_submission(
+            group=self.group, status=ag_models.Submission.GradingStatus.being_graded)
+        self.assertEqual(self.cmd2_correct_submission, get_ultimate_submission(self.group))
+
+        new_submission = obj_build.make_finished_submission(self.group)
+        self.assertEqual(new_submission, get_ultimate_submission(self.group))
+
+    def test_command_points_changed_invalidates_entry(self):
+        self.assertEqual(self.cmd2_correct_submission, get_ultimate_submission(self.group))
+
+        self.cmd1.validate_and_update(
+            points_for_correct_stdout=self.cmd1.points_for_correct_stdout + 10)
+        self.assertEqual(self.cmd1_correct_submission, get_ultimate_submission(self.group))
+
+        self.cmd1.delete()
+        self.assertEqual(self.cmd2_correct_submission, get_ultimate_submission(self.group))
+
+    def test_policy_changed_uses_entry_for_new_policy(self):
+        newest_submission = obj_build.make_finished_submission(self.group)
+        self.assertEqual(self.cmd2_correct_submission, get_ultimate_submission(self.group))
+
+        self.project.validate_and_update(
+            ultimate_submission_policy=ag_models.UltimateSubmissionPolicy.most_recent)
+        self.assertEqual(newest_submission, get_ultimate_submission(self.group))
+        self.assertEqual(2, ag_models.UltimateSubmissionEntry.objects.count())
+
+    def test_separate_entries_for_group_members(self):
+        user1, user2 = self.group.members.all()
+        self.cmd2_correct_submission.does_not_count_for = [user2.username]
+        self.cmd2_correct_submission.save()
+
+        self.assertEqual(self.cmd2_correct_submission, get_ultimate_submission(self.group))
+        self.assertEqual(self.cmd2_correct_submission,
+                         get_ultimate_submission(self.group, user=user1))
+        self.assertEqual(self.cmd1_correct_submission,
+                         get_ultimate_submission(self.group, user=user2))
+
+        self.assertCountEqual(
+            ['', user1.username, user2.username],
+            ag_models.UltimateSubmissionEntry.objects.values_list('username', flat=True))
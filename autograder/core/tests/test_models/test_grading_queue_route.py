@@ -0,0 +1,235 @@
+import datetime
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+import autograder.core.models as ag_models
+import autograder.utils.testing.model_obj_builders as obj_build
+from autograder.utils.testing import TransactionUnitTestBase, UnitTestBase
+
+
+class GradingQueueRouteTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.project = obj_build.make_project()
+        self.suite = obj_build.make_ag_test_suite(self.project)
+        self.case = obj_build.make_ag_test_case(self.suite)
+
+    def test_route_created_on_first_lookup(self) -> None:
+        obj_build.make_full_ag_test_command(self.case, time_limit=5)
+        self.assertFalse(
+            ag_models.GradingQueueRoute.objects.filter(project=self.project).exists())
+
+        self.assertEqual(
+            ag_models.GradingQueueClass.fast,
+            ag_models.GradingQueueRoute.get_queue_class(self.project.pk))
+
+        route = ag_models.GradingQueueRoute.objects.get(project=self.project)
+        self.assertEqual(5, route.worst_case_grading_time)
+        self.assertIsNone(route.median_grading_time)
+        self.assertEqual(0, route.num_grading_time_samples)
+        self.assertEqual(ag_models.GradingQueueClass.fast, route.queue_class)
+
+    def test_queue_class_cached(self) -> None:
+        ag_models.GradingQueueRoute.get_queue_class(self.project.pk)
+        with CaptureQueriesContext(connection) as queries:
+            ag_models.GradingQueueRoute.get_queue_class(self.project.pk)
+        self.assertEqual(0, len(queries.captured_queries))
+
+        cache.clear()
+        self.assertEqual(
+            ag_models.GradingQueueClass.fast,
+            ag_models.GradingQueueRoute.get_queue_class(self.project.pk))
+
+    def test_worst_case_grading_time_updated_when_tests_change(self) -> None:
+        ag_models.GradingQueueRoute.get_queue_class(self.project.pk)
+
+        cmd = obj_build.make_full_ag_test_command(self.case, time_limit=5)
+        self._assert_worst_case_grading_time(5)
+
+        cmd.validate_and_update(time_limit=10)
+        self._assert_worst_case_grading_time(10)
+
+        other_cmd = obj_build.make_full_ag_test_command(self.case, time_limit=3)
+        self._assert_worst_case_grading_time(13)
+
+        other_cmd.delete()
+        self._assert_worst_case_grading_time(10)
+
+        self.suite.validate_and_update(deferred=True)
+        self._assert_worst_case_grading_time(0)
+
+        self.suite.validate_and_update(deferred=False)
+        self._assert_worst_case_grading_time(10)
+
+        mutation_suite = obj_build.make_mutation_test_suite(self.project)
+        self._assert_worst_case_grading_time(
+            10 + mutation_suite.student_test_validity_check_command.time_limit
+            * mutation_suite.max_num_student_tests)
+
+        mutation_suite.delete()
+        self._assert_worst_case_grading_time(10)
+
+        self.case.delete()
+        self._assert_worst_case_grading_time(0)
+
+    def test_slow_queue_class_from_worst_case_grading_time(self) -> None:
+        for i in range(7):
+            obj_build.make_full_ag_test_command(self.case, time_limit=90)
+
+        self.assertEqual(
+            ag_models.GradingQueueClass.slow,
+            ag_models.GradingQueueRoute.get_queue_class(self.project.pk))
+
+    @override_settings(GRADING_TIME_MIN_SAMPLES=3, GRADING_TIME_NUM_SAMPLES=4)
+    def test_median_grading_time_used_once_enough_samples(self) -> None:
+        for i in range(7):
+            obj_build.make_full_ag_test_command(self.case, time_limit=90)
+        self.assertEqual(
+            ag_models.GradingQueueClass.slow,
+            ag_models.GradingQueueRoute.get_queue_class(self.project.pk))
+
+        self._make_graded_submission(grading_time=30)
+        self._make_graded_submission(grading_time=20)
+        route = ag_models.GradingQueueRoute.update_median_grading_time(self.project.pk)
+        self.assertEqual(25, route.median_grading_time)
+        self.assertEqual(2, route.num_grading_time_samples)
+        self.assertEqual(ag_models.GradingQueueClass.slow, route.queue_class)
+
+        self._make_graded_submission(grading_time=10)
+        route = ag_models.GradingQueueRoute.update_median_grading_time(self.project.pk)
+        self.assertEqual(20, route.median_grading_time)
+        self.assertEqual(3, route.num_grading_time_samples)
+        self.assertEqual(ag_models.GradingQueueClass.fast, route.queue_class)
+        self.assertEqual(
+            ag_models.GradingQueueClass.fast,
+            ag_models.GradingQueueRoute.get_queue_class(self.project.pk))
+
+        # Only the most recent GRADING_TIME_NUM_SAMPLES submissions are used.
+        self._make_graded_submission(grading_time=1000)
+        self._make_graded_submission(grading_time=1000)
+        self._make_graded_submission(grading_time=1000)
+        route = ag_models.GradingQueueRoute.update_median_grading_time(self.project.pk)
+        self.assertEqual(1000, route.median_grading_time)
+        self.assertEqual(4, route.num_grading_time_samples)
+        self.assertEqual(ag_models.GradingQueueClass.slow, route.queue_class)
+
+    def test_update_median_grading_time_does_not_lock_route(self) -> None:
+        ag_models.GradingQueueRoute.get_queue_class(self.project.pk)
+        self._make_graded_submission(grading_time=12)
+        with CaptureQueriesContext(connection) as queries:
+            ag_models.GradingQueueRoute.update_median_grading_time(self.project.pk)
+
+        for query in queries.captured_queries:
+            self.assertNotIn('FOR UPDATE', query['sql'])
+
+    @override_settings(GRADING_TIME_MIN_SAMPLES=3)
+    def test_median_update_retried_if_worst_case_grading_time_changes(self) -> None:
+        for i in range(7):
+            obj_build.make_full_ag_test_command(self.case, time_limit=90)
+        route = ag_models.GradingQueueRoute.objects.get(project=self.project)
+        self.assertEqual(ag_models.GradingQueueClass.slow, route.queue_class)
+        self._make_graded_submission(grading_time=12)
+
+        # Simulates the worst case grading time being updated after
+        # the route is loaded.
+        stale_route = ag_models.GradingQueueRoute(
+            project=self.project, worst_case_grading_time=0)
+        current_route = ag_models.GradingQueueRoute.objects.get_or_create(
+            project_id=self.project.pk)
+        with mock.patch.object(ag_models.GradingQueueRoute.objects, 'get_or_create',
+                               side_effect=[(stale_route, False), current_route]):
+            ag_models.GradingQueueRoute.update_median_grading_time(self.project.pk)
+
+        route.refresh_from_db()
+        self.assertEqual(630, route.worst_case_grading_time)
+        self.assertEqual(12, route.median_grading_time)
+        self.assertEqual(ag_models.GradingQueueClass.slow, route.queue_class)
+
+    @override_settings(GRADING_TIME_MIN_SAMPLES=1)
+    def test_median_update_locks_route_after_max_attempts(self) -> None:
+        for i in range(7):
+            obj_build.make_full_ag_test_command(self.case, time_limit=90)
+        self._make_graded_submission(grading_time=12)
+
+        num_attempts = ag_models.grading_queue_route._MAX_MEDIAN_UPDATE_ATTEMPTS
+        stale_routes = [
+            (ag_models.GradingQueueRoute(project=self.project, worst_case_grading_time=0), False)
+            for i in range(num_attempts)
+        ]
+        current_route = ag_models.GradingQueueRoute.objects.get_or_create(
+            project_id=self.project.pk)
+        with mock.patch.object(ag_models.GradingQueueRoute.objects, 'get_or_create',
+                               side_effect=stale_routes + [current_route]) as mock_get_or_create, \
+                CaptureQueriesContext(connection) as queries:
+            route = ag_models.GradingQueueRoute.update_median_grading_time(self.project.pk)
+
+        self.assertEqual(num_attempts + 1, mock_get_or_create.call_count)
+        self.assertTrue(any('FOR UPDATE' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(12, route.median_grading_time)
+        self.assertEqual(ag_models.GradingQueueClass.fast, route.queue_class)
+
+        route.refresh_from_db()
+        self.assertEqual(630, route.worst_case_grading_time)
+        self.assertEqual(12, route.median_grading_time)
+        self.assertEqual(1, route.num_grading_time_samples)
+        self.assertEqual(ag_models.GradingQueueClass.fast, route.queue_class)
+
+    def test_submissions_without_grading_times_ignored(self) -> None:
+        obj_build.make_submission(group=obj_build.make_group(project=self.project))
+        self._make_graded_submission(grading_time=-5)
+        self._make_graded_submission(grading_time=12)
+
+        route = ag_models.GradingQueueRoute.update_median_grading_time(self.project.pk)
+        self.assertEqual(12, route.median_grading_time)
+        self.assertEqual(1, route.num_grading_time_samples)
+
+    def test_project_with_route_deleted(self) -> None:
+        obj_build.make_full_ag_test_command(self.case, time_limit=5)
+        ag_models.GradingQueueRoute.get_queue_class(self.project.pk)
+
+        self.project.delete()
+        self.assertFalse(ag_models.GradingQueueRoute.objects.exists())
+
+    def _assert_worst_case_grading_time(self, expected: int) -> None:
+        route = ag_models.GradingQueueRoute.objects.get(project=self.project)
+        self.assertEqual(expected, route.worst_case_grading_time)
+
+    def _make_graded_submission(self, grading_time: float) -> ag_models.Submission:
+        submission = obj_build.make_finished_submission(
+            group=obj_build.make_group(project=self.project))
+        start = timezone.now()
+        ag_models.Submission.objects.filter(pk=submission.pk).update(
+            grading_start_time=start,
+            non_deferred_grading_end_time=start + datetime.timedelta(seconds=grading_time))
+        return submission
+
+
+class GradingQueueClassCacheTestCase(TransactionUnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.project = obj_build.make_project()
+        self.cache_key = f'project_{self.project.pk}_grading_queue_class'
+
+    def test_queue_class_cached_when_transaction_commits(self) -> None:
+        ag_models.GradingQueueRoute.get_queue_class(self.project.pk)
+        self.assertEqual('fast', cache.get(self.cache_key))
+
+        with transaction.atomic():
+            ag_models.GradingQueueRoute.update_worst_case_grading_time(self.project.pk)
+            self.assertIsNone(cache.get(self.cache_key))
+
+        self.assertEqual('fast', cache.get(self.cache_key))
+
+    def test_queue_class_not_cached_when_transaction_rolled_back(self) -> None:
+        ag_models.GradingQueueRoute.get_queue_class(self.project.pk)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                ag_models.GradingQueueRoute.update_worst_case_grading_time(self.project.pk)
+                raise RuntimeError
+
+        self.assertIsNone(cache.get(self.cache_key))
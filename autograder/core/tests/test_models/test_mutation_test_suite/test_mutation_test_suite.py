@@ -45,6 +45,7 @@ class MutationTestSuiteTestCase(UnitTestBase):
         self.assertEqual(ag_models.SandboxDockerImage.objects.get(name='default'),
                          mutation_suite.sandbox_docker_image)
         self.assertFalse(mutation_suite.allow_network_access)
+        self.assertFalse(mutation_suite.run_student_tests_in_parallel)
 
         self.assertIsInstance(mutation_suite.normal_fdbk_config,
                               ag_models.MutationTestSuiteFeedbackConfig)
@@ -103,6 +104,7 @@ class MutationTestSuiteTestCase(UnitTestBase):
             'deferred': True,
             'sandbox_docker_image': sandbox_image.to_dict(),
             'allow_network_access': True,
+            'run_student_tests_in_parallel': True,
             'normal_fdbk_config': {
                 'bugs_exposed_fdbk_level': (
                     ag_models.BugsExposedFeedbackLevel.num_bugs_exposed.value),
@@ -308,6 +310,7 @@ class MutationTestSuiteTestCase(UnitTestBase):
             'deferred',
             'sandbox_docker_image',
             'allow_network_access',
+            'run_student_tests_in_parallel',
             'normal_fdbk_config',
             'ultimate_submission_fdbk_config',
             'past_limit_submission_fdbk_config',
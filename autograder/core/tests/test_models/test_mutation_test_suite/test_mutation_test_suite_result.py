@@ -2,6 +2,7 @@ import decimal
 import os
 
 import autograder.core.models as ag_models
+from autograder.core.result_output import open_output
 from autograder.core.submission_feedback import MutationTestSuitePreLoader
 from autograder.utils.testing import UnitTestBase
 import autograder.utils.testing.model_obj_builders as obj_build
@@ -85,9 +86,9 @@ class MutationTestSuiteResultFeedbackTestCase(UnitTestBase):
             return_code=0
         )  # type: ag_models.AGCommandResult
 
-        with open(self.setup_result.stdout_filename, 'w') as f:
+        with open_output(self.setup_result.stdout_filename, 'w') as f:
             f.write(self.setup_stdout)
-        with open(self.setup_result.stderr_filename, 'w') as f:
+        with open_output(self.setup_result.stderr_filename, 'w') as f:
             f.write(self.setup_stderr)
 
         self.valid_tests = ['test{}'.format(i) for i in range(3)]
@@ -102,9 +103,9 @@ class MutationTestSuiteResultFeedbackTestCase(UnitTestBase):
         self.get_test_names_result = ag_models.AGCommandResult.objects.validate_and_create(
             return_code=self.get_test_names_return_code
         )  # type: ag_models.AGCommandResult
-        with open(self.get_test_names_result.stdout_filename, 'w') as f:
+        with open_output(self.get_test_names_result.stdout_filename, 'w') as f:
             f.write(self.get_test_names_stdout)
-        with open(self.get_test_names_result.stderr_filename, 'w') as f:
+        with open_output(self.get_test_names_result.stderr_filename, 'w') as f:
             f.write(self.get_test_names_stderr)
 
         self.bugs_exposed = self.bug_names
@@ -120,13 +121,13 @@ class MutationTestSuiteResultFeedbackTestCase(UnitTestBase):
             get_test_names_result=self.get_test_names_result
         )  # type: ag_models.MutationTestSuiteResult
 
-        with open(self.result.validity_check_stdout_filename, 'w') as f:
+        with open_output(self.result.validity_check_stdout_filename, 'w') as f:
             f.write(self.validity_check_stdout)
-        with open(self.result.validity_check_stderr_filename, 'w') as f:
+        with open_output(self.result.validity_check_stderr_filename, 'w') as f:
             f.write(self.validity_check_stderr)
-        with open(self.result.grade_buggy_impls_stdout_filename, 'w') as f:
+        with open_output(self.result.grade_buggy_impls_stdout_filename, 'w') as f:
             f.write(self.grade_buggy_impls_stdout)
-        with open(self.result.grade_buggy_impls_stderr_filename, 'w') as f:
+        with open_output(self.result.grade_buggy_impls_stderr_filename, 'w') as f:
             f.write(self.grade_buggy_impls_stderr)
 
     def test_feedback_calculator_factory_method(self):
@@ -3,6 +3,7 @@ from django.core.exceptions import ValidationError
 import autograder.core.models as ag_models
 from autograder.utils.testing import UnitTestBase
 import autograder.utils.testing.model_obj_builders as obj_build
+from autograder.core.models.project.download_task import download_progress_counter
 
 
 class DownloadTaskTestCase(UnitTestBase):
@@ -65,3 +66,21 @@ class DownloadTaskTestCase(UnitTestBase):
 
         task.validate_and_update(result_filename='/a/file', progress=50, error_msg='waaaluigi')
         self.assertTrue(task.has_error)
+
+    def test_live_progress(self):
+        task = ag_models.DownloadTask.objects.validate_and_create(
+            project=self.project, creator=self.user,
+            download_type=ag_models.DownloadType.all_submission_files
+        )  # type: ag_models.DownloadTask
+        self.assertEqual(0, task.live_progress)
+
+        download_progress_counter(task.pk).set(12)
+        download_progress_counter(task.pk).set(15)
+        self.assertEqual(15, task.live_progress)
+        self.assertEqual(15, task.to_dict()['progress'])
+
+        task.refresh_from_db()
+        self.assertEqual(12, task.progress)
+
+        task.validate_and_update(progress=100)
+        self.assertEqual(100, task.live_progress)
@@ -4,6 +4,7 @@ from django.core import exceptions
 
 import autograder.core.models as ag_models
 import autograder.utils.testing.model_obj_builders as obj_build
+from autograder.core.models.rerun_submissions_task import num_completed_subtasks_counter
 from autograder.utils.testing import UnitTestBase
 
 
@@ -74,6 +75,21 @@ class RerunSubmissionsTaskTestCase(UnitTestBase):
         other_submission = obj_build.make_finished_submission(group=self.submission.group)
         self.assertAlmostEqual((completed_count / num_subtasks) * 100, rerun_task.progress)
 
+    def test_progress_includes_live_num_completed_subtasks(self):
+        rerun_task = ag_models.RerunSubmissionsTask.objects.validate_and_create(
+            creator=self.creator,
+            project=self.project,
+            num_completed_subtasks=1,
+        )  # type: ag_models.RerunSubmissionsTask
+        self.assertEqual(50, rerun_task.progress)
+
+        num_completed_subtasks_counter(rerun_task.pk).increment()
+        num_completed_subtasks_counter(rerun_task.pk).increment()
+        rerun_task.refresh_from_db()
+        self.assertEqual(1, rerun_task.num_completed_subtasks)
+        self.assertEqual(100, rerun_task.progress)
+        self.assertEqual(100, rerun_task.to_dict()['progress'])
+
     def test_progress_computation_with_specified_pks(self):
         completed_count = 1
         rerun_task = ag_models.RerunSubmissionsTask.objects.validate_and_create(
@@ -1,14 +1,23 @@
+import hashlib
 import os
 from collections import namedtuple
+from unittest import mock
 
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.client import Pipeline
 
 import autograder.core.models as ag_models
 import autograder.core.utils as core_ut
 import autograder.utils.testing.model_obj_builders as obj_build
 from autograder import utils
 from autograder.core import constants
+from autograder.core.models.submission_queue_index import (
+    _indexed_projects_key, get_positions_in_queue, prune_queue_indexes, rebuild_queue_index,
+    remove_from_queue_index)
+from autograder.core.submitted_file_blobs import get_blob_path
 from autograder.utils.testing import UnitTestBase
 
 
@@ -82,14 +91,18 @@ class SubmissionTestCase(UnitTestBase):
         self.assertTrue(os.path.isdir(core_ut.get_submission_dir(submission)))
         with utils.ChangeDirectory(core_ut.get_submission_dir(submission)):
             self.assertTrue(os.path.isdir(constants.FILESYSTEM_RESULT_OUTPUT_DIRNAME))
-            for name, content in files_to_submit:
-                self.assertEqual(name, submission.get_file(name).name)
-                self.assertEqual(content, submission.get_file(name).read())
-
-                self.assertTrue(
-                    os.path.isfile(os.path.basename(name)))
-                with open(name, 'rb') as f:
-                    self.assertEqual(content, f.read())
+        for name, content in files_to_submit:
+            self.assertEqual(name, submission.get_file(name).name)
+            self.assertEqual(content, submission.get_file(name).read())
+
+            # Submitted files are stored in the blob store.
+            self.assertEqual(
+                hashlib.sha256(content).hexdigest(), submission.submitted_file_hashes[name])
+            self.assertEqual(
+                get_blob_path(submission.submitted_file_hashes[name]),
+                submission.get_file_path(name))
+            with open(submission.get_file_path(name), 'rb') as f:
+                self.assertEqual(content, f.read())
 
         # Check submitted files using member accessors
         expected = sorted(files_to_submit)
@@ -324,3 +337,166 @@ class PositionInQueueTestCase(UnitTestBase):
             submission.status = status
             submission.save()
             self.assertEqual(0, submission.position_in_queue)
+
+    def test_position_in_queue_updated_when_submission_dequeued(self):
+        group = obj_build.make_group()
+        queued = ag_models.Submission.GradingStatus.queued
+        submissions = [
+            obj_build.make_submission(group=group, status=queued) for i in range(3)
+        ]
+        self.assertEqual(3, submissions[2].position_in_queue)
+
+        submissions[0].status = ag_models.Submission.GradingStatus.being_graded
+        submissions[0].save()
+        submissions[1].status = ag_models.Submission.GradingStatus.removed_from_queue
+        submissions[1].save()
+
+        submission = ag_models.Submission.objects.get(pk=submissions[2].pk)
+        self.assertEqual(1, submission.position_in_queue)
+
+    def test_position_in_queue_index_rebuilt_when_missing(self):
+        group = obj_build.make_group()
+        submissions = [obj_build.make_submission(group=group) for i in range(3)]
+        # Queryset updates bypass the queue index.
+        ag_models.Submission.objects.filter(
+            pk__in=[submission.pk for submission in submissions]
+        ).update(status=ag_models.Submission.GradingStatus.queued)
+
+        cache.clear()
+        for submission in submissions:
+            submission.refresh_from_db()
+        self.assertEqual(
+            {submissions[0].pk: 1, submissions[1].pk: 2, submissions[2].pk: 3},
+            get_positions_in_queue(submissions))
+
+        # The rebuilt index is used for later lookups.
+        with self.assertNumQueries(0):
+            self.assertEqual(2, submissions[1].position_in_queue)
+
+    def test_queue_index_rebuild_removes_submissions_dequeued_during_rebuild(self):
+        group = obj_build.make_group()
+        queued = ag_models.Submission.GradingStatus.queued
+        first = obj_build.make_submission(group=group, status=queued)
+        second = obj_build.make_submission(group=group, status=queued)
+        cache.clear()
+
+        original_execute = Pipeline.execute
+
+        def dequeue_then_execute(pipeline, *args, **kwargs):
+            # Simulates the first submission being dequeued after the
+            # rebuild loads the queued pks but before it updates Redis.
+            if not hasattr(dequeue_then_execute, 'called'):
+                dequeue_then_execute.called = True
+                ag_models.Submission.objects.filter(pk=first.pk).update(
+                    status=ag_models.Submission.GradingStatus.being_graded)
+                remove_from_queue_index(group.project_id, [first.pk])
+            return original_execute(pipeline, *args, **kwargs)
+
+        with mock.patch.object(Pipeline, 'execute', new=dequeue_then_execute):
+            rebuild_queue_index(group.project_id)
+
+        second.refresh_from_db()
+        self.assertEqual(1, second.position_in_queue)
+
+    def test_prune_queue_indexes_removes_stale_submissions(self):
+        group1 = obj_build.make_group()
+        group2 = obj_build.make_group()
+        queued = ag_models.Submission.GradingStatus.queued
+        group1_stale = obj_build.make_submission(group=group1, status=queued)
+        group1_queued = obj_build.make_submission(group=group1, status=queued)
+        group2_stale = obj_build.make_submission(group=group2, status=queued)
+        group2_queued = obj_build.make_submission(group=group2, status=queued)
+
+        # Queryset updates bypass the queue index.
+        ag_models.Submission.objects.filter(
+            pk__in=[group1_stale.pk, group2_stale.pk]
+        ).update(status=ag_models.Submission.GradingStatus.finished_grading)
+        self.assertEqual(2, group1_queued.position_in_queue)
+
+        prune_queue_indexes()
+
+        for submission in [group1_queued, group2_queued]:
+            submission.refresh_from_db()
+            self.assertEqual(1, submission.position_in_queue)
+
+    def test_prune_queue_indexes_stops_tracking_empty_indexes(self):
+        group1 = obj_build.make_group()
+        group2 = obj_build.make_group()
+        queued = ag_models.Submission.GradingStatus.queued
+        obj_build.make_submission(group=group1, status=queued)
+        dequeued = obj_build.make_submission(group=group2, status=queued)
+        dequeued.status = ag_models.Submission.GradingStatus.being_graded
+        dequeued.save()
+
+        redis = get_redis_connection('default')
+        self.assertEqual({str(group1.project_id).encode(), str(group2.project_id).encode()},
+                         redis.smembers(_indexed_projects_key()))
+
+        prune_queue_indexes()
+        self.assertEqual({str(group1.project_id).encode()},
+                         redis.smembers(_indexed_projects_key()))
+
+    def test_save_without_status_change_doesnt_update_queue_index(self):
+        queued = ag_models.Submission.GradingStatus.queued
+        submission = obj_build.make_submission(status=queued)
+        submission = ag_models.Submission.objects.get(pk=submission.pk)
+
+        with mock.patch('autograder.core.models.submission.add_to_queue_index') as add_mock, \
+                mock.patch('autograder.core.models.submission.remove_from_queue_index'
+                           ) as remove_mock:
+            submission.save()
+            submission.status = ag_models.Submission.GradingStatus.being_graded
+            submission.save(update_fields=['error_msg'])
+
+        add_mock.assert_not_called()
+        remove_mock.assert_not_called()
+
+        submission.save()
+        self.assertEqual(0, submission.position_in_queue)
+
+    def test_status_changed_after_refresh_from_db_updates_queue_index(self):
+        submission = obj_build.make_submission(
+            status=ag_models.Submission.GradingStatus.queued)
+        # Queryset updates bypass the queue index.
+        ag_models.Submission.objects.filter(pk=submission.pk).update(
+            status=ag_models.Submission.GradingStatus.being_graded)
+        remove_from_queue_index(submission.project_id, [submission.pk])
+        submission.refresh_from_db()
+
+        submission.status = ag_models.Submission.GradingStatus.queued
+        submission.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(1, submission.position_in_queue)
+
+    def test_ultimate_submissions_invalidated_only_when_tracked_fields_change(self):
+        submission = obj_build.make_finished_submission()
+        submission = ag_models.Submission.objects.get(pk=submission.pk)
+
+        path = 'autograder.core.models.submission.invalidate_group_ultimate_submissions'
+        with mock.patch(path) as invalidate_mock:
+            submission.save()
+            invalidate_mock.assert_not_called()
+
+            submission.does_not_count_for.append('spam')
+            submission.save()
+            invalidate_mock.assert_called_once_with(submission.group_id)
+
+    def test_get_positions_in_queue_multiple_projects(self):
+        group1 = obj_build.make_group()
+        group2 = obj_build.make_group()
+        queued = ag_models.Submission.GradingStatus.queued
+        group1_first = obj_build.make_submission(group=group1, status=queued)
+        group2_first = obj_build.make_submission(group=group2, status=queued)
+        group1_second = obj_build.make_submission(group=group1, status=queued)
+        not_queued = obj_build.make_finished_submission(group1)
+
+        submissions = [group1_first, group2_first, group1_second, not_queued]
+        with self.assertNumQueries(0):
+            positions = get_positions_in_queue(submissions)
+
+        self.assertEqual({
+            group1_first.pk: 1,
+            group2_first.pk: 1,
+            group1_second.pk: 2,
+            not_queued.pk: 0,
+        }, positions)
@@ -0,0 +1,72 @@
+from django.core.cache import cache
+
+import autograder.core.models as ag_models
+import autograder.utils.testing.model_obj_builders as obj_build
+from autograder.core.models.task import TaskProgressCounter
+from autograder.utils.testing import UnitTestBase
+
+
+class TaskProgressCounterTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        project = obj_build.make_project()
+        self.task = ag_models.RerunSubmissionsTask.objects.validate_and_create(
+            project=project, creator=obj_build.make_user())
+        self.counter = TaskProgressCounter(
+            ag_models.RerunSubmissionsTask, self.task.pk, 'num_completed_subtasks',
+            flush_interval=3)
+
+    def test_increment_flushed_every_interval(self):
+        self.assertIsNone(self.counter.get())
+
+        self.assertEqual(1, self.counter.increment())
+        self.assertEqual(2, self.counter.increment())
+        self.assertEqual(2, self.counter.get())
+        self._assert_flushed_value(0)
+
+        self.assertEqual(3, self.counter.increment())
+        self._assert_flushed_value(3)
+
+        self.assertEqual(7, self.counter.increment(4))
+        self._assert_flushed_value(7)
+
+        self.assertEqual(8, self.counter.increment())
+        self._assert_flushed_value(7)
+
+        self.counter.flush()
+        self._assert_flushed_value(8)
+
+    def test_set_flushed_every_interval(self):
+        self.counter.set(1)
+        self._assert_flushed_value(1)
+
+        self.counter.set(2)
+        self.assertEqual(2, self.counter.get())
+        self._assert_flushed_value(1)
+
+        self.counter.set(4)
+        self._assert_flushed_value(4)
+
+    def test_flushed_value_never_decreases(self):
+        ag_models.RerunSubmissionsTask.objects.filter(
+            pk=self.task.pk).update(num_completed_subtasks=10)
+        self.counter.set(5)
+        self.counter.flush()
+        self._assert_flushed_value(10)
+
+    def test_increment_after_live_value_lost(self):
+        self.counter.increment()
+        self.counter.increment()
+        self.counter.increment()
+        self._assert_flushed_value(3)
+
+        cache.clear()
+        self.assertEqual(4, self.counter.increment())
+
+    def test_flush_no_live_value(self):
+        self.counter.flush()
+        self._assert_flushed_value(0)
+
+    def _assert_flushed_value(self, expected: int):
+        self.task.refresh_from_db()
+        self.assertEqual(expected, self.task.num_completed_subtasks)
@@ -0,0 +1,229 @@
+import gzip
+import io
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+import autograder.core.models as ag_models
+import autograder.core.utils as core_ut
+import autograder.utils.testing.model_obj_builders as obj_build
+from autograder.core.result_output import (
+    COMPRESSED_SUFFIX, CompressedOutputFile, compress_output, compress_outputs_in_dir,
+    copy_output, get_output_diff_source, get_output_size, open_output, write_output)
+from autograder.utils.testing import UnitTestBase
+
+
+class ResultOutputTestCase(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.output_dir = tempdir.name
+        self.filename = os.path.join(self.output_dir, 'cmd_result_1_stdout')
+
+    def test_write_and_read_output(self):
+        output = b'spam\n' * 10000
+        write_output(io.BytesIO(output), self.filename)
+
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertLess(os.path.getsize(self.filename + COMPRESSED_SUFFIX), len(output))
+        with gzip.open(self.filename + COMPRESSED_SUFFIX) as f:
+            self.assertEqual(output, f.read())
+
+        with open_output(self.filename) as f:
+            self.assertIsInstance(f, CompressedOutputFile)
+            self.assertEqual(output, f.read())
+            self.assertEqual(len(output), f.size)
+
+        with open_output(self.filename, 'r') as f:
+            self.assertEqual(output.decode(), f.read())
+
+        self.assertEqual(len(output), get_output_size(self.filename))
+
+    def test_write_output_from_current_position(self):
+        source = io.BytesIO(b'spam egg')
+        source.seek(5)
+        write_output(source, self.filename)
+        with open_output(self.filename) as f:
+            self.assertEqual(b'egg', f.read())
+
+    def test_write_output_replaces_uncompressed_output(self):
+        self._write_uncompressed(b'old output')
+        write_output(io.BytesIO(b'new output'), self.filename)
+
+        self.assertFalse(os.path.exists(self.filename))
+        with open_output(self.filename) as f:
+            self.assertEqual(b'new output', f.read())
+
+    def test_identical_output_compresses_identically(self):
+        other_filename = os.path.join(self.output_dir, 'cmd_result_2_stdout')
+        write_output(io.BytesIO(b'spam'), self.filename)
+        write_output(io.BytesIO(b'spam'), other_filename)
+
+        with open(self.filename + COMPRESSED_SUFFIX, 'rb') as f:
+            compressed = f.read()
+        with open(other_filename + COMPRESSED_SUFFIX, 'rb') as f:
+            self.assertEqual(compressed, f.read())
+
+    def test_empty_output(self):
+        write_output(io.BytesIO(), self.filename)
+        self.assertEqual(0, get_output_size(self.filename))
+        with open_output(self.filename) as f:
+            self.assertEqual(b'', f.read())
+
+    def test_open_output_for_writing(self):
+        self._write_uncompressed(b'old output')
+        with open_output(self.filename, 'w') as f:
+            f.write('new output')
+
+        self.assertFalse(os.path.exists(self.filename))
+        with open_output(self.filename, 'r') as f:
+            self.assertEqual('new output', f.read())
+
+        with open_output(self.filename, 'wb') as f:
+            f.write(b'newer output')
+
+        self.assertEqual(len(b'newer output'), get_output_size(self.filename))
+
+    def test_open_output_for_appending_not_allowed(self):
+        for mode in ['a', 'ab', 'r+', 'w+b']:
+            with self.assertRaises(ValueError):
+                open_output(self.filename, mode)
+
+    def test_read_uncompressed_output(self):
+        self._write_uncompressed(b'spam')
+
+        with open_output(self.filename) as f:
+            self.assertNotIsInstance(f, CompressedOutputFile)
+            self.assertEqual(b'spam', f.read())
+
+        self.assertEqual(4, get_output_size(self.filename))
+        self.assertEqual(self.filename, get_output_diff_source(self.filename))
+
+    def test_get_output_diff_source(self):
+        write_output(io.BytesIO(b'spam\negg\n'), self.filename)
+        self.assertEqual(b'spam\negg\n', get_output_diff_source(self.filename))
+
+        diff = core_ut.get_diff(b'spam\n', get_output_diff_source(self.filename))
+        self.assertFalse(diff.diff_pass)
+        self.assertEqual(['  spam\n', '+ egg\n'], diff.diff_content)
+
+    def test_missing_output(self):
+        with self.assertRaises(FileNotFoundError):
+            open_output(self.filename)
+
+        with self.assertRaises(FileNotFoundError):
+            get_output_size(self.filename)
+
+    def test_copy_output(self):
+        dest = os.path.join(self.output_dir, 'cmd_result_2_stdout')
+
+        write_output(io.BytesIO(b'compressed'), self.filename)
+        copy_output(self.filename, dest)
+        self.assertTrue(os.path.isfile(dest + COMPRESSED_SUFFIX))
+        with open_output(dest) as f:
+            self.assertEqual(b'compressed', f.read())
+
+        os.remove(self.filename + COMPRESSED_SUFFIX)
+        self._write_uncompressed(b'uncompressed')
+        copy_output(self.filename, dest)
+        self.assertFalse(os.path.exists(dest + COMPRESSED_SUFFIX))
+        with open_output(dest) as f:
+            self.assertEqual(b'uncompressed', f.read())
+
+        os.remove(self.filename)
+        copy_output(self.filename, dest)
+        self.assertFalse(os.path.exists(dest))
+        self.assertFalse(os.path.exists(dest + COMPRESSED_SUFFIX))
+
+    def test_compress_output(self):
+        self._write_uncompressed(b'spam')
+
+        self.assertTrue(compress_output(self.filename))
+        self.assertFalse(os.path.exists(self.filename))
+        with open_output(self.filename) as f:
+            self.assertIsInstance(f, CompressedOutputFile)
+            self.assertEqual(b'spam', f.read())
+
+        self.assertFalse(compress_output(self.filename))
+
+    def test_compress_output_keeps_newer_compressed_output(self):
+        # Simulates the output being regraded while it's compressed.
+        self._write_uncompressed(b'old output')
+        with gzip.open(self.filename + COMPRESSED_SUFFIX, 'wb') as f:
+            f.write(b'new output')
+
+        self.assertTrue(compress_output(self.filename))
+        self.assertFalse(os.path.exists(self.filename))
+        with open_output(self.filename) as f:
+            self.assertEqual(b'new output', f.read())
+
+    def test_compress_outputs_in_dir(self):
+        self._write_uncompressed(b'spam')
+        stderr_filename = os.path.join(self.output_dir, 'cmd_result_1_stderr')
+        with open(stderr_filename, 'wb') as f:
+            f.write(b'egg')
+        diff_filename = self.filename + '_diff'
+        with open(diff_filename, 'w') as f:
+            f.write('[]')
+        compressed_filename = os.path.join(self.output_dir, 'cmd_result_2_stdout')
+        write_output(io.BytesIO(b'sausage'), compressed_filename)
+
+        self.assertEqual(3, compress_outputs_in_dir(self.output_dir))
+        self.assertCountEqual(
+            ['cmd_result_1_stdout.gz', 'cmd_result_1_stderr.gz',
+             'cmd_result_1_stdout_diff.gz', 'cmd_result_2_stdout.gz'],
+            os.listdir(self.output_dir))
+
+        self.assertEqual(0, compress_outputs_in_dir(self.output_dir))
+        self.assertEqual(0, compress_outputs_in_dir(os.path.join(self.output_dir, 'nope')))
+
+    def _write_uncompressed(self, output: bytes):
+        with open(self.filename, 'wb') as f:
+            f.write(output)
+
+
+class CompressResultOutputCommandTestCase(UnitTestBase):
+    def test_compress_result_output(self):
+        cmd = obj_build.make_full_ag_test_command()
+        submission = obj_build.make_submission(group=obj_build.make_group(
+            project=cmd.ag_test_case.ag_test_suite.project))
+        other_cmd = obj_build.make_full_ag_test_command()
+        other_submission = obj_build.make_submission(group=obj_build.make_group(
+            project=other_cmd.ag_test_case.ag_test_suite.project))
+
+        result = obj_build.make_correct_ag_test_command_result(cmd, submission=submission)
+        other_result = obj_build.make_correct_ag_test_command_result(
+            other_cmd, submission=other_submission)
+        for cmd_result in [result, other_result]:
+            for filename in [cmd_result.stdout_filename, cmd_result.stderr_filename]:
+                os.remove(filename + COMPRESSED_SUFFIX)
+                with open(filename, 'w') as f:
+                    f.write('legacy output')
+
+        setup_result = ag_models.AGCommandResult.objects.validate_and_create()
+        os.remove(setup_result.stdout_filename + COMPRESSED_SUFFIX)
+        with open(setup_result.stdout_filename, 'w') as f:
+            f.write('legacy setup output')
+
+        call_command('compress_result_output', project=submission.project.pk,
+                     stdout=io.StringIO())
+
+        for filename in [result.stdout_filename, result.stderr_filename]:
+            self.assertFalse(os.path.exists(filename))
+            with open_output(filename, 'r') as f:
+                self.assertEqual('legacy output', f.read())
+
+        self.assertTrue(os.path.isfile(other_result.stdout_filename))
+        self.assertTrue(os.path.isfile(setup_result.stdout_filename))
+
+        call_command('compress_result_output', stdout=io.StringIO())
+
+        for filename in [other_result.stdout_filename, other_result.stderr_filename,
+                         setup_result.stdout_filename]:
+            self.assertFalse(os.path.exists(filename))
+
+        with open_output(setup_result.stdout_filename, 'r') as f:
+            self.assertEqual('legacy setup output', f.read())
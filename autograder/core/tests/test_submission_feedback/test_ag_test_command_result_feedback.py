@@ -1,12 +1,15 @@
+import json
 import os
 import tempfile
 from typing import Union
 from unittest import mock
 
 import autograder.core.models as ag_models
+from autograder.core.result_output import open_output
 import autograder.core.utils as core_ut
 import autograder.utils.testing.model_obj_builders as obj_build
-from autograder.core.submission_feedback import AGTestCommandResultFeedback, AGTestPreLoader
+from autograder.core.submission_feedback import (
+    AGTestCommandResultFeedback, AGTestPreLoader, SerializedAGTestCommandResultWrapper)
 from autograder.core.tests.test_submission_feedback.fdbk_getter_shortcuts import get_cmd_fdbk
 from autograder.utils.testing import UnitTestBase
 
@@ -72,6 +75,23 @@ class AGTestCommandResultFeedbackTestCase(UnitTestBase):
             'cmd_result_' + str(result.pk) + '_stderr')
         self.assertEqual(expected_stderr_name, result.stderr_filename)
 
+    def test_serialized_result_output_filenames_computed_without_queries(self):
+        result = self.make_correct_result()
+        expected = [result.stdout_filename, result.stderr_filename,
+                    result.stdout_diff_filename, result.stderr_diff_filename]
+
+        submission = ag_models.Submission.objects.get(
+            pk=result.ag_test_case_result.ag_test_suite_result.submission_id)
+        # Load the submission's course pk into the cache.
+        core_ut.get_result_output_dir(submission)
+
+        serialized_result = SerializedAGTestCommandResultWrapper(result.to_dict(), submission)
+        with self.assertNumQueries(0):
+            actual = [serialized_result.stdout_filename, serialized_result.stderr_filename,
+                      serialized_result.stdout_diff_filename,
+                      serialized_result.stderr_diff_filename]
+        self.assertEqual(expected, actual)
+
     def test_feedback_calculator_factory_method(self):
         # check against the actual objects (their pks)
         result = self.make_correct_result()
@@ -728,6 +748,75 @@ class AGTestCommandResultFeedbackTestCase(UnitTestBase):
         self.assertEqual(self.ag_test_command.points_for_correct_stderr,
                          fdbk.stderr_points)
 
+    def test_diffs_stored_at_grading_time_not_recomputed(self):
+        self.ag_test_command.validate_and_update(
+            expected_stdout_source=ag_models.ExpectedOutputSource.text,
+            expected_stdout_text='spam\n',
+            expected_stderr_source=ag_models.ExpectedOutputSource.text,
+            expected_stderr_text='egg\n')
+        result = self.make_incorrect_result()
+        _write_stdout(result, 'spam\n')
+        _write_stderr(result, 'egg\n')
+
+        stdout_diff = ['- spam\n', '+ wow\n']
+        stderr_diff = ['- egg\n']
+        with open_output(result.stdout_diff_filename, 'w') as f:
+            json.dump(stdout_diff, f)
+        # Diffs stored before diffs were compressed.
+        with open(result.stderr_diff_filename, 'w') as f:
+            json.dump(stderr_diff, f)
+        result.stdout_diff_size = 13
+        result.stderr_diff_size = 6
+        result.save()
+
+        with mock.patch('autograder.core.utils.get_diff') as mock_get_diff:
+            fdbk = get_cmd_fdbk(result, ag_models.FeedbackCategory.max)
+            self.assertFalse(fdbk.stdout_diff.diff_pass)
+            self.assertEqual(stdout_diff, fdbk.stdout_diff.diff_content)
+            self.assertEqual(13, fdbk.get_stdout_diff_size())
+            with fdbk.get_stdout_diff_json() as f:
+                self.assertEqual(stdout_diff, json.load(f))
+
+            self.assertFalse(fdbk.stderr_diff.diff_pass)
+            self.assertEqual(stderr_diff, fdbk.stderr_diff.diff_content)
+            self.assertEqual(6, fdbk.get_stderr_diff_size())
+            with fdbk.get_stderr_diff_json() as f:
+                self.assertEqual(stderr_diff, json.load(f))
+
+        mock_get_diff.assert_not_called()
+
+    def test_passing_diff_rebuilt_from_output(self):
+        self.ag_test_command.validate_and_update(
+            expected_stdout_source=ag_models.ExpectedOutputSource.text,
+            expected_stdout_text='spam\n')
+        result = self.make_correct_result()
+        _write_stdout(result, 'spam\n')
+        result.stdout_diff_size = 7
+        result.save()
+        self.assertFalse(os.path.exists(result.stdout_diff_filename))
+
+        fdbk = get_cmd_fdbk(result, ag_models.FeedbackCategory.max)
+        self.assertTrue(fdbk.stdout_diff.diff_pass)
+        self.assertEqual(['  spam\n'], fdbk.stdout_diff.diff_content)
+        self.assertEqual(7, fdbk.get_stdout_diff_size())
+        with fdbk.get_stdout_diff_json() as f:
+            self.assertEqual(['  spam\n'], json.load(f))
+
+    def test_diff_not_stored_computed_on_demand(self):
+        self.ag_test_command.validate_and_update(
+            expected_stdout_source=ag_models.ExpectedOutputSource.text,
+            expected_stdout_text='spam\n')
+        result = self.make_incorrect_result()
+        _write_stdout(result, 'wow\n')
+        self.assertIsNone(result.stdout_diff_size)
+
+        fdbk = get_cmd_fdbk(result, ag_models.FeedbackCategory.max)
+        expected_diff = ['- spam\n', '+ wow\n']
+        self.assertEqual(expected_diff, fdbk.stdout_diff.diff_content)
+        self.assertEqual(13, fdbk.get_stdout_diff_size())
+        with fdbk.get_stdout_diff_json() as f:
+            self.assertEqual(expected_diff, json.load(f))
+
     def test_points_visibility(self):
         self.ag_test_command.validate_and_update(normal_fdbk_config={'show_points': False})
 
@@ -786,10 +875,10 @@ class AGTestCommandResultFeedbackTestCase(UnitTestBase):
             **diff_options)
 
         result = self.make_correct_result()
-        with open(result.stdout_filename, 'w') as f:
+        with open_output(result.stdout_filename, 'w') as f:
             f.write(actual_stdout)
             actual_stdout_filename = f.name
-        with open(result.stderr_filename, 'w') as f:
+        with open_output(result.stderr_filename, 'w') as f:
             f.write(actual_stderr)
             actual_stderr_filename = f.name
 
@@ -864,7 +953,7 @@ class AGTestCommandResultFeedbackTestCase(UnitTestBase):
 def _stdout_text(result_or_fdbk: Union[ag_models.AGTestCommandResult,
                                        AGTestCommandResultFeedback]) -> str:
     if isinstance(result_or_fdbk, ag_models.AGTestCommandResult):
-        with open(result_or_fdbk.stdout_filename) as f:
+        with open_output(result_or_fdbk.stdout_filename, 'r') as f:
             return f.read()
     elif isinstance(result_or_fdbk, AGTestCommandResultFeedback):
         return result_or_fdbk.stdout.read().decode()
@@ -873,19 +962,19 @@ def _stdout_text(result_or_fdbk: Union[ag_models.AGTestCommandResult,
 def _stderr_text(result_or_fdbk: Union[ag_models.AGTestCommandResult,
                                        AGTestCommandResultFeedback]) -> str:
     if isinstance(result_or_fdbk, ag_models.AGTestCommandResult):
-        with open(result_or_fdbk.stderr_filename) as f:
+        with open_output(result_or_fdbk.stderr_filename, 'r') as f:
             return f.read()
     elif isinstance(result_or_fdbk, AGTestCommandResultFeedback):
         return result_or_fdbk.stderr.read().decode()
 
 
 def _write_stdout(result, stdout):
-    with open(result.stdout_filename, 'w') as f:
+    with open_output(result.stdout_filename, 'w') as f:
         f.write(stdout)
 
 
 def _write_stderr(result, stderr):
-    with open(result.stderr_filename, 'w') as f:
+    with open_output(result.stderr_filename, 'w') as f:
         f.write(stderr)
 
 
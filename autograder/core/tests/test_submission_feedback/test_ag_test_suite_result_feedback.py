@@ -1,6 +1,7 @@
 import os
 
 import autograder.core.models as ag_models
+from autograder.core.submission_feedback import SerializedAGTestSuiteResultWrapper
 from autograder.core.tests.test_submission_feedback.fdbk_getter_shortcuts import (
     get_suite_fdbk, get_case_fdbk, get_cmd_fdbk)
 from autograder.utils.testing import UnitTestBase
@@ -78,6 +79,20 @@ class AGTestSuiteFeedbackTestCase(UnitTestBase):
         self.assertEqual(expected_setup_stderr_filename,
                          self.ag_test_suite_result.setup_stderr_filename)
 
+    def test_serialized_result_output_filenames_computed_without_queries(self):
+        submission = ag_models.Submission.objects.get(pk=self.ag_test_suite_result.submission_id)
+        # Load the submission's course pk into the cache.
+        core_ut.get_result_output_dir(submission)
+
+        serialized_result = SerializedAGTestSuiteResultWrapper(
+            self.ag_test_suite_result.to_dict(), submission)
+        with self.assertNumQueries(0):
+            setup_stdout_filename = serialized_result.setup_stdout_filename
+            setup_stderr_filename = serialized_result.setup_stderr_filename
+
+        self.assertEqual(self.ag_test_suite_result.setup_stdout_filename, setup_stdout_filename)
+        self.assertEqual(self.ag_test_suite_result.setup_stderr_filename, setup_stderr_filename)
+
     def test_feedback_calculator_ctor(self):
         self.assertEqual(
             self.ag_test_suite.normal_fdbk_config.to_dict(),
@@ -0,0 +1,185 @@
+from decimal import Decimal
+from unittest import mock
+
+import autograder.core.models as ag_models
+import autograder.utils.testing.model_obj_builders as obj_build
+from autograder.core.models.get_ultimate_submissions import get_ultimate_submission
+from autograder.core.models.submission_score import get_submission_scores_version
+from autograder.core.submission_feedback import update_denormalized_ag_test_results
+from autograder.core.submission_scores import (
+    update_project_submission_scores, update_submission_scores)
+from autograder.core.tests.test_submission_feedback.fdbk_getter_shortcuts import (
+    get_submission_fdbk)
+from autograder.grading_tasks.tasks import (
+    queue_project_submission_scores_update, update_project_submission_scores_task)
+from autograder.utils.testing import UnitTestBase
+
+
+class SubmissionScoresTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.project = obj_build.make_project(
+            ultimate_submission_policy=ag_models.UltimateSubmissionPolicy.best)
+        self.group = obj_build.make_group(project=self.project)
+
+        self.suite = obj_build.make_ag_test_suite(self.project)
+        case = obj_build.make_ag_test_case(self.suite)
+        self.cmd = obj_build.make_full_ag_test_command(case)
+
+        self.best_submission = obj_build.make_finished_submission(self.group)
+        obj_build.make_correct_ag_test_command_result(
+            self.cmd, submission=self.best_submission)
+        update_denormalized_ag_test_results(self.best_submission.pk)
+
+        self.most_recent_submission = obj_build.make_finished_submission(self.group)
+        obj_build.make_incorrect_ag_test_command_result(
+            self.cmd, submission=self.most_recent_submission)
+        update_denormalized_ag_test_results(self.most_recent_submission.pk)
+
+    def test_scores_stored_for_every_fdbk_category(self):
+        update_submission_scores(self.project, [self.best_submission.pk])
+
+        scores = ag_models.SubmissionScore.objects.filter(submission=self.best_submission)
+        self.assertCountEqual(list(ag_models.FeedbackCategory),
+                              [score.fdbk_category for score in scores])
+        for score in scores:
+            fdbk = get_submission_fdbk(self.best_submission, score.fdbk_category)
+            self.assertEqual(fdbk.total_points, score.total_points)
+            self.assertEqual(fdbk.total_points_possible, score.total_points_possible)
+            self.assertEqual(get_submission_scores_version(self.project.pk),
+                             score.project_version)
+
+        max_score = scores.get(fdbk_category=ag_models.FeedbackCategory.max)
+        self.assertNotEqual(0, max_score.total_points)
+        self.assertEqual(
+            {str(self.suite.pk): [str(max_score.total_points),
+                                  str(max_score.total_points_possible)]},
+            max_score.ag_test_suite_totals)
+        self.assertEqual({}, max_score.mutation_test_suite_totals)
+
+    def test_unfinished_submission_skipped(self):
+        submission = obj_build.make_submission(
+            group=self.group, status=ag_models.Submission.GradingStatus.being_graded)
+        update_submission_scores(self.project, [submission.pk])
+        self.assertFalse(ag_models.SubmissionScore.objects.filter(submission=submission).exists())
+
+    def test_update_scores_again_replaces_scores(self):
+        update_submission_scores(self.project, [self.best_submission.pk])
+        update_submission_scores(self.project, [self.best_submission.pk])
+        self.assertEqual(
+            len(ag_models.FeedbackCategory),
+            ag_models.SubmissionScore.objects.filter(submission=self.best_submission).count())
+
+    def test_points_changed_scores_invalidated_and_recomputed(self):
+        update_project_submission_scores(self.project)
+        old_version = get_submission_scores_version(self.project.pk)
+        old_score = ag_models.SubmissionScore.objects.get(
+            submission=self.best_submission, fdbk_category=ag_models.FeedbackCategory.max)
+
+        self.cmd.validate_and_update(
+            points_for_correct_stdout=self.cmd.points_for_correct_stdout + 10)
+        self.assertNotEqual(old_version, get_submission_scores_version(self.project.pk))
+
+        update_project_submission_scores(self.project)
+        self.assertEqual(len(ag_models.FeedbackCategory) * 2,
+                         ag_models.SubmissionScore.objects.count())
+        new_score = ag_models.SubmissionScore.objects.get(
+            submission=self.best_submission, fdbk_category=ag_models.FeedbackCategory.max)
+        self.assertEqual(old_score.total_points + 10, new_score.total_points)
+        self.assertEqual(get_submission_scores_version(self.project.pk),
+                         new_score.project_version)
+
+    def test_fields_that_dont_affect_scores_changed_scores_not_invalidated(self):
+        old_version = get_submission_scores_version(self.project.pk)
+
+        self.cmd.validate_and_update(name='new name', cmd='true')
+        self.cmd.ag_test_case.validate_and_update(name='new name')
+        self.suite.validate_and_update(name='new name', setup_suite_cmd='true')
+        self.suite.save(update_fields=['deferred'])
+        self.assertEqual(old_version, get_submission_scores_version(self.project.pk))
+
+        self.suite.save(update_fields=['normal_fdbk_config'])
+        self.assertNotEqual(old_version, get_submission_scores_version(self.project.pk))
+
+    def test_fdbk_config_changed_scores_invalidated(self):
+        old_version = get_submission_scores_version(self.project.pk)
+        self.cmd.validate_and_update(
+            normal_fdbk_config={'visible': not self.cmd.normal_fdbk_config.visible})
+        self.assertNotEqual(old_version, get_submission_scores_version(self.project.pk))
+
+    def test_project_deleted_results_not_invalidated_for_each_test(self):
+        with mock.patch('autograder.rest_api.signals._invalidate_project_results'
+                        ) as invalidate_mock:
+            self.project.delete()
+
+        invalidate_mock.assert_not_called()
+
+        other_suite = obj_build.make_ag_test_suite()
+        with mock.patch('autograder.rest_api.signals._invalidate_project_results'
+                        ) as invalidate_mock:
+            other_suite.delete()
+
+        invalidate_mock.assert_called_once_with(other_suite.project_id, True)
+
+    def test_best_submission_chosen_from_stored_scores(self):
+        update_project_submission_scores(self.project)
+        # Make the stored scores disagree with the results so that we
+        # can tell which ones were used.
+        ag_models.SubmissionScore.objects.filter(
+            submission=self.most_recent_submission
+        ).update(total_points=Decimal(1000))
+
+        self.assertEqual(self.most_recent_submission, get_ultimate_submission(self.group))
+
+    def test_best_submission_computed_when_scores_missing(self):
+        update_submission_scores(self.project, [self.most_recent_submission.pk])
+        ag_models.SubmissionScore.objects.filter(
+            submission=self.most_recent_submission
+        ).update(total_points=Decimal(1000))
+
+        # best_submission doesn't have a score, so the stored scores
+        # can't be used for this group.
+        self.assertEqual(self.best_submission, get_ultimate_submission(self.group))
+
+    def test_best_submission_for_user_from_stored_scores(self):
+        user = self.group.members.first()
+        self.best_submission.does_not_count_for = [user.username]
+        self.best_submission.save()
+        update_project_submission_scores(self.project)
+
+        ag_models.SubmissionScore.objects.filter(
+            submission=self.best_submission
+        ).update(total_points=Decimal(1000))
+
+        self.assertEqual(self.best_submission, get_ultimate_submission(self.group))
+        self.assertEqual(self.most_recent_submission,
+                         get_ultimate_submission(self.group, user=user))
+
+
+@mock.patch.object(update_project_submission_scores_task, 'apply_async')
+class QueueProjectSubmissionScoresUpdateTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.project = obj_build.make_project()
+
+    def test_pending_update_not_queued_again(self, apply_async_mock):
+        queue_project_submission_scores_update(self.project.pk)
+        queue_project_submission_scores_update(self.project.pk)
+        self.assertEqual(1, apply_async_mock.call_count)
+
+        # Once the update starts, changes need another update.
+        update_project_submission_scores_task(self.project.pk)
+        queue_project_submission_scores_update(self.project.pk)
+        self.assertEqual(2, apply_async_mock.call_count)
+
+    def test_updates_for_different_projects_queued(self, apply_async_mock):
+        queue_project_submission_scores_update(self.project.pk)
+        queue_project_submission_scores_update(obj_build.make_project().pk)
+        self.assertEqual(2, apply_async_mock.call_count)
+
+    def test_project_deleted_before_update_runs(self, apply_async_mock):
+        project_pk = self.project.pk
+        self.project.delete()
+        with mock.patch('autograder.utils.retry.sleep') as sleep_mock:
+            update_project_submission_scores_task(project_pk)
+        sleep_mock.assert_not_called()
@@ -0,0 +1,257 @@
+import hashlib
+import io
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+import autograder.core.models as ag_models
+import autograder.core.utils as core_ut
+import autograder.utils.testing.model_obj_builders as obj_build
+from autograder.core.submitted_file_blobs import (
+    delete_legacy_submission_files, delete_orphaned_blobs, get_blob_path, get_blob_store_dir,
+    link_blobs, move_submission_files_to_blob_store, named_submitted_file_paths, store_blob)
+from autograder.utils.testing import UnitTestBase
+
+
+class BlobStoreTestCase(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        media_root_override = override_settings(MEDIA_ROOT=tempdir.name)
+        media_root_override.enable()
+        self.addCleanup(media_root_override.disable)
+
+    def test_store_blob(self):
+        content = b'int main() { return 0; }\n'
+        digest = store_blob(SimpleUploadedFile('main.cpp', content))
+
+        self.assertEqual(hashlib.sha256(content).hexdigest(), digest)
+        with open(get_blob_path(digest), 'rb') as f:
+            self.assertEqual(content, f.read())
+
+    def test_identical_files_stored_once(self):
+        digest = store_blob(SimpleUploadedFile('spam.cpp', b'spam'))
+        self.assertEqual(digest, store_blob(SimpleUploadedFile('eggs.cpp', b'spam')))
+        self.assertNotEqual(digest, store_blob(SimpleUploadedFile('spam.cpp', b'eggs')))
+
+        blob_dirs = [entry for entry in os.scandir(get_blob_store_dir())
+                     if entry.name != 'tmp']
+        self.assertEqual(2, sum(len(os.listdir(entry.path)) for entry in blob_dirs))
+
+    def test_link_blobs(self):
+        spam_digest = store_blob(SimpleUploadedFile('spam.cpp', b'spam'))
+        eggs_digest = store_blob(SimpleUploadedFile('eggs.cpp', b'eggs'))
+
+        with tempfile.TemporaryDirectory() as dest_dir:
+            link_blobs({
+                'spam.cpp': spam_digest,
+                'spam_copy.cpp': spam_digest,
+                'eggs.cpp': eggs_digest
+            }, dest_dir)
+
+            self.assertCountEqual(['spam.cpp', 'spam_copy.cpp', 'eggs.cpp'], os.listdir(dest_dir))
+            for filename, content in [('spam.cpp', b'spam'),
+                                      ('spam_copy.cpp', b'spam'),
+                                      ('eggs.cpp', b'eggs')]:
+                with open(os.path.join(dest_dir, filename), 'rb') as f:
+                    self.assertEqual(content, f.read())
+
+            # Files that share a blob must not share an inode.
+            self.assertNotEqual(
+                os.stat(os.path.join(dest_dir, 'spam.cpp')).st_ino,
+                os.stat(os.path.join(dest_dir, 'spam_copy.cpp')).st_ino)
+
+    def test_delete_orphaned_blobs(self):
+        referenced = store_blob(SimpleUploadedFile('spam.cpp', b'spam'))
+        orphaned = store_blob(SimpleUploadedFile('eggs.cpp', b'eggs'))
+
+        self.assertEqual(0, delete_orphaned_blobs([referenced], min_age=60))
+        self.assertTrue(os.path.isfile(get_blob_path(orphaned)))
+
+        an_hour_ago = time.time() - 60 * 60
+        os.utime(get_blob_path(referenced), (an_hour_ago, an_hour_ago))
+        os.utime(get_blob_path(orphaned), (an_hour_ago, an_hour_ago))
+
+        self.assertEqual(1, delete_orphaned_blobs([referenced], min_age=60))
+        self.assertTrue(os.path.isfile(get_blob_path(referenced)))
+        self.assertFalse(os.path.exists(get_blob_path(orphaned)))
+
+    def test_storing_existing_blob_refreshes_its_age(self):
+        digest = store_blob(SimpleUploadedFile('spam.cpp', b'spam'))
+        an_hour_ago = time.time() - 60 * 60
+        os.utime(get_blob_path(digest), (an_hour_ago, an_hour_ago))
+
+        store_blob(SimpleUploadedFile('spam.cpp', b'spam'))
+        self.assertEqual(0, delete_orphaned_blobs([], min_age=60))
+        self.assertTrue(os.path.isfile(get_blob_path(digest)))
+
+    def test_blob_reused_before_quarantine_not_deleted(self):
+        digest = store_blob(SimpleUploadedFile('spam.cpp', b'spam'))
+        an_hour_ago = time.time() - 60 * 60
+        os.utime(get_blob_path(digest), (an_hour_ago, an_hour_ago))
+
+        original_rename = os.rename
+
+        def reuse_then_rename(src, dst):
+            # store_blob() reuses the blob after the first mtime check.
+            store_blob(SimpleUploadedFile('spam.cpp', b'spam'))
+            original_rename(src, dst)
+
+        with mock.patch('os.rename', side_effect=reuse_then_rename):
+            self.assertEqual(0, delete_orphaned_blobs([], min_age=60))
+
+        with open(get_blob_path(digest), 'rb') as f:
+            self.assertEqual(b'spam', f.read())
+
+    def test_blob_reused_after_quarantine_written_again(self):
+        digest = store_blob(SimpleUploadedFile('spam.cpp', b'spam'))
+        an_hour_ago = time.time() - 60 * 60
+        os.utime(get_blob_path(digest), (an_hour_ago, an_hour_ago))
+
+        original_rename = os.rename
+
+        def rename_then_reuse(src, dst):
+            original_rename(src, dst)
+            store_blob(SimpleUploadedFile('spam.cpp', b'spam'))
+
+        with mock.patch('os.rename', side_effect=rename_then_reuse):
+            self.assertEqual(1, delete_orphaned_blobs([], min_age=60))
+
+        with open(get_blob_path(digest), 'rb') as f:
+            self.assertEqual(b'spam', f.read())
+
+    def test_delete_orphaned_blobs_empty_store(self):
+        self.assertEqual(0, delete_orphaned_blobs([], min_age=0))
+
+
+class SubmissionBlobsTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.group = obj_build.make_group()
+        ag_models.ExpectedStudentFile.objects.validate_and_create(
+            project=self.group.project, pattern='*', max_num_matches=10)
+
+    def test_resubmitted_files_share_blobs(self):
+        first = self._make_submission({'spam.cpp': b'spam', 'eggs.cpp': b'eggs'})
+        second = self._make_submission({'spam.cpp': b'spam', 'eggs.cpp': b'new eggs'})
+
+        self.assertEqual(first.submitted_file_hashes['spam.cpp'],
+                         second.submitted_file_hashes['spam.cpp'])
+        self.assertNotEqual(first.submitted_file_hashes['eggs.cpp'],
+                            second.submitted_file_hashes['eggs.cpp'])
+        self.assertEqual(first.get_file_path('spam.cpp'), second.get_file_path('spam.cpp'))
+        self.assertEqual(b'new eggs', second.get_file('eggs.cpp').read())
+
+    def test_named_submitted_file_paths(self):
+        submission = self._make_submission(
+            {'spam.cpp': b'spam', 'spam_copy.cpp': b'spam', 'eggs.cpp': b'eggs'})
+
+        with named_submitted_file_paths(submission, ['spam.cpp', 'spam_copy.cpp']) as paths:
+            self.assertEqual(['spam.cpp', 'spam_copy.cpp'],
+                             [os.path.basename(path) for path in paths])
+            for path in paths:
+                with open(path, 'rb') as f:
+                    self.assertEqual(b'spam', f.read())
+
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+
+    def test_named_submitted_file_paths_file_not_submitted(self):
+        submission = self._make_submission({'spam.cpp': b'spam'})
+        with self.assertRaises(ObjectDoesNotExist):
+            with named_submitted_file_paths(submission, ['eggs.cpp']):
+                pass
+
+    def test_move_submission_files_to_blob_store(self):
+        files = {'spam.cpp': b'spam', 'eggs.cpp': b'eggs'}
+        submission = self._make_legacy_submission(files)
+        legacy_paths = [submission.get_file_path(filename) for filename in files]
+        self.assertTrue(all(os.path.isfile(path) for path in legacy_paths))
+        with named_submitted_file_paths(submission, ['spam.cpp']) as paths:
+            self.assertEqual(legacy_paths[:1], paths)
+
+        self.assertTrue(move_submission_files_to_blob_store(submission))
+
+        submission.refresh_from_db()
+        self.assertEqual(
+            {filename: hashlib.sha256(content).hexdigest()
+             for filename, content in files.items()},
+            submission.submitted_file_hashes)
+        for filename, content in files.items():
+            self.assertEqual(content, submission.get_file(filename).read())
+
+        # The original files are kept for readers that started before
+        # the move until they're deleted separately.
+        self.assertTrue(all(os.path.isfile(path) for path in legacy_paths))
+        self.assertFalse(move_submission_files_to_blob_store(submission))
+
+        self.assertEqual(2, delete_legacy_submission_files(submission))
+        self.assertFalse(any(os.path.exists(path) for path in legacy_paths))
+        for filename, content in files.items():
+            self.assertEqual(content, submission.get_file(filename).read())
+        self.assertEqual(0, delete_legacy_submission_files(submission))
+
+    def test_delete_legacy_files_of_submission_not_moved(self):
+        submission = self._make_legacy_submission({'spam.cpp': b'spam'})
+        self.assertEqual(0, delete_legacy_submission_files(submission))
+        self.assertEqual(b'spam', submission.get_file('spam.cpp').read())
+
+    def test_move_submission_files_command(self):
+        legacy_submission = self._make_legacy_submission({'spam.cpp': b'spam'})
+        legacy_path = legacy_submission.get_file_path('spam.cpp')
+        submission = self._make_submission({'eggs.cpp': b'eggs'})
+        hashes = submission.submitted_file_hashes
+
+        call_command('move_submission_files_to_blob_store', stdout=io.StringIO())
+        self.assertTrue(os.path.isfile(legacy_path))
+
+        legacy_submission.refresh_from_db()
+        self.assertEqual({'spam.cpp': hashlib.sha256(b'spam').hexdigest()},
+                         legacy_submission.submitted_file_hashes)
+        self.assertEqual(b'spam', legacy_submission.get_file('spam.cpp').read())
+
+        submission.refresh_from_db()
+        self.assertEqual(hashes, submission.submitted_file_hashes)
+
+        call_command('move_submission_files_to_blob_store', delete_legacy_files=True,
+                     stdout=io.StringIO())
+        self.assertFalse(os.path.exists(legacy_path))
+        self.assertEqual(b'spam', legacy_submission.get_file('spam.cpp').read())
+
+    def test_delete_orphaned_blobs_command(self):
+        submission = self._make_submission({'spam.cpp': b'spam'})
+        deleted_submission = self._make_submission({'eggs.cpp': b'eggs'})
+        orphaned_path = deleted_submission.get_file_path('eggs.cpp')
+        deleted_submission.delete()
+
+        call_command('delete_orphaned_submission_blobs', min_age=0,
+                     stdout=io.StringIO())
+
+        self.assertEqual(b'spam', submission.get_file('spam.cpp').read())
+        self.assertFalse(os.path.exists(orphaned_path))
+
+    def _make_submission(self, files) -> ag_models.Submission:
+        return ag_models.Submission.objects.validate_and_create(
+            [SimpleUploadedFile(filename, content) for filename, content in files.items()],
+            group=self.group)
+
+    def _make_legacy_submission(self, files) -> ag_models.Submission:
+        """
+        Makes a submission whose files are stored in its submission
+        directory, like submissions made before the blob store was added.
+        """
+        submission = self._make_submission({})
+        submission.submitted_filenames = list(files)
+        submission.save()
+        for filename, content in files.items():
+            with open(os.path.join(core_ut.get_submission_dir(submission), filename), 'wb') as f:
+                f.write(content)
+
+        return submission
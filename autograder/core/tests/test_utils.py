@@ -1,5 +1,6 @@
 import os
 import tempfile
+from unittest import mock
 
 from django.test import SimpleTestCase
 from django.conf import settings
@@ -162,6 +163,79 @@ cheese\r
                                   ignore_blank_lines=True)
         self.assertTrue(result.diff_pass)
 
+    def test_file_contents_passed_as_bytes(self):
+        self._write_and_seek(self.file2, 'spam\negg\n')
+        diff = core_ut.get_diff(b'spam\nsausage\n', self.file2.name)
+        self.assertFalse(diff.diff_pass)
+        self.assertEqual(['  spam\n', '- sausage\n', '+ egg\n'], diff.diff_content)
+
+        diff = core_ut.get_diff(b'spam\negg\n', self.file2.name)
+        self.assertTrue(diff.diff_pass)
+        self.assertEqual(['  spam\n', '  egg\n'], diff.diff_content)
+
+    def test_equivalent_files_diff_content_uses_first_file(self):
+        self._write_and_seek(self.file1, 'SPAM\negg')
+        self._write_and_seek(self.file2, 'spam\nEGG')
+        diff = core_ut.get_diff(self.file1.name, self.file2.name, ignore_case=True)
+        self.assertTrue(diff.diff_pass)
+        self.assertEqual(['  SPAM\n', '  egg'], diff.diff_content)
+
+    def test_large_files_memory_mapped(self):
+        content = b''.join(b'line %d\n' % i for i in range(1000))
+        self._write_and_seek(self.file1, content)
+        self._write_and_seek(self.file2, content.replace(b'line 500\n', b'line 500 \n'))
+
+        with mock.patch('autograder.core.diff.MMAP_THRESHOLD', 100), \
+                mock.patch('autograder.core.utils.get_gnu_diff',
+                           wraps=core_ut.get_gnu_diff) as mock_gnu_diff:
+            self.assertFalse(core_ut.get_diff_pass(self.file1.name, self.file2.name))
+            self.assertTrue(core_ut.get_diff_pass(
+                self.file1.name, self.file2.name, ignore_whitespace_changes=True))
+            mock_gnu_diff.assert_not_called()
+
+            diff = core_ut.get_diff(self.file1.name, self.file2.name)
+            # Unequal memory-mapped files are diffed without loading them.
+            mock_gnu_diff.assert_called_once()
+
+        self.assertFalse(diff.diff_pass)
+        self.assertIn('- line 500\n', diff.diff_content)
+        self.assertIn('+ line 500 \n', diff.diff_content)
+        self.assertEqual(1001, len(diff.diff_content))
+
+    def test_expensive_diff_uses_gnu_diff(self):
+        self._write_and_seek(self.file1, 'spam\negg\nsausage\n')
+        self._write_and_seek(self.file2, 'egg\nspam\nsausage\n')
+
+        with mock.patch('autograder.core.utils.MAX_IN_PROCESS_DIFF_COST', 0), \
+                mock.patch('autograder.core.utils.get_gnu_diff',
+                           wraps=core_ut.get_gnu_diff) as mock_gnu_diff:
+            diff = core_ut.get_diff(self.file1.name, self.file2.name)
+
+        mock_gnu_diff.assert_called_once()
+        self.assertFalse(diff.diff_pass)
+        self.assertEqual(
+            core_ut.get_gnu_diff(self.file1.name, self.file2.name).diff_content,
+            diff.diff_content)
+
+    def test_diff_pass(self):
+        self._write_and_seek(self.file1, 'spam\n\negg\n')
+        self._write_and_seek(self.file2, 'spam\negg\n\n')
+        self.assertFalse(core_ut.get_diff_pass(self.file1.name, self.file2.name))
+        self.assertTrue(
+            core_ut.get_diff_pass(self.file1.name, self.file2.name, ignore_blank_lines=True))
+        self.assertTrue(core_ut.get_diff_pass(self.file1.name, self.file1.name))
+
+    def test_diff_pass_ignore_blank_lines_depends_on_alignment(self):
+        # GNU diff matches up the blank lines here and then finds a
+        # non-blank change.
+        self._write_and_seek(self.file1, 'spam\n\negg\n')
+        self._write_and_seek(self.file2, '\nspam\negg\n')
+        self.assertFalse(
+            core_ut.get_diff_pass(self.file1.name, self.file2.name, ignore_blank_lines=True))
+        self.assertFalse(
+            core_ut.get_gnu_diff(self.file1.name, self.file2.name,
+                                 ignore_blank_lines=True).diff_pass)
+
 
 class CheckFilenameTest(SimpleTestCase):
     def test_valid_filename(self):
@@ -284,6 +358,32 @@ class FileSystemUtilTestCase(UnitTestBase):
         actual_absolute = core_ut.get_submission_dir(submission)
         self.assertEqual(expected_absolute, actual_absolute)
 
+    def test_submission_paths_computed_without_loading_related_objects(self):
+        submission = ag_models.Submission.objects.validate_and_create(
+            group=self.group, submitted_files=[])
+        expected_submission_dir = core_ut.get_submission_dir(submission)
+        expected_result_output_dir = core_ut.get_result_output_dir(submission)
+        expected_group_dir = core_ut.get_student_group_dir(self.group)
+
+        submission = ag_models.Submission.objects.get(pk=submission.pk)
+        group = ag_models.Group.objects.get(pk=self.group.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(expected_submission_dir, core_ut.get_submission_dir(submission))
+            self.assertEqual(expected_result_output_dir,
+                             core_ut.get_result_output_dir(submission))
+            self.assertEqual(expected_group_dir, core_ut.get_student_group_dir(group))
+
+            pks = {
+                'course_pk': self.course.pk,
+                'project_pk': self.project.pk,
+                'group_pk': self.group.pk,
+                'submission_pk': submission.pk,
+            }
+            self.assertEqual(core_ut.get_submission_relative_dir(submission),
+                             core_ut.get_submission_relative_dir_from_pks(**pks))
+            self.assertEqual(expected_result_output_dir,
+                             core_ut.get_result_output_dir_from_pks(**pks))
+
     def test_get_result_output_dir(self):
         submission = ag_models.Submission.objects.validate_and_create(
             group=self.group, submitted_files=[])
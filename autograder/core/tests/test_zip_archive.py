@@ -0,0 +1,181 @@
+import io
+import os
+import random
+import tempfile
+import zipfile
+from typing import Dict
+
+from django.test import SimpleTestCase, tag
+
+from autograder import utils
+from autograder.core.zip_archive import ArchiveMember, ZipArchiveWriter
+from autograder.utils.testing.misc import Timer
+
+
+class ZipArchiveWriterTestCase(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self._tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tempdir.cleanup)
+        self.files = {
+            'main.cpp': b'int main() { return 0; }\n' * 100,
+            'empty.txt': b'',
+            'random.bin': random.Random(42).getrandbits(8 * 5000).to_bytes(5000, 'little'),
+            'already_compressed.zip': b'spam' * 1000,
+        }  # type: Dict[str, bytes]
+        for filename, content in self.files.items():
+            with open(self._path(filename), 'wb') as f:
+                f.write(content)
+
+    def test_members_written_in_order(self):
+        members = [
+            ArchiveMember(self._path(filename), os.path.join('dir', filename))
+            for filename in self.files
+        ]
+        archive = self._make_archive(members)
+
+        with zipfile.ZipFile(archive) as z:
+            self.assertIsNone(z.testzip())
+            self.assertEqual([member.arcname for member in members], z.namelist())
+            for filename, content in self.files.items():
+                self.assertEqual(content, z.read(os.path.join('dir', filename)))
+
+    def test_compressible_members_deflated(self):
+        archive = self._make_archive(self._members())
+
+        with zipfile.ZipFile(archive) as z:
+            self.assertEqual(zipfile.ZIP_DEFLATED, z.getinfo('main.cpp').compress_type)
+            self.assertLess(z.getinfo('main.cpp').compress_size, len(self.files['main.cpp']))
+
+            # Deflating random data would make it bigger.
+            self.assertEqual(zipfile.ZIP_STORED, z.getinfo('random.bin').compress_type)
+            # Files with known compressed extensions aren't deflated.
+            self.assertEqual(zipfile.ZIP_STORED,
+                             z.getinfo('already_compressed.zip').compress_type)
+
+    def test_store_all(self):
+        archive = self._make_archive(self._members(), store_all=True)
+
+        with zipfile.ZipFile(archive) as z:
+            self.assertIsNone(z.testzip())
+            for info in z.infolist():
+                self.assertEqual(zipfile.ZIP_STORED, info.compress_type)
+                self.assertEqual(self.files[info.filename], z.read(info))
+
+    def test_non_ascii_member_name(self):
+        archive = self._make_archive([ArchiveMember(self._path('main.cpp'), 'späm/égg.cpp')])
+
+        with zipfile.ZipFile(archive) as z:
+            self.assertEqual(['späm/égg.cpp'], z.namelist())
+            self.assertEqual(self.files['main.cpp'], z.read('späm/égg.cpp'))
+
+    def test_file_mode_and_mtime_preserved(self):
+        os.chmod(self._path('main.cpp'), 0o755)
+        os.utime(self._path('main.cpp'), (0, 1500000000))
+        archive = self._make_archive([ArchiveMember(self._path('main.cpp'), 'main.cpp')])
+
+        with zipfile.ZipFile(archive) as z:
+            info = z.getinfo('main.cpp')
+            self.assertEqual(0o755, (info.external_attr >> 16) & 0o777)
+            expected = zipfile.ZipInfo.from_file(self._path('main.cpp')).date_time
+            self.assertEqual(expected, info.date_time)
+
+    def test_empty_archive(self):
+        archive = self._make_archive([])
+        with zipfile.ZipFile(archive) as z:
+            self.assertEqual([], z.namelist())
+
+    def test_write_members_multiple_times(self):
+        archive = io.BytesIO()
+        with ZipArchiveWriter(archive) as writer:
+            writer.write_members(self._members()[:2])
+            writer.write_members(self._members()[2:])
+
+        with zipfile.ZipFile(archive) as z:
+            self.assertIsNone(z.testzip())
+            self.assertCountEqual(self.files.keys(), z.namelist())
+
+    def test_write_after_close_error(self):
+        writer = ZipArchiveWriter(io.BytesIO())
+        writer.close()
+        with self.assertRaises(ValueError):
+            writer.write_members(self._members())
+
+    def test_source_file_error_propagated(self):
+        with self.assertRaises(FileNotFoundError):
+            self._make_archive([ArchiveMember(self._path('not_a_file'), 'not_a_file')])
+
+    @tag('slow')
+    def test_too_many_members_for_standard_zip(self):
+        num_members = 0xFFFF + 10
+        archive = self._make_archive(
+            ArchiveMember(self._path('empty.txt'), 'file{}.txt'.format(i))
+            for i in range(num_members))
+
+        with zipfile.ZipFile(archive) as z:
+            self.assertEqual(num_members, len(z.infolist()))
+            self.assertEqual(b'', z.read('file{}.txt'.format(num_members - 1)))
+
+    def _members(self):
+        return [ArchiveMember(self._path(filename), filename) for filename in self.files]
+
+    def _make_archive(self, members, **kwargs) -> io.BytesIO:
+        archive = io.BytesIO()
+        with ZipArchiveWriter(archive, **kwargs) as writer:
+            writer.write_members(members)
+
+        archive.seek(0)
+        return archive
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self._tempdir.name, filename)
+
+
+@tag('slow')
+class ZipArchiveWriterBenchmarkTestCase(SimpleTestCase):
+    """
+    Compares the time it takes ZipArchiveWriter and zipfile.ZipFile
+    to archive a typical set of submitted files.
+    """
+
+    def test_benchmark(self):
+        rng = random.Random(42)
+        words = [b'int', b'return', b'for', b'while', b'std::vector', b'x', b'i', b'++', b';',
+                 b'{', b'}', b'(', b')', b'\n', b'    ']
+        with tempfile.TemporaryDirectory() as source_dir:
+            filenames = ['file{}.cpp'.format(i) for i in range(300)]
+            for filename in filenames:
+                with open(os.path.join(source_dir, filename), 'wb') as f:
+                    f.write(b' '.join(rng.choice(words) for i in range(50000)))
+            total_size = sum(os.path.getsize(os.path.join(source_dir, filename))
+                             for filename in filenames)
+
+            with tempfile.TemporaryFile() as zipfile_archive:
+                zipfile_timer = Timer('zipfile.ZipFile')
+                with zipfile_timer:
+                    with zipfile.ZipFile(zipfile_archive, 'w', zipfile.ZIP_DEFLATED) as z:
+                        with utils.ChangeDirectory(source_dir):
+                            for filename in filenames:
+                                z.write(filename, arcname=os.path.join('dir', filename))
+                zipfile_archive_size = zipfile_archive.tell()
+
+            for num_threads in (1, 4):
+                with tempfile.TemporaryFile() as archive:
+                    timer = Timer('ZipArchiveWriter, {} threads'.format(num_threads))
+                    with timer:
+                        with ZipArchiveWriter(archive, num_threads=num_threads) as writer:
+                            writer.write_members(
+                                ArchiveMember(os.path.join(source_dir, filename),
+                                              os.path.join('dir', filename))
+                                for filename in filenames)
+                    archive_size = archive.tell()
+
+                    archive.seek(0)
+                    with zipfile.ZipFile(archive) as z:
+                        self.assertIsNone(z.testzip())
+
+                print('zipfile.ZipFile: {:.1f} MB/s, ZipArchiveWriter ({} threads): {:.1f} MB/s'
+                      .format(total_size / zipfile_timer.elapsed / 1e6, num_threads,
+                              total_size / timer.elapsed / 1e6))
+                print('zipfile.ZipFile size: {}, ZipArchiveWriter size: {}'.format(
+                    zipfile_archive_size, archive_size))
@@ -1,8 +1,12 @@
+import contextlib
 import datetime
 import enum
+import functools
+import mmap
 import os
 import re
 import subprocess
+import tempfile
 from typing import List
 
 from django.conf import settings
@@ -10,6 +14,8 @@ from django.core import exceptions
 from django.utils import timezone
 
 from . import constants as const
+from .diff import (DiffSource, DiffTooExpensive, diff_bytes, iter_lines, lines_equivalent,
+                   open_diff_source)
 
 
 class DiffResult:
@@ -18,44 +24,156 @@ class DiffResult:
         self.diff_content = diff_content
 
 
+def get_diff_size(diff: DiffResult) -> int:
+    """
+    Returns the total length of the lines in diff.diff_content.
+    """
+    return sum((len(line) for line in diff.diff_content))
+
+
 _DIFF_LINE_REGEX = re.compile(r'^(?:  |\+ |- ).*\n+'.encode(), flags=re.MULTILINE)
 
+# When computing a diff in-process would take longer than this many
+# steps (roughly 35ms), we hand the files to GNU diff instead.
+MAX_IN_PROCESS_DIFF_COST = 100000
 
-def get_diff(first_filename: str, second_filename: str,
+
+def get_diff(first: DiffSource, second: DiffSource,
              ignore_case=False,
              ignore_whitespace=False,
              ignore_whitespace_changes=False,
              ignore_blank_lines=False) -> DiffResult:
     """
-    Diffs first and second using the GNU diff command line utility.
+    Diffs first and second, which can each be either a filename or
+    the contents of a file as bytes.
     Returns an empty list if first and second are considered equivalent.
     Otherwise, returns a list of strings, each of which are prefixed
     with one of the two-letter opcodes used by
     https://docs.python.org/3.5/library/difflib.html#difflib.Differ
-    """
-    # We're adding newlines at the beginning of each formatted line
-    # because GNU diff will otherwise handle missing trailing
-    # newlines in a way that the client can't reliably parse.
-    diff_cmd = ['diff',
-                '--text',  # Consider all files to be text
-                '--new-line-format', '+ %L\n',
-                '--old-line-format', '- %L\n',
-                '--unchanged-line-format', '  %L\n']
-    if ignore_case:
-        diff_cmd.append('--ignore-case')
-    if ignore_whitespace:
-        diff_cmd.append('--ignore-all-space')
-    if ignore_whitespace_changes:
-        diff_cmd.append('--ignore-space-change')
+
+    The result is identical to that of get_gnu_diff, but the diff is
+    computed in-process (see autograder.core.diff) unless doing so
+    would be unusually expensive.
+
+    Files large enough to be memory-mapped (see
+    autograder.core.diff.MMAP_THRESHOLD) are only compared in-process
+    to check whether they're equivalent. Diffing them line by line
+    would require loading them into memory, so when they differ, they
+    are diffed with get_gnu_diff instead.
+    """
+    diff_kwargs = {
+        'ignore_case': ignore_case,
+        'ignore_whitespace': ignore_whitespace,
+        'ignore_whitespace_changes': ignore_whitespace_changes,
+    }
+    with open_diff_source(first) as first_buf, open_diff_source(second) as second_buf:
+        if lines_equivalent(first_buf, second_buf, **diff_kwargs):
+            return DiffResult(True, _get_unchanged_diff_content(first_buf))
+
+        if isinstance(first_buf, mmap.mmap) or isinstance(second_buf, mmap.mmap):
+            return get_gnu_diff(first, second,
+                                ignore_blank_lines=ignore_blank_lines, **diff_kwargs)
+
+        try:
+            diff_pass, output = diff_bytes(
+                first_buf, second_buf,
+                ignore_blank_lines=ignore_blank_lines,
+                max_cost=MAX_IN_PROCESS_DIFF_COST,
+                **diff_kwargs)
+        except DiffTooExpensive:
+            return get_gnu_diff(first, second,
+                                ignore_blank_lines=ignore_blank_lines, **diff_kwargs)
+
+    return DiffResult(diff_pass, _parse_diff_output(output))
+
+
+def get_diff_pass(first: DiffSource, second: DiffSource,
+                  ignore_case=False,
+                  ignore_whitespace=False,
+                  ignore_whitespace_changes=False,
+                  ignore_blank_lines=False) -> bool:
+    """
+    Returns get_diff(first, second, ...).diff_pass. When the files are
+    equivalent, this only scans them rather than computing the diff.
+    """
+    with open_diff_source(first) as first_buf, open_diff_source(second) as second_buf:
+        if lines_equivalent(first_buf, second_buf,
+                            ignore_case=ignore_case,
+                            ignore_whitespace=ignore_whitespace,
+                            ignore_whitespace_changes=ignore_whitespace_changes):
+            return True
+
+    # Whether the differences are all blank lines depends on how
+    # the lines are matched up.
     if ignore_blank_lines:
-        diff_cmd.append('--ignore-blank-lines')
+        return get_diff(first, second,
+                        ignore_case=ignore_case,
+                        ignore_whitespace=ignore_whitespace,
+                        ignore_whitespace_changes=ignore_whitespace_changes,
+                        ignore_blank_lines=ignore_blank_lines).diff_pass
+
+    return False
+
+
+def get_gnu_diff(first: DiffSource, second: DiffSource,
+                 ignore_case=False,
+                 ignore_whitespace=False,
+                 ignore_whitespace_changes=False,
+                 ignore_blank_lines=False) -> DiffResult:
+    """
+    Like get_diff, but diffs first and second using the GNU diff
+    command line utility.
+    """
+    with contextlib.ExitStack() as stack:
+        first_filename = _get_diff_source_filename(first, stack)
+        second_filename = _get_diff_source_filename(second, stack)
+
+        # We're adding newlines at the beginning of each formatted line
+        # because GNU diff will otherwise handle missing trailing
+        # newlines in a way that the client can't reliably parse.
+        diff_cmd = ['diff',
+                    '--text',  # Consider all files to be text
+                    '--new-line-format', '+ %L\n',
+                    '--old-line-format', '- %L\n',
+                    '--unchanged-line-format', '  %L\n']
+        if ignore_case:
+            diff_cmd.append('--ignore-case')
+        if ignore_whitespace:
+            diff_cmd.append('--ignore-all-space')
+        if ignore_whitespace_changes:
+            diff_cmd.append('--ignore-space-change')
+        if ignore_blank_lines:
+            diff_cmd.append('--ignore-blank-lines')
+
+        diff_cmd += [first_filename, second_filename]
 
-    diff_cmd += [first_filename, second_filename]
+        diff_result = subprocess.run(diff_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
 
-    diff_result = subprocess.run(diff_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    diff_list = [match.group()[:-1].decode('utf-8', 'surrogateescape')
-                 for match in _DIFF_LINE_REGEX.finditer(diff_result.stdout)]
-    return DiffResult(diff_result.returncode == 0, diff_list)
+    return DiffResult(diff_result.returncode == 0, _parse_diff_output(diff_result.stdout))
+
+
+def _parse_diff_output(output: bytes) -> List[str]:
+    return [match.group()[:-1].decode('utf-8', 'surrogateescape')
+            for match in _DIFF_LINE_REGEX.finditer(output)]
+
+
+def _get_unchanged_diff_content(buf) -> List[str]:
+    # Equivalent to _parse_diff_output() on GNU diff's output when
+    # there are no differences.
+    return [
+        '  ' + (line + b'\n' if has_newline else line).decode('utf-8', 'surrogateescape')
+        for line, has_newline in iter_lines(buf)
+    ]
+
+
+def _get_diff_source_filename(source: DiffSource, stack: contextlib.ExitStack) -> str:
+    if isinstance(source, str):
+        return source
+
+    tmp_file = stack.enter_context(tempfile.NamedTemporaryFile())
+    tmp_file.write(source)
+    tmp_file.flush()
+    return tmp_file.name
 
 
 def get_24_hour_period(start_time, contains_datetime: datetime.datetime,
@@ -118,7 +236,7 @@ def get_course_relative_root_dir(course):
     Same as get_course_root_dir() but returns a path that is
     relative to MEDIA_ROOT.
     """
-    return os.path.join('courses', 'course{}'.format(course.pk))
+    return _course_relative_root_dir(course.pk)
 
 
 def get_project_root_dir(project):
@@ -134,9 +252,7 @@ def get_project_relative_root_dir(project):
     Same as get_project_root_dir() but returns a path that is
     relative to MEDIA_ROOT.
     """
-    return os.path.join(
-        get_course_relative_root_dir(project.course),
-        'project{}'.format(project.pk))
+    return _project_relative_root_dir(project.course_id, project.pk)
 
 
 def get_project_files_dir(project):
@@ -172,9 +288,7 @@ def get_project_groups_relative_dir(project):
     Same as get_project_groups_dir() but returns a path
     that is relative to MEDIA_ROOT.
     """
-    return os.path.join(
-        get_project_relative_root_dir(project),
-        const.PROJECT_SUBMISSIONS_DIRNAME)
+    return _project_groups_relative_dir(project.course_id, project.pk)
 
 
 def get_student_group_dir(group):
@@ -192,9 +306,7 @@ def get_student_group_relative_dir(group):
     Same as get_student_group_dir() but returns a path that is
     relative to MEDIA_ROOT.
     """
-    return os.path.join(
-        get_project_groups_relative_dir(group.project),
-        'group{}'.format(group.pk))
+    return _student_group_relative_dir(_get_course_pk(group), group.project_id, group.pk)
 
 
 def get_submission_dir(submission):
@@ -212,19 +324,89 @@ def get_submission_relative_dir(submission):
     Same as get_submission_dir() but returns a path that is relative to
     MEDIA_ROOT.
     """
+    return get_submission_relative_dir_from_pks(
+        course_pk=_get_course_pk(submission),
+        project_pk=submission.project_id,
+        group_pk=submission.group_id,
+        submission_pk=submission.pk)
+
+
+def get_submission_relative_dir_from_pks(*, course_pk: int, project_pk: int,
+                                         group_pk: int, submission_pk: int) -> str:
+    """
+    Same as get_submission_relative_dir(), but computes the path
+    from the primary keys of the submission and the objects it
+    belongs to.
+    """
     return os.path.join(
-        get_student_group_relative_dir(submission.group),
-        get_submission_dir_basename(submission))
+        _student_group_relative_dir(course_pk, project_pk, group_pk),
+        _submission_dir_basename(submission_pk))
 
 
 def get_submission_dir_basename(submission):
-    return 'submission{}'.format(submission.pk)
+    return _submission_dir_basename(submission.pk)
 
 
 def get_result_output_dir(submission):
     return os.path.join(get_submission_dir(submission), 'output')
 
 
+def get_result_output_dir_from_pks(*, course_pk: int, project_pk: int,
+                                   group_pk: int, submission_pk: int) -> str:
+    """
+    Same as get_result_output_dir(), but computes the path from the
+    primary keys of the submission and the objects it belongs to.
+    """
+    return os.path.join(
+        settings.MEDIA_ROOT,
+        get_submission_relative_dir_from_pks(
+            course_pk=course_pk, project_pk=project_pk,
+            group_pk=group_pk, submission_pk=submission_pk),
+        'output')
+
+
+@functools.lru_cache(maxsize=4096)
+def get_project_course_pk(project_pk: int) -> int:
+    """
+    Returns the primary key of the Course that the project with the
+    given primary key belongs to. Since a project can't be moved to
+    another course, the result is cached for the life of the process.
+    """
+    from django.apps import apps
+    return apps.get_model('core', 'Project').objects.values_list(
+        'course_id', flat=True).get(pk=project_pk)
+
+
+def _get_course_pk(group_or_submission) -> int:
+    # Avoid a query if the project has already been loaded.
+    if type(group_or_submission).project.is_cached(group_or_submission):
+        return group_or_submission.project.course_id
+
+    return get_project_course_pk(group_or_submission.project_id)
+
+
+def _course_relative_root_dir(course_pk: int) -> str:
+    return os.path.join('courses', 'course{}'.format(course_pk))
+
+
+def _project_relative_root_dir(course_pk: int, project_pk: int) -> str:
+    return os.path.join(_course_relative_root_dir(course_pk), 'project{}'.format(project_pk))
+
+
+def _project_groups_relative_dir(course_pk: int, project_pk: int) -> str:
+    return os.path.join(
+        _project_relative_root_dir(course_pk, project_pk), const.PROJECT_SUBMISSIONS_DIRNAME)
+
+
+def _student_group_relative_dir(course_pk: int, project_pk: int, group_pk: int) -> str:
+    return os.path.join(
+        _project_groups_relative_dir(course_pk, project_pk), 'group{}'.format(group_pk))
+
+
+def _submission_dir_basename(submission_pk: int) -> str:
+    return 'submission{}'.format(submission_pk)
+
+
 def misc_cmd_output_dir():
     return os.path.join(settings.MEDIA_ROOT, 'misc_cmd_output')
 
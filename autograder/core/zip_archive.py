@@ -0,0 +1,265 @@
+"""
+A ZIP archive writer that compresses the archive's members in parallel.
+
+zipfile.ZipFile compresses each member on the calling thread as the
+member is written. ZipArchiveWriter instead reads and compresses
+upcoming members on a pool of worker threads (zlib releases the GIL
+while compressing and computing checksums) and writes each member's
+headers using the CRC and sizes computed by the workers. Members are
+written in the order they're given, and the archive is written
+sequentially, so the destination doesn't need to be seekable.
+
+ZIP64 extensions are used for members, offsets, and member counts
+that are too large for the standard ZIP format.
+"""
+
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Collection, Deque, Iterable, List, NamedTuple, Tuple
+
+
+class ArchiveMember(NamedTuple):
+    # The absolute path of the file to add to the archive.
+    source_path: str
+    # The name of the file inside the archive.
+    arcname: str
+
+
+# Files with these extensions are already compressed, so deflating
+# them again costs time without saving space. They are stored as-is.
+COMPRESSED_FILE_EXTENSIONS = frozenset({
+    '.7z', '.bz2', '.docx', '.gif', '.gz', '.jar', '.jpeg', '.jpg', '.mp3', '.mp4',
+    '.pdf', '.png', '.pptx', '.tar.gz', '.tgz', '.whl', '.xlsx', '.xz', '.zip',
+})
+
+
+class ZipArchiveWriter:
+    """
+    Writes a ZIP archive to a binary file object. Use as a context
+    manager, or call close() to write the archive's central directory.
+    """
+
+    def __init__(self, dest: BinaryIO, *,
+                 num_threads: int=4,
+                 store_all: bool=False,
+                 store_extensions: Collection[str]=COMPRESSED_FILE_EXTENSIONS,
+                 compresslevel: int=6):
+        """
+        :param dest: The file object to write the archive to.
+        :param num_threads: The number of threads used to read and
+            compress members.
+        :param store_all: When True, no members are compressed.
+        :param store_extensions: Members whose names end with one of
+            these extensions are stored without compression.
+        :param compresslevel: The zlib compression level used for
+            compressed members.
+        """
+        self._dest = dest
+        self._num_threads = num_threads
+        self._store_all = store_all
+        self._store_extensions = tuple(ext.lower() for ext in store_extensions)
+        self._compresslevel = compresslevel
+
+        self._offset = 0
+        self._central_directory = []  # type: List[bytes]
+        self._closed = False
+
+    def __enter__(self) -> 'ZipArchiveWriter':
+        return self
+
+    def __exit__(self, exc_type, *args) -> None:
+        if exc_type is None:
+            self.close()
+
+    def write_members(self, members: Iterable[ArchiveMember]) -> None:
+        """
+        Adds the given files to the archive, in order. members is
+        consumed lazily, so at most a few members per thread are held
+        in memory at once.
+        """
+        max_pending = self._num_threads * 2
+        pending = deque()  # type: Deque[Future]
+        with ThreadPoolExecutor(max_workers=self._num_threads) as executor:
+            for member in members:
+                pending.append(executor.submit(self._prepare_member, member))
+                if len(pending) >= max_pending:
+                    self._write_member(pending.popleft().result())
+
+            while pending:
+                self._write_member(pending.popleft().result())
+
+    def close(self) -> None:
+        """
+        Writes the archive's central directory. No members can be
+        added afterwards.
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+        central_directory_offset = self._offset
+        for record in self._central_directory:
+            self._write(record)
+        central_directory_size = self._offset - central_directory_offset
+
+        num_members = len(self._central_directory)
+        if (num_members >= _ZIP64_MAX_MEMBERS
+                or central_directory_offset >= _ZIP64_LIMIT
+                or central_directory_size >= _ZIP64_LIMIT):
+            zip64_end_record_offset = self._offset
+            self._write(struct.pack(
+                _ZIP64_END_RECORD_FMT, _ZIP64_END_RECORD_SIGNATURE,
+                struct.calcsize(_ZIP64_END_RECORD_FMT) - 12,
+                _ZIP64_VERSION, _ZIP64_VERSION, 0, 0,
+                num_members, num_members, central_directory_size, central_directory_offset))
+            self._write(struct.pack(
+                _ZIP64_END_LOCATOR_FMT, _ZIP64_END_LOCATOR_SIGNATURE,
+                0, zip64_end_record_offset, 1))
+
+        self._write(struct.pack(
+            _END_RECORD_FMT, _END_RECORD_SIGNATURE, 0, 0,
+            min(num_members, _ZIP64_MAX_MEMBERS), min(num_members, _ZIP64_MAX_MEMBERS),
+            min(central_directory_size, _ZIP64_LIMIT),
+            min(central_directory_offset, _ZIP64_LIMIT),
+            0))
+
+    def _prepare_member(self, member: ArchiveMember) -> '_PreparedMember':
+        with open(member.source_path, 'rb') as f:
+            data = f.read()
+        stat = os.stat(member.source_path)
+
+        crc = zlib.crc32(data)
+        compress_type = _STORED
+        payload = data
+        if not self._store_all and not member.arcname.lower().endswith(self._store_extensions):
+            compressor = zlib.compressobj(self._compresslevel, zlib.DEFLATED, -15)
+            deflated = compressor.compress(data) + compressor.flush()
+            # Some files that don't have a known extension still
+            # don't compress well.
+            if len(deflated) < len(data):
+                compress_type = _DEFLATED
+                payload = deflated
+
+        return _PreparedMember(
+            arcname=member.arcname,
+            compress_type=compress_type,
+            crc=crc,
+            file_size=len(data),
+            payload=payload,
+            mtime=stat.st_mtime,
+            mode=stat.st_mode)
+
+    def _write_member(self, member: '_PreparedMember') -> None:
+        if self._closed:
+            raise ValueError('Cannot add members to a closed archive')
+
+        filename = member.arcname.encode('utf-8')
+        flags = 0 if member.arcname.isascii() else _UTF8_FLAG
+        dos_time, dos_date = _dos_timestamp(member.mtime)
+        compress_size = len(member.payload)
+        header_offset = self._offset
+
+        needs_zip64_sizes = (member.file_size >= _ZIP64_LIMIT or compress_size >= _ZIP64_LIMIT)
+        extract_version = _ZIP64_VERSION if needs_zip64_sizes else (
+            _DEFLATED_VERSION if member.compress_type == _DEFLATED else _STORED_VERSION)
+
+        local_extra = b''
+        if needs_zip64_sizes:
+            local_extra = struct.pack(
+                '<HHQQ', _ZIP64_EXTRA_ID, 16, member.file_size, compress_size)
+
+        self._write(struct.pack(
+            _LOCAL_HEADER_FMT, _LOCAL_HEADER_SIGNATURE,
+            extract_version, flags, member.compress_type, dos_time, dos_date, member.crc,
+            _ZIP64_LIMIT if needs_zip64_sizes else compress_size,
+            _ZIP64_LIMIT if needs_zip64_sizes else member.file_size,
+            len(filename), len(local_extra)))
+        self._write(filename)
+        self._write(local_extra)
+        self._write(member.payload)
+
+        # In the central directory, only the fields that overflow are
+        # moved into the ZIP64 extra field.
+        zip64_fields = []  # type: List[int]
+        if member.file_size >= _ZIP64_LIMIT:
+            zip64_fields.append(member.file_size)
+        if compress_size >= _ZIP64_LIMIT:
+            zip64_fields.append(compress_size)
+        if header_offset >= _ZIP64_LIMIT:
+            zip64_fields.append(header_offset)
+
+        central_extra = b''
+        if zip64_fields:
+            extract_version = _ZIP64_VERSION
+            central_extra = struct.pack(
+                '<HH' + 'Q' * len(zip64_fields),
+                _ZIP64_EXTRA_ID, 8 * len(zip64_fields), *zip64_fields)
+
+        self._central_directory.append(struct.pack(
+            _CENTRAL_DIRECTORY_FMT, _CENTRAL_DIRECTORY_SIGNATURE,
+            _ZIP64_VERSION, _UNIX_SYSTEM, extract_version, flags, member.compress_type,
+            dos_time, dos_date, member.crc,
+            min(compress_size, _ZIP64_LIMIT),
+            min(member.file_size, _ZIP64_LIMIT),
+            len(filename), len(central_extra), 0, 0, 0,
+            (member.mode & 0xFFFF) << 16,
+            min(header_offset, _ZIP64_LIMIT)
+        ) + filename + central_extra)
+
+    def _write(self, data: bytes) -> None:
+        self._dest.write(data)
+        self._offset += len(data)
+
+
+class _PreparedMember(NamedTuple):
+    arcname: str
+    compress_type: int
+    crc: int
+    file_size: int
+    payload: bytes
+    mtime: float
+    mode: int
+
+
+def _dos_timestamp(mtime: float) -> Tuple[int, int]:
+    year, month, day, hour, minute, second = time.localtime(mtime)[:6]
+    # DOS timestamps can't represent dates before 1980.
+    if year < 1980:
+        year, month, day, hour, minute, second = 1980, 1, 1, 0, 0, 0
+    dos_time = (hour << 11) | (minute << 5) | (second // 2)
+    dos_date = ((year - 1980) << 9) | (month << 5) | day
+    return dos_time, dos_date
+
+
+_STORED = 0
+_DEFLATED = 8
+
+_STORED_VERSION = 10
+_DEFLATED_VERSION = 20
+_ZIP64_VERSION = 45
+
+_UNIX_SYSTEM = 3
+_UTF8_FLAG = 0x800
+
+_ZIP64_LIMIT = 0xFFFFFFFF
+_ZIP64_MAX_MEMBERS = 0xFFFF
+_ZIP64_EXTRA_ID = 0x0001
+
+_LOCAL_HEADER_SIGNATURE = 0x04034b50
+_LOCAL_HEADER_FMT = '<IHHHHHIIIHH'
+
+_CENTRAL_DIRECTORY_SIGNATURE = 0x02014b50
+_CENTRAL_DIRECTORY_FMT = '<IBBHHHHHIIIHHHHHII'
+
+_ZIP64_END_RECORD_SIGNATURE = 0x06064b50
+_ZIP64_END_RECORD_FMT = '<IQHHIIQQQQ'
+
+_ZIP64_END_LOCATOR_SIGNATURE = 0x07064b50
+_ZIP64_END_LOCATOR_FMT = '<IIQI'
+
+_END_RECORD_SIGNATURE = 0x06054b50
+_END_RECORD_FMT = '<IHHHHIIH'
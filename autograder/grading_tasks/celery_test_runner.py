@@ -21,6 +21,9 @@ def _set_eager():
     current_app.conf.CELERY_ALWAYS_EAGER = True
     settings.CELERY_EAGER_PROPAGATES_EXCEPTIONS = True  # Issue #75
     current_app.conf.CELERY_EAGER_PROPAGATES_EXCEPTIONS = True
+    # Otherwise, creating a submission would grade it synchronously
+    # inside the request.
+    settings.QUEUE_SUBMISSIONS_ON_CREATE = False
 
 
 class CeleryTestSuiteRunner(DiscoverRunner):
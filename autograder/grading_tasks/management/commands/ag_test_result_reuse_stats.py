@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+import autograder.core.models as ag_models
+from autograder.grading_tasks.tasks.ag_test_result_reuse import get_result_reuse_stats
+
+
+class Command(BaseCommand):
+    help = """Prints how often the results of deterministic AGTestSuites were
+              reused instead of the suites being run again."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--project', type=int, default=None,
+            help='Only print the stats for suites in the project with this ID.')
+
+    def handle(self, *args, **options):
+        suites = ag_models.AGTestSuite.objects.filter(
+            deterministic=True).select_related('project').order_by('project', '_order')
+        if options['project'] is not None:
+            suites = suites.filter(project=options['project'])
+
+        suites = list(suites)
+        stats = get_result_reuse_stats([suite.pk for suite in suites])
+        for suite in suites:
+            hits, misses = stats[suite.pk]
+            hit_rate = '-' if hits + misses == 0 else f'{hits / (hits + misses):.1%}'
+            self.stdout.write(
+                f'{suite.project.name} (project {suite.project.pk}) / {suite.name} '
+                f'(suite {suite.pk}): {hits} hits, {misses} misses, hit rate {hit_rate}')
@@ -11,4 +11,6 @@ from .grade_mutation_test_suite import (
     grade_mutation_test_suite_impl, grade_deferred_mutation_test_suite)
 from .utils import run_ag_test_command, run_ag_command, run_command_from_args
 
-from .queueing import queue_submissions, register_project_queues
+from .queueing import queue_submission_on_commit, queue_submissions, register_project_queues
+from .update_submission_scores import (queue_project_submission_scores_update,
+                                       update_project_submission_scores_task)
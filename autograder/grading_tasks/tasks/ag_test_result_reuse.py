@@ -0,0 +1,351 @@
+"""
+Reuses the results of deterministic AGTestSuites.
+
+When an AGTestSuite is marked as deterministic, the results of running
+it depend only on its inputs: the suite's configuration (including its
+test cases and commands), the sandbox image it runs in, the contents of
+the instructor and student files added to the sandbox, and the
+usernames passed to the sandbox as an environment variable. These
+inputs are hashed, and the hash is stored in
+AGTestSuiteResult.inputs_hash once the suite has been graded. A later
+grading of the same suite with the same hash (such as a resubmission of
+byte-identical files, or a rerun after an unrelated test was changed)
+copies those results instead of running the suite again.
+"""
+
+import fnmatch
+import hashlib
+import json
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+import autograder.core.models as ag_models
+import autograder.core.utils as core_ut
+from autograder.core.result_output import copy_output
+from autograder.utils.retry import retry_should_recover
+
+from .exceptions import SubmissionRejected
+from .utils import load_queryset_with_retry
+
+# Increment this when the inputs included in the hash change so that
+# results hashed the old way aren't reused.
+_INPUTS_HASH_VERSION = 1
+
+# The AGTestCommand fields that affect how a command is run or how its
+# output is checked. Point values and feedback settings are applied
+# when results are served, so they're excluded.
+_AG_TEST_COMMAND_INPUT_FIELDS = (
+    'cmd',
+    'stdin_source',
+    'stdin_text',
+    'expected_return_code',
+    'expected_stdout_source',
+    'expected_stdout_text',
+    'expected_stderr_source',
+    'expected_stderr_text',
+    'ignore_case',
+    'ignore_whitespace',
+    'ignore_whitespace_changes',
+    'ignore_blank_lines',
+    'time_limit',
+    'stack_size_limit',
+    'use_virtual_memory_limit',
+    'virtual_memory_limit',
+    'block_process_spawn',
+    'process_spawn_limit',
+)
+
+_AG_TEST_COMMAND_RESULT_FIELDS = (
+    'return_code',
+    'timed_out',
+    'stdout_truncated',
+    'stderr_truncated',
+    'return_code_correct',
+    'stdout_correct',
+    'stderr_correct',
+    'stdout_diff_size',
+    'stderr_diff_size',
+)
+
+
+@retry_should_recover
+def get_suite_inputs_hash(ag_test_suite: ag_models.AGTestSuite,
+                          submission: ag_models.Submission,
+                          group: ag_models.Group) -> str:
+    """
+    Returns a hash of everything that running ag_test_suite for
+    submission depends on.
+    """
+    instructor_files, student_files = get_sandbox_file_digests(ag_test_suite, submission)
+
+    ag_test_cases = []
+    for ag_test_case in ag_test_suite.ag_test_cases.all():
+        ag_test_cases.append({
+            'pk': ag_test_case.pk,
+            'commands': [
+                _get_ag_test_command_inputs(ag_test_cmd)
+                for ag_test_cmd in ag_test_case.ag_test_commands.select_related(
+                    'stdin_instructor_file',
+                    'expected_stdout_instructor_file',
+                    'expected_stderr_instructor_file',
+                )
+            ]
+        })
+
+    inputs = {
+        'version': _INPUTS_HASH_VERSION,
+        'ag_test_suite': ag_test_suite.pk,
+        'setup_suite_cmd': ag_test_suite.setup_suite_cmd,
+        'allow_network_access': ag_test_suite.allow_network_access,
+        'read_only_instructor_files': ag_test_suite.read_only_instructor_files,
+        'docker_image': ag_test_suite.sandbox_docker_image.tag,
+        'usernames': group.member_names,
+        'instructor_files': instructor_files,
+        'student_files': student_files,
+        'ag_test_cases': ag_test_cases,
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def get_sandbox_file_digests(
+    ag_test_suite: ag_models.AGTestSuite,
+    submission: ag_models.Submission
+) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """
+    Returns the names and SHA-256 digests of the instructor files and
+    the student files that add_files_to_sandbox() adds to the sandbox
+    for ag_test_suite and submission.
+    """
+    instructor_files = [
+        (instructor_file.name, _get_instructor_file_digest(instructor_file.abspath))
+        for instructor_file in ag_test_suite.instructor_files_needed.order_by('name')
+    ]
+
+    student_files = []
+    for student_file in ag_test_suite.student_files_needed.all():
+        for filename in fnmatch.filter(submission.submitted_filenames, student_file.pattern):
+            if submission.submitted_file_hashes:
+                digest = submission.submitted_file_hashes[filename]
+            else:
+                digest = _get_file_digest(submission.get_file_path(filename))
+            student_files.append((filename, digest))
+
+    return instructor_files, student_files
+
+
+def _get_ag_test_command_inputs(ag_test_cmd: ag_models.AGTestCommand) -> dict:
+    inputs = {
+        field_name: getattr(ag_test_cmd, field_name)
+        for field_name in _AG_TEST_COMMAND_INPUT_FIELDS
+    }  # type: Dict[str, object]
+    inputs['pk'] = ag_test_cmd.pk
+
+    for field_name in ['stdin_instructor_file',
+                       'expected_stdout_instructor_file',
+                       'expected_stderr_instructor_file']:
+        instructor_file = getattr(ag_test_cmd, field_name)
+        inputs[field_name] = (
+            None if instructor_file is None
+            else _get_instructor_file_digest(instructor_file.abspath))
+
+    return inputs
+
+
+def _get_instructor_file_digest(path: str) -> str:
+    # Instructor files are hashed for every submission, so their
+    # digests are cached until the files are modified.
+    stat = os.stat(path)
+    cache_key = 'instructor_file_sha256_{}'.format(
+        hashlib.sha256(f'{path}:{stat.st_mtime_ns}:{stat.st_size}'.encode()).hexdigest())
+    digest = cache.get(cache_key)
+    if digest is None:
+        digest = _get_file_digest(path)
+        cache.set(cache_key, digest, timeout=_INSTRUCTOR_FILE_DIGEST_CACHE_TIMEOUT)
+
+    return digest
+
+
+_INSTRUCTOR_FILE_DIGEST_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+
+def _get_file_digest(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+def reuse_suite_results(ag_test_suite: ag_models.AGTestSuite,
+                        suite_result: ag_models.AGTestSuiteResult,
+                        inputs_hash: str,
+                        *,
+                        on_suite_setup_finished,
+                        on_test_case_finished) -> bool:
+    """
+    If a result for ag_test_suite with the given inputs_hash exists,
+    copies its data and output into suite_result, calls the callbacks
+    the same way grade_ag_test_suite_impl does, and returns True.
+    Otherwise, returns False.
+    Raises SubmissionRejected if the reused setup command failed and
+    ag_test_suite rejects submissions when that happens.
+    """
+    source = _find_result_with_inputs_hash(ag_test_suite, inputs_hash, suite_result)
+    record_result_reuse(ag_test_suite.pk, hit=source is not None)
+    if source is None:
+        return False
+
+    print('Reusing the results of suite result', source.pk)
+    if source.pk != suite_result.pk:
+        if not _copy_suite_result(source, suite_result, inputs_hash):
+            return False
+
+    on_suite_setup_finished(suite_result)
+
+    setup_failed = suite_result.setup_return_code != 0 or suite_result.setup_timed_out
+    if (ag_test_suite.setup_suite_cmd
+            and ag_test_suite.reject_submission_if_setup_fails
+            and setup_failed):
+        raise SubmissionRejected
+
+    case_results = load_queryset_with_retry(
+        suite_result.ag_test_case_results.select_related('ag_test_case').order_by(
+            'ag_test_case___order'))
+    for case_result in case_results:
+        on_test_case_finished(case_result)
+
+    return True
+
+
+@retry_should_recover
+def set_inputs_hash(suite_result: ag_models.AGTestSuiteResult, inputs_hash: str) -> None:
+    """
+    Records that suite_result holds the results of running its suite
+    with the inputs that hash to inputs_hash. inputs_hash should be
+    an empty string while the suite is being graded.
+    """
+    ag_models.AGTestSuiteResult.objects.filter(
+        pk=suite_result.pk).update(inputs_hash=inputs_hash)
+    suite_result.inputs_hash = inputs_hash
+
+
+@retry_should_recover
+def _find_result_with_inputs_hash(
+    ag_test_suite: ag_models.AGTestSuite,
+    inputs_hash: str,
+    suite_result: ag_models.AGTestSuiteResult
+) -> Optional[ag_models.AGTestSuiteResult]:
+    if suite_result.inputs_hash == inputs_hash:
+        return suite_result
+
+    return ag_models.AGTestSuiteResult.objects.filter(
+        ag_test_suite=ag_test_suite, inputs_hash=inputs_hash
+    ).select_related('submission__project').order_by('-pk').first()
+
+
+@retry_should_recover
+def _copy_suite_result(source: ag_models.AGTestSuiteResult,
+                       dest: ag_models.AGTestSuiteResult,
+                       inputs_hash: str) -> bool:
+    source_output_dir = core_ut.get_result_output_dir(source.submission)
+    dest_output_dir = core_ut.get_result_output_dir(dest.submission)
+
+    source_case_results = list(
+        source.ag_test_case_results.prefetch_related('ag_test_command_results'))
+
+    try:
+        with transaction.atomic():
+            dest.setup_return_code = source.setup_return_code
+            dest.setup_timed_out = source.setup_timed_out
+            dest.setup_stdout_truncated = source.setup_stdout_truncated
+            dest.setup_stderr_truncated = source.setup_stderr_truncated
+            dest.inputs_hash = inputs_hash
+            dest.save()
+
+            _copy_output_files([
+                (ag_models.AGTestSuiteResult.get_setup_stdout_filename,
+                 source.pk, dest.pk),
+                (ag_models.AGTestSuiteResult.get_setup_stderr_filename,
+                 source.pk, dest.pk),
+            ], source_output_dir, dest_output_dir)
+
+            for source_case_result in source_case_results:
+                dest_case_result = ag_models.AGTestCaseResult.objects.get_or_create(
+                    ag_test_case_id=source_case_result.ag_test_case_id,
+                    ag_test_suite_result=dest)[0]
+                for source_cmd_result in source_case_result.ag_test_command_results.all():
+                    dest_cmd_result = ag_models.AGTestCommandResult.objects.update_or_create(
+                        defaults={
+                            field_name: getattr(source_cmd_result, field_name)
+                            for field_name in _AG_TEST_COMMAND_RESULT_FIELDS
+                        },
+                        ag_test_command_id=source_cmd_result.ag_test_command_id,
+                        ag_test_case_result=dest_case_result)[0]
+
+                    _copy_output_files([
+                        (get_filename, source_cmd_result.pk, dest_cmd_result.pk)
+                        for get_filename in [
+                            ag_models.AGTestCommandResult.get_stdout_filename,
+                            ag_models.AGTestCommandResult.get_stderr_filename,
+                            ag_models.AGTestCommandResult.get_stdout_diff_filename,
+                            ag_models.AGTestCommandResult.get_stderr_diff_filename,
+                        ]
+                    ], source_output_dir, dest_output_dir)
+    except IntegrityError:
+        # A test or the destination result was deleted.
+        return False
+
+    return True
+
+
+# A function that computes the path of an output file from a result
+# output directory and the pk of the result the file belongs to.
+_GetOutputFilename = Callable[[str, int], str]
+
+
+def _copy_output_files(files: Iterable[Tuple[_GetOutputFilename, int, int]],
+                       source_output_dir: str, dest_output_dir: str) -> None:
+    for get_filename, source_pk, dest_pk in files:
+        source_filename = get_filename(source_output_dir, source_pk)
+        dest_filename = get_filename(dest_output_dir, dest_pk)
+        # Files are copied rather than linked because rerunning the
+        # source result overwrites its diff files in place.
+        copy_output(source_filename, dest_filename)
+
+
+def record_result_reuse(ag_test_suite_pk: int, *, hit: bool) -> None:
+    """
+    Counts a lookup of reusable results for the given suite as a hit
+    or a miss.
+    """
+    key = _result_reuse_stats_key(ag_test_suite_pk, hit=hit)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_result_reuse_stats(ag_test_suite_pks: List[int]) -> Dict[int, Tuple[int, int]]:
+    """
+    Returns a dictionary mapping each of the given suite pks to the
+    number of (hits, misses) recorded by record_result_reuse.
+    """
+    keys = {
+        pk: (_result_reuse_stats_key(pk, hit=True), _result_reuse_stats_key(pk, hit=False))
+        for pk in ag_test_suite_pks
+    }
+    counts = cache.get_many([key for pair in keys.values() for key in pair])
+    return {
+        pk: (counts.get(hits_key, 0), counts.get(misses_key, 0))
+        for pk, (hits_key, misses_key) in keys.items()
+    }
+
+
+def _result_reuse_stats_key(ag_test_suite_pk: int, *, hit: bool) -> str:
+    return 'ag_test_suite_{}_result_reuse_{}'.format(
+        ag_test_suite_pk, 'hits' if hit else 'misses')
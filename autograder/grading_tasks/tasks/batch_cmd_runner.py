@@ -0,0 +1,140 @@
+"""
+Runs a batch of commands inside of a sandbox. This script is not
+imported by the autograder. Its source is passed to the sandbox's
+python3 by autograder.grading_tasks.tasks.batch_commands, so it must
+only use the standard library and must run on Python 3.5.
+
+The batch is read from stdin: the length of a JSON list of command
+descriptions, a newline, the JSON itself, and then the stdin content
+of each command that has any, in order. The commands are run one at
+a time the same way that the sandbox's cmd_runner.py runs a single
+command. After each command finishes, its results are written to
+stdout in the same format that cmd_runner.py uses.
+"""
+
+import grp
+import json
+import os
+import pwd
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+
+# Keep up to date with SANDBOX_USERNAME in autograder_sandbox.
+SANDBOX_USERNAME = 'autograder'
+
+
+def main():
+    batch_input = sys.stdin.buffer
+    json_len = int(batch_input.readline().decode())
+    commands = json.loads(batch_input.read(json_len).decode())
+
+    for command in commands:
+        if command['stdin_size'] is None:
+            run_command(command, subprocess.DEVNULL)
+            continue
+
+        with tempfile.TemporaryFile() as stdin:
+            for chunk in _chunked_read(batch_input, command['stdin_size']):
+                stdin.write(chunk)
+            stdin.seek(0)
+            run_command(command, stdin)
+
+
+def run_command(command, stdin):
+    def set_subprocess_rlimits():
+        if not command['as_root']:
+            os.setgid(grp.getgrnam(SANDBOX_USERNAME).gr_gid)
+            os.setuid(pwd.getpwnam(SANDBOX_USERNAME).pw_uid)
+
+        if command['block_process_spawn']:
+            resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+
+        max_virtual_memory = command['max_virtual_memory']
+        if max_virtual_memory is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (max_virtual_memory, max_virtual_memory))
+
+    env = os.environ.copy()
+    if not command['as_root']:
+        record = pwd.getpwnam(SANDBOX_USERNAME)
+        env['HOME'] = record.pw_dir
+        env['USER'] = record.pw_name
+        env['LOGNAME'] = record.pw_name
+
+    timed_out = False
+    return_code = None
+    # As in cmd_runner.py, the output sizes are taken from the
+    # filesystem rather than from file.tell().
+    with tempfile.NamedTemporaryFile() as stdout, tempfile.NamedTemporaryFile() as stderr:
+        try:
+            with subprocess.Popen(command['args'],
+                                  stdin=stdin,
+                                  stdout=stdout,
+                                  stderr=stderr,
+                                  preexec_fn=set_subprocess_rlimits,
+                                  start_new_session=True,
+                                  env=env) as process:
+                try:
+                    process.communicate(None, timeout=command['timeout'])
+                    return_code = process.poll()
+                except subprocess.TimeoutExpired:
+                    os.killpg(os.getpgid(process.pid), signal.SIGKILL)
+                    process.wait()
+                    timed_out = True
+                except:  # noqa
+                    os.killpg(os.getpgid(process.pid), signal.SIGKILL)
+                    process.wait()
+                    raise
+        except FileNotFoundError:
+            # This is the value returned by /bin/sh when an executable
+            # could not be found.
+            return_code = 127
+
+        stdout_len, stdout_truncated = _get_output_len(stdout, command['truncate_stdout'])
+        stderr_len, stderr_truncated = _get_output_len(stderr, command['truncate_stderr'])
+        results = {
+            'return_code': return_code,
+            'timed_out': timed_out,
+            'stdout_truncated': stdout_truncated,
+            'stderr_truncated': stderr_truncated,
+        }
+
+        json_data = json.dumps(results).encode()
+        _write_chunk(json_data, len(json_data))
+        _write_chunk(stdout, stdout_len)
+        _write_chunk(stderr, stderr_len)
+        sys.stdout.buffer.flush()
+
+
+def _get_output_len(output, truncate):
+    output_len = os.path.getsize(output.name)
+    if truncate is not None and output_len > truncate:
+        return truncate, True
+
+    return output_len, False
+
+
+def _write_chunk(data, data_len):
+    sys.stdout.buffer.write('{}\n'.format(data_len).encode())
+    if isinstance(data, bytes):
+        sys.stdout.buffer.write(data)
+        return
+
+    data.seek(0)
+    for chunk in _chunked_read(data, data_len):
+        sys.stdout.buffer.write(chunk)
+
+
+def _chunked_read(file_obj, amount_to_read, chunk_size=1024 * 16):
+    while amount_to_read > 0:
+        chunk = file_obj.read(min(chunk_size, amount_to_read))
+        if not chunk:
+            raise EOFError('Expected {} more bytes'.format(amount_to_read))
+        amount_to_read -= len(chunk)
+        yield chunk
+
+
+if __name__ == '__main__':
+    main()
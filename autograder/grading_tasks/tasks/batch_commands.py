@@ -0,0 +1,169 @@
+"""
+Runs several commands in a sandbox over a single "docker exec".
+
+Each call to AutograderSandbox.run_command() starts a new docker exec
+session, which adds noticeable overhead to short commands.
+run_commands_in_batch() instead sends all of the commands, along with
+their stdin content, to a small runner process (batch_cmd_runner.py)
+inside the sandbox. The runner runs the commands one at a time with
+the same user, resource limits, and timeout handling that
+run_command() uses and streams back each command's results.
+"""
+
+import io
+import json
+import os
+import shutil
+import tempfile
+from typing import IO, List, NamedTuple, Optional, Sequence
+
+from autograder_sandbox import AutograderSandbox
+from autograder_sandbox.autograder_sandbox import CompletedCommand
+
+_RUNNER_SOURCE_PATH = os.path.join(os.path.dirname(__file__), 'batch_cmd_runner.py')
+
+# The runner's time limit is the sum of its commands' time limits plus
+# this many seconds, plus this many seconds per command.
+_RUNNER_TIMEOUT_SLACK = 10
+
+
+class BatchCommandError(Exception):
+    """
+    Raised when the batch runner doesn't report the results of every
+    command in the batch. completed_results contains the results that
+    were reported, in order. The commands after those may or may not
+    have been run.
+    """
+
+    def __init__(self, msg: str = '', completed_results: Sequence[CompletedCommand] = ()):
+        super().__init__(msg)
+        self.completed_results = list(completed_results)
+
+
+class BatchCommand(NamedTuple):
+    """
+    A command to run with run_commands_in_batch(). The fields have the
+    same meaning as the arguments to AutograderSandbox.run_command()
+    with the same names.
+    """
+    args: List[str]
+    as_root: bool = False
+    block_process_spawn: bool = False
+    max_virtual_memory: Optional[int] = None
+    timeout: Optional[int] = None
+    stdin: Optional[IO[bytes]] = None
+    truncate_stdout: Optional[int] = None
+    truncate_stderr: Optional[int] = None
+
+
+def run_commands_in_batch(sandbox: AutograderSandbox,
+                          commands: Sequence[BatchCommand]) -> List[CompletedCommand]:
+    """
+    Runs commands in order inside of sandbox over a single docker exec
+    and returns their results. The stdout and stderr of each
+    CompletedCommand are NamedTemporaryFiles, as they are for
+    AutograderSandbox.run_command().
+
+    Raises BatchCommandError if the results of any of the commands
+    can't be read. The exception contains the results that could be
+    read.
+    """
+    if not commands:
+        return []
+
+    with open(_RUNNER_SOURCE_PATH) as f:
+        runner_source = f.read()
+
+    with tempfile.TemporaryFile() as batch_input:
+        _write_batch_input(commands, batch_input)
+        batch_input.seek(0)
+        runner_result = sandbox.run_command(
+            ['python3', '-c', runner_source],
+            as_root=True,
+            stdin=batch_input,
+            timeout=_get_runner_timeout(commands))
+
+    results = []  # type: List[CompletedCommand]
+    with runner_result.stdout, runner_result.stderr:
+        try:
+            for _ in commands:
+                results.append(_read_command_result(runner_result.stdout))
+        except (ValueError, KeyError, EOFError) as e:
+            raise BatchCommandError(
+                'Error reading batch results (return code: {}, timed out: {}): {}\n{}'.format(
+                    runner_result.return_code, runner_result.timed_out, e,
+                    runner_result.stderr.read().decode(errors='backslashreplace')),
+                results)
+
+    return results
+
+
+def _write_batch_input(commands: Sequence[BatchCommand], batch_input: IO[bytes]) -> None:
+    stdin_sizes = []  # type: List[Optional[int]]
+    for command in commands:
+        if command.stdin is None:
+            stdin_sizes.append(None)
+        else:
+            start = command.stdin.tell()
+            stdin_sizes.append(command.stdin.seek(0, os.SEEK_END) - start)
+            command.stdin.seek(start)
+
+    command_data = [
+        {
+            'args': command.args,
+            'as_root': command.as_root,
+            'block_process_spawn': command.block_process_spawn,
+            'max_virtual_memory': command.max_virtual_memory,
+            'timeout': command.timeout,
+            'truncate_stdout': command.truncate_stdout,
+            'truncate_stderr': command.truncate_stderr,
+            'stdin_size': stdin_size,
+        }
+        for command, stdin_size in zip(commands, stdin_sizes)
+    ]
+    json_data = json.dumps(command_data).encode()
+    batch_input.write('{}\n'.format(len(json_data)).encode())
+    batch_input.write(json_data)
+
+    for command in commands:
+        if command.stdin is not None:
+            shutil.copyfileobj(command.stdin, batch_input)
+
+
+def _get_runner_timeout(commands: Sequence[BatchCommand]) -> Optional[int]:
+    if any(command.timeout is None for command in commands):
+        return None
+
+    return (sum(command.timeout for command in commands)
+            + _RUNNER_TIMEOUT_SLACK + len(commands))
+
+
+def _read_command_result(runner_stdout: IO[bytes]) -> CompletedCommand:
+    results_json_data = io.BytesIO()
+    _copy_chunk(runner_stdout, results_json_data)
+    results_json = json.loads(results_json_data.getvalue().decode())
+
+    stdout = tempfile.NamedTemporaryFile()
+    _copy_chunk(runner_stdout, stdout)
+    stdout.seek(0)
+
+    stderr = tempfile.NamedTemporaryFile()
+    _copy_chunk(runner_stdout, stderr)
+    stderr.seek(0)
+
+    return CompletedCommand(return_code=results_json['return_code'],
+                            timed_out=results_json['timed_out'],
+                            stdout=stdout,
+                            stderr=stderr,
+                            stdout_truncated=results_json['stdout_truncated'],
+                            stderr_truncated=results_json['stderr_truncated'])
+
+
+def _copy_chunk(runner_stdout: IO[bytes], dest: IO[bytes], chunk_size=1024 * 16) -> None:
+    amount_to_read = int(runner_stdout.readline().decode())
+    while amount_to_read > 0:
+        chunk = runner_stdout.read(min(chunk_size, amount_to_read))
+        if not chunk:
+            raise EOFError('Expected {} more bytes'.format(amount_to_read))
+        dest.write(chunk)
+        amount_to_read -= len(chunk)
@@ -0,0 +1,153 @@
+import json
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from django.db import connection, transaction
+
+import autograder.core.models as ag_models
+from autograder.utils.retry import retry_should_recover
+
+
+class DenormalizedAGTestResultsBuffer:
+    """
+    Buffers changes to a submission's denormalized_ag_test_results.
+
+    Buffered changes are written with a single UPDATE that uses
+    jsonb_set to replace only the changed paths, so the rest of the
+    document is never rewritten and the submission row is locked only
+    for the duration of that UPDATE.
+
+    Changes are flushed when max_buffered changes are pending, when the
+    oldest pending change is at least max_delay seconds old, or when
+    flush() is called. The max_delay deadline is enforced by a timer
+    thread, so a slow test case doesn't hold back the results that were
+    buffered before it started. Pending changes are taken out of the
+    buffer before they're written, so threads that buffer new changes
+    don't wait for a write that's in progress.
+    """
+
+    def __init__(self, submission_pk: int, *, max_buffered: int, max_delay: float):
+        self.submission_pk = submission_pk
+        self.max_buffered = max_buffered
+        self.max_delay = max_delay
+
+        # Maps JSON paths to their new values. Ordered by when the path
+        # was most recently set so that a suite result that replaces
+        # previously buffered test case results is applied after them.
+        self._pending = OrderedDict()  # type: OrderedDict[Tuple[str, ...], object]
+        self._oldest_pending_time = None  # type: Optional[float]
+
+        # Guards the fields above, which are also used by the timer
+        # thread.
+        self._lock = threading.Lock()
+        self._flush_timer = None  # type: Optional[threading.Timer]
+
+        # Held while writing so that the timer thread and the grading
+        # thread write their changes in the order they were taken out
+        # of the buffer.
+        self._write_lock = threading.Lock()
+
+    def set_ag_test_suite_result(self, ag_test_suite_id: int, suite_result_data: dict) -> None:
+        self._set((str(ag_test_suite_id),), suite_result_data)
+
+    def set_ag_test_case_result(self, ag_test_suite_id: int, ag_test_case_id: int,
+                                case_result_data: dict) -> None:
+        self._set(
+            (str(ag_test_suite_id), 'ag_test_case_results', str(ag_test_case_id)),
+            case_result_data)
+
+    @property
+    def num_pending(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> None:
+        with self._write_lock:
+            with self._lock:
+                updates = list(self._pending.items())
+                oldest_pending_time = self._oldest_pending_time
+                self._clear_pending()
+
+            if not updates:
+                return
+
+            try:
+                _write_denormalized_updates(self.submission_pk, updates)
+            except Exception:
+                with self._lock:
+                    self._restore_pending(updates, oldest_pending_time)
+                raise
+
+    def _clear_pending(self) -> None:
+        # Must be called with self._lock held.
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+        self._pending = OrderedDict()
+        self._oldest_pending_time = None
+
+    def _restore_pending(self, updates: List[Tuple[Tuple[str, ...], object]],
+                         oldest_pending_time: Optional[float]) -> None:
+        # Must be called with self._lock held.
+        # Puts back changes that failed to be written. Changes that
+        # were buffered in the meantime are newer, so they go after the
+        # restored ones and replace any restored change to the same path.
+        restored = OrderedDict(updates)
+        for path, value in self._pending.items():
+            restored.pop(path, None)
+            restored[path] = value
+
+        self._pending = restored
+        self._oldest_pending_time = oldest_pending_time
+
+    def _set(self, path: Tuple[str, ...], value: object) -> None:
+        with self._lock:
+            self._pending.pop(path, None)
+            self._pending[path] = value
+            if self._oldest_pending_time is None:
+                self._oldest_pending_time = time.monotonic()
+                self._flush_timer = threading.Timer(self.max_delay, self._flush_on_timer)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+            should_flush = (
+                len(self._pending) >= self.max_buffered
+                or time.monotonic() - self._oldest_pending_time >= self.max_delay)
+
+        if should_flush:
+            self.flush()
+
+    def _flush_on_timer(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            # The changes are still pending, so they'll be written by
+            # the next call to flush() or _set().
+            print('Error writing denormalized test results for submission',
+                  self.submission_pk)
+            traceback.print_exc()
+        finally:
+            # Django opens a separate database connection for each
+            # thread, and nothing else closes this thread's connection.
+            connection.close()
+
+
+@retry_should_recover
+def _write_denormalized_updates(submission_pk: int,
+                                updates: List[Tuple[Tuple[str, ...], object]]) -> None:
+    expr = 'denormalized_ag_test_results'
+    params = []  # type: List[object]
+    for path, value in updates:
+        expr = 'jsonb_set({}, %s::text[], %s::jsonb)'.format(expr)
+        params += [list(path), json.dumps(value)]
+
+    table = ag_models.Submission._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE {table} SET denormalized_ag_test_results = {expr} WHERE id = %s'.format(
+                table=table, expr=expr),
+            params + [submission_pk]
+        )
@@ -1,24 +1,40 @@
-import shutil
+import io
+import json
 import tempfile
 import traceback
 import uuid
-from typing import IO, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Dict, List, Optional, Sequence, Tuple
 
 import celery
 from autograder_sandbox import AutograderSandbox
+from autograder_sandbox.autograder_sandbox import CompletedCommand
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import IntegrityError, transaction
 
 import autograder.core.models as ag_models
 import autograder.core.utils as core_ut
 from autograder.core import constants
+from autograder.core.result_output import remove_output, write_output
 from autograder.core.submission_feedback import update_denormalized_ag_test_results
 from autograder.utils.retry import retry_ag_test_cmd, retry_should_recover
 
+from .ag_test_result_reuse import get_suite_inputs_hash, reuse_suite_results, set_inputs_hash
+from .batch_commands import BatchCommand, BatchCommandError, run_commands_in_batch
 from .exceptions import SubmissionRejected, TestDeleted
-from .utils import (FileCloser, add_files_to_sandbox, load_queryset_with_retry,
+from .sandbox_pool import SandboxPool, get_sandbox_pool
+from .setup_snapshot_cache import (get_setup_snapshot_key, restore_setup_snapshot,
+                                   save_setup_snapshot)
+from .utils import (FileCloser, add_files_to_sandbox, get_stdin_file, load_queryset_with_retry,
                     mark_submission_as_error, run_ag_test_command, run_command_from_args)
 
+# The results of running an AGTestCommand: the CompletedCommand, the
+# field values for its AGTestCommandResult, and the stdout and stderr
+# diffs (None if that output isn't checked).
+CommandRunResult = Tuple[CompletedCommand, Dict[str, object],
+                         Optional[core_ut.DiffResult], Optional[core_ut.DiffResult]]
+
 
 @celery.shared_task(bind=True, max_retries=1, acks_late=True)
 def grade_deferred_ag_test_suite(self, ag_test_suite_pk, submission_pk):
@@ -54,7 +70,8 @@ def grade_ag_test_suite_impl(ag_test_suite: ag_models.AGTestSuite,
                              group: ag_models.Group,
                              *ag_test_cases_to_run: int,
                              on_suite_setup_finished=lambda _: None,
-                             on_test_case_finished=lambda _: None):
+                             on_test_case_finished=lambda _: None,
+                             sandbox_pool: Optional[SandboxPool] = None):
     @retry_should_recover
     def get_or_create_suite_result():
         try:
@@ -68,24 +85,59 @@ def grade_ag_test_suite_impl(ag_test_suite: ag_models.AGTestSuite,
     if suite_result is None:
         return
 
-    sandbox = AutograderSandbox(
-        name='submission{}-suite{}-{}'.format(submission.pk, ag_test_suite.pk, uuid.uuid4().hex),
-        environment_variables={
-            'usernames': ' '.join(group.member_names)
-        },
-        allow_network_access=ag_test_suite.allow_network_access,
-        docker_image=ag_test_suite.sandbox_docker_image.tag)
+    environment_variables = {
+        'usernames': ' '.join(group.member_names)
+    }
+    if sandbox_pool is None:
+        sandbox_pool = get_sandbox_pool()
+    if sandbox_pool is not None:
+        sandbox_context = sandbox_pool.lease(
+            environment_variables=environment_variables,
+            allow_network_access=ag_test_suite.allow_network_access,
+            docker_image=ag_test_suite.sandbox_docker_image.tag)
+    else:
+        sandbox_context = AutograderSandbox(
+            name='submission{}-suite{}-{}'.format(
+                submission.pk, ag_test_suite.pk, uuid.uuid4().hex),
+            environment_variables=environment_variables,
+            allow_network_access=ag_test_suite.allow_network_access,
+            docker_image=ag_test_suite.sandbox_docker_image.tag)
+    inputs_hash = ''
+    if ag_test_suite.deterministic and len(ag_test_cases_to_run) == 0:
+        inputs_hash = get_suite_inputs_hash(ag_test_suite, submission, group)
+        if reuse_suite_results(ag_test_suite, suite_result, inputs_hash,
+                               on_suite_setup_finished=on_suite_setup_finished,
+                               on_test_case_finished=on_test_case_finished):
+            return
+
+    # The results are only reusable once they've all been recorded.
+    if suite_result.inputs_hash:
+        set_inputs_hash(suite_result, '')
+
     print(ag_test_suite.sandbox_docker_image.to_dict())
-    print(sandbox.docker_image)
-    with sandbox:
-        add_files_to_sandbox(sandbox, ag_test_suite, submission)
+    with sandbox_context as sandbox:
+        print(sandbox.name, sandbox.docker_image)
+        setup_snapshot_key = ''
+        restored_setup_result = None
+        if ag_test_suite.reuse_setup_snapshots and ag_test_suite.setup_suite_cmd:
+            setup_snapshot_key = get_setup_snapshot_key(ag_test_suite, submission, group)
+            restored_setup_result = restore_setup_snapshot(sandbox, setup_snapshot_key)
+
+        # The snapshot includes the files added to the sandbox.
+        if restored_setup_result is None:
+            add_files_to_sandbox(sandbox, ag_test_suite, submission)
 
         try:
-            print('Running setup for', ag_test_suite.name)
+            if restored_setup_result is None:
+                print('Running setup for', ag_test_suite.name)
+            else:
+                print('Restored setup snapshot for', ag_test_suite.name)
             _run_suite_setup(
                 sandbox,
                 ag_test_suite,
                 suite_result,
+                setup_snapshot_key=setup_snapshot_key,
+                restored_setup_result=restored_setup_result,
                 on_suite_setup_finished=on_suite_setup_finished
             )
         except TestDeleted:
@@ -95,10 +147,23 @@ def grade_ag_test_suite_impl(ag_test_suite: ag_models.AGTestSuite,
         if len(ag_test_cases_to_run) != 0:
             ag_test_case_queryset = ag_test_case_queryset.filter(pk__in=ag_test_cases_to_run)
 
-        for ag_test_case in load_queryset_with_retry(ag_test_case_queryset):
-            print('Grading test case', ag_test_case.name)
-            case_result = grade_ag_test_case_impl(sandbox, ag_test_case, suite_result)
-            on_test_case_finished(case_result)
+        ag_test_cases = load_queryset_with_retry(ag_test_case_queryset)
+        if ag_test_suite.run_test_cases_in_parallel and len(ag_test_cases) > 1:
+            _grade_ag_test_cases_in_parallel(
+                sandbox, ag_test_cases, suite_result,
+                in_batch=ag_test_suite.batch_test_case_commands,
+                on_test_case_finished=on_test_case_finished)
+        else:
+            for ag_test_case in ag_test_cases:
+                print('Grading test case', ag_test_case.name)
+                case_result = grade_ag_test_case_impl(
+                    sandbox, ag_test_case, suite_result,
+                    in_batch=ag_test_suite.batch_test_case_commands)
+                if case_result is not None:
+                    on_test_case_finished(case_result)
+
+    if inputs_hash:
+        set_inputs_hash(suite_result, inputs_hash)
 
 
 # This is patched in test cases
@@ -111,7 +176,16 @@ def _run_suite_setup(sandbox: AutograderSandbox,
                      ag_test_suite: ag_models.AGTestSuite,
                      suite_result: ag_models.AGTestSuiteResult,
                      *,
+                     setup_snapshot_key: str = '',
+                     restored_setup_result: Optional[CompletedCommand] = None,
                      on_suite_setup_finished):
+    """
+    Runs ag_test_suite's setup command and records its results in
+    suite_result. If restored_setup_result is not None, it's recorded
+    instead of running the setup command. Otherwise, if
+    setup_snapshot_key is non-empty, the sandbox's working directory is
+    saved to the setup snapshot cache after the setup command finishes.
+    """
     @retry_should_recover
     def _save_suite_result():
         try:
@@ -127,29 +201,34 @@ def _run_suite_setup(sandbox: AutograderSandbox,
         _save_suite_result()
 
         # Erase the setup output files.
-        with open(suite_result.setup_stdout_filename, 'wb') as f:
-            pass
-        with open(suite_result.setup_stderr_filename, 'wb') as f:
-            pass
+        write_output(io.BytesIO(), suite_result.setup_stdout_filename)
+        write_output(io.BytesIO(), suite_result.setup_stderr_filename)
 
         on_suite_setup_finished(suite_result)
         return
 
-    setup_result = run_command_from_args(
-        cmd=ag_test_suite.setup_suite_cmd,
-        sandbox=sandbox,
-        block_process_spawn=False,
-        max_virtual_memory=None,
-        timeout=constants.MAX_SUBPROCESS_TIMEOUT)
+    if restored_setup_result is not None:
+        setup_result = restored_setup_result
+        # In case the output was already read by an earlier attempt.
+        setup_result.stdout.seek(0)
+        setup_result.stderr.seek(0)
+    else:
+        setup_result = run_command_from_args(
+            cmd=ag_test_suite.setup_suite_cmd,
+            sandbox=sandbox,
+            block_process_spawn=False,
+            max_virtual_memory=None,
+            timeout=constants.MAX_SUBPROCESS_TIMEOUT)
+        if setup_snapshot_key:
+            save_setup_snapshot(sandbox, setup_snapshot_key, setup_result)
+
     suite_result.setup_return_code = setup_result.return_code
     suite_result.setup_timed_out = setup_result.timed_out
     suite_result.setup_stdout_truncated = setup_result.stdout_truncated
     suite_result.setup_stderr_truncated = setup_result.stderr_truncated
 
-    with open(suite_result.setup_stdout_filename, 'wb') as f:
-        shutil.copyfileobj(setup_result.stdout, f)
-    with open(suite_result.setup_stderr_filename, 'wb') as f:
-        shutil.copyfileobj(setup_result.stderr, f)
+    write_output(setup_result.stdout, suite_result.setup_stdout_filename)
+    write_output(setup_result.stderr, suite_result.setup_stderr_filename)
 
     mocking_hook_delete_suite_during_setup()  # FOR TESTING. LEAVE THIS HERE
     _save_suite_result()
@@ -160,22 +239,157 @@ def _run_suite_setup(sandbox: AutograderSandbox,
         raise SubmissionRejected
 
 
-def grade_ag_test_case_impl(sandbox: AutograderSandbox,
-                            ag_test_case: ag_models.AGTestCase,
-                            suite_result: ag_models.AGTestSuiteResult):
-    @retry_should_recover
-    def get_or_create_ag_test_case_result():
+def _grade_ag_test_cases_in_parallel(sandbox: AutograderSandbox,
+                                     ag_test_cases: Sequence[ag_models.AGTestCase],
+                                     suite_result: ag_models.AGTestSuiteResult,
+                                     *,
+                                     in_batch: bool,
+                                     on_test_case_finished):
+    """
+    Runs the commands for up to settings.AG_TEST_CASE_MAX_PARALLELISM
+    test cases at a time in the same sandbox.
+    Only the sandbox commands and output checking are done on worker
+    threads. Results are saved on this thread, and on_test_case_finished
+    is called in the same order that the test cases would have been
+    graded in sequentially.
+    """
+    # Load everything the worker threads need so that they don't make
+    # any database queries.
+    ag_test_cmds_by_case = [
+        load_queryset_with_retry(
+            ag_test_case.ag_test_commands.select_related(
+                'stdin_instructor_file',
+                'expected_stdout_instructor_file',
+                'expected_stderr_instructor_file',
+            )
+        )
+        for ag_test_case in ag_test_cases
+    ]
+
+    with ThreadPoolExecutor(max_workers=settings.AG_TEST_CASE_MAX_PARALLELISM) as executor:
+        futures = [
+            executor.submit(_run_ag_test_case_commands, sandbox, ag_test_cmds, suite_result,
+                            in_batch=in_batch)
+            for ag_test_cmds in ag_test_cmds_by_case
+        ]
+
+        for ag_test_case, ag_test_cmds, future in zip(
+                ag_test_cases, ag_test_cmds_by_case, futures):
+            cmd_results = future.result()
+            print('Grading test case', ag_test_case.name)
+            case_result = _get_or_create_ag_test_case_result(ag_test_case, suite_result)
+            if case_result is None:
+                # The test case was deleted while we were grading it.
+                continue
+
+            for ag_test_cmd, cmd_run_result in zip(ag_test_cmds, cmd_results):
+                _save_ag_test_command_result(ag_test_cmd, case_result, *cmd_run_result)
+
+            on_test_case_finished(case_result)
+
+
+def _run_ag_test_case_commands(
+    sandbox: AutograderSandbox,
+    ag_test_cmds: Sequence[ag_models.AGTestCommand],
+    suite_result: ag_models.AGTestSuiteResult,
+    *,
+    in_batch: bool = False
+) -> List[CommandRunResult]:
+    run_results = []  # type: List[CompletedCommand]
+    if in_batch:
+        # If the batch fails, the commands that the batch runner didn't
+        # report results for are run one at a time, which is slower but
+        # doesn't depend on the batch runner. The commands it did report
+        # results for aren't run again, since commands with side effects
+        # (e.g., appending to a file) could then give different results.
         try:
-            return ag_models.AGTestCaseResult.objects.get_or_create(
-                ag_test_case=ag_test_case, ag_test_suite_result=suite_result)[0]
-        except IntegrityError:
-            # The AGTestCase or AGSuiteResult has been deleted.
-            return None
+            run_results = _run_ag_test_commands_in_batch(sandbox, ag_test_cmds, suite_result)
+        except BatchCommandError as e:
+            run_results = e.completed_results
+            print('Error running test case commands in a batch. '
+                  'Running the {} commands without results one at a time instead.'.format(
+                      len(ag_test_cmds) - len(run_results)))
+            traceback.print_exc()
+        except Exception:
+            print('Error starting test case commands in a batch. '
+                  'Running them one at a time instead.')
+            traceback.print_exc()
+
+    return [
+        _check_ag_test_command_output(ag_test_cmd, run_result)
+        for ag_test_cmd, run_result in zip(ag_test_cmds, run_results)
+    ] + [
+        retry_ag_test_cmd(_run_ag_test_command_and_check_output)(
+            sandbox, ag_test_cmd, suite_result)
+        for ag_test_cmd in ag_test_cmds[len(run_results):]
+    ]
+
+
+def _run_ag_test_commands_in_batch(
+    sandbox: AutograderSandbox,
+    ag_test_cmds: Sequence[ag_models.AGTestCommand],
+    suite_result: ag_models.AGTestSuiteResult
+) -> List[CompletedCommand]:
+    """
+    Runs ag_test_cmds in order over a single docker exec and returns
+    the same CompletedCommands that run_ag_test_command would for each
+    command. Does not touch the database.
+    """
+    with FileCloser() as file_closer:
+        batch = []
+        for ag_test_cmd in ag_test_cmds:
+            stdin = get_stdin_file(ag_test_cmd, suite_result)
+            file_closer.register_file(stdin)
+            batch.append(BatchCommand(
+                args=['bash', '-c', ag_test_cmd.cmd],
+                block_process_spawn=ag_test_cmd.block_process_spawn,
+                max_virtual_memory=(
+                    ag_test_cmd.virtual_memory_limit if ag_test_cmd.use_virtual_memory_limit
+                    else None),
+                timeout=ag_test_cmd.time_limit,
+                stdin=stdin,
+                truncate_stdout=constants.MAX_RECORDED_OUTPUT_LENGTH,
+                truncate_stderr=constants.MAX_RECORDED_OUTPUT_LENGTH))
+
+        return run_commands_in_batch(sandbox, batch)
+
+
+@retry_should_recover
+def _get_or_create_ag_test_case_result(
+    ag_test_case: ag_models.AGTestCase,
+    suite_result: ag_models.AGTestSuiteResult
+) -> Optional[ag_models.AGTestCaseResult]:
+    try:
+        return ag_models.AGTestCaseResult.objects.get_or_create(
+            ag_test_case=ag_test_case, ag_test_suite_result=suite_result)[0]
+    except IntegrityError:
+        # The AGTestCase or AGSuiteResult has been deleted.
+        return None
+
 
-    case_result = get_or_create_ag_test_case_result()
+def grade_ag_test_case_impl(sandbox: AutograderSandbox,
+                            ag_test_case: ag_models.AGTestCase,
+                            suite_result: ag_models.AGTestSuiteResult,
+                            *,
+                            in_batch: bool = False):
+    """
+    Grades the commands of ag_test_case. If in_batch is True (i.e.,
+    the suite's batch_test_case_commands is set), they're run over a
+    single docker exec.
+    """
+    case_result = _get_or_create_ag_test_case_result(ag_test_case, suite_result)
     if case_result is None:
         return
 
+    if in_batch:
+        ag_test_cmds = load_queryset_with_retry(ag_test_case.ag_test_commands.all())
+        cmd_results = _run_ag_test_case_commands(
+            sandbox, ag_test_cmds, suite_result, in_batch=True)
+        for ag_test_cmd, cmd_run_result in zip(ag_test_cmds, cmd_results):
+            _save_ag_test_command_result(ag_test_cmd, case_result, *cmd_run_result)
+
+        return case_result
+
     @retry_ag_test_cmd
     def _grade_ag_test_cmd_with_retry(ag_test_cmd, case_result):
         grade_ag_test_command_impl(sandbox, ag_test_cmd, case_result)
@@ -190,65 +404,112 @@ def grade_ag_test_case_impl(sandbox: AutograderSandbox,
 def grade_ag_test_command_impl(sandbox: AutograderSandbox,
                                ag_test_cmd: ag_models.AGTestCommand,
                                case_result: ag_models.AGTestCaseResult):
+    run_result, result_data, stdout_diff, stderr_diff = _run_ag_test_command_and_check_output(
+        sandbox, ag_test_cmd, case_result.ag_test_suite_result)
+    _save_ag_test_command_result(
+        ag_test_cmd, case_result, run_result, result_data, stdout_diff, stderr_diff)
+
+
+def _run_ag_test_command_and_check_output(
+    sandbox: AutograderSandbox,
+    ag_test_cmd: ag_models.AGTestCommand,
+    suite_result: ag_models.AGTestSuiteResult
+) -> CommandRunResult:
+    """
+    Runs ag_test_cmd and returns the CompletedCommand along with the
+    field values for its AGTestCommandResult and the diffs of its
+    output. Does not touch the database.
+    """
+    run_result = run_ag_test_command(ag_test_cmd, sandbox, suite_result)
+    return _check_ag_test_command_output(ag_test_cmd, run_result)
+
+
+def _check_ag_test_command_output(ag_test_cmd: ag_models.AGTestCommand,
+                                  run_result: CompletedCommand) -> CommandRunResult:
     with FileCloser() as file_closer:
-        run_result = run_ag_test_command(ag_test_cmd, sandbox, case_result.ag_test_suite_result)
-
         result_data = {
             'return_code': run_result.return_code,
             'timed_out': run_result.timed_out,
             'stdout_truncated': run_result.stdout_truncated,
             'stderr_truncated': run_result.stderr_truncated,
-        }
+        }  # type: Dict[str, object]
 
         if ag_test_cmd.expected_return_code == ag_models.ExpectedReturnCode.zero:
             result_data['return_code_correct'] = run_result.return_code == 0
         elif ag_test_cmd.expected_return_code == ag_models.ExpectedReturnCode.nonzero:
             result_data['return_code_correct'] = run_result.return_code != 0
 
+        # Failing diffs are stored along with the output so that
+        # feedback can be served without diffing the output again.
         expected_stdout, expected_stdout_filename = _get_expected_stdout_file_and_name(ag_test_cmd)
         file_closer.register_file(expected_stdout)
 
+        stdout_diff = None
+        result_data['stdout_diff_size'] = None
         if expected_stdout_filename is not None:
-            diff = core_ut.get_diff(
+            stdout_diff = core_ut.get_diff(
                 expected_stdout_filename, run_result.stdout.name,
                 ignore_case=ag_test_cmd.ignore_case,
                 ignore_whitespace=ag_test_cmd.ignore_whitespace,
                 ignore_whitespace_changes=ag_test_cmd.ignore_whitespace_changes,
                 ignore_blank_lines=ag_test_cmd.ignore_blank_lines)
-            result_data['stdout_correct'] = diff.diff_pass
+            result_data['stdout_correct'] = stdout_diff.diff_pass
+            result_data['stdout_diff_size'] = core_ut.get_diff_size(stdout_diff)
 
         expected_stderr, expected_stderr_filename = _get_expected_stderr_file_and_name(ag_test_cmd)
         file_closer.register_file(expected_stderr)
 
+        stderr_diff = None
+        result_data['stderr_diff_size'] = None
         if expected_stderr_filename is not None:
-            diff = core_ut.get_diff(
+            stderr_diff = core_ut.get_diff(
                 expected_stderr_filename, run_result.stderr.name,
                 ignore_case=ag_test_cmd.ignore_case,
                 ignore_whitespace=ag_test_cmd.ignore_whitespace,
                 ignore_whitespace_changes=ag_test_cmd.ignore_whitespace_changes,
                 ignore_blank_lines=ag_test_cmd.ignore_blank_lines)
-            result_data['stderr_correct'] = diff.diff_pass
-
-        print(result_data)
-
-        @retry_should_recover
-        def save_ag_test_cmd_result():
-            try:
-                with transaction.atomic():
-                    cmd_result = ag_models.AGTestCommandResult.objects.update_or_create(
-                        defaults=result_data,
-                        ag_test_command=ag_test_cmd,
-                        ag_test_case_result=case_result)[0]  # type: ag_models.AGTestCommandResult
-
-                    with open(cmd_result.stdout_filename, 'wb') as f:
-                        shutil.copyfileobj(run_result.stdout, f)
-                    with open(cmd_result.stderr_filename, 'wb') as f:
-                        shutil.copyfileobj(run_result.stderr, f)
-            except IntegrityError:
-                # The command or case result has likely been deleted
-                return
-
-        save_ag_test_cmd_result()
+            result_data['stderr_correct'] = stderr_diff.diff_pass
+            result_data['stderr_diff_size'] = core_ut.get_diff_size(stderr_diff)
+
+        return run_result, result_data, stdout_diff, stderr_diff
+
+
+@retry_should_recover
+def _save_ag_test_command_result(ag_test_cmd: ag_models.AGTestCommand,
+                                 case_result: ag_models.AGTestCaseResult,
+                                 run_result: CompletedCommand,
+                                 result_data: Dict[str, object],
+                                 stdout_diff: Optional[core_ut.DiffResult],
+                                 stderr_diff: Optional[core_ut.DiffResult]):
+    try:
+        with transaction.atomic():
+            cmd_result = ag_models.AGTestCommandResult.objects.update_or_create(
+                defaults=result_data,
+                ag_test_command=ag_test_cmd,
+                ag_test_case_result=case_result)[0]  # type: ag_models.AGTestCommandResult
+
+            run_result.stdout.seek(0)
+            run_result.stderr.seek(0)
+            write_output(run_result.stdout, cmd_result.stdout_filename)
+            write_output(run_result.stderr, cmd_result.stderr_filename)
+
+            _save_diff(stdout_diff, cmd_result.stdout_diff_filename)
+            _save_diff(stderr_diff, cmd_result.stderr_diff_filename)
+    except IntegrityError:
+        # The command or case result has likely been deleted
+        return
+
+
+def _save_diff(diff: Optional[core_ut.DiffResult], filename: str) -> None:
+    # A passing diff is just the actual output, so it's cheaper to
+    # rebuild it from the stored output when it's requested than to
+    # store it.
+    if diff is None or diff.diff_pass:
+        # Remove the diff left over from a previous run, if any.
+        remove_output(filename)
+        return
+
+    write_output(io.BytesIO(json.dumps(diff.diff_content).encode()), filename)
 
 
 def _get_expected_stdout_file_and_name(
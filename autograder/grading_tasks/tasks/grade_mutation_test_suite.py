@@ -1,20 +1,27 @@
+import collections
+import functools
 import shutil
 import tempfile
+import threading
 import traceback
 import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from io import FileIO
-from typing import List
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
 
 import celery
 from autograder_sandbox import AutograderSandbox
 from autograder_sandbox.autograder_sandbox import CompletedCommand
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import IntegrityError, transaction
 
 import autograder.core.models as ag_models
 from autograder.core import constants
+from autograder.core.result_output import write_output
 from autograder.utils.retry import retry_ag_test_cmd, retry_should_recover
 
+from .sandbox_pool import SandboxPool, get_sandbox_pool
 from .utils import (
     add_files_to_sandbox, mark_submission_as_error, run_ag_test_command, run_ag_command)
 
@@ -41,18 +48,28 @@ def grade_deferred_mutation_test_suite(mutation_test_suite_pk, submission_pk):
 
 
 def grade_mutation_test_suite_impl(mutation_test_suite: ag_models.MutationTestSuite,
-                                   submission: ag_models.Submission):
-    sandbox = AutograderSandbox(
-        name='submission{}-suite{}-{}'.format(
-            submission.pk, mutation_test_suite.pk, uuid.uuid4().hex),
-        environment_variables={
-            'usernames': ' '.join(submission.group.member_names)
-        },
-        allow_network_access=mutation_test_suite.allow_network_access,
-        docker_image=mutation_test_suite.sandbox_docker_image.tag)
+                                   submission: ag_models.Submission,
+                                   *, sandbox_pool: Optional[SandboxPool] = None):
+    environment_variables = {
+        'usernames': ' '.join(submission.group.member_names)
+    }
+    if sandbox_pool is None:
+        sandbox_pool = get_sandbox_pool()
+    if sandbox_pool is not None:
+        sandbox_context = sandbox_pool.lease(
+            environment_variables=environment_variables,
+            allow_network_access=mutation_test_suite.allow_network_access,
+            docker_image=mutation_test_suite.sandbox_docker_image.tag)
+    else:
+        sandbox_context = AutograderSandbox(
+            name='submission{}-suite{}-{}'.format(
+                submission.pk, mutation_test_suite.pk, uuid.uuid4().hex),
+            environment_variables=environment_variables,
+            allow_network_access=mutation_test_suite.allow_network_access,
+            docker_image=mutation_test_suite.sandbox_docker_image.tag)
     print(mutation_test_suite.sandbox_docker_image.to_dict())
-    print(sandbox.docker_image)
-    with sandbox:
+    with sandbox_context as sandbox:
+        print(sandbox.name, sandbox.docker_image)
         add_files_to_sandbox(sandbox, mutation_test_suite, submission)
 
         if mutation_test_suite.use_setup_command:
@@ -89,19 +106,29 @@ def grade_mutation_test_suite_impl(mutation_test_suite: ag_models.MutationTestSu
             discarded_tests = student_tests[mutation_test_suite.max_num_student_tests:]
             student_tests = student_tests[:mutation_test_suite.max_num_student_tests]
 
+        if mutation_test_suite.run_student_tests_in_parallel:
+            max_parallelism = max(settings.MUTATION_TEST_MAX_PARALLELISM, 1)
+        else:
+            max_parallelism = 1
+
         valid_tests = []
         invalid_tests = []
         timed_out_tests = []
 
+        validity_cmd = mutation_test_suite.student_test_validity_check_command
         validity_check_stdout = tempfile.TemporaryFile()
         validity_check_stderr = tempfile.TemporaryFile()
-        for test in student_tests:
-            validity_cmd = mutation_test_suite.student_test_validity_check_command
-            concrete_cmd = validity_cmd.cmd.replace(
-                ag_models.MutationTestSuite.STUDENT_TEST_NAME_PLACEHOLDER, test)
-
-            validity_run_result = run_ag_command(validity_cmd, sandbox,
-                                                 cmd_str_override=concrete_cmd)
+        validity_run_results = _run_in_order(
+            (
+                functools.partial(
+                    run_ag_command, validity_cmd, sandbox,
+                    cmd_str_override=validity_cmd.cmd.replace(
+                        ag_models.MutationTestSuite.STUDENT_TEST_NAME_PLACEHOLDER, test))
+                for test in student_tests
+            ),
+            max_parallelism=max_parallelism
+        )
+        for test, validity_run_result in zip(student_tests, validity_run_results):
             line = '\n------ {} ------\n'.format(test).encode()
             validity_check_stdout.write(line)
             validity_check_stderr.write(line)
@@ -120,24 +147,17 @@ def grade_mutation_test_suite_impl(mutation_test_suite: ag_models.MutationTestSu
 
         buggy_impls_stdout = tempfile.TemporaryFile()
         buggy_impls_stderr = tempfile.TemporaryFile()
-        for bug in mutation_test_suite.buggy_impl_names:
-            for valid_test in valid_tests:
-                grade_cmd = mutation_test_suite.grade_buggy_impl_command
-                concrete_cmd = grade_cmd.cmd.replace(
-                    ag_models.MutationTestSuite.STUDENT_TEST_NAME_PLACEHOLDER, valid_test
-                ).replace(ag_models.MutationTestSuite.BUGGY_IMPL_NAME_PLACEHOLDER, bug)
-
-                buggy_impl_run_result = run_ag_command(grade_cmd, sandbox,
-                                                       cmd_str_override=concrete_cmd)
-                line = '\n----- Bug "{}" with Test "{}" -----\n'.format(bug, valid_test).encode()
-                buggy_impls_stdout.write(line)
-                buggy_impls_stderr.write(line)
-                shutil.copyfileobj(buggy_impl_run_result.stdout, buggy_impls_stdout)
-                shutil.copyfileobj(buggy_impl_run_result.stderr, buggy_impls_stderr)
-
-                if buggy_impl_run_result.return_code != 0:
-                    exposed_bugs.append(bug)
-                    break
+        bug_runner = _BuggyImplRunner(mutation_test_suite, sandbox, valid_tests)
+        for bug, valid_test, buggy_impl_run_result in bug_runner.run(
+                max_parallelism=max_parallelism):
+            line = '\n----- Bug "{}" with Test "{}" -----\n'.format(bug, valid_test).encode()
+            buggy_impls_stdout.write(line)
+            buggy_impls_stderr.write(line)
+            shutil.copyfileobj(buggy_impl_run_result.stdout, buggy_impls_stdout)
+            shutil.copyfileobj(buggy_impl_run_result.stderr, buggy_impls_stderr)
+
+            if buggy_impl_run_result.return_code != 0:
+                exposed_bugs.append(bug)
 
         _save_results(mutation_test_suite, submission,
                       setup_run_result,
@@ -149,6 +169,113 @@ def grade_mutation_test_suite_impl(mutation_test_suite: ag_models.MutationTestSu
                       buggy_impls_stderr=buggy_impls_stderr)
 
 
+class _BuggyImplRunner:
+    """
+    Runs the buggy implementation command for each (bug, valid test)
+    pair of a mutation test suite. A bug's remaining pairs are skipped
+    as soon as one of its tests exposes it.
+    """
+
+    def __init__(self, mutation_test_suite: ag_models.MutationTestSuite,
+                 sandbox: AutograderSandbox,
+                 valid_tests: List[str]):
+        self._mutation_test_suite = mutation_test_suite
+        self._sandbox = sandbox
+        self._valid_tests = valid_tests
+
+        # Maps bug names to the index (in valid_tests) of the earliest
+        # test known to expose that bug. Updated by worker threads.
+        self._exposed_by = {}  # type: Dict[str, int]
+        self._lock = threading.Lock()
+
+    def run(self, *, max_parallelism: int) -> Iterator[Tuple[str, str, CompletedCommand]]:
+        """
+        Yields (bug, test, run result) tuples in the same order as
+        running the pairs one at a time would: bugs in the order they
+        are listed in the suite, and each bug's tests in order up to
+        and including the first test that exposes the bug. Up to
+        max_parallelism pairs are run at a time.
+        """
+        pairs = [
+            (bug, test_index)
+            for bug in self._mutation_test_suite.buggy_impl_names
+            for test_index in range(len(self._valid_tests))
+        ]
+        # Pairs are looked up lazily so that the pairs of bugs that
+        # have already been exposed aren't started.
+        run_results = _run_in_order(
+            (functools.partial(self._run_pair, bug, test_index)
+             for bug, test_index in pairs
+             if not self._is_exposed_before(bug, test_index)),
+            max_parallelism=max_parallelism
+        )
+
+        finished_bugs = set()
+        for run_result in run_results:
+            if run_result is None:
+                continue
+
+            bug, test_index, buggy_impl_run_result = run_result
+            if bug in finished_bugs:
+                # The bug was exposed by an earlier test while this
+                # pair was already running.
+                continue
+
+            yield bug, self._valid_tests[test_index], buggy_impl_run_result
+
+            if buggy_impl_run_result.return_code != 0:
+                finished_bugs.add(bug)
+
+    def _run_pair(self, bug: str, test_index: int) -> Optional[
+            Tuple[str, int, CompletedCommand]]:
+        if self._is_exposed_before(bug, test_index):
+            return None
+
+        grade_cmd = self._mutation_test_suite.grade_buggy_impl_command
+        concrete_cmd = grade_cmd.cmd.replace(
+            ag_models.MutationTestSuite.STUDENT_TEST_NAME_PLACEHOLDER,
+            self._valid_tests[test_index]
+        ).replace(ag_models.MutationTestSuite.BUGGY_IMPL_NAME_PLACEHOLDER, bug)
+
+        run_result = run_ag_command(grade_cmd, self._sandbox, cmd_str_override=concrete_cmd)
+        if run_result.return_code != 0:
+            with self._lock:
+                self._exposed_by[bug] = min(self._exposed_by.get(bug, test_index), test_index)
+
+        return bug, test_index, run_result
+
+    def _is_exposed_before(self, bug: str, test_index: int) -> bool:
+        with self._lock:
+            return bug in self._exposed_by and self._exposed_by[bug] < test_index
+
+
+_T = TypeVar('_T')
+
+
+def _run_in_order(funcs: Iterable[Callable[[], _T]], *, max_parallelism: int) -> Iterator[_T]:
+    """
+    Calls each function in funcs and yields the return values in the
+    same order as funcs. When max_parallelism is greater than 1, up to
+    that many functions are called at a time on worker threads. funcs
+    is consumed lazily, and only a bounded number of return values are
+    held at once, since each holds open output files.
+    """
+    if max_parallelism <= 1:
+        for func in funcs:
+            yield func()
+        return
+
+    with ThreadPoolExecutor(max_workers=max_parallelism) as executor:
+        pending = collections.deque()  # type: Deque[Future]
+        for func in funcs:
+            pending.append(executor.submit(func))
+            if len(pending) >= max_parallelism * 2:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
 @retry_should_recover
 def _save_results(mutation_test_suite: ag_models.MutationTestSuite,
                   submission: ag_models.Submission,
@@ -185,11 +312,8 @@ def _save_results(mutation_test_suite: ag_models.MutationTestSuite,
                     stderr_truncated=setup_run_result.stderr_truncated
                 )  # type: ag_models.AGCommandResult
 
-                with open(setup_result.stdout_filename, 'wb') as f:
-                    shutil.copyfileobj(setup_run_result.stdout, f)
-
-                with open(setup_result.stderr_filename, 'wb') as f:
-                    shutil.copyfileobj(setup_run_result.stderr, f)
+                write_output(setup_run_result.stdout, setup_result.stdout_filename)
+                write_output(setup_run_result.stderr, setup_result.stderr_filename)
 
                 result.setup_result = setup_result
                 result.save()
@@ -198,29 +322,25 @@ def _save_results(mutation_test_suite: ag_models.MutationTestSuite,
                 result.get_test_names_result.return_code = get_test_names_run_result.return_code
                 result.get_test_names_result.timed_out = get_test_names_run_result.timed_out
                 result.get_test_names_result.save()
-                with open(result.get_test_names_result.stdout_filename, 'wb') as f:
-                    get_test_names_run_result.stdout.seek(0)
-                    shutil.copyfileobj(get_test_names_run_result.stdout, f)
-                with open(result.get_test_names_result.stderr_filename, 'wb') as f:
-                    get_test_names_run_result.stderr.seek(0)
-                    shutil.copyfileobj(get_test_names_run_result.stderr, f)
+                get_test_names_run_result.stdout.seek(0)
+                write_output(get_test_names_run_result.stdout,
+                             result.get_test_names_result.stdout_filename)
+                get_test_names_run_result.stderr.seek(0)
+                write_output(get_test_names_run_result.stderr,
+                             result.get_test_names_result.stderr_filename)
 
             if validity_check_stdout is not None:
                 validity_check_stdout.seek(0)
-                with open(result.validity_check_stdout_filename, 'wb') as f:
-                    shutil.copyfileobj(validity_check_stdout, f)
+                write_output(validity_check_stdout, result.validity_check_stdout_filename)
             if validity_check_stderr is not None:
                 validity_check_stderr.seek(0)
-                with open(result.validity_check_stderr_filename, 'wb') as f:
-                    shutil.copyfileobj(validity_check_stderr, f)
+                write_output(validity_check_stderr, result.validity_check_stderr_filename)
             if buggy_impls_stdout is not None:
                 buggy_impls_stdout.seek(0)
-                with open(result.grade_buggy_impls_stdout_filename, 'wb') as f:
-                    shutil.copyfileobj(buggy_impls_stdout, f)
+                write_output(buggy_impls_stdout, result.grade_buggy_impls_stdout_filename)
             if buggy_impls_stderr is not None:
                 buggy_impls_stderr.seek(0)
-                with open(result.grade_buggy_impls_stderr_filename, 'wb') as f:
-                    shutil.copyfileobj(buggy_impls_stderr, f)
+                write_output(buggy_impls_stderr, result.grade_buggy_impls_stderr_filename)
     except IntegrityError:
         # The mutation test suite has likely been deleted, so do nothing
         pass
@@ -10,6 +10,8 @@ from django.utils import timezone
 
 import autograder.core.models as ag_models
 from autograder.core.caching import delete_cached_submission_result
+from autograder.core.models.get_ultimate_submissions import refresh_ultimate_submission
+from autograder.core.submission_scores import update_submission_scores
 from autograder.utils.retry import retry_should_recover
 
 from .grade_mutation_test_suite import (
@@ -18,6 +20,7 @@ from .grade_ag_test import (
     grade_ag_test_suite_impl,
     grade_deferred_ag_test_suite
 )
+from .denormalized_results_buffer import DenormalizedAGTestResultsBuffer
 from .utils import mark_submission_as_error, load_queryset_with_retry
 from autograder.core.submission_email_receipts import send_submission_score_summary_email
 
@@ -31,6 +34,11 @@ class SubmissionGrader:
         self._project = None
         self._group = None
 
+        self._denormalized_results_buffer = DenormalizedAGTestResultsBuffer(
+            submission_pk,
+            max_buffered=settings.DENORMALIZED_RESULTS_MAX_BUFFERED,
+            max_delay=settings.DENORMALIZED_RESULTS_MAX_FLUSH_DELAY)
+
     # Note: Avoid aliasing the object this returns, as the object
     # is replaced at certain points in the grading process.
     @property
@@ -61,6 +69,7 @@ class SubmissionGrader:
                 self.mark_submission_as_rejected()
                 return
 
+            self.refresh_denormalized_ag_test_results()
             self.send_non_deferred_tests_finished_email()
             self.grade_deferred_suites()
         except Exception as e:
@@ -103,13 +112,25 @@ class SubmissionGrader:
             self.grade_mutation_test_suite(suite)
 
     def grade_ag_test_suite(self, suite: ag_models.AGTestSuite) -> None:
-        grade_ag_test_suite_impl(
-            suite,
-            self.submission,
-            self.group,
-            on_suite_setup_finished=self.save_denormalized_ag_test_suite_result,
-            on_test_case_finished=self.save_denormalized_ag_test_case_result,
-        )
+        try:
+            grade_ag_test_suite_impl(
+                suite,
+                self.submission,
+                self.group,
+                on_suite_setup_finished=self.save_denormalized_ag_test_suite_result,
+                on_test_case_finished=self.save_denormalized_ag_test_case_result,
+            )
+        except Exception:
+            # Write the results of the tests that finished, without
+            # letting an error doing so hide the grading error.
+            try:
+                self._denormalized_results_buffer.flush()
+            except Exception:
+                print('Error writing denormalized test results')
+                traceback.print_exc()
+            raise
+
+        self._denormalized_results_buffer.flush()
 
     @retry_should_recover
     def mark_submission_as_rejected(self):
@@ -121,38 +142,39 @@ class SubmissionGrader:
 
             self.submission.is_bonus_submission = False
             self.submission.status = ag_models.Submission.GradingStatus.rejected
-            self.submission.save()
+            self.submission.save(update_fields=['is_bonus_submission', 'status'])
 
     def grade_mutation_test_suite(self, suite: ag_models.MutationTestSuite) -> None:
         grade_mutation_test_suite_impl(suite, self.submission)
 
-    @retry_should_recover
+    # The denormalized results are written to the database in batches
+    # (see DenormalizedAGTestResultsBuffer). self.submission is kept
+    # up to date in memory.
     def save_denormalized_ag_test_suite_result(
         self,
         ag_test_suite_result: ag_models.AGTestSuiteResult
     ) -> None:
-        with transaction.atomic():
-            submission = Submission.objects.select_for_update().get(pk=self.submission.pk)
-            key = str(ag_test_suite_result.ag_test_suite_id)
-            submission.denormalized_ag_test_results[key] = ag_test_suite_result.to_dict()
-            submission.save()
-            self._submission = submission
+        suite_result_data = ag_test_suite_result.to_dict()
+        self.submission.denormalized_ag_test_results[
+            str(ag_test_suite_result.ag_test_suite_id)] = suite_result_data
+        self._denormalized_results_buffer.set_ag_test_suite_result(
+            ag_test_suite_result.ag_test_suite_id, suite_result_data)
 
-    @retry_should_recover
     def save_denormalized_ag_test_case_result(
         self,
         ag_test_case_result: ag_models.AGTestCaseResult
     ) -> None:
-        with transaction.atomic():
-            submission = Submission.objects.select_for_update().get(pk=self.submission.pk)
-            print(submission.denormalized_ag_test_results)
-            ag_test_case = ag_test_case_result.ag_test_case
-            submission.denormalized_ag_test_results[
-                str(ag_test_case.ag_test_suite_id)
-            ]['ag_test_case_results'][str(ag_test_case.pk)] = ag_test_case_result.to_dict()
+        ag_test_case = ag_test_case_result.ag_test_case
+        case_result_data = ag_test_case_result.to_dict()
+        self.submission.denormalized_ag_test_results[
+            str(ag_test_case.ag_test_suite_id)
+        ]['ag_test_case_results'][str(ag_test_case.pk)] = case_result_data
+        self._denormalized_results_buffer.set_ag_test_case_result(
+            ag_test_case.ag_test_suite_id, ag_test_case.pk, case_result_data)
 
-            submission.save()
-            self._submission = submission
+    @retry_should_recover
+    def refresh_denormalized_ag_test_results(self) -> None:
+        self.submission.refresh_from_db(fields=['denormalized_ag_test_results'])
 
     def send_non_deferred_tests_finished_email(self) -> None:
         if self.project.send_email_on_non_deferred_tests_finished:
@@ -180,6 +202,17 @@ class SubmissionGrader:
             status=ag_models.Submission.GradingStatus.waiting_for_deferred,
             non_deferred_grading_end_time=timezone.now()
         )
+        self.update_median_grading_time()
+
+    def update_median_grading_time(self):
+        # The queue routing info is an optimization, so we don't want
+        # a failure here to keep the submission from being graded.
+        try:
+            retry_should_recover(ag_models.GradingQueueRoute.update_median_grading_time)(
+                self.project.pk)
+        except Exception:
+            print('Error updating median grading time for project', self.project.pk)
+            traceback.print_exc()
 
     def get_deferred_suite_task_signatures(self):
         deferred_ag_test_suites = load_queryset_with_retry(
@@ -241,3 +274,5 @@ def _mark_submission_as_finished_impl(submission_pk):
     submission = ag_models.Submission.objects.select_related(
         'group__project').get(pk=submission_pk)
     delete_cached_submission_result(submission)
+    update_submission_scores(submission.group.project, [submission_pk])
+    refresh_ultimate_submission(submission.group)
@@ -1,50 +1,136 @@
+import traceback
+from typing import Dict, List
+
 import celery
 from django.conf import settings
 from django.db import transaction
-from django.db.models import Sum, F
 
 import autograder.core.models as ag_models
-from .grade_submission import grade_submission
+from autograder.core.models.submission_queue_index import (
+    add_to_queue_index, prune_queue_indexes, remove_from_queue_index)
+from autograder.utils.retry import retry_should_recover
 
+from .grade_submission import grade_submission
 
-def _estimated_grading_time(project_pk: int):
-    ag_test_time_max = sum(
-        command.time_limit for command in
-        ag_models.AGTestCommand.objects.filter(
-            ag_test_case__ag_test_suite__project=project_pk
-        ).exclude(ag_test_case__ag_test_suite__deferred=True)
-    )
-
-    mutation_test_suite_time_max = sum(
-        suite.student_test_validity_check_command.time_limit * suite.max_num_student_tests
-        for suite in
-        ag_models.MutationTestSuite.objects.filter(project=project_pk).exclude(deferred=True)
-    )
 
-    return ag_test_time_max + mutation_test_suite_time_max
+def get_submission_queue_name(project_pk: int) -> str:
+    """
+    Returns the name of the queue that submissions to the given project
+    should be sent to for grading.
+    """
+    queue_class = ag_models.GradingQueueRoute.get_queue_class(project_pk)
+    if queue_class == ag_models.GradingQueueClass.slow:
+        return settings.SUBMISSION_QUEUE_TMPL.format(project_pk)
+
+    return settings.FAST_QUEUE_TMPL.format(project_pk)
+
+
+def queue_submission_on_commit(submission: ag_models.Submission) -> None:
+    """
+    Queues the given submission for grading once the current
+    transaction is committed.
+    """
+    submission_pk = submission.pk
+    project_pk = submission.project_id
+
+    def _queue_submission():
+        # Errors here would otherwise propagate out of the view that
+        # created the submission. If we fail to queue the submission
+        # here, queue_submissions will pick it up.
+        try:
+            queue_submission(submission_pk, project_pk)
+        except Exception:
+            print('Error queueing submission{}'.format(submission_pk))
+            traceback.print_exc()
+
+    transaction.on_commit(_queue_submission)
+
+
+def queue_submission(submission_pk: int, project_pk: int) -> bool:
+    """
+    Marks the submission with the given pk as queued and sends it to
+    be graded if its status is "received".
+    Returns True if the submission was queued.
+    """
+    num_updated = ag_models.Submission.objects.filter(
+        pk=submission_pk,
+        status=ag_models.Submission.GradingStatus.received
+    ).update(status=ag_models.Submission.GradingStatus.queued)
+    if num_updated == 0:
+        # The submission was already queued or was removed from the queue.
+        return False
+
+    add_to_queue_index(project_pk, [submission_pk])
+    try:
+        print('adding submission{} to queue for grading'.format(submission_pk))
+        grade_submission.apply_async(
+            [submission_pk], queue=get_submission_queue_name(project_pk))
+    except Exception:
+        # Put the submission back so that queue_submissions will retry it.
+        _mark_queued_submission_as_received(submission_pk, project_pk)
+        raise
+
+    return True
+
+
+@retry_should_recover
+def _mark_queued_submission_as_received(submission_pk: int, project_pk: int) -> None:
+    ag_models.Submission.objects.filter(
+        pk=submission_pk,
+        status=ag_models.Submission.GradingStatus.queued
+    ).update(status=ag_models.Submission.GradingStatus.received)
+    remove_from_queue_index(project_pk, [submission_pk])
 
 
 @celery.shared_task
 def queue_submissions():
-    with transaction.atomic():
-        to_queue = list(ag_models.Submission.objects.select_for_update().filter(
-            status=ag_models.Submission.GradingStatus.received).reverse())
-        print(to_queue)
-
-        for submission in to_queue:
-            print('adding submission{} to queue for grading'.format(submission.pk))
-            submission.status = ag_models.Submission.GradingStatus.queued
-            submission.save()
-
-            if _estimated_grading_time(submission.project_id) / 60 > 10:
-                queue_name_tmpl = settings.SUBMISSION_QUEUE_TMPL.format(submission.project_id)
-            else:
-                queue_name_tmpl = settings.FAST_QUEUE_TMPL.format(submission.project_id)
+    """
+    Queues any submissions that still have status "received".
+    Submissions are normally queued as soon as they are created (see
+    queue_submission_on_commit), so this task picks up stragglers, e.g.
+    submissions whose grading task couldn't be sent to the broker.
+    It also removes submissions that are no longer queued from the
+    queue indexes (see autograder.core.models.submission_queue_index).
+    """
+    try:
+        prune_queue_indexes()
+    except Exception:
+        print('Error pruning submission queue indexes')
+        traceback.print_exc()
 
+    with transaction.atomic():
+        # Rows that are locked are in the middle of being queued.
+        to_queue = list(
+            ag_models.Submission.objects.select_for_update(
+                skip_locked=True
+            ).filter(
+                status=ag_models.Submission.GradingStatus.received
+            ).order_by('pk').values_list('pk', 'project_id')
+        )
+        if not to_queue:
+            return
+
+        ag_models.Submission.objects.filter(
+            pk__in=[submission_pk for submission_pk, project_pk in to_queue]
+        ).update(status=ag_models.Submission.GradingStatus.queued)
+
+    pks_by_project = {}  # type: Dict[int, List[int]]
+    for submission_pk, project_pk in to_queue:
+        pks_by_project.setdefault(project_pk, []).append(submission_pk)
+    for project_pk, submission_pks in pks_by_project.items():
+        add_to_queue_index(project_pk, submission_pks)
+
+    for submission_pk, project_pk in to_queue:
+        print('adding submission{} to queue for grading'.format(submission_pk))
+        try:
             grade_submission.apply_async(
-                [submission.pk], queue=queue_name_tmpl.format(submission.project_id))
+                [submission_pk], queue=get_submission_queue_name(project_pk))
+        except Exception:
+            print('Error queueing submission{}'.format(submission_pk))
+            traceback.print_exc()
+            _mark_queued_submission_as_received(submission_pk, project_pk)
 
-        print('queued {} submissions'.format(to_queue))
+    print('queued {} submissions'.format(len(to_queue)))
 
 
 @celery.shared_task(acks_late=True, autoretry_for=(Exception,), default_retry_delay=5)
@@ -1,32 +1,153 @@
 from autograder.core.submission_feedback import update_denormalized_ag_test_results
+import contextlib
 import traceback
+from typing import Iterator, List, Optional, Set, Tuple
 
 import celery
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
-from django.db.models import F, Value
+from django.db.models import Value
 from django.db.models.functions import Concat
 
 import autograder.core.models as ag_models
-from autograder.core.caching import clear_submission_results_cache
+from autograder.core.caching import clear_submission_results_cache, delete_cached_submission_result
+from autograder.core.models.get_ultimate_submissions import refresh_ultimate_submission
+from autograder.core.models.rerun_submissions_task import (
+    RERUN_TASK_CACHE_TIMEOUT, num_completed_subtasks_counter, rerun_task_is_cancelled)
+from autograder.core.submission_scores import update_submission_scores
 from autograder.grading_tasks.tasks.grade_mutation_test_suite import grade_mutation_test_suite_impl
 from autograder.grading_tasks.tasks.utils import load_queryset_with_retry
 from autograder.utils.retry import retry_should_recover
 
 from .exceptions import RerunCancelled
 from .grade_ag_test import grade_ag_test_suite_impl
+from .sandbox_pool import SandboxPool, get_sandbox_pool
 
 # See autograder/rest_api/tests/test_views/test_rerun_submissions_task_views.py
 # for tests that cover this module.
 
 
+def split_into_rerun_batches(submission_pks: List[int]) -> List[List[int]]:
+    """
+    Splits submission_pks into batches of at most
+    settings.RERUN_BATCH_SIZE submissions, each of which should be
+    rerun by one rerun_submissions_batch task.
+    """
+    batch_size = max(settings.RERUN_BATCH_SIZE, 1)
+    return [
+        submission_pks[i:i + batch_size] for i in range(0, len(submission_pks), batch_size)
+    ]
+
+
+def start_rerun_batches(rerun_task_pk: int, num_batches: int) -> None:
+    """
+    Records that num_batches rerun_submissions_batch tasks are about to
+    be queued for the given rerun task. Must be called before the
+    batches are queued.
+    """
+    cache.set(_num_batches_remaining_key(rerun_task_pk), num_batches,
+              timeout=RERUN_TASK_CACHE_TIMEOUT)
+
+
+@celery.shared_task(acks_late=True)
+def rerun_submissions_batch(submission_pks: List[int], rerun_task_pk: int) -> None:
+    """
+    Reruns the given submissions one after another, reusing one
+    sandbox per docker image across the whole batch. Sandboxes are
+    reset between leases, and sandboxes that can't be reset aren't
+    reused (see sandbox_pool.py). When the last batch of the rerun task
+    finishes, the project's cached submission results are invalidated.
+    """
+    try:
+        with _batch_sandbox_pool(rerun_task_pk) as sandbox_pool:
+            for submission_pk in submission_pks:
+                if rerun_task_is_cancelled(rerun_task_pk):
+                    break
+
+                rerunner = SubmissionRerunner(
+                    submission_pk, rerun_task_pk, sandbox_pool=sandbox_pool)
+                rerunner.rerun_submission()
+    finally:
+        _finish_rerun_batch(rerun_task_pk)
+
+
+# Reruns used to be queued as one task per submission. This task is
+# kept so that any such tasks still in the queue can finish.
 @celery.shared_task(acks_late=True)
 def rerun_submission(submission_pk: int, rerun_task_pk: int) -> None:
-    rerunner = SubmissionRerunner(submission_pk, rerun_task_pk)
-    return rerunner.rerun_submission()
+    rerun_submissions_batch([submission_pk], rerun_task_pk)
+
+
+@contextlib.contextmanager
+def _batch_sandbox_pool(rerun_task_pk: int) -> Iterator[SandboxPool]:
+    sandbox_pool = get_sandbox_pool()
+    if sandbox_pool is not None:
+        yield sandbox_pool
+        return
+
+    # Sandbox pooling is disabled for this worker, so we use a pool
+    # that only lives as long as the batch. Suites are graded one at a
+    # time, so the pool never holds more than one idle sandbox for
+    # each (docker image, network access) combination.
+    sandbox_pool = SandboxPool(
+        max(len(_load_sandbox_keys(rerun_task_pk)), 1),
+        max_idle_time=settings.SANDBOX_POOL_MAX_IDLE_TIME,
+        max_uses=settings.SANDBOX_POOL_MAX_USES)
+    try:
+        yield sandbox_pool
+    finally:
+        print('Rerun batch sandbox pool stats:', sandbox_pool.stats.to_dict())
+        sandbox_pool.drain()
+
+
+@retry_should_recover
+def _load_sandbox_keys(rerun_task_pk: int) -> Set[Tuple[str, bool]]:
+    project_pk = _load_rerun_task_project_pk(rerun_task_pk)
+    keys = set(ag_models.AGTestSuite.objects.filter(
+        project=project_pk
+    ).values_list('sandbox_docker_image__tag', 'allow_network_access'))
+    keys.update(ag_models.MutationTestSuite.objects.filter(
+        project=project_pk
+    ).values_list('sandbox_docker_image__tag', 'allow_network_access'))
+    return keys
+
+
+def _finish_rerun_batch(rerun_task_pk: int) -> None:
+    _flush_rerun_progress(rerun_task_pk)
+
+    try:
+        num_remaining = cache.decr(_num_batches_remaining_key(rerun_task_pk))
+    except ValueError:
+        # The count expired, was evicted, or was never recorded (e.g.,
+        # for a rerun_submission task). Invalidating the results
+        # cache more than once is harmless, so we err on that side.
+        num_remaining = 0
+
+    if num_remaining > 0:
+        return
+
+    _clear_cached_submission_results_impl(_load_rerun_task_project_pk(rerun_task_pk))
+
+
+@retry_should_recover
+def _flush_rerun_progress(rerun_task_pk: int) -> None:
+    num_completed_subtasks_counter(rerun_task_pk).flush()
+
+
+@retry_should_recover
+def _load_rerun_task_project_pk(rerun_task_pk: int) -> int:
+    return ag_models.RerunSubmissionsTask.objects.values_list(
+        'project', flat=True).get(pk=rerun_task_pk)
+
+
+def _num_batches_remaining_key(rerun_task_pk: int) -> str:
+    return f'rerun_task_{rerun_task_pk}_num_batches_remaining'
 
 
 class SubmissionRerunner:
-    def __init__(self, submission_pk: int, rerun_task_pk: int):
+    def __init__(self, submission_pk: int, rerun_task_pk: int, *,
+                 sandbox_pool: Optional[SandboxPool] = None):
         self._submission_pk = submission_pk
         self._submission = None
         self._group = None
@@ -35,6 +156,8 @@ class SubmissionRerunner:
         self._rerun_task_pk = rerun_task_pk
         self._rerun_task = None
 
+        self._sandbox_pool = sandbox_pool
+
     @property
     def submission(self) -> ag_models.Submission:
         assert self._submission is not None
@@ -102,6 +225,7 @@ class SubmissionRerunner:
                 self.submission,
                 self.group,
                 *self.rerun_task.ag_test_suite_data.get(str(suite.pk), []),
+                sandbox_pool=self._sandbox_pool,
             )
             self.update_rerun_progress()
             self._update_denormalized_ag_test_results()
@@ -117,39 +241,45 @@ class SubmissionRerunner:
 
         if (suite.pk in self.rerun_task.mutation_suite_pks
                 or self.rerun_task.rerun_all_mutation_test_suites):
-            grade_mutation_test_suite_impl(suite, self.submission)
+            grade_mutation_test_suite_impl(
+                suite, self.submission, sandbox_pool=self._sandbox_pool)
             self.update_rerun_progress()
 
     @retry_should_recover
     def rerun_is_cancelled(self) -> bool:
-        self.rerun_task.refresh_from_db()
-        return self.rerun_task.is_cancelled
+        # The task is loaded from the database once per submission, and
+        # cancelling it sets a flag in the cache that we check before
+        # every suite.
+        return self.rerun_task.is_cancelled or rerun_task_is_cancelled(self._rerun_task_pk)
 
-    @retry_should_recover
     def update_rerun_progress(self) -> None:
-        with transaction.atomic():
-            ag_models.RerunSubmissionsTask.objects.select_for_update().filter(
-                pk=self._rerun_task_pk
-            ).update(num_completed_subtasks=F('num_completed_subtasks') + 1)
+        # Incremented atomically in the cache, so rerun workers don't
+        # have to wait on each other for the rerun task's row.
+        num_completed_subtasks_counter(self._rerun_task_pk).increment()
 
     def mark_as_finished(self) -> None:
         if (self.rerun_task.rerun_all_ag_test_suites
                 and self.rerun_task.rerun_all_mutation_test_suites):
             _mark_submission_as_finished_after_rerun(self._submission_pk)
 
-        _clear_cached_submission_results_impl(self.project.pk)
+        # The cached results of the whole project are invalidated once
+        # all of the rerun task's batches have finished.
+        _delete_cached_submission_result_impl(self.submission)
+        _update_submission_scores_impl(self.project, self._submission_pk)
+        _refresh_ultimate_submission_impl(self.group)
 
     @retry_should_recover
     def record_submission_grading_error(self, error_msg: str) -> None:
-        with transaction.atomic():
-            ag_models.RerunSubmissionsTask.objects.select_for_update().filter(
-                pk=self._rerun_task_pk
-            ).update(
-                error_msg=Concat(
-                    'error_msg',
-                    Value(f'Error rerunning submission {self._submission_pk}\n' + error_msg)
-                )
+        # The UPDATE appends to error_msg atomically, so the task row
+        # doesn't need to be locked first.
+        ag_models.RerunSubmissionsTask.objects.filter(
+            pk=self._rerun_task_pk
+        ).update(
+            error_msg=Concat(
+                'error_msg',
+                Value(f'Error rerunning submission {self._submission_pk}\n' + error_msg)
             )
+        )
 
 
 @retry_should_recover
@@ -166,3 +296,18 @@ def _mark_submission_as_finished_after_rerun(submission_pk: int):
 @retry_should_recover
 def _clear_cached_submission_results_impl(project_pk: int):
     clear_submission_results_cache(project_pk)
+
+
+@retry_should_recover
+def _delete_cached_submission_result_impl(submission: ag_models.Submission):
+    delete_cached_submission_result(submission)
+
+
+@retry_should_recover
+def _update_submission_scores_impl(project: ag_models.Project, submission_pk: int):
+    update_submission_scores(project, [submission_pk])
+
+
+@retry_should_recover
+def _refresh_ultimate_submission_impl(group: ag_models.Group):
+    refresh_ultimate_submission(group)
@@ -0,0 +1,389 @@
+"""
+A per-worker-process pool of started sandboxes.
+
+Creating, starting, and destroying a docker container for every suite
+we grade can take longer than running the suite's commands. When
+enabled (see SANDBOX_POOL_SIZE in the settings), grading tasks lease a
+started sandbox from this pool and return it when they're done.
+
+Before a returned sandbox is made available again, any processes left
+running by the sandbox user are killed, everything the sandbox user
+owns outside of its home directory is deleted, and the home directory
+is restored from an archive taken when the container was created.
+That's only enough to undo what a submission did if the sandbox user
+can't modify any files it doesn't own, so when a container is created
+we look for files and directories outside of the home directory that
+the sandbox user owns or can write to (other than sticky directories
+like /tmp). Sandboxes created from images that have any are never
+reused. Likewise, a sandbox whose reset fails is destroyed.
+
+Sandboxes are keyed by docker image tag and whether network access is
+allowed, since neither can be changed once a container is created.
+"""
+
+import atexit
+import subprocess
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from autograder_sandbox import SANDBOX_USERNAME, AutograderSandbox
+from autograder_sandbox.autograder_sandbox import SANDBOX_HOME_DIR_NAME, CompletedCommand
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+
+_PoolKey = Tuple[str, bool]
+
+# A root-only directory in the container that holds the archive of the
+# sandbox user's home directory.
+_SNAPSHOT_DIR = '/var/lib/ag_sandbox_pool'
+_HOME_ARCHIVE = _SNAPSHOT_DIR + '/home.tar'
+
+# The start of a find(1) command that searches the container's
+# filesystem outside of the sandbox user's home directory.
+_FIND_OUTSIDE_HOME = (
+    'find / /dev/shm \\( -path /proc -o -path /sys -o -path /dev '
+    '-o -path {home} -o -path {snapshot_dir} \\) -prune -o'
+).format(home=SANDBOX_HOME_DIR_NAME, snapshot_dir=_SNAPSHOT_DIR)
+
+# Archives the sandbox user's home directory, then prints the paths
+# outside of it that a reset can't restore and exits with status 1 if
+# there are any.
+_SNAPSHOT_CMD = '''
+set -eu -o pipefail
+mkdir -m 700 {snapshot_dir}
+tar -cpf {home_archive} -C {home} .
+unresettable="$({find} \\( -user {user} -o \\( -type f -o -type d \\) \\
+    \\( -perm -o+w -o -group {user} -perm -g+w \\) ! \\( -type d -perm -1000 \\) \\) -print)"
+if [ -n "$unresettable" ]; then
+    echo "$unresettable"
+    exit 1
+fi
+'''.format(snapshot_dir=_SNAPSHOT_DIR, home_archive=_HOME_ARCHIVE, home=SANDBOX_HOME_DIR_NAME,
+           find=_FIND_OUTSIDE_HOME, user=SANDBOX_USERNAME)
+_SNAPSHOT_TIMEOUT = 60
+
+_RESET_CMD = '''
+set -eu -o pipefail
+pkill -KILL -u {user} || true
+for _ in $(seq 100); do
+    pgrep -u {user} > /dev/null || break
+    sleep 0.1
+done
+if pgrep -u {user} > /dev/null; then
+    echo 'Processes owned by {user} are still running' >&2
+    exit 1
+fi
+
+{find} -user {user} -print0 | xargs -0 -r rm -rf --
+find {home} -mindepth 1 -delete
+tar -xpf {home_archive} -C {home}
+
+if [ -n "$({find} -user {user} -print -quit)" ]; then
+    echo 'Files owned by {user} could not be deleted' >&2
+    exit 1
+fi
+'''.format(user=SANDBOX_USERNAME, home=SANDBOX_HOME_DIR_NAME, home_archive=_HOME_ARCHIVE,
+           find=_FIND_OUTSIDE_HOME)
+_RESET_TIMEOUT = 60
+
+
+class PooledSandbox(AutograderSandbox):
+    """
+    An AutograderSandbox that can be leased to more than one submission.
+
+    Environment variables passed to the constructor of
+    AutograderSandbox are fixed when the container is created. Since
+    some of our environment variables (e.g., "usernames") differ from
+    one lease to the next, they are instead applied to each command
+    with env(1).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lease_environment_variables = {}  # type: Dict[str, str]
+        self.num_leases = 0
+        self.last_returned_at = time.monotonic()
+        # Set to False if the sandbox user can modify files that
+        # _reset_sandbox() can't restore.
+        self.resettable = False
+
+    def run_command(self, args: List[str], *pos_args, **kwargs) -> CompletedCommand:
+        if self.lease_environment_variables:
+            args = ['env'] + [
+                '{}={}'.format(key, value)
+                for key, value in self.lease_environment_variables.items()
+            ] + list(args)
+
+        return super().run_command(args, *pos_args, **kwargs)
+
+
+class SandboxPoolStats:
+    """
+    Counters and cumulative timings (in seconds) for a SandboxPool.
+    """
+
+    def __init__(self):
+        self.num_leases = 0
+        self.num_created = 0
+        self.num_evicted = 0
+        self.num_reset_failures = 0
+        self.num_not_resettable = 0
+
+        self.total_wait_time = 0.0
+        self.total_lease_time = 0.0
+        self.total_reset_time = 0.0
+
+    def to_dict(self) -> Dict[str, object]:
+        return dict(vars(self))
+
+
+class SandboxLease:
+    """
+    A context manager that starts a lease on __enter__ and returns the
+    sandbox to its pool on __exit__.
+    """
+
+    def __init__(self, pool: 'SandboxPool', *,
+                 docker_image: str,
+                 allow_network_access: bool,
+                 environment_variables: Optional[Mapping[str, str]] = None):
+        self._pool = pool
+        self._key = (docker_image, allow_network_access)
+        self._environment_variables = dict(environment_variables or {})
+
+        self._sandbox = None  # type: Optional[PooledSandbox]
+        self._leased_at = None  # type: Optional[float]
+
+    def __enter__(self) -> PooledSandbox:
+        start = time.monotonic()
+        self._sandbox = self._pool._acquire(self._key)
+        self._sandbox.lease_environment_variables = self._environment_variables
+        self._leased_at = time.monotonic()
+
+        with self._pool._lock:
+            self._pool.stats.num_leases += 1
+            self._pool.stats.total_wait_time += self._leased_at - start
+
+        return self._sandbox
+
+    def __exit__(self, exc_type, *args) -> None:
+        assert self._sandbox is not None
+        assert self._leased_at is not None
+
+        with self._pool._lock:
+            self._pool.stats.total_lease_time += time.monotonic() - self._leased_at
+
+        self._sandbox.lease_environment_variables = {}
+        # If something went wrong while the sandbox was leased, we don't
+        # know what state the container is in, so we throw it away.
+        self._pool._release(self._key, self._sandbox, discard=exc_type is not None)
+        self._sandbox = None
+
+
+class SandboxPool:
+    """
+    Holds up to max_size idle, started sandboxes.
+
+    :param max_size: The maximum number of idle sandboxes to keep
+        (across all keys). When the pool is full, the least recently
+        returned sandbox is destroyed.
+    :param max_idle_time: Idle sandboxes that haven't been leased in
+        this many seconds are destroyed.
+    :param max_uses: Sandboxes are destroyed after being leased this
+        many times, in case the reset step misses something.
+    """
+
+    def __init__(self, max_size: int, *, max_idle_time: float, max_uses: int):
+        self.max_size = max_size
+        self.max_idle_time = max_idle_time
+        self.max_uses = max_uses
+        self.stats = SandboxPoolStats()
+
+        # Ordered from least to most recently returned.
+        self._idle = OrderedDict()  # type: OrderedDict[PooledSandbox, _PoolKey]
+        self._lock = threading.Lock()
+
+    def lease(self, *, docker_image: str,
+              allow_network_access: bool,
+              environment_variables: Optional[Mapping[str, str]] = None) -> SandboxLease:
+        return SandboxLease(
+            self,
+            docker_image=docker_image,
+            allow_network_access=allow_network_access,
+            environment_variables=environment_variables)
+
+    @property
+    def num_idle(self) -> int:
+        return len(self._idle)
+
+    def drain(self) -> None:
+        """
+        Destroys all idle sandboxes.
+        """
+        with self._lock:
+            to_destroy = list(self._idle)
+            self._idle.clear()
+
+        for sandbox in to_destroy:
+            self._destroy(sandbox)
+
+    def _acquire(self, key: _PoolKey) -> PooledSandbox:
+        self._evict_expired()
+
+        with self._lock:
+            for sandbox, sandbox_key in reversed(self._idle.items()):
+                if sandbox_key == key:
+                    del self._idle[sandbox]
+                    sandbox.num_leases += 1
+                    return sandbox
+
+        docker_image, allow_network_access = key
+        sandbox = PooledSandbox(
+            name='pooled-sandbox-{}'.format(uuid.uuid4().hex),
+            docker_image=docker_image,
+            allow_network_access=allow_network_access)
+        sandbox.__enter__()
+        sandbox.resettable = _snapshot_sandbox(sandbox)
+        sandbox.num_leases += 1
+        with self._lock:
+            self.stats.num_created += 1
+            if not sandbox.resettable:
+                self.stats.num_not_resettable += 1
+
+        return sandbox
+
+    def _release(self, key: _PoolKey, sandbox: PooledSandbox, *, discard: bool) -> None:
+        if (discard
+                or not sandbox.resettable
+                or self.max_size < 1
+                or sandbox.num_leases >= self.max_uses):
+            self._destroy(sandbox)
+            return
+
+        start = time.monotonic()
+        reset_succeeded = _reset_sandbox(sandbox)
+        with self._lock:
+            self.stats.total_reset_time += time.monotonic() - start
+            if not reset_succeeded:
+                self.stats.num_reset_failures += 1
+
+        if not reset_succeeded:
+            self._destroy(sandbox)
+            return
+
+        sandbox.last_returned_at = time.monotonic()
+        to_evict = []
+        with self._lock:
+            self._idle[sandbox] = key
+            while len(self._idle) > self.max_size:
+                to_evict.append(self._idle.popitem(last=False)[0])
+
+        for evicted in to_evict:
+            self._destroy(evicted)
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                sandbox for sandbox in self._idle
+                if now - sandbox.last_returned_at > self.max_idle_time
+            ]
+            for sandbox in expired:
+                del self._idle[sandbox]
+
+        for sandbox in expired:
+            self._destroy(sandbox)
+
+    def _destroy(self, sandbox: PooledSandbox) -> None:
+        with self._lock:
+            self.stats.num_evicted += 1
+
+        try:
+            sandbox.__exit__()
+        except subprocess.CalledProcessError:
+            # The container is already gone or docker is unhappy.
+            # Either way there's nothing useful left to do with it.
+            print('Error destroying pooled sandbox', sandbox.name)
+            traceback.print_exc()
+
+
+def _snapshot_sandbox(sandbox: PooledSandbox) -> bool:
+    """
+    Archives the home directory of a newly created sandbox so that
+    _reset_sandbox() can restore it. Returns False if the sandbox
+    can't be reset, in which case it must not be reused.
+    """
+    try:
+        result = sandbox.run_command(
+            ['bash', '-c', _SNAPSHOT_CMD], as_root=True, timeout=_SNAPSHOT_TIMEOUT)
+        with result.stdout, result.stderr:
+            if result.return_code == 0 and not result.timed_out:
+                return True
+
+            print('Pooled sandbox {} from image {} will not be reused. '
+                  'Return code: {}, timed out: {}, unresettable paths:\n{}\n{}'.format(
+                      sandbox.name, sandbox.docker_image, result.return_code, result.timed_out,
+                      result.stdout.read().decode(errors='backslashreplace'),
+                      result.stderr.read().decode(errors='backslashreplace')))
+            return False
+    except Exception:
+        print('Error snapshotting pooled sandbox', sandbox.name)
+        traceback.print_exc()
+        return False
+
+
+def _reset_sandbox(sandbox: PooledSandbox) -> bool:
+    """
+    Kills processes started by the sandbox user, deletes the files
+    they own outside of their home directory, and restores the home
+    directory to its state when the sandbox was created. Returns False
+    if the sandbox could not be reset.
+    """
+    try:
+        result = sandbox.run_command(
+            ['bash', '-c', _RESET_CMD], as_root=True, timeout=_RESET_TIMEOUT)
+        with result.stdout, result.stderr:
+            if result.return_code == 0 and not result.timed_out:
+                return True
+
+            print('Error resetting pooled sandbox {} (return code: {}, timed out: {}):\n{}'.format(
+                sandbox.name, result.return_code, result.timed_out,
+                result.stderr.read().decode(errors='backslashreplace')))
+            return False
+    except Exception:
+        print('Error resetting pooled sandbox', sandbox.name)
+        traceback.print_exc()
+        return False
+
+
+_pool = None  # type: Optional[SandboxPool]
+
+
+def get_sandbox_pool() -> Optional[SandboxPool]:
+    """
+    Returns this process's SandboxPool, or None if sandbox pooling is
+    disabled (SANDBOX_POOL_SIZE is 0).
+    """
+    global _pool
+    if settings.SANDBOX_POOL_SIZE < 1:
+        return None
+
+    if _pool is None:
+        _pool = SandboxPool(
+            settings.SANDBOX_POOL_SIZE,
+            max_idle_time=settings.SANDBOX_POOL_MAX_IDLE_TIME,
+            max_uses=settings.SANDBOX_POOL_MAX_USES)
+
+    return _pool
+
+
+@atexit.register
+@worker_process_shutdown.connect
+def _drain_sandbox_pool(*args, **kwargs):
+    if _pool is not None:
+        print('Sandbox pool stats:', _pool.stats.to_dict())
+        _pool.drain()
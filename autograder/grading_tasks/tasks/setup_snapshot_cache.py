@@ -0,0 +1,254 @@
+"""
+Caches the state of a sandbox after an AGTestSuite's setup command.
+
+Suites often share a setup command (e.g., one that compiles the
+student's code), and reruns run the same setup command on the same
+files again. For suites with reuse_setup_snapshots set to True, the
+contents of the sandbox's working directory after the setup command
+finishes are saved along with the setup command's results. The cache
+is keyed by a hash of everything the setup command depends on: the
+command itself, the sandbox image, the contents of the files added to
+the sandbox, and the usernames passed to the sandbox as an environment
+variable. When a later grading has the same key, the working directory
+is restored from the snapshot instead of adding the files and running
+the setup command again.
+
+Snapshots are stored on disk in setup_snapshot_cache_dir(), one
+directory per key. The cache is limited to
+settings.SETUP_SNAPSHOT_CACHE_MAX_SIZE bytes, and the least recently
+used snapshots are evicted first.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import traceback
+from contextlib import ExitStack
+from typing import List, Optional, Tuple
+
+from autograder_sandbox import AutograderSandbox
+from autograder_sandbox.autograder_sandbox import SANDBOX_WORKING_DIR_NAME, CompletedCommand
+from django.conf import settings
+
+import autograder.core.models as ag_models
+from autograder.core import constants
+from autograder.core.result_output import open_output, write_output
+from autograder.utils.retry import retry_should_recover
+
+from .ag_test_result_reuse import get_sandbox_file_digests
+
+# Increment this when the inputs included in the key or the format of
+# the snapshots change so that old snapshots aren't reused.
+_SNAPSHOT_KEY_VERSION = 1
+
+_WORKING_DIR_ARCHIVE_NAME = 'working_dir.tar.gz'
+_SETUP_RESULT_NAME = 'setup_result.json'
+_SETUP_STDOUT_NAME = 'setup_stdout'
+_SETUP_STDERR_NAME = 'setup_stderr'
+
+_CLEAR_WORKING_DIR_CMD = ['find', SANDBOX_WORKING_DIR_NAME, '-mindepth', '1', '-delete']
+
+
+def setup_snapshot_cache_dir() -> str:
+    return os.path.join(settings.MEDIA_ROOT, 'setup_snapshot_cache')
+
+
+@retry_should_recover
+def get_setup_snapshot_key(ag_test_suite: ag_models.AGTestSuite,
+                           submission: ag_models.Submission,
+                           group: ag_models.Group) -> str:
+    """
+    Returns a hash of everything that running ag_test_suite's setup
+    command for submission depends on. Unlike the hash returned by
+    get_suite_inputs_hash(), this doesn't include the suite itself, so
+    suites with the same setup command and files share snapshots.
+    """
+    instructor_files, student_files = get_sandbox_file_digests(ag_test_suite, submission)
+    inputs = {
+        'version': _SNAPSHOT_KEY_VERSION,
+        'setup_suite_cmd': ag_test_suite.setup_suite_cmd,
+        'allow_network_access': ag_test_suite.allow_network_access,
+        'read_only_instructor_files': ag_test_suite.read_only_instructor_files,
+        'docker_image': ag_test_suite.sandbox_docker_image.tag,
+        'usernames': group.member_names,
+        'instructor_files': instructor_files,
+        'student_files': student_files,
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def restore_setup_snapshot(sandbox: AutograderSandbox, key: str) -> Optional[CompletedCommand]:
+    """
+    If there's a snapshot for key, extracts it into sandbox's empty
+    working directory and returns the setup command's results.
+    Otherwise, returns None. If the snapshot can't be extracted, the
+    working directory is emptied again and None is returned.
+    """
+    entry_dir = os.path.join(setup_snapshot_cache_dir(), key)
+    with ExitStack() as exit_stack:
+        try:
+            # The snapshot may be evicted while we're restoring it, so
+            # we open all of its files up front.
+            with open(os.path.join(entry_dir, _SETUP_RESULT_NAME)) as f:
+                setup_result_json = json.load(f)
+            archive = exit_stack.enter_context(
+                open(os.path.join(entry_dir, _WORKING_DIR_ARCHIVE_NAME), 'rb'))
+            stdout = exit_stack.enter_context(
+                open_output(os.path.join(entry_dir, _SETUP_STDOUT_NAME)))
+            stderr = exit_stack.enter_context(
+                open_output(os.path.join(entry_dir, _SETUP_STDERR_NAME)))
+        except FileNotFoundError:
+            return None
+
+        try:
+            extract_result = sandbox.run_command(
+                ['tar', '-xzpf', '-', '-C', SANDBOX_WORKING_DIR_NAME],
+                as_root=True,
+                stdin=archive,
+                timeout=constants.MAX_SUBPROCESS_TIMEOUT)
+            extract_result.stdout.close()
+            extract_result.stderr.close()
+            if extract_result.return_code != 0 or extract_result.timed_out:
+                raise Exception(
+                    'Extracting the setup snapshot failed with return code {}{}'.format(
+                        extract_result.return_code,
+                        ' (timed out)' if extract_result.timed_out else ''))
+        except Exception:
+            print('Error restoring setup snapshot', key)
+            traceback.print_exc()
+            sandbox.run_command(_CLEAR_WORKING_DIR_CMD, as_root=True, check=True)
+            return None
+
+        # Restored snapshots are the most recently used.
+        _touch(entry_dir)
+
+        setup_result = CompletedCommand(
+            return_code=setup_result_json['return_code'],
+            stdout=tempfile.NamedTemporaryFile(),
+            stderr=tempfile.NamedTemporaryFile(),
+            timed_out=setup_result_json['timed_out'],
+            stdout_truncated=setup_result_json['stdout_truncated'],
+            stderr_truncated=setup_result_json['stderr_truncated'])
+        shutil.copyfileobj(stdout, setup_result.stdout)
+        shutil.copyfileobj(stderr, setup_result.stderr)
+        setup_result.stdout.seek(0)
+        setup_result.stderr.seek(0)
+        return setup_result
+
+
+def save_setup_snapshot(sandbox: AutograderSandbox, key: str,
+                        setup_result: CompletedCommand) -> None:
+    """
+    Saves the contents of sandbox's working directory and setup_result
+    as the snapshot for key, then evicts the least recently used
+    snapshots if the cache is too large. Errors are printed rather than
+    raised, since grading can continue without the snapshot.
+    setup_result's stdout and stderr are left at position 0.
+    """
+    if setup_result.timed_out:
+        # Whether a command times out isn't reproducible.
+        return
+
+    cache_dir = setup_snapshot_cache_dir()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # The snapshot is written to a temporary directory that is then
+        # renamed into place, so that a snapshot is never restored
+        # while it's partially written.
+        tmp_dir = tempfile.mkdtemp(dir=cache_dir, prefix='.tmp')
+        try:
+            _write_snapshot(sandbox, tmp_dir, setup_result)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        try:
+            os.rename(tmp_dir, os.path.join(cache_dir, key))
+        except OSError:
+            # Another grading worker saved the same snapshot first.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        evict_setup_snapshots(settings.SETUP_SNAPSHOT_CACHE_MAX_SIZE)
+    except Exception:
+        print('Error saving setup snapshot', key)
+        traceback.print_exc()
+    finally:
+        setup_result.stdout.seek(0)
+        setup_result.stderr.seek(0)
+
+
+def evict_setup_snapshots(max_size: int) -> None:
+    """
+    Deletes the least recently used snapshots until the snapshots in
+    the cache take up at most max_size bytes.
+    """
+    entries = []  # type: List[Tuple[float, int, str]]
+    try:
+        dir_entries = list(os.scandir(setup_snapshot_cache_dir()))
+    except FileNotFoundError:
+        return
+
+    for dir_entry in dir_entries:
+        try:
+            entries.append(
+                (dir_entry.stat().st_mtime, _get_dir_size(dir_entry.path), dir_entry.path))
+        except FileNotFoundError:
+            # Evicted by another grading worker.
+            pass
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= max_size:
+            return
+
+        shutil.rmtree(path, ignore_errors=True)
+        total_size -= size
+
+
+def _write_snapshot(sandbox: AutograderSandbox, dirname: str,
+                    setup_result: CompletedCommand) -> None:
+    archive_result = sandbox.run_command(
+        ['tar', '-czf', '-', '-C', SANDBOX_WORKING_DIR_NAME, '.'],
+        as_root=True,
+        timeout=constants.MAX_SUBPROCESS_TIMEOUT)
+    with archive_result.stdout, archive_result.stderr:
+        if archive_result.return_code != 0 or archive_result.timed_out:
+            raise Exception('Archiving the working directory failed: {}'.format(
+                archive_result.stderr.read().decode(errors='backslashreplace')))
+
+        with open(os.path.join(dirname, _WORKING_DIR_ARCHIVE_NAME), 'wb') as f:
+            shutil.copyfileobj(archive_result.stdout, f)
+
+    with open(os.path.join(dirname, _SETUP_RESULT_NAME), 'w') as f:
+        json.dump({
+            'return_code': setup_result.return_code,
+            'timed_out': setup_result.timed_out,
+            'stdout_truncated': setup_result.stdout_truncated,
+            'stderr_truncated': setup_result.stderr_truncated,
+        }, f)
+
+    setup_result.stdout.seek(0)
+    setup_result.stderr.seek(0)
+    write_output(setup_result.stdout, os.path.join(dirname, _SETUP_STDOUT_NAME))
+    write_output(setup_result.stderr, os.path.join(dirname, _SETUP_STDERR_NAME))
+
+
+def _get_dir_size(dirname: str) -> int:
+    size = 0
+    for dirpath, _, filenames in os.walk(dirname):
+        for filename in filenames:
+            try:
+                size += os.path.getsize(os.path.join(dirpath, filename))
+            except FileNotFoundError:
+                pass
+
+    return size
+
+
+def _touch(dirname: str) -> None:
+    try:
+        os.utime(dirname)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,60 @@
+from typing import Optional
+
+import celery
+from django.core.cache import cache
+
+import autograder.core.models as ag_models
+from autograder.core.submission_scores import update_project_submission_scores
+from autograder.utils.retry import retry_should_recover
+
+
+def queue_project_submission_scores_update(project_pk: int) -> None:
+    """
+    Queues update_project_submission_scores_task for the given project
+    unless one is already queued and hasn't started yet. Since that
+    task recomputes the scores of the whole project, the pending one
+    will pick up any changes made before it starts.
+    """
+    if not cache.add(_update_pending_key(project_pk), True, timeout=_UPDATE_PENDING_TIMEOUT):
+        return
+
+    from autograder.celery import app
+    try:
+        update_project_submission_scores_task.apply_async(
+            (project_pk,), connection=app.connection())
+    except BaseException:
+        cache.delete(_update_pending_key(project_pk))
+        raise
+
+
+@celery.shared_task(queue='small_tasks', acks_late=True)
+def update_project_submission_scores_task(project_pk: int) -> None:
+    """
+    Recomputes the stored scores of every finished submission in the
+    given project, e.g. after its test cases' points or feedback
+    settings were changed.
+    """
+    # Changes made from here on need another update, so this must
+    # happen before the test and feedback settings are loaded.
+    cache.delete(_update_pending_key(project_pk))
+
+    project = _load_project(project_pk)
+    if project is None:
+        return
+
+    update_project_submission_scores(project)
+
+
+@retry_should_recover
+def _load_project(project_pk: int) -> Optional[ag_models.Project]:
+    # The project may have been deleted after the task was queued.
+    return ag_models.Project.objects.filter(pk=project_pk).first()
+
+
+def _update_pending_key(project_pk: int) -> str:
+    return f'project_{project_pk}_submission_scores_update_pending'
+
+
+# If a queued task is lost, another one can be queued after this many
+# seconds.
+_UPDATE_PENDING_TIMEOUT = 60 * 60
@@ -1,11 +1,12 @@
 import fnmatch
 import os
+import shutil
 import tempfile
 import traceback
 
 import time
 from io import FileIO
-from typing import Union, Optional, List
+from typing import BinaryIO, Union, Optional, List
 
 from autograder_sandbox import AutograderSandbox
 from autograder_sandbox import SANDBOX_USERNAME
@@ -18,6 +19,8 @@ from django.db.models import QuerySet
 import autograder.core.models as ag_models
 import autograder.core.utils as core_ut
 from autograder.core import constants
+from autograder.core.models.submission_queue_index import remove_from_queue_index
+from autograder.core.submitted_file_blobs import named_submitted_file_paths
 
 from autograder.utils.retry import retry_should_recover
 
@@ -29,25 +32,26 @@ def mark_submission_as_error(submission_pk, error_msg):
             pk=submission_pk
         ).update(status=ag_models.Submission.GradingStatus.error, error_msg=error_msg)
 
+    project_pk = ag_models.Submission.objects.values_list(
+        'project', flat=True).get(pk=submission_pk)
+    remove_from_queue_index(project_pk, [submission_pk])
+
 
 def add_files_to_sandbox(sandbox: AutograderSandbox,
                          suite: Union[ag_models.AGTestSuite, ag_models.MutationTestSuite],
                          submission: ag_models.Submission):
     student_files_to_add = []
     for student_file in load_queryset_with_retry(suite.student_files_needed.all()):
-        matching_files = fnmatch.filter(submission.submitted_filenames,
-                                        student_file.pattern)
+        student_files_to_add += fnmatch.filter(submission.submitted_filenames,
+                                               student_file.pattern)
 
+    if student_files_to_add:
         @retry_should_recover
-        def _get_submission_dir():
-            return core_ut.get_submission_dir(submission)
-
-        student_files_to_add += [
-            os.path.join(_get_submission_dir(), filename)
-            for filename in matching_files]
+        def _add_student_files():
+            with named_submitted_file_paths(submission, student_files_to_add) as paths:
+                sandbox.add_files(*paths)
 
-    if student_files_to_add:
-        sandbox.add_files(*student_files_to_add)
+        _add_student_files()
 
     project_files_to_add = [
         file_.abspath for file_
@@ -123,16 +127,27 @@ def get_stdin_file(cmd: ag_models.AGTestCommand,
         if ag_test_suite_result is None:
             raise Exception('Expected ag test suite result, but got None.')
 
-        return ag_test_suite_result.open_setup_stdout('rb')
+        with ag_test_suite_result.open_setup_stdout('rb') as setup_stdout:
+            return _decompress_to_tempfile(setup_stdout)
     elif cmd.stdin_source == ag_models.StdinSource.setup_stderr:
         if ag_test_suite_result is None:
             raise Exception('Expected ag test suite result, but got None.')
 
-        return ag_test_suite_result.open_setup_stderr('rb')
+        with ag_test_suite_result.open_setup_stderr('rb') as setup_stderr:
+            return _decompress_to_tempfile(setup_stderr)
     else:
         return None
 
 
+def _decompress_to_tempfile(output: BinaryIO) -> FileIO:
+    # Stdin is redirected using the file's descriptor, so compressed
+    # output needs to be decompressed into a real file first.
+    stdin = tempfile.TemporaryFile()
+    shutil.copyfileobj(output, stdin)
+    stdin.seek(0)
+    return stdin
+
+
 class FileCloser:
     def __init__(self):
         self._files_to_close = []  # type: List[FileIO]
@@ -0,0 +1,170 @@
+import subprocess
+import sys
+import tempfile
+from typing import List
+
+from autograder_sandbox.autograder_sandbox import CompletedCommand
+from django.test import SimpleTestCase
+
+from autograder.grading_tasks.tasks.batch_commands import (BatchCommand, BatchCommandError,
+                                                           run_commands_in_batch)
+
+
+class _LocalSandbox:
+    """
+    Runs commands on this machine rather than in a sandbox so that the
+    batch runner can be tested without docker. The commands in a batch
+    must be run with as_root=True, since the runner can't switch to the
+    sandbox user here.
+    """
+
+    def __init__(self):
+        self.run_command_kwargs = []
+
+    def run_command(self, args: List[str], **kwargs) -> CompletedCommand:
+        self.run_command_kwargs.append(kwargs)
+        if args[0] == 'python3':
+            args = [sys.executable] + args[1:]
+
+        stdout = tempfile.NamedTemporaryFile()
+        stderr = tempfile.NamedTemporaryFile()
+        process = subprocess.run(args, stdin=kwargs['stdin'], stdout=stdout, stderr=stderr)
+        stdout.seek(0)
+        stderr.seek(0)
+        return CompletedCommand(return_code=process.returncode, stdout=stdout, stderr=stderr,
+                                timed_out=False, stdout_truncated=False, stderr_truncated=False)
+
+
+def _bash(cmd: str, **kwargs) -> BatchCommand:
+    return BatchCommand(args=['bash', '-c', cmd], as_root=True, **kwargs)
+
+
+class RunCommandsInBatchTestCase(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sandbox = _LocalSandbox()
+
+    def test_results_returned_in_order(self) -> None:
+        results = run_commands_in_batch(self.sandbox, [
+            _bash('printf spam; printf egg >&2', timeout=5),
+            _bash('printf sausage; exit 3', timeout=5),
+            _bash('true', timeout=5),
+        ])
+
+        self.assertEqual(1, len(self.sandbox.run_command_kwargs))
+        self.assertEqual([0, 3, 0], [result.return_code for result in results])
+        self.assertEqual(
+            [b'spam', b'sausage', b''], [result.stdout.read() for result in results])
+        self.assertEqual([b'egg', b'', b''], [result.stderr.read() for result in results])
+        for result in results:
+            self.assertFalse(result.timed_out)
+            self.assertFalse(result.stdout_truncated)
+            self.assertFalse(result.stderr_truncated)
+            # Same as AutograderSandbox.run_command()
+            self.assertTrue(hasattr(result.stdout, 'name'))
+            self.assertTrue(hasattr(result.stderr, 'name'))
+
+    def test_commands_run_in_order(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            results = run_commands_in_batch(self.sandbox, [
+                _bash('printf spam > {}/file'.format(tempdir)),
+                _bash('cat {}/file'.format(tempdir)),
+            ])
+
+        self.assertEqual(b'spam', results[1].stdout.read())
+
+    def test_each_command_gets_its_own_stdin(self) -> None:
+        with tempfile.TemporaryFile() as stdin1, tempfile.TemporaryFile() as stdin2:
+            stdin1.write(b'spam\n' * 10000)
+            stdin1.seek(0)
+            stdin2.write(b'ignore me egg')
+            stdin2.seek(len(b'ignore me '))
+
+            results = run_commands_in_batch(self.sandbox, [
+                _bash('cat', stdin=stdin1),
+                _bash('cat'),
+                _bash('cat', stdin=stdin2),
+            ])
+
+        self.assertEqual(b'spam\n' * 10000, results[0].stdout.read())
+        self.assertEqual(b'', results[1].stdout.read())
+        self.assertEqual(b'egg', results[2].stdout.read())
+
+    def test_command_timeout(self) -> None:
+        results = run_commands_in_batch(self.sandbox, [
+            _bash('printf spam; sleep 10', timeout=1),
+            _bash('printf egg', timeout=1),
+        ])
+
+        self.assertTrue(results[0].timed_out)
+        self.assertIsNone(results[0].return_code)
+        self.assertEqual(b'spam', results[0].stdout.read())
+
+        self.assertFalse(results[1].timed_out)
+        self.assertEqual(0, results[1].return_code)
+        self.assertEqual(b'egg', results[1].stdout.read())
+
+        self.assertEqual(1 + 1 + 10 + 2, self.sandbox.run_command_kwargs[0]['timeout'])
+
+    def test_no_runner_timeout_if_any_command_has_no_timeout(self) -> None:
+        run_commands_in_batch(self.sandbox, [_bash('true', timeout=1), _bash('true')])
+        self.assertIsNone(self.sandbox.run_command_kwargs[0]['timeout'])
+
+    def test_output_truncated(self) -> None:
+        results = run_commands_in_batch(self.sandbox, [
+            _bash('printf spamspam; printf eggegg >&2', truncate_stdout=4, truncate_stderr=3),
+            _bash('printf spam', truncate_stdout=4),
+        ])
+
+        self.assertTrue(results[0].stdout_truncated)
+        self.assertEqual(b'spam', results[0].stdout.read())
+        self.assertTrue(results[0].stderr_truncated)
+        self.assertEqual(b'egg', results[0].stderr.read())
+
+        self.assertFalse(results[1].stdout_truncated)
+        self.assertEqual(b'spam', results[1].stdout.read())
+
+    def test_max_virtual_memory(self) -> None:
+        results = run_commands_in_batch(self.sandbox, [
+            BatchCommand(args=['bash', '-c', 'ulimit -v'], as_root=True,
+                         max_virtual_memory=500000000),
+            BatchCommand(args=['bash', '-c', 'ulimit -v'], as_root=True),
+        ])
+
+        self.assertEqual(str(500000000 // 1024), results[0].stdout.read().decode().strip())
+        self.assertEqual('unlimited', results[1].stdout.read().decode().strip())
+
+    def test_missing_executable(self) -> None:
+        results = run_commands_in_batch(self.sandbox, [
+            BatchCommand(args=['not_a_real_executable'], as_root=True),
+            _bash('printf spam'),
+        ])
+
+        self.assertEqual(127, results[0].return_code)
+        self.assertEqual(b'spam', results[1].stdout.read())
+
+    def test_no_commands(self) -> None:
+        self.assertEqual([], run_commands_in_batch(self.sandbox, []))
+        self.assertEqual([], self.sandbox.run_command_kwargs)
+
+    def test_incomplete_results_error(self) -> None:
+        # There is no sandbox user here, so the runner fails before
+        # running the first command.
+        with self.assertRaises(BatchCommandError) as cm:
+            run_commands_in_batch(self.sandbox, [
+                BatchCommand(args=['true'], as_root=False),
+                _bash('true'),
+            ])
+        self.assertEqual([], cm.exception.completed_results)
+
+    def test_incomplete_results_error_contains_completed_results(self) -> None:
+        with self.assertRaises(BatchCommandError) as cm:
+            run_commands_in_batch(self.sandbox, [
+                _bash('printf spam'),
+                BatchCommand(args=['true'], as_root=False),
+                _bash('true'),
+            ])
+
+        self.assertEqual(1, len(cm.exception.completed_results))
+        self.assertEqual(0, cm.exception.completed_results[0].return_code)
+        self.assertEqual(b'spam', cm.exception.completed_results[0].stdout.read())
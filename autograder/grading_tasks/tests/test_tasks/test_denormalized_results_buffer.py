@@ -0,0 +1,233 @@
+import threading
+from unittest import mock
+
+from django.db import connection
+from django.test import tag
+from django.test.utils import CaptureQueriesContext
+
+import autograder.core.models as ag_models
+import autograder.utils.testing.model_obj_builders as obj_build
+from autograder.grading_tasks.tasks.denormalized_results_buffer import (
+    DenormalizedAGTestResultsBuffer, _write_denormalized_updates)
+from autograder.grading_tasks.tasks.grade_submission import SubmissionGrader
+from autograder.utils.testing import UnitTestBase
+
+
+_WRITE_PATH = ('autograder.grading_tasks.tasks.denormalized_results_buffer'
+               '._write_denormalized_updates')
+
+
+class DenormalizedAGTestResultsBufferTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.submission = obj_build.make_submission()
+        self.suite_data = {
+            'pk': 42,
+            'ag_test_suite_id': 7,
+            'setup_return_code': 0,
+            'ag_test_case_results': {},
+        }
+
+    def test_changes_not_written_until_flush(self) -> None:
+        buffer = DenormalizedAGTestResultsBuffer(
+            self.submission.pk, max_buffered=10, max_delay=60)
+        buffer.set_ag_test_suite_result(7, self.suite_data)
+        buffer.set_ag_test_case_result(7, 3, {'pk': 3})
+        self.assertEqual(2, buffer.num_pending)
+
+        self.submission.refresh_from_db()
+        self.assertEqual({}, self.submission.denormalized_ag_test_results)
+
+        buffer.flush()
+        self.assertEqual(0, buffer.num_pending)
+
+        self.submission.refresh_from_db()
+        expected = dict(self.suite_data, ag_test_case_results={'3': {'pk': 3}})
+        self.assertEqual({'7': expected}, self.submission.denormalized_ag_test_results)
+
+    def test_flush_when_max_buffered_reached(self) -> None:
+        buffer = DenormalizedAGTestResultsBuffer(
+            self.submission.pk, max_buffered=2, max_delay=60)
+        buffer.set_ag_test_suite_result(7, self.suite_data)
+        self.submission.refresh_from_db()
+        self.assertEqual({}, self.submission.denormalized_ag_test_results)
+
+        buffer.set_ag_test_case_result(7, 3, {'pk': 3})
+        self.assertEqual(0, buffer.num_pending)
+
+        self.submission.refresh_from_db()
+        self.assertEqual(
+            {'3': {'pk': 3}},
+            self.submission.denormalized_ag_test_results['7']['ag_test_case_results'])
+
+    def test_flush_when_max_delay_exceeded(self) -> None:
+        buffer = DenormalizedAGTestResultsBuffer(
+            self.submission.pk, max_buffered=10, max_delay=0)
+        buffer.set_ag_test_suite_result(7, self.suite_data)
+        self.assertEqual(0, buffer.num_pending)
+
+        self.submission.refresh_from_db()
+        self.assertEqual({'7': self.suite_data}, self.submission.denormalized_ag_test_results)
+
+    def test_pending_changes_flushed_by_timer(self) -> None:
+        written = threading.Event()
+        with mock.patch(_WRITE_PATH, side_effect=lambda *args: written.set()) as mock_write:
+            buffer = DenormalizedAGTestResultsBuffer(
+                self.submission.pk, max_buffered=10, max_delay=0.1)
+            buffer.set_ag_test_suite_result(7, self.suite_data)
+            # No other changes arrive, e.g. because the next test case
+            # is slow.
+            self.assertTrue(written.wait(timeout=10))
+
+        mock_write.assert_called_once_with(self.submission.pk, [(('7',), self.suite_data)])
+        self.assertEqual(0, buffer.num_pending)
+
+    def test_changes_buffered_while_timer_thread_writes(self) -> None:
+        write_started = threading.Event()
+        finish_write = threading.Event()
+
+        def slow_write(*args):
+            write_started.set()
+            self.assertTrue(finish_write.wait(timeout=10))
+
+        with mock.patch(_WRITE_PATH, side_effect=slow_write) as mock_write:
+            buffer = DenormalizedAGTestResultsBuffer(
+                self.submission.pk, max_buffered=10, max_delay=0.1)
+            buffer.set_ag_test_suite_result(7, self.suite_data)
+            self.assertTrue(write_started.wait(timeout=10))
+
+            # The write in progress on the timer thread doesn't block
+            # buffering new changes.
+            buffer.set_ag_test_case_result(7, 3, {'pk': 3})
+            self.assertEqual(1, buffer.num_pending)
+
+            finish_write.set()
+            buffer.flush()
+
+        self.assertEqual(
+            [mock.call(self.submission.pk, [(('7',), self.suite_data)]),
+             mock.call(self.submission.pk, [(('7', 'ag_test_case_results', '3'), {'pk': 3})])],
+            mock_write.call_args_list)
+        self.assertEqual(0, buffer.num_pending)
+
+    def test_changes_restored_if_write_fails(self) -> None:
+        buffer = DenormalizedAGTestResultsBuffer(
+            self.submission.pk, max_buffered=10, max_delay=60)
+        buffer.set_ag_test_suite_result(7, self.suite_data)
+        buffer.set_ag_test_case_result(7, 3, {'pk': 3})
+
+        def failing_write(*args):
+            # Simulates changes being buffered during the write.
+            buffer.set_ag_test_case_result(7, 3, {'pk': 3, 'updated': True})
+            buffer.set_ag_test_case_result(7, 4, {'pk': 4})
+            raise ValueError('write error')
+
+        with mock.patch(_WRITE_PATH, side_effect=failing_write):
+            with self.assertRaisesMessage(ValueError, 'write error'):
+                buffer.flush()
+
+        self.assertEqual(3, buffer.num_pending)
+        buffer.flush()
+
+        self.submission.refresh_from_db()
+        expected = dict(
+            self.suite_data,
+            ag_test_case_results={'3': {'pk': 3, 'updated': True}, '4': {'pk': 4}})
+        self.assertEqual({'7': expected}, self.submission.denormalized_ag_test_results)
+
+    def test_flush_error_does_not_hide_grading_error(self) -> None:
+        suite = obj_build.make_ag_test_suite(self.submission.project)
+        grader = SubmissionGrader(self.submission.pk)
+        grader.load_submission()
+
+        def grade_suite(*args, on_test_case_finished, **kwargs):
+            grader._denormalized_results_buffer.set_ag_test_case_result(suite.pk, 3, {'pk': 3})
+            raise RuntimeError('grading error')
+
+        with mock.patch('autograder.grading_tasks.tasks.grade_submission'
+                        '.grade_ag_test_suite_impl', new=grade_suite), \
+                mock.patch(_WRITE_PATH, side_effect=ValueError('flush error')) as mock_write:
+            with self.assertRaisesMessage(RuntimeError, 'grading error'):
+                grader.grade_ag_test_suite(suite)
+
+        mock_write.assert_called()
+
+    def test_flush_only_updates_changed_paths(self) -> None:
+        other_suite_data = {'pk': 1, 'ag_test_case_results': {'2': {'pk': 2}}}
+        self.suite_data['ag_test_case_results'] = {'4': {'pk': 4}}
+        ag_models.Submission.objects.filter(pk=self.submission.pk).update(
+            denormalized_ag_test_results={'1': other_suite_data, '7': self.suite_data})
+
+        buffer = DenormalizedAGTestResultsBuffer(
+            self.submission.pk, max_buffered=10, max_delay=60)
+        buffer.set_ag_test_case_result(7, 3, {'pk': 3})
+        buffer.set_ag_test_case_result(7, 3, {'pk': 3, 'updated': True})
+        self.assertEqual(1, buffer.num_pending)
+
+        with CaptureQueriesContext(connection) as queries:
+            buffer.flush()
+
+        update_queries = [
+            query for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(1, len(update_queries))
+
+        self.submission.refresh_from_db()
+        self.assertEqual(
+            {
+                '1': other_suite_data,
+                '7': dict(
+                    self.suite_data,
+                    ag_test_case_results={'4': {'pk': 4}, '3': {'pk': 3, 'updated': True}}
+                )
+            },
+            self.submission.denormalized_ag_test_results
+        )
+
+    def test_suite_result_set_after_case_result_replaces_it(self) -> None:
+        buffer = DenormalizedAGTestResultsBuffer(
+            self.submission.pk, max_buffered=10, max_delay=60)
+        buffer.set_ag_test_suite_result(7, self.suite_data)
+        buffer.set_ag_test_case_result(7, 3, {'pk': 3})
+        buffer.set_ag_test_suite_result(7, self.suite_data)
+        buffer.flush()
+
+        self.submission.refresh_from_db()
+        self.assertEqual({'7': self.suite_data}, self.submission.denormalized_ag_test_results)
+
+    def test_flush_with_nothing_pending(self) -> None:
+        buffer = DenormalizedAGTestResultsBuffer(
+            self.submission.pk, max_buffered=10, max_delay=60)
+        with CaptureQueriesContext(connection) as queries:
+            buffer.flush()
+
+        self.assertEqual(0, len(queries.captured_queries))
+
+
+@tag('slow', 'sandbox')
+@mock.patch('autograder.utils.retry.sleep')
+class SubmissionGraderDenormalizedResultsBatchingTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.submission = obj_build.make_submission()
+        self.project = self.submission.group.project
+        self.suite = obj_build.make_ag_test_suite(self.project, setup_suite_cmd='true')
+        self.cases = [obj_build.make_ag_test_case(self.suite) for i in range(5)]
+
+    def test_pending_results_written_when_suite_finishes(self, *args) -> None:
+        with self.settings(DENORMALIZED_RESULTS_MAX_BUFFERED=100,
+                           DENORMALIZED_RESULTS_MAX_FLUSH_DELAY=600):
+            grader = SubmissionGrader(self.submission.pk)
+            grader.load_submission()
+            with mock.patch(_WRITE_PATH, wraps=_write_denormalized_updates) as mock_write:
+                grader.grade_ag_test_suite(self.suite)
+
+        mock_write.assert_called_once()
+
+        self.submission.refresh_from_db()
+        self.assertEqual(
+            grader.submission.denormalized_ag_test_results,
+            self.submission.denormalized_ag_test_results)
+        self.assertCountEqual(
+            [str(case.pk) for case in self.cases],
+            self.submission.denormalized_ag_test_results[
+                str(self.suite.pk)]['ag_test_case_results'].keys())
@@ -1,9 +1,12 @@
+import io
+import json
 import os
 import random
 import tempfile
 from unittest import mock
 
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import tag
 
 from autograder_sandbox import AutograderSandbox
@@ -12,9 +15,14 @@ from autograder.grading_tasks.tasks.exceptions import SubmissionRejected
 import autograder.core.models as ag_models
 import autograder.utils.testing.model_obj_builders as obj_build
 from autograder.core import constants
-from autograder.core.tests.test_submission_feedback.fdbk_getter_shortcuts import \
-    get_submission_fdbk
+from autograder.core.result_output import COMPRESSED_SUFFIX, get_output_size, open_output
+from autograder.core.tests.test_submission_feedback.fdbk_getter_shortcuts import (
+    get_cmd_fdbk, get_submission_fdbk)
 from autograder.grading_tasks import tasks
+from autograder.grading_tasks.tasks import grade_ag_test
+from autograder.grading_tasks.tasks.ag_test_result_reuse import (get_result_reuse_stats,
+                                                                 record_result_reuse)
+from autograder.grading_tasks.tasks.batch_commands import BatchCommandError
 from autograder.utils.testing import TransactionUnitTestBase, UnitTestBase
 
 
@@ -100,6 +108,48 @@ class AGTestCommandCorrectnessTestCase(UnitTestBase):
             2,
             get_submission_fdbk(self.submission, ag_models.FeedbackCategory.max).total_points)
 
+    def test_output_diffs_stored(self, *args):
+        cmd = obj_build.make_full_ag_test_command(
+            self.ag_test_case, set_arbitrary_points=False,
+            set_arbitrary_expected_vals=False,
+            cmd="""bash -c 'printf "spam\negg\n"; printf "wow\n" >&2'""",
+            expected_stdout_source=ag_models.ExpectedOutputSource.text,
+            expected_stdout_text='spam\nsausage\n',
+            expected_stderr_source=ag_models.ExpectedOutputSource.text,
+            expected_stderr_text='wow\n')
+        tasks.grade_submission_task(self.submission.pk)
+
+        res = ag_models.AGTestCommandResult.objects.get(ag_test_command=cmd)
+        self.assertFalse(res.stdout_correct)
+        self.assertTrue(res.stderr_correct)
+
+        expected_stdout_diff = ['  spam\n', '- sausage\n', '+ egg\n']
+        self.assertTrue(os.path.exists(res.stdout_diff_filename + COMPRESSED_SUFFIX))
+        with open_output(res.stdout_diff_filename) as f:
+            self.assertEqual(expected_stdout_diff, json.load(f))
+        self.assertEqual(sum(len(line) for line in expected_stdout_diff), res.stdout_diff_size)
+
+        # Passing diffs aren't stored, since they can be rebuilt from
+        # the output.
+        self.assertEqual(6, res.stderr_diff_size)
+        self.assertFalse(os.path.exists(res.stderr_diff_filename))
+        self.assertFalse(os.path.exists(res.stderr_diff_filename + COMPRESSED_SUFFIX))
+        stderr_diff = get_cmd_fdbk(res, ag_models.FeedbackCategory.max).stderr_diff
+        self.assertEqual(['  wow\n'], stderr_diff.diff_content)
+
+    def test_output_not_checked_no_diff_stored(self, *args):
+        cmd = obj_build.make_full_ag_test_command(
+            self.ag_test_case, set_arbitrary_points=False,
+            set_arbitrary_expected_vals=False,
+            cmd='printf hello')
+        tasks.grade_submission_task(self.submission.pk)
+
+        res = ag_models.AGTestCommandResult.objects.get(ag_test_command=cmd)
+        self.assertIsNone(res.stdout_diff_size)
+        self.assertIsNone(res.stderr_diff_size)
+        self.assertFalse(os.path.exists(res.stdout_diff_filename))
+        self.assertFalse(os.path.exists(res.stderr_diff_filename))
+
     def test_correct_expected_return_code_zero(self, *args):
         cmd = obj_build.make_full_ag_test_command(
             self.ag_test_case,
@@ -261,7 +311,7 @@ class AGTestCommandStdinSourceTestCase(UnitTestBase):
         tasks.grade_submission_task(self.submission.pk)
 
         res = ag_models.AGTestCommandResult.objects.get(ag_test_command=cmd)
-        self.assertEqual(text, open(res.stdout_filename).read())
+        self.assertEqual(text, open_output(res.stdout_filename, 'r').read())
 
     def test_stdin_source_instructor_file(self, *args):
         text = ',vnaejfal;skjdf;lakjsdfklajsl;dkjf;'
@@ -276,7 +326,7 @@ class AGTestCommandStdinSourceTestCase(UnitTestBase):
         tasks.grade_submission_task(self.submission.pk)
 
         res = ag_models.AGTestCommandResult.objects.get(ag_test_command=cmd)
-        self.assertEqual(text, open(res.stdout_filename).read())
+        self.assertEqual(text, open_output(res.stdout_filename, 'r').read())
 
     def test_stdin_source_setup_stdout(self, *args):
         cmd = obj_build.make_full_ag_test_command(
@@ -286,7 +336,13 @@ class AGTestCommandStdinSourceTestCase(UnitTestBase):
         tasks.grade_submission_task(self.submission.pk)
 
         res = ag_models.AGTestCommandResult.objects.get(ag_test_command=cmd)
-        self.assertEqual(self.setup_stdout, open(res.stdout_filename).read())
+        self.assertEqual(self.setup_stdout, open_output(res.stdout_filename, 'r').read())
+
+        # The setup output is stored compressed, so it has to be
+        # decompressed before being redirected to the command's stdin.
+        setup_stdout_filename = res.ag_test_case_result.ag_test_suite_result.setup_stdout_filename
+        self.assertTrue(os.path.isfile(setup_stdout_filename + COMPRESSED_SUFFIX))
+        self.assertFalse(os.path.exists(setup_stdout_filename))
 
     def test_stdin_source_setup_stderr(self, *args):
         cmd = obj_build.make_full_ag_test_command(
@@ -296,7 +352,7 @@ class AGTestCommandStdinSourceTestCase(UnitTestBase):
         tasks.grade_submission_task(self.submission.pk)
 
         res = ag_models.AGTestCommandResult.objects.get(ag_test_command=cmd)
-        self.assertEqual(self.setup_stderr, open(res.stdout_filename).read())
+        self.assertEqual(self.setup_stderr, open_output(res.stdout_filename, 'r').read())
 
 
 @mock.patch('autograder.utils.retry.sleep')
@@ -412,9 +468,9 @@ sys.stderr.flush()
         self.assertTrue(res.stdout_truncated)
         self.assertTrue(res.stderr_truncated)
         self.assertEqual(
-            constants.MAX_RECORDED_OUTPUT_LENGTH, os.path.getsize(res.stdout_filename))
+            constants.MAX_RECORDED_OUTPUT_LENGTH, get_output_size(res.stdout_filename))
         self.assertEqual(
-            constants.MAX_RECORDED_OUTPUT_LENGTH, os.path.getsize(res.stderr_filename))
+            constants.MAX_RECORDED_OUTPUT_LENGTH, get_output_size(res.stderr_filename))
 
     def test_program_prints_non_unicode_chars(self, *args):
         cmd = obj_build.make_full_ag_test_command(
@@ -426,8 +482,8 @@ sys.stderr.flush()
 
         res = ag_models.AGTestCommandResult.objects.get(ag_test_command=cmd)
         self.assertEqual(0, res.return_code)
-        self.assertEqual(self.non_utf_bytes, open(res.stdout_filename, 'rb').read())
-        self.assertEqual(self.non_utf_bytes, open(res.stderr_filename, 'rb').read())
+        self.assertEqual(self.non_utf_bytes, open_output(res.stdout_filename, 'rb').read())
+        self.assertEqual(self.non_utf_bytes, open_output(res.stderr_filename, 'rb').read())
 
     def test_suite_setup_return_code_set(self, *args):
         self.ag_test_suite.validate_and_update(setup_suite_cmd='bash -c "exit 2"')
@@ -453,9 +509,9 @@ sys.stderr.flush()
         self.assertTrue(res.setup_stderr_truncated)
 
         self.assertEqual(
-            constants.MAX_RECORDED_OUTPUT_LENGTH, os.path.getsize(res.setup_stdout_filename))
+            constants.MAX_RECORDED_OUTPUT_LENGTH, get_output_size(res.setup_stdout_filename))
         self.assertEqual(
-            constants.MAX_RECORDED_OUTPUT_LENGTH, os.path.getsize(res.setup_stderr_filename))
+            constants.MAX_RECORDED_OUTPUT_LENGTH, get_output_size(res.setup_stderr_filename))
 
     def test_setup_print_non_unicode_chars(self, *args):
         self.ag_test_suite.validate_and_update(
@@ -630,9 +686,9 @@ class AGTestSuiteRerunTestCase(UnitTestBase):
         suite_result = ag_models.AGTestSuiteResult.objects.get(ag_test_suite=self.ag_test_suite)
         suite_result.setup_timed_out = True  # So that we know this value gets reset
         suite_result.save()
-        with open(suite_result.setup_stdout_filename, 'r') as f:
+        with open_output(suite_result.setup_stdout_filename, 'r') as f:
             self.assertNotEqual('', f.read())
-        with open(suite_result.setup_stderr_filename, 'r') as f:
+        with open_output(suite_result.setup_stderr_filename, 'r') as f:
             self.assertNotEqual('', f.read())
 
         self.assertEqual(0, suite_result.setup_return_code)
@@ -645,9 +701,9 @@ class AGTestSuiteRerunTestCase(UnitTestBase):
         )
 
         suite_result.refresh_from_db()
-        with open(suite_result.setup_stdout_filename, 'r') as f:
+        with open_output(suite_result.setup_stdout_filename, 'r') as f:
             self.assertEqual('', f.read())
-        with open(suite_result.setup_stderr_filename, 'r') as f:
+        with open_output(suite_result.setup_stderr_filename, 'r') as f:
             self.assertEqual('', f.read())
 
         self.assertIsNone(suite_result.setup_return_code)
@@ -851,3 +907,388 @@ class GradeAGTestSuiteCallbacksTestCase(TransactionUnitTestBase):
         case_result = call2.args[0]
         self.assertEqual(ag_test_case2, case_result.ag_test_case)
         self.assertEqual(self.submission, case_result.ag_test_suite_result.submission)
+
+
+@tag('slow', 'sandbox')
+@mock.patch('autograder.utils.retry.sleep')
+class ParallelAGTestCasesTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.submission = obj_build.make_submission()
+        self.project = self.submission.group.project
+        self.ag_test_suite = obj_build.make_ag_test_suite(
+            self.project,
+            setup_suite_cmd='printf spam',
+            run_test_cases_in_parallel=True)
+
+        self.ag_test_cases = []
+        self.ag_test_cmds = []
+        for i in range(6):
+            ag_test_case = obj_build.make_ag_test_case(self.ag_test_suite)
+            self.ag_test_cases.append(ag_test_case)
+            # Later test cases finish first.
+            self.ag_test_cmds.append(obj_build.make_full_ag_test_command(
+                ag_test_case,
+                set_arbitrary_points=False,
+                set_arbitrary_expected_vals=False,
+                cmd='sleep {}; cat; printf {}'.format((6 - i) * 0.2, i),
+                stdin_source=ag_models.StdinSource.setup_stdout,
+                expected_stdout_source=ag_models.ExpectedOutputSource.text,
+                expected_stdout_text='spam{}'.format(i),
+                points_for_correct_stdout=1))
+
+    def test_results_saved_and_callback_called_in_test_case_order(self, *args) -> None:
+        finished = []
+        tasks.grade_ag_test_suite_impl(
+            self.ag_test_suite, self.submission, self.submission.group,
+            on_test_case_finished=finished.append)
+
+        self.assertEqual(
+            [ag_test_case.pk for ag_test_case in self.ag_test_cases],
+            [case_result.ag_test_case_id for case_result in finished])
+
+        for i, cmd in enumerate(self.ag_test_cmds):
+            res = ag_models.AGTestCommandResult.objects.get(ag_test_command=cmd)
+            self.assertTrue(res.stdout_correct)
+            self.assertEqual(0, res.return_code)
+            with open_output(res.stdout_filename, 'r') as f:
+                self.assertEqual('spam{}'.format(i), f.read())
+
+    def test_only_requested_test_cases_rerun(self, *args) -> None:
+        finished = []
+        tasks.grade_ag_test_suite_impl(
+            self.ag_test_suite, self.submission, self.submission.group,
+            self.ag_test_cases[1].pk, self.ag_test_cases[3].pk,
+            on_test_case_finished=finished.append)
+
+        self.assertEqual(
+            [self.ag_test_cases[1].pk, self.ag_test_cases[3].pk],
+            [case_result.ag_test_case_id for case_result in finished])
+        self.assertEqual(2, ag_models.AGTestCommandResult.objects.count())
+
+    def test_test_case_deleted_while_grading_skipped(self, *args) -> None:
+        deleted_case = self.ag_test_cases[2]
+        get_or_create_case_result = grade_ag_test._get_or_create_ag_test_case_result
+
+        def get_or_create_unless_deleted(ag_test_case, suite_result):
+            # Same as if the test case were deleted before its result
+            # was created.
+            if ag_test_case == deleted_case:
+                return None
+            return get_or_create_case_result(ag_test_case, suite_result)
+
+        finished = []
+        with mock.patch.object(grade_ag_test, '_get_or_create_ag_test_case_result',
+                               new=get_or_create_unless_deleted):
+            tasks.grade_ag_test_suite_impl(
+                self.ag_test_suite, self.submission, self.submission.group,
+                on_test_case_finished=finished.append)
+
+        self.assertEqual(
+            [ag_test_case.pk for ag_test_case in self.ag_test_cases
+             if ag_test_case != deleted_case],
+            [case_result.ag_test_case_id for case_result in finished])
+        self.assertEqual(len(self.ag_test_cmds) - 1,
+                         ag_models.AGTestCommandResult.objects.count())
+
+    def test_command_error_retried_in_parallel(self, *args) -> None:
+        run_command_from_args = tasks.run_command_from_args
+        num_failures = 0
+
+        def fail_once(*args, **kwargs):
+            nonlocal num_failures
+            if num_failures == 0:
+                num_failures += 1
+                raise Exception('Oops')
+            return run_command_from_args(*args, **kwargs)
+
+        with mock.patch('autograder.grading_tasks.tasks.utils.run_command_from_args',
+                        new=fail_once):
+            tasks.grade_ag_test_suite_impl(
+                self.ag_test_suite, self.submission, self.submission.group)
+
+        self.assertEqual(len(self.ag_test_cmds), ag_models.AGTestCommandResult.objects.count())
+        for res in ag_models.AGTestCommandResult.objects.all():
+            self.assertTrue(res.stdout_correct)
+
+
+@tag('slow', 'sandbox')
+@mock.patch('autograder.utils.retry.sleep')
+class BatchAGTestCaseCommandsTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.submission = obj_build.make_submission()
+        self.project = self.submission.group.project
+        self.ag_test_suite = obj_build.make_ag_test_suite(
+            self.project, setup_suite_cmd='printf spam', batch_test_case_commands=True)
+        self.ag_test_case = obj_build.make_ag_test_case(self.ag_test_suite)
+
+        cmd_kwargs = [
+            {
+                'cmd': 'printf egg > file; cat; printf sausage >&2',
+                'stdin_source': ag_models.StdinSource.setup_stdout,
+                'expected_stdout_source': ag_models.ExpectedOutputSource.text,
+                'expected_stdout_text': 'spam',
+            },
+            {
+                'cmd': 'cat file; whoami; exit 2',
+                'stdin_source': ag_models.StdinSource.text,
+                'stdin_text': 'not read',
+                'expected_return_code': ag_models.ExpectedReturnCode.zero,
+            },
+            {
+                'cmd': 'printf waluigi; sleep 10',
+                'time_limit': 1,
+            },
+            {
+                'cmd': 'echo "echo hello" | bash',
+                'block_process_spawn': True,
+                'time_limit': 1,
+            },
+            {
+                'cmd': 'python3 -c "x = bytearray(100000000)"',
+                'use_virtual_memory_limit': True,
+                'virtual_memory_limit': 40000000,
+                'expected_return_code': ag_models.ExpectedReturnCode.nonzero,
+            },
+            {
+                'cmd': 'yes | head -c {}'.format(constants.MAX_RECORDED_OUTPUT_LENGTH + 10),
+            },
+        ]
+        self.ag_test_cmds = [
+            obj_build.make_full_ag_test_command(
+                self.ag_test_case,
+                set_arbitrary_points=False,
+                set_arbitrary_expected_vals=False,
+                **kwargs)
+            for kwargs in cmd_kwargs
+        ]
+
+    def test_batch_results_same_as_unbatched(self, *args) -> None:
+        with mock.patch.object(AutograderSandbox, 'run_command', autospec=True,
+                               side_effect=AutograderSandbox.run_command) as run_command:
+            tasks.grade_ag_test_suite_impl(
+                self.ag_test_suite, self.submission, self.submission.group)
+        # The setup command and one batch.
+        self.assertEqual(2, run_command.call_count)
+        batched_results = self._get_results()
+
+        self.ag_test_suite.validate_and_update(batch_test_case_commands=False)
+        tasks.grade_ag_test_suite_impl(self.ag_test_suite, self.submission, self.submission.group)
+        self.assertEqual(self._get_results(), batched_results)
+
+        self.assertEqual('spam', batched_results[0]['stdout'])
+        self.assertEqual('sausage', batched_results[0]['stderr'])
+        self.assertTrue(batched_results[0]['stdout_correct'])
+        self.assertEqual('egg' + 'autograder\n', batched_results[1]['stdout'])
+        self.assertFalse(batched_results[1]['return_code_correct'])
+        self.assertTrue(batched_results[2]['timed_out'])
+        self.assertEqual('waluigi', batched_results[2]['stdout'])
+        self.assertTrue(batched_results[3]['timed_out'])
+        self.assertTrue(batched_results[4]['return_code_correct'])
+        self.assertTrue(batched_results[5]['stdout_truncated'])
+        self.assertEqual(
+            constants.MAX_RECORDED_OUTPUT_LENGTH, len(batched_results[5]['stdout']))
+
+    def test_test_case_commands_batched_in_parallel(self, *args) -> None:
+        self.ag_test_suite.validate_and_update(run_test_cases_in_parallel=True)
+        other_case = obj_build.make_ag_test_case(self.ag_test_suite)
+        other_cmd = obj_build.make_full_ag_test_command(
+            other_case,
+            set_arbitrary_points=False,
+            set_arbitrary_expected_vals=False,
+            cmd='cat',
+            stdin_source=ag_models.StdinSource.setup_stdout)
+
+        tasks.grade_ag_test_suite_impl(self.ag_test_suite, self.submission, self.submission.group)
+
+        self.assertEqual('spam', self._get_results()[0]['stdout'])
+        res = ag_models.AGTestCommandResult.objects.get(ag_test_command=other_cmd)
+        with open_output(res.stdout_filename, 'r') as f:
+            self.assertEqual('spam', f.read())
+
+    def test_batch_error_commands_run_one_at_a_time(self, *args) -> None:
+        with mock.patch('autograder.grading_tasks.tasks.grade_ag_test.run_commands_in_batch',
+                        side_effect=BatchCommandError):
+            tasks.grade_ag_test_suite_impl(
+                self.ag_test_suite, self.submission, self.submission.group)
+
+        self.assertEqual(len(self.ag_test_cmds), ag_models.AGTestCommandResult.objects.count())
+        self.assertEqual('spam', self._get_results()[0]['stdout'])
+
+    def test_batch_error_only_commands_without_results_run_again(self, *args) -> None:
+        stdout = tempfile.NamedTemporaryFile()
+        stdout.write(b'from batch')
+        stdout.seek(0)
+        completed = CompletedCommand(
+            return_code=0, stdout=stdout, stderr=tempfile.NamedTemporaryFile(),
+            timed_out=False, stdout_truncated=False, stderr_truncated=False)
+
+        with mock.patch('autograder.grading_tasks.tasks.grade_ag_test.run_commands_in_batch',
+                        side_effect=BatchCommandError('', [completed])), \
+                mock.patch.object(AutograderSandbox, 'run_command', autospec=True,
+                                  side_effect=AutograderSandbox.run_command) as run_command:
+            tasks.grade_ag_test_suite_impl(
+                self.ag_test_suite, self.submission, self.submission.group)
+
+        # The setup command and each command after the first.
+        self.assertEqual(len(self.ag_test_cmds), run_command.call_count)
+        results = self._get_results()
+        self.assertEqual('from batch', results[0]['stdout'])
+        self.assertEqual('waluigi', results[2]['stdout'])
+
+    def _get_results(self):
+        results = []
+        for cmd in self.ag_test_cmds:
+            res = ag_models.AGTestCommandResult.objects.get(ag_test_command=cmd)
+            with open_output(res.stdout_filename, 'r') as stdout, \
+                    open_output(res.stderr_filename, 'r') as stderr:
+                results.append({
+                    'return_code': res.return_code,
+                    'return_code_correct': res.return_code_correct,
+                    'timed_out': res.timed_out,
+                    'stdout_correct': res.stdout_correct,
+                    'stdout_truncated': res.stdout_truncated,
+                    'stdout': stdout.read(),
+                    'stderr': stderr.read(),
+                })
+
+        return results
+
+
+@tag('slow', 'sandbox')
+@mock.patch('autograder.utils.retry.sleep')
+class ReuseDeterministicAGTestSuiteResultsTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.group = obj_build.make_group()
+        self.project = self.group.project
+        self.student_file = ag_models.ExpectedStudentFile.objects.validate_and_create(
+            pattern='*.txt', max_num_matches=10, project=self.project)
+        self.instructor_file = obj_build.make_instructor_file(self.project)
+
+        # The random output of these commands shows whether they were rerun.
+        self.ag_test_suite = obj_build.make_ag_test_suite(
+            self.project,
+            setup_suite_cmd='cat /proc/sys/kernel/random/uuid',
+            instructor_files_needed=[self.instructor_file.to_dict()],
+            student_files_needed=[self.student_file.to_dict()],
+            deterministic=True)
+        self.ag_test_case = obj_build.make_ag_test_case(self.ag_test_suite)
+        self.ag_test_cmd = obj_build.make_full_ag_test_command(
+            self.ag_test_case,
+            set_arbitrary_points=False,
+            set_arbitrary_expected_vals=False,
+            cmd='cat student.txt; cat /proc/sys/kernel/random/uuid',
+            expected_stdout_source=ag_models.ExpectedOutputSource.text,
+            expected_stdout_text='spam')
+
+    def test_identical_submission_results_reused(self, *args) -> None:
+        first = self._grade_submission(b'spam')
+        second = self._grade_submission(b'spam')
+
+        self.assertEqual(self._get_setup_stdout(first), self._get_setup_stdout(second))
+        first_cmd_result = self._get_cmd_result(first)
+        second_cmd_result = self._get_cmd_result(second)
+        self.assertNotEqual(first_cmd_result.pk, second_cmd_result.pk)
+        self.assertEqual(self._get_stdout(first_cmd_result), self._get_stdout(second_cmd_result))
+        self.assertFalse(second_cmd_result.stdout_correct)
+        self.assertEqual(first_cmd_result.return_code, second_cmd_result.return_code)
+        with open_output(second_cmd_result.stdout_diff_filename) as f:
+            self.assertEqual(second_cmd_result.stdout_diff_size, len(json.load(f)))
+
+        self.assertEqual(
+            {self.ag_test_suite.pk: (1, 1)}, get_result_reuse_stats([self.ag_test_suite.pk]))
+
+    def test_different_student_file_contents_not_reused(self, *args) -> None:
+        first = self._grade_submission(b'spam')
+        second = self._grade_submission(b'eggs')
+
+        self.assertNotEqual(self._get_setup_stdout(first), self._get_setup_stdout(second))
+        self.assertNotEqual(self._get_stdout(self._get_cmd_result(first)),
+                            self._get_stdout(self._get_cmd_result(second)))
+        self.assertEqual(
+            {self.ag_test_suite.pk: (0, 2)}, get_result_reuse_stats([self.ag_test_suite.pk]))
+
+    def test_changed_command_not_reused(self, *args) -> None:
+        first = self._grade_submission(b'spam')
+        self.ag_test_cmd.validate_and_update(expected_stdout_text='eggs')
+        second = self._grade_submission(b'spam')
+
+        self.assertNotEqual(self._get_setup_stdout(first), self._get_setup_stdout(second))
+
+    def test_changed_instructor_file_not_reused(self, *args) -> None:
+        first = self._grade_submission(b'spam')
+        with open(self.instructor_file.abspath, 'wb') as f:
+            f.write(b'new content')
+        second = self._grade_submission(b'spam')
+
+        self.assertNotEqual(self._get_setup_stdout(first), self._get_setup_stdout(second))
+
+    def test_nondeterministic_suite_not_reused(self, *args) -> None:
+        self.ag_test_suite.validate_and_update(deterministic=False)
+        first = self._grade_submission(b'spam')
+        second = self._grade_submission(b'spam')
+
+        self.assertNotEqual(self._get_setup_stdout(first), self._get_setup_stdout(second))
+        self.assertEqual(
+            {self.ag_test_suite.pk: (0, 0)}, get_result_reuse_stats([self.ag_test_suite.pk]))
+
+    def test_rerun_with_unchanged_inputs_reused(self, *args) -> None:
+        submission = self._grade_submission(b'spam')
+        setup_stdout = self._get_setup_stdout(submission)
+
+        finished = []
+        tasks.grade_ag_test_suite_impl(
+            self.ag_test_suite, submission, self.group, on_test_case_finished=finished.append)
+        self.assertEqual(setup_stdout, self._get_setup_stdout(submission))
+        self.assertEqual([self.ag_test_case.pk],
+                         [case_result.ag_test_case_id for case_result in finished])
+
+    def test_rerun_of_some_test_cases_not_reused(self, *args) -> None:
+        submission = self._grade_submission(b'spam')
+        setup_stdout = self._get_setup_stdout(submission)
+
+        tasks.grade_ag_test_suite_impl(
+            self.ag_test_suite, submission, self.group, self.ag_test_case.pk)
+        self.assertNotEqual(setup_stdout, self._get_setup_stdout(submission))
+        self.assertEqual(
+            '', ag_models.AGTestSuiteResult.objects.get(submission=submission).inputs_hash)
+
+    def _grade_submission(self, content: bytes) -> ag_models.Submission:
+        submission = obj_build.make_submission(
+            group=self.group,
+            submitted_files=[SimpleUploadedFile('student.txt', content)])
+        tasks.grade_ag_test_suite_impl(self.ag_test_suite, submission, self.group)
+        return submission
+
+    def _get_setup_stdout(self, submission: ag_models.Submission) -> str:
+        suite_result = ag_models.AGTestSuiteResult.objects.get(submission=submission)
+        with suite_result.open_setup_stdout() as f:
+            return f.read()
+
+    def _get_cmd_result(self, submission: ag_models.Submission) -> ag_models.AGTestCommandResult:
+        return ag_models.AGTestCommandResult.objects.get(
+            ag_test_case_result__ag_test_suite_result__submission=submission)
+
+    def _get_stdout(self, cmd_result: ag_models.AGTestCommandResult) -> bytes:
+        with open_output(cmd_result.stdout_filename, 'rb') as f:
+            return f.read()
+
+
+class AGTestResultReuseStatsCommandTestCase(UnitTestBase):
+    def test_stats_printed(self) -> None:
+        project = obj_build.make_project()
+        suite = obj_build.make_ag_test_suite(project, deterministic=True)
+        other_suite = obj_build.make_ag_test_suite(project, deterministic=True)
+        obj_build.make_ag_test_suite(project)
+
+        for hit in [True, True, True, False]:
+            record_result_reuse(suite.pk, hit=hit)
+
+        out = io.StringIO()
+        call_command('ag_test_result_reuse_stats', project=project.pk, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(2, len(lines))
+        self.assertIn('3 hits, 1 misses, hit rate 75.0%', lines[0])
+        self.assertIn(f'(suite {other_suite.pk}): 0 hits, 0 misses, hit rate -', lines[1])
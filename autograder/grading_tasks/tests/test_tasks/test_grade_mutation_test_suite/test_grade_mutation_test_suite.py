@@ -1,13 +1,16 @@
 import os
+import time
 from unittest import mock
 
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import tag
+from django.test import SimpleTestCase, override_settings, tag
 
 import autograder.core.models as ag_models
+from autograder.core.result_output import open_output
 import autograder.utils.testing.model_obj_builders as obj_build
 from autograder.core import constants
 from autograder.grading_tasks import tasks
+from autograder.grading_tasks.tasks.grade_mutation_test_suite import _BuggyImplRunner
 from autograder.utils.testing import TransactionUnitTestBase, UnitTestBase
 from autograder_sandbox.autograder_sandbox import AutograderSandbox, CompletedCommand
 import tempfile
@@ -92,38 +95,38 @@ class EECS280StyleMutationTestGradingIntegrationTestCase(UnitTestBase):
 
         self.assertEqual(0, result.get_test_names_result.return_code)
 
-        with open(result.get_test_names_result.stdout_filename) as f:
+        with open_output(result.get_test_names_result.stdout_filename, 'r') as f:
             print('get_test_names_result.stdout_filename')
             print(f.read())
-        with open(result.get_test_names_result.stderr_filename) as f:
+        with open_output(result.get_test_names_result.stderr_filename, 'r') as f:
             print('get_test_names_result.stderr_filename')
             print(f.read())
 
-        with open(result.setup_result.stdout_filename) as f:
+        with open_output(result.setup_result.stdout_filename, 'r') as f:
             print('setup_result stdout')
             print(f.read())
-        with open(result.setup_result.stderr_filename) as f:
+        with open_output(result.setup_result.stderr_filename, 'r') as f:
             print('setup_result stderr')
             print(f.read())
 
-        with open(result.get_test_names_result.stdout_filename) as f:
+        with open_output(result.get_test_names_result.stdout_filename, 'r') as f:
             print('get_test_names_result stdout')
             print(f.read())
-        with open(result.get_test_names_result.stderr_filename) as f:
+        with open_output(result.get_test_names_result.stderr_filename, 'r') as f:
             print('get_test_names_result stderr')
             print(f.read())
 
-        with open(result.validity_check_stdout_filename) as f:
+        with open_output(result.validity_check_stdout_filename, 'r') as f:
             print('open_validity_check_stdout')
             print(f.read())
-        with open(result.validity_check_stderr_filename) as f:
+        with open_output(result.validity_check_stderr_filename, 'r') as f:
             print('open_validity_check_stderr')
             print(f.read())
 
-        with open(result.grade_buggy_impls_stdout_filename) as f:
+        with open_output(result.grade_buggy_impls_stdout_filename, 'r') as f:
             print('open_grade_buggy_impls_stdout')
             print(f.read())
-        with open(result.grade_buggy_impls_stderr_filename) as f:
+        with open_output(result.grade_buggy_impls_stderr_filename, 'r') as f:
             print('open_grade_buggy_impls_stderr')
             print(f.read())
 
@@ -157,19 +160,19 @@ class EECS280StyleMutationTestGradingIntegrationTestCase(UnitTestBase):
         self.assertEqual([], result.invalid_tests)
         self.assertEqual([], result.timed_out_tests)
 
-        with open(result.get_test_names_result.stdout_filename) as f:
+        with open_output(result.get_test_names_result.stdout_filename, 'r') as f:
             self.assertEqual('', f.read())
-        with open(result.get_test_names_result.stderr_filename) as f:
+        with open_output(result.get_test_names_result.stderr_filename, 'r') as f:
             self.assertEqual('', f.read())
 
-        with open(result.validity_check_stdout_filename) as f:
+        with open_output(result.validity_check_stdout_filename, 'r') as f:
             self.assertEqual('', f.read())
-        with open(result.validity_check_stderr_filename) as f:
+        with open_output(result.validity_check_stderr_filename, 'r') as f:
             self.assertEqual('', f.read())
 
-        with open(result.grade_buggy_impls_stdout_filename) as f:
+        with open_output(result.grade_buggy_impls_stdout_filename, 'r') as f:
             self.assertEqual('', f.read())
-        with open(result.grade_buggy_impls_stderr_filename) as f:
+        with open_output(result.grade_buggy_impls_stderr_filename, 'r') as f:
             self.assertEqual('', f.read())
 
     def test_setup_command_times_out_no_tests_discovered(self, *args):
@@ -186,19 +189,19 @@ class EECS280StyleMutationTestGradingIntegrationTestCase(UnitTestBase):
             self.assertEqual([], result.invalid_tests)
             self.assertEqual([], result.timed_out_tests)
 
-            with open(result.get_test_names_result.stdout_filename) as f:
+            with open_output(result.get_test_names_result.stdout_filename, 'r') as f:
                 self.assertEqual('', f.read())
-            with open(result.get_test_names_result.stderr_filename) as f:
+            with open_output(result.get_test_names_result.stderr_filename, 'r') as f:
                 self.assertEqual('', f.read())
 
-            with open(result.validity_check_stdout_filename) as f:
+            with open_output(result.validity_check_stdout_filename, 'r') as f:
                 self.assertEqual('', f.read())
-            with open(result.validity_check_stderr_filename) as f:
+            with open_output(result.validity_check_stderr_filename, 'r') as f:
                 self.assertEqual('', f.read())
 
-            with open(result.grade_buggy_impls_stdout_filename) as f:
+            with open_output(result.grade_buggy_impls_stdout_filename, 'r') as f:
                 self.assertEqual('', f.read())
-            with open(result.grade_buggy_impls_stderr_filename) as f:
+            with open_output(result.grade_buggy_impls_stderr_filename, 'r') as f:
                 self.assertEqual('', f.read())
 
 
@@ -301,10 +304,10 @@ class MutationTestSuiteGradingEdgeCaseTestCase(UnitTestBase):
         self.assertEqual(0, result.get_test_names_result.return_code)
         self.assertSequenceEqual(test_names.split(), result.student_tests)
 
-        with open(result.get_test_names_result.stdout_filename) as f:
+        with open_output(result.get_test_names_result.stdout_filename, 'r') as f:
             self.assertEqual(test_names, f.read())
 
-        with open(result.get_test_names_result.stderr_filename) as f:
+        with open_output(result.get_test_names_result.stderr_filename, 'r') as f:
             self.assertEqual(stderr, f.read())
 
     def test_get_test_names_return_code_nonzero(self, *args):
@@ -326,23 +329,23 @@ class MutationTestSuiteGradingEdgeCaseTestCase(UnitTestBase):
         self.assertNotEqual(0, result.get_test_names_result.return_code)
         self.assertSequenceEqual([], result.student_tests)
 
-        with open(result.get_test_names_result.stdout_filename) as f:
+        with open_output(result.get_test_names_result.stdout_filename, 'r') as f:
             self.assertEqual(test_names, f.read())
 
-        with open(result.get_test_names_result.stderr_filename) as f:
+        with open_output(result.get_test_names_result.stderr_filename, 'r') as f:
             self.assertEqual(stderr, f.read())
 
         # Make sure that validity check and buggy impl grading didn't happen
-        with open(result.validity_check_stdout_filename) as f:
+        with open_output(result.validity_check_stdout_filename, 'r') as f:
             self.assertEqual('', f.read())
 
-        with open(result.validity_check_stderr_filename) as f:
+        with open_output(result.validity_check_stderr_filename, 'r') as f:
             self.assertEqual('', f.read())
 
-        with open(result.grade_buggy_impls_stdout_filename) as f:
+        with open_output(result.grade_buggy_impls_stdout_filename, 'r') as f:
             self.assertEqual('', f.read())
 
-        with open(result.grade_buggy_impls_stderr_filename) as f:
+        with open_output(result.grade_buggy_impls_stderr_filename, 'r') as f:
             self.assertEqual('', f.read())
 
     def test_non_default_docker_image(self, *args):
@@ -491,6 +494,118 @@ class MutationTestSuiteGradingEdgeCaseTestCase(UnitTestBase):
         ])
 
 
+@tag('slow', 'sandbox')
+@mock.patch('autograder.utils.retry.sleep')
+class ParallelMutationTestSuiteGradingTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.submission = obj_build.make_submission()
+        self.mutation_suite = obj_build.make_mutation_test_suite(
+            self.submission.project,
+            buggy_impl_names=['bug1', 'bug2', 'bug3'],
+            get_student_test_names_command={
+                'cmd': 'echo test1 test2 test3 test4'
+            },
+            student_test_validity_check_command={
+                # Later tests finish first.
+                'cmd': ("bash -c 'case ${student_test_name} in "
+                        "test1) sleep 0.4;; test2) sleep 0.2;; esac; "
+                        "echo ${student_test_name}; echo err >&2; "
+                        "[ ${student_test_name} != test3 ]'")
+            },
+            grade_buggy_impl_command={
+                'cmd': ("bash -c 'echo ${student_test_name} ${buggy_impl_name}; "
+                        'case "${student_test_name}-${buggy_impl_name}" in '
+                        "test2-bug1|test1-bug2|test4-bug2) false;; *) true;; esac'")
+            },
+            points_per_exposed_bug=1)
+
+    def test_parallel_results_and_output_match_sequential(self, *args) -> None:
+        tasks.grade_mutation_test_suite_impl(self.mutation_suite, self.submission)
+        sequential_result = self._get_result()
+
+        self.assertEqual(['test1', 'test2', 'test4'], sequential_result['valid_tests'])
+        self.assertEqual(['test3'], sequential_result['invalid_tests'])
+        self.assertEqual(['bug1', 'bug2'], sequential_result['bugs_exposed'])
+        self.assertEqual(
+            '\n----- Bug "bug1" with Test "test1" -----\ntest1 bug1\n'
+            '\n----- Bug "bug1" with Test "test2" -----\ntest2 bug1\n'
+            '\n----- Bug "bug2" with Test "test1" -----\ntest1 bug2\n'
+            '\n----- Bug "bug3" with Test "test1" -----\ntest1 bug3\n'
+            '\n----- Bug "bug3" with Test "test2" -----\ntest2 bug3\n'
+            '\n----- Bug "bug3" with Test "test4" -----\ntest4 bug3\n',
+            sequential_result['grade_buggy_impls_stdout'])
+
+        self.mutation_suite.validate_and_update(run_student_tests_in_parallel=True)
+        with override_settings(MUTATION_TEST_MAX_PARALLELISM=3):
+            tasks.grade_mutation_test_suite_impl(self.mutation_suite, self.submission)
+
+        self.assertEqual(sequential_result, self._get_result())
+
+    def _get_result(self) -> dict:
+        result = ag_models.MutationTestSuiteResult.objects.get(
+            mutation_test_suite=self.mutation_suite)
+        output = {
+            'valid_tests': [
+                test for test in result.student_tests if test not in result.invalid_tests],
+            'invalid_tests': result.invalid_tests,
+            'bugs_exposed': result.bugs_exposed,
+        }
+        for field in ['validity_check_stdout', 'validity_check_stderr',
+                      'grade_buggy_impls_stdout', 'grade_buggy_impls_stderr']:
+            with open_output(getattr(result, field + '_filename'), 'r') as f:
+                output[field] = f.read()
+
+        return output
+
+
+class BuggyImplRunnerTestCase(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.mutation_suite = mock.Mock(
+            buggy_impl_names=['bug1', 'bug2', 'bug3'],
+            grade_buggy_impl_command=mock.Mock(
+                cmd='${student_test_name} ${buggy_impl_name}'))
+        self.valid_tests = ['test1', 'test2', 'test3', 'test4']
+        self.exposed_by = {('test2', 'bug1'), ('test4', 'bug1'), ('test1', 'bug2')}
+
+    def test_pairs_run_one_at_a_time(self) -> None:
+        self._do_run_test(max_parallelism=1)
+        self.assertEqual(
+            ['test1 bug1', 'test2 bug1', 'test1 bug2',
+             'test1 bug3', 'test2 bug3', 'test3 bug3', 'test4 bug3'],
+            [call[1]['cmd_str_override'] for call in self.run_command_mock.call_args_list])
+
+    def test_pairs_run_in_parallel(self) -> None:
+        self._do_run_test(max_parallelism=4)
+
+    def _do_run_test(self, *, max_parallelism: int) -> None:
+        def run_ag_command(cmd, sandbox, cmd_str_override):
+            test, bug = cmd_str_override.split()
+            # Later pairs finish first.
+            time.sleep((4 - int(test[-1])) * 0.01)
+            return mock.Mock(return_code=int((test, bug) in self.exposed_by))
+
+        self.run_command_mock = mock.Mock(side_effect=run_ag_command)
+        with mock.patch('autograder.grading_tasks.tasks.grade_mutation_test_suite.run_ag_command',
+                        new=self.run_command_mock):
+            runner = _BuggyImplRunner(self.mutation_suite, mock.Mock(), self.valid_tests)
+            results = [
+                (bug, test, run_result.return_code)
+                for bug, test, run_result in runner.run(max_parallelism=max_parallelism)
+            ]
+
+        self.assertEqual([
+            ('bug1', 'test1', 0),
+            ('bug1', 'test2', 1),
+            ('bug2', 'test1', 1),
+            ('bug3', 'test1', 0),
+            ('bug3', 'test2', 0),
+            ('bug3', 'test3', 0),
+            ('bug3', 'test4', 0),
+        ], results)
+
+
 @mock.patch('autograder.utils.retry.sleep')
 class NoRetryOnObjectNotFoundTestCase(TransactionUnitTestBase):
     def test_mutation_test_suite_not_found_no_retry(self, sleep_mock) -> None:
@@ -1,4 +1,5 @@
 from autograder.core.models import submission
+import copy
 from unittest import mock
 
 from django.conf import settings
@@ -6,6 +7,7 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import tag
 
 import autograder.core.models as ag_models
+from autograder.core.result_output import open_output
 import autograder.utils.testing.model_obj_builders as obj_build
 from autograder.core.models.ag_test.feedback_category import FeedbackCategory
 from autograder.core.submission_feedback import (AGTestPreLoader, SubmissionResultFeedback,
@@ -66,12 +68,12 @@ class GradeSubmissionTestCase(UnitTestBase):
         cmd_result = ag_models.AGTestCommandResult.objects.get(
             ag_test_command=cmd,
             ag_test_case_result__ag_test_suite_result__submission=self.submission)
-        with open(cmd_result.stderr_filename) as f:
+        with open_output(cmd_result.stderr_filename, 'r') as f:
             output = f.read()
         print(output)
         self.assertEqual(0, cmd_result.return_code, msg=output)
-        self.assertEqual('hello', open(cmd_result.stdout_filename).read())
-        self.assertEqual('whoops', open(cmd_result.stderr_filename).read())
+        self.assertEqual('hello', open_output(cmd_result.stdout_filename, 'r').read())
+        self.assertEqual('whoops', open_output(cmd_result.stderr_filename, 'r').read())
         self.assertTrue(cmd_result.stdout_correct)
         self.assertTrue(cmd_result.stderr_correct)
 
@@ -181,8 +183,8 @@ class GradeSubmissionTestCase(UnitTestBase):
 
         for res in cmd_results:
             self.assertEqual(0, res.return_code)
-            self.assertEqual('hello', open(res.stdout_filename).read())
-            self.assertEqual('whoops', open(res.stderr_filename).read())
+            self.assertEqual('hello', open_output(res.stdout_filename, 'r').read())
+            self.assertEqual('whoops', open_output(res.stderr_filename, 'r').read())
             self.assertTrue(res.stdout_correct)
             self.assertTrue(res.stderr_correct)
 
@@ -281,13 +283,13 @@ void file2() {
 
         tasks.grade_submission_task(self.submission.pk)
         res = ag_models.AGTestCommandResult.objects.get(ag_test_command=cmd)
-        self.assertEqual('hello', open(res.stdout_filename).read())
+        self.assertEqual('hello', open_output(res.stdout_filename, 'r').read())
 
         cmd.cmd = 'printf weee'
         cmd.save()
         tasks.grade_submission_task(self.submission.pk)
         res = ag_models.AGTestCommandResult.objects.get(ag_test_command=cmd)
-        self.assertEqual('weee', open(res.stdout_filename).read())
+        self.assertEqual('weee', open_output(res.stdout_filename, 'r').read())
 
     def test_network_access_allowed_in_suite(self, *args):
         suite1 = obj_build.make_ag_test_suite(self.project, allow_network_access=True)
@@ -308,7 +310,7 @@ void file2() {
 
         res = ag_models.AGTestCommandResult.objects.get(ag_test_command=cmd)
         self.assertEqual(' '.join(self.submission.group.member_names),
-                         open(res.stdout_filename).read())
+                         open_output(res.stdout_filename, 'r').read())
 
     def test_one_ag_suite_deferred_one_mutation_suite_deferred(self, *args):
         suite1 = obj_build.make_ag_test_suite(self.project, deferred=False)
@@ -554,11 +556,11 @@ class DenormalizedResultsUpdateTestCase(UnitTestBase):
 
         def save_denormalized_ag_test_suite_result(self, *args) -> None:
             super().save_denormalized_ag_test_suite_result(*args)
-            self.denormalized_result_snapshots.append(self.submission)
+            self.denormalized_result_snapshots.append(copy.deepcopy(self.submission))
 
         def save_denormalized_ag_test_case_result(self, *args) -> None:
             super().save_denormalized_ag_test_case_result(*args)
-            self.denormalized_result_snapshots.append(self.submission)
+            self.denormalized_result_snapshots.append(copy.deepcopy(self.submission))
 
     def setUp(self):
         super().setUp()
@@ -1,16 +1,22 @@
 from unittest import mock
 
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings, tag
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from django.test import tag
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
 import autograder.core.models as ag_models
 import autograder.utils.testing.model_obj_builders as obj_build
-from autograder.utils.testing import TransactionUnitTestBase, sleeper_subtest
+from autograder.utils.testing import TransactionUnitTestBase, UnitTestBase, sleeper_subtest
 
 from autograder.grading_tasks import tasks
+from autograder.grading_tasks.tasks.queueing import get_submission_queue_name, queue_submission
+
+_APPLY_ASYNC_PATH = 'autograder.grading_tasks.tasks.queueing.grade_submission.apply_async'
 
 
 @tag('slow')
@@ -42,3 +48,150 @@ class RaceConditionTestCase(TransactionUnitTestBase):
         self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
 
         self.assertEqual(ag_models.Submission.GradingStatus.finished_grading, submission.status)
+
+
+@mock.patch(_APPLY_ASYNC_PATH)
+class QueueSubmissionTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.submission = obj_build.make_submission()
+        self.project = self.submission.group.project
+
+    def test_received_submission_queued(self, mock_apply_async: mock.Mock) -> None:
+        self.assertTrue(queue_submission(self.submission.pk, self.project.pk))
+
+        self.submission.refresh_from_db()
+        self.assertEqual(ag_models.Submission.GradingStatus.queued, self.submission.status)
+        mock_apply_async.assert_called_once_with(
+            [self.submission.pk], queue=settings.FAST_QUEUE_TMPL.format(self.project.pk))
+
+    def test_submission_not_received_not_queued(self, mock_apply_async: mock.Mock) -> None:
+        for grading_status in (ag_models.Submission.GradingStatus.queued,
+                               ag_models.Submission.GradingStatus.removed_from_queue,
+                               ag_models.Submission.GradingStatus.being_graded):
+            self.submission.status = grading_status
+            self.submission.save()
+
+            self.assertFalse(queue_submission(self.submission.pk, self.project.pk))
+            self.submission.refresh_from_db()
+            self.assertEqual(grading_status, self.submission.status)
+
+        mock_apply_async.assert_not_called()
+
+    def test_submission_marked_as_received_if_send_fails(
+        self, mock_apply_async: mock.Mock
+    ) -> None:
+        mock_apply_async.side_effect = RuntimeError('Broker down')
+        with self.assertRaises(RuntimeError):
+            queue_submission(self.submission.pk, self.project.pk)
+
+        self.submission.refresh_from_db()
+        self.assertEqual(ag_models.Submission.GradingStatus.received, self.submission.status)
+
+    def test_queue_submissions_sweeper(self, mock_apply_async: mock.Mock) -> None:
+        received = [self.submission] + [
+            obj_build.make_submission(group=obj_build.make_group(project=self.project))
+            for i in range(2)
+        ]
+        finished = obj_build.make_finished_submission(
+            group=obj_build.make_group(project=self.project))
+
+        with CaptureQueriesContext(connection) as queries:
+            tasks.queue_submissions()
+
+        update_queries = [
+            query for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(1, len(update_queries))
+
+        for submission in received:
+            submission.refresh_from_db()
+            self.assertEqual(ag_models.Submission.GradingStatus.queued, submission.status)
+
+        finished.refresh_from_db()
+        self.assertEqual(ag_models.Submission.GradingStatus.finished_grading, finished.status)
+
+        queue_name = settings.FAST_QUEUE_TMPL.format(self.project.pk)
+        mock_apply_async.assert_has_calls([
+            mock.call([submission.pk], queue=queue_name)
+            for submission in sorted(received, key=lambda submission: submission.pk)
+        ])
+        self.assertEqual(len(received), mock_apply_async.call_count)
+
+    def test_queue_submissions_sweeper_send_fails(self, mock_apply_async: mock.Mock) -> None:
+        mock_apply_async.side_effect = RuntimeError('Broker down')
+        tasks.queue_submissions()
+
+        self.submission.refresh_from_db()
+        self.assertEqual(ag_models.Submission.GradingStatus.received, self.submission.status)
+
+
+class GetSubmissionQueueNameTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.project = obj_build.make_project()
+        self.suite = obj_build.make_ag_test_suite(self.project)
+        self.case = obj_build.make_ag_test_case(self.suite)
+
+    def test_slow_project_uses_submission_queue(self) -> None:
+        self.assertEqual(
+            settings.FAST_QUEUE_TMPL.format(self.project.pk),
+            get_submission_queue_name(self.project.pk))
+
+        for i in range(7):
+            obj_build.make_full_ag_test_command(self.case, time_limit=90)
+
+        self.assertEqual(
+            settings.SUBMISSION_QUEUE_TMPL.format(self.project.pk),
+            get_submission_queue_name(self.project.pk))
+
+    def test_queue_name_cached(self) -> None:
+        obj_build.make_full_ag_test_command(self.case, time_limit=5)
+        get_submission_queue_name(self.project.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                settings.FAST_QUEUE_TMPL.format(self.project.pk),
+                get_submission_queue_name(self.project.pk))
+        self.assertEqual(0, len(queries.captured_queries))
+
+
+@override_settings(QUEUE_SUBMISSIONS_ON_CREATE=True)
+@mock.patch(_APPLY_ASYNC_PATH)
+class QueueSubmissionOnCreateTestCase(TransactionUnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.group = obj_build.make_group(members_role=obj_build.UserRole.admin)
+        self.client = APIClient()
+        self.client.force_authenticate(self.group.members.first())
+
+    def test_submission_queued_when_created(self, mock_apply_async: mock.Mock) -> None:
+        response = self.client.post(reverse('submissions', kwargs={'pk': self.group.pk}),
+                                    {'submitted_files': []},
+                                    format='multipart')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code, msg=response.data)
+
+        submission = ag_models.Submission.objects.get(pk=response.data['pk'])
+        self.assertEqual(ag_models.Submission.GradingStatus.queued, submission.status)
+        mock_apply_async.assert_called_once_with(
+            [submission.pk], queue=settings.FAST_QUEUE_TMPL.format(self.group.project.pk))
+
+    def test_submission_left_for_sweeper_if_send_fails(self, mock_apply_async: mock.Mock) -> None:
+        mock_apply_async.side_effect = RuntimeError('Broker down')
+        response = self.client.post(reverse('submissions', kwargs={'pk': self.group.pk}),
+                                    {'submitted_files': []},
+                                    format='multipart')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code, msg=response.data)
+
+        submission = ag_models.Submission.objects.get(pk=response.data['pk'])
+        self.assertEqual(ag_models.Submission.GradingStatus.received, submission.status)
+
+    @override_settings(QUEUE_SUBMISSIONS_ON_CREATE=False)
+    def test_queue_on_create_disabled(self, mock_apply_async: mock.Mock) -> None:
+        response = self.client.post(reverse('submissions', kwargs={'pk': self.group.pk}),
+                                    {'submitted_files': []},
+                                    format='multipart')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code, msg=response.data)
+
+        submission = ag_models.Submission.objects.get(pk=response.data['pk'])
+        self.assertEqual(ag_models.Submission.GradingStatus.received, submission.status)
+        mock_apply_async.assert_not_called()
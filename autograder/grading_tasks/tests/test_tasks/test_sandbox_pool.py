@@ -0,0 +1,223 @@
+from unittest import mock
+
+from autograder_sandbox.autograder_sandbox import SANDBOX_DOCKER_IMAGE
+from django.test import override_settings, tag
+
+import autograder.core.models as ag_models
+import autograder.utils.testing.model_obj_builders as obj_build
+from autograder.grading_tasks import tasks
+from autograder.grading_tasks.tasks import sandbox_pool
+from autograder.grading_tasks.tasks.sandbox_pool import SandboxPool, get_sandbox_pool
+from autograder.utils.testing import UnitTestBase
+
+
+@tag('slow', 'sandbox')
+class SandboxPoolTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.pool = SandboxPool(2, max_idle_time=600, max_uses=50)
+
+    def tearDown(self):
+        self.pool.drain()
+        super().tearDown()
+
+    def test_sandbox_reused_for_same_key(self) -> None:
+        with self._lease() as sandbox:
+            first_name = sandbox.name
+
+        self.assertEqual(1, self.pool.num_idle)
+
+        with self._lease() as sandbox:
+            self.assertEqual(first_name, sandbox.name)
+
+        self.assertEqual(2, self.pool.stats.num_leases)
+        self.assertEqual(1, self.pool.stats.num_created)
+
+    def test_different_network_access_not_reused(self) -> None:
+        with self._lease(allow_network_access=False) as sandbox:
+            first_name = sandbox.name
+
+        with self._lease(allow_network_access=True) as sandbox:
+            self.assertNotEqual(first_name, sandbox.name)
+            self.assertTrue(sandbox.allow_network_access)
+
+        self.assertEqual(2, self.pool.stats.num_created)
+
+    def test_reset_removes_files_and_kills_processes(self) -> None:
+        with self._lease() as sandbox:
+            sandbox.run_command(['touch', 'spam', '/tmp/egg'], check=True)
+            sandbox.run_command(
+                ['bash', '-c', 'nohup sleep 300 > /dev/null 2>&1 &'], check=True)
+
+        with self._lease() as sandbox:
+            ls_result = sandbox.run_command(['ls', '-A'], check=True)
+            self.assertEqual(b'', ls_result.stdout.read())
+
+            tmp_result = sandbox.run_command(['ls', '/tmp/egg'])
+            self.assertNotEqual(0, tmp_result.return_code)
+
+            pgrep_result = sandbox.run_command(['pgrep', 'sleep'])
+            self.assertNotEqual(0, pgrep_result.return_code)
+
+    def test_reset_restores_home_dir_and_user_owned_paths(self) -> None:
+        with self._lease() as sandbox:
+            original_bashrc = sandbox.run_command(
+                ['cat', '/home/autograder/.bashrc'], check=True).stdout.read()
+            sandbox.run_command([
+                'bash', '-c',
+                'echo "echo pwned" >> ~/.bashrc; '
+                'mkdir -p ~/.local/lib/python3/site-packages ~/.cache; '
+                'touch ~/.local/lib/python3/site-packages/spam.pth ~/.cache/egg; '
+                'chmod 777 ~; touch /dev/shm/sausage /var/tmp/baked_beans'
+            ], check=True)
+
+        with self._lease() as sandbox:
+            bashrc = sandbox.run_command(['cat', '/home/autograder/.bashrc'], check=True)
+            self.assertEqual(original_bashrc, bashrc.stdout.read())
+
+            for path in ['/home/autograder/.local/lib/python3/site-packages/spam.pth',
+                         '/home/autograder/.cache/egg',
+                         '/dev/shm/sausage',
+                         '/var/tmp/baked_beans']:
+                self.assertNotEqual(0, sandbox.run_command(['ls', path]).return_code)
+
+            mode = sandbox.run_command(['stat', '-c', '%a', '/home/autograder'], check=True)
+            self.assertNotEqual(b'777', mode.stdout.read().strip())
+
+            # The archive of the home directory can't be read or
+            # modified by the sandbox user.
+            self.assertNotEqual(
+                0, sandbox.run_command(['ls', '/var/lib/ag_sandbox_pool']).return_code)
+
+    def test_sandbox_with_unresettable_paths_not_reused(self) -> None:
+        with mock.patch('autograder.grading_tasks.tasks.sandbox_pool._SNAPSHOT_CMD',
+                        'echo /etc/world_writable; exit 1'):
+            with self._lease() as sandbox:
+                first_name = sandbox.name
+                self.assertFalse(sandbox.resettable)
+
+        self.assertEqual(0, self.pool.num_idle)
+        self.assertEqual(1, self.pool.stats.num_not_resettable)
+        self.assertEqual(0, self.pool.stats.num_reset_failures)
+
+        with self._lease() as sandbox:
+            self.assertNotEqual(first_name, sandbox.name)
+            self.assertTrue(sandbox.resettable)
+
+    def test_lease_environment_variables(self) -> None:
+        with self._lease(environment_variables={'usernames': 'spam egg'}) as sandbox:
+            result = sandbox.run_command(['bash', '-c', 'printf "$usernames"'], check=True)
+            self.assertEqual(b'spam egg', result.stdout.read())
+
+        with self._lease() as sandbox:
+            result = sandbox.run_command(['bash', '-c', 'printf "$usernames"'], check=True)
+            self.assertEqual(b'', result.stdout.read())
+
+    def test_least_recently_returned_sandbox_evicted_when_full(self) -> None:
+        pool = SandboxPool(1, max_idle_time=600, max_uses=50)
+        self.addCleanup(pool.drain)
+
+        with pool.lease(docker_image=SANDBOX_DOCKER_IMAGE, allow_network_access=False):
+            with pool.lease(docker_image=SANDBOX_DOCKER_IMAGE,
+                            allow_network_access=True) as sandbox:
+                second_name = sandbox.name
+
+        self.assertEqual(1, pool.num_idle)
+        self.assertEqual(1, pool.stats.num_evicted)
+
+        with pool.lease(docker_image=SANDBOX_DOCKER_IMAGE, allow_network_access=True) as sandbox:
+            self.assertEqual(second_name, sandbox.name)
+
+    def test_idle_sandbox_evicted_after_max_idle_time(self) -> None:
+        pool = SandboxPool(2, max_idle_time=0, max_uses=50)
+        self.addCleanup(pool.drain)
+
+        with pool.lease(docker_image=SANDBOX_DOCKER_IMAGE,
+                        allow_network_access=False) as sandbox:
+            first_name = sandbox.name
+
+        with pool.lease(docker_image=SANDBOX_DOCKER_IMAGE,
+                        allow_network_access=False) as sandbox:
+            self.assertNotEqual(first_name, sandbox.name)
+
+    def test_sandbox_evicted_after_max_uses(self) -> None:
+        pool = SandboxPool(2, max_idle_time=600, max_uses=1)
+        self.addCleanup(pool.drain)
+
+        with pool.lease(docker_image=SANDBOX_DOCKER_IMAGE, allow_network_access=False):
+            pass
+
+        self.assertEqual(0, pool.num_idle)
+        self.assertEqual(1, pool.stats.num_evicted)
+
+    def test_sandbox_discarded_on_error(self) -> None:
+        with self.assertRaises(RuntimeError):
+            with self._lease():
+                raise RuntimeError
+
+        self.assertEqual(0, self.pool.num_idle)
+        self.assertEqual(1, self.pool.stats.num_evicted)
+
+    def test_failed_reset_discards_sandbox(self) -> None:
+        with mock.patch('autograder.grading_tasks.tasks.sandbox_pool._reset_sandbox',
+                        return_value=False):
+            with self._lease():
+                pass
+
+        self.assertEqual(0, self.pool.num_idle)
+        self.assertEqual(1, self.pool.stats.num_reset_failures)
+
+    def _lease(self, *, allow_network_access=False, environment_variables=None):
+        return self.pool.lease(
+            docker_image=SANDBOX_DOCKER_IMAGE,
+            allow_network_access=allow_network_access,
+            environment_variables=environment_variables)
+
+
+class GetSandboxPoolTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(setattr, sandbox_pool, '_pool', None)
+
+    @override_settings(SANDBOX_POOL_SIZE=0)
+    def test_pooling_disabled(self) -> None:
+        self.assertIsNone(get_sandbox_pool())
+
+    @override_settings(SANDBOX_POOL_SIZE=3)
+    def test_pool_created_once_per_process(self) -> None:
+        pool = get_sandbox_pool()
+        self.assertIsNotNone(pool)
+        self.assertEqual(3, pool.max_size)
+        self.assertIs(pool, get_sandbox_pool())
+
+
+@tag('slow', 'sandbox')
+@mock.patch('autograder.utils.retry.sleep')
+@override_settings(SANDBOX_POOL_SIZE=1)
+class GradeWithSandboxPoolTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(setattr, sandbox_pool, '_pool', None)
+        self.addCleanup(lambda: get_sandbox_pool().drain())
+
+        self.submission = obj_build.make_submission()
+        self.project = self.submission.group.project
+        self.ag_test_suite = obj_build.make_ag_test_suite(self.project)
+        self.ag_test_case = obj_build.make_ag_test_case(self.ag_test_suite)
+
+    def test_suites_graded_in_pooled_sandbox(self, *args) -> None:
+        cmd = obj_build.make_full_ag_test_command(
+            self.ag_test_case,
+            cmd='bash -c \'printf "$usernames"; ls\'',
+            expected_stdout_source=ag_models.ExpectedOutputSource.text,
+            expected_stdout_text=' '.join(self.submission.group.member_names))
+
+        tasks.grade_submission_task(self.submission.pk)
+        tasks.grade_submission_task(self.submission.pk)
+
+        res = ag_models.AGTestCommandResult.objects.get(ag_test_command=cmd)
+        self.assertTrue(res.stdout_correct)
+
+        pool = get_sandbox_pool()
+        self.assertEqual(2, pool.stats.num_leases)
+        self.assertEqual(1, pool.stats.num_created)
@@ -0,0 +1,187 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings, tag
+
+import autograder.core.models as ag_models
+import autograder.utils.testing.model_obj_builders as obj_build
+from autograder.core.result_output import open_output
+from autograder.grading_tasks import tasks
+from autograder.grading_tasks.tasks.exceptions import SubmissionRejected
+from autograder.grading_tasks.tasks.setup_snapshot_cache import (evict_setup_snapshots,
+                                                                 setup_snapshot_cache_dir)
+from autograder.utils.testing import UnitTestBase
+
+
+@tag('slow', 'sandbox')
+@mock.patch('autograder.utils.retry.sleep')
+class SetupSnapshotCacheTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.group = obj_build.make_group()
+        self.project = self.group.project
+        self.student_file = ag_models.ExpectedStudentFile.objects.validate_and_create(
+            pattern='*.txt', max_num_matches=10, project=self.project)
+
+        # The random output of the setup command shows whether it was
+        # rerun. The student file is removed to check that the working
+        # directory is restored as it was after the setup command.
+        setup_suite_cmd = (
+            'cat /proc/sys/kernel/random/uuid | tee uuid; '
+            'cp student.txt compiled; rm student.txt')
+        self.ag_test_suites = [
+            obj_build.make_ag_test_suite(
+                self.project,
+                setup_suite_cmd=setup_suite_cmd,
+                student_files_needed=[self.student_file.to_dict()],
+                reuse_setup_snapshots=True)
+            for _ in range(2)
+        ]
+        self.ag_test_cmds = [
+            obj_build.make_full_ag_test_command(
+                obj_build.make_ag_test_case(ag_test_suite),
+                set_arbitrary_points=False,
+                set_arbitrary_expected_vals=False,
+                cmd='cat uuid compiled; ls; whoami > whoami; stat -c %U compiled')
+            for ag_test_suite in self.ag_test_suites
+        ]
+
+    def test_snapshot_shared_between_suites(self, *args) -> None:
+        submission = self._make_submission(b'spam')
+        for ag_test_suite in self.ag_test_suites:
+            tasks.grade_ag_test_suite_impl(ag_test_suite, submission, self.group)
+
+        setup_stdouts = [
+            self._get_setup_stdout(submission, ag_test_suite)
+            for ag_test_suite in self.ag_test_suites
+        ]
+        self.assertEqual(setup_stdouts[0], setup_stdouts[1])
+
+        for ag_test_cmd in self.ag_test_cmds:
+            self.assertEqual(
+                setup_stdouts[0] + 'spam' + 'compiled\nuuid\n' + 'autograder\n',
+                self._get_cmd_stdout(submission, ag_test_cmd))
+
+    def test_rerun_restores_snapshot(self, *args) -> None:
+        submission = self._make_submission(b'spam')
+        ag_test_suite = self.ag_test_suites[0]
+        tasks.grade_ag_test_suite_impl(ag_test_suite, submission, self.group)
+        setup_stdout = self._get_setup_stdout(submission, ag_test_suite)
+
+        with mock.patch('autograder.grading_tasks.tasks.grade_ag_test.add_files_to_sandbox'
+                        ) as add_files_to_sandbox:
+            tasks.grade_ag_test_suite_impl(ag_test_suite, submission, self.group)
+        add_files_to_sandbox.assert_not_called()
+
+        self.assertEqual(setup_stdout, self._get_setup_stdout(submission, ag_test_suite))
+        suite_result = ag_models.AGTestSuiteResult.objects.get(
+            submission=submission, ag_test_suite=ag_test_suite)
+        self.assertEqual(0, suite_result.setup_return_code)
+        self.assertFalse(suite_result.setup_timed_out)
+
+    def test_different_student_files_not_shared(self, *args) -> None:
+        first = self._make_submission(b'spam')
+        second = self._make_submission(b'egg')
+        tasks.grade_ag_test_suite_impl(self.ag_test_suites[0], first, self.group)
+        tasks.grade_ag_test_suite_impl(self.ag_test_suites[1], second, self.group)
+
+        self.assertNotEqual(self._get_setup_stdout(first, self.ag_test_suites[0]),
+                            self._get_setup_stdout(second, self.ag_test_suites[1]))
+        self.assertIn('egg', self._get_cmd_stdout(second, self.ag_test_cmds[1]))
+
+    def test_different_setup_cmd_not_shared(self, *args) -> None:
+        self.ag_test_suites[1].validate_and_update(
+            setup_suite_cmd=self.ag_test_suites[1].setup_suite_cmd + '; true')
+        self._check_not_shared()
+
+    def test_suite_without_reuse_setup_snapshots_not_shared(self, *args) -> None:
+        self.ag_test_suites[1].validate_and_update(reuse_setup_snapshots=False)
+        self._check_not_shared()
+
+    @override_settings(SETUP_SNAPSHOT_CACHE_MAX_SIZE=0)
+    def test_snapshots_evicted(self, *args) -> None:
+        self._check_not_shared()
+        self.assertEqual([], os.listdir(setup_snapshot_cache_dir()))
+
+    def test_rejected_submission_rejected_again_when_snapshot_restored(self, *args) -> None:
+        for ag_test_suite in self.ag_test_suites:
+            ag_test_suite.validate_and_update(
+                setup_suite_cmd='cat /proc/sys/kernel/random/uuid; false',
+                reject_submission_if_setup_fails=True)
+
+        submission = self._make_submission(b'spam')
+        for ag_test_suite in self.ag_test_suites:
+            with self.assertRaises(SubmissionRejected):
+                tasks.grade_ag_test_suite_impl(ag_test_suite, submission, self.group)
+
+        self.assertEqual(self._get_setup_stdout(submission, self.ag_test_suites[0]),
+                         self._get_setup_stdout(submission, self.ag_test_suites[1]))
+
+    def _check_not_shared(self) -> None:
+        submission = self._make_submission(b'spam')
+        for ag_test_suite in self.ag_test_suites:
+            tasks.grade_ag_test_suite_impl(ag_test_suite, submission, self.group)
+
+        self.assertNotEqual(self._get_setup_stdout(submission, self.ag_test_suites[0]),
+                            self._get_setup_stdout(submission, self.ag_test_suites[1]))
+
+    def _make_submission(self, content: bytes) -> ag_models.Submission:
+        return obj_build.make_submission(
+            group=self.group,
+            submitted_files=[SimpleUploadedFile('student.txt', content)])
+
+    def _get_setup_stdout(self, submission: ag_models.Submission,
+                          ag_test_suite: ag_models.AGTestSuite) -> str:
+        suite_result = ag_models.AGTestSuiteResult.objects.get(
+            submission=submission, ag_test_suite=ag_test_suite)
+        with suite_result.open_setup_stdout() as f:
+            return f.read()
+
+    def _get_cmd_stdout(self, submission: ag_models.Submission,
+                        ag_test_cmd: ag_models.AGTestCommand) -> str:
+        cmd_result = ag_models.AGTestCommandResult.objects.get(
+            ag_test_command=ag_test_cmd,
+            ag_test_case_result__ag_test_suite_result__submission=submission)
+        with open_output(cmd_result.stdout_filename, 'r') as f:
+            return f.read()
+
+
+class EvictSetupSnapshotsTestCase(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        media_root_override = override_settings(MEDIA_ROOT=tempdir.name)
+        media_root_override.enable()
+        self.addCleanup(media_root_override.disable)
+
+    def test_least_recently_used_snapshots_evicted(self) -> None:
+        # Snapshots are touched when they're restored.
+        self._make_snapshot('oldest', size=100, mtime=1)
+        self._make_snapshot('restored', size=100, mtime=4)
+        self._make_snapshot('old', size=100, mtime=2)
+        self._make_snapshot('newest', size=100, mtime=3)
+
+        evict_setup_snapshots(250)
+        self.assertCountEqual(['restored', 'newest'], os.listdir(setup_snapshot_cache_dir()))
+
+        evict_setup_snapshots(200)
+        self.assertCountEqual(['restored', 'newest'], os.listdir(setup_snapshot_cache_dir()))
+
+        evict_setup_snapshots(0)
+        self.assertEqual([], os.listdir(setup_snapshot_cache_dir()))
+
+    def test_no_snapshots(self) -> None:
+        evict_setup_snapshots(0)
+        self.assertFalse(os.path.exists(setup_snapshot_cache_dir()))
+
+    def _make_snapshot(self, key: str, *, size: int, mtime: float) -> None:
+        dirname = os.path.join(setup_snapshot_cache_dir(), key)
+        os.makedirs(dirname)
+        with open(os.path.join(dirname, 'working_dir.tar.gz'), 'wb') as f:
+            f.write(b'x' * (size - 10))
+        with open(os.path.join(dirname, 'setup_result.json'), 'wb') as f:
+            f.write(b'x' * 10)
+        os.utime(dirname, (mtime, mtime))
@@ -316,7 +316,6 @@ class ListHandgradingResultsView(AGModelAPIView):
 
         groups = project.groups.prefetch_related(
             'members',
-            'submissions',
             Prefetch('handgrading_result', hg_result_queryset),
         ).all()
 
@@ -328,6 +327,8 @@ class ListHandgradingResultsView(AGModelAPIView):
             )
             groups = groups.exclude(members__in=staff)
 
+        groups = ag_models.annotate_submission_counts(groups, project)
+
         paginator = HandgradingResultPaginator()
         page = paginator.paginate_queryset(queryset=groups, request=self.request, view=self)
 
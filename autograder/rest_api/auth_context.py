@@ -0,0 +1,71 @@
+from typing import Dict, FrozenSet
+
+from django.contrib.auth.models import User
+
+import autograder.core.models as ag_models
+
+
+class AuthorizationContext:
+    """
+    Loads the requesting user's course roles and group memberships at
+    most once per request so that permission classes and views that
+    check the same things don't repeat cache requests and queries.
+    Use get_auth_context() to get the context for a request.
+    """
+
+    def __init__(self, user: User):
+        self.user = user
+        self._user_roles = {}  # type: Dict[int, Dict[str, bool]]
+        self._group_pks_by_project = {}  # type: Dict[int, FrozenSet[int]]
+
+    def get_user_roles(self, course: ag_models.Course) -> Dict[str, bool]:
+        if course.pk not in self._user_roles:
+            self._user_roles[course.pk] = course.get_user_roles(self.user)
+
+        return self._user_roles[course.pk]
+
+    def is_admin(self, course: ag_models.Course) -> bool:
+        return self.get_user_roles(course)['is_admin']
+
+    def is_staff(self, course: ag_models.Course) -> bool:
+        return self.get_user_roles(course)['is_staff']
+
+    def is_handgrader(self, course: ag_models.Course) -> bool:
+        return self.get_user_roles(course)['is_handgrader']
+
+    def is_student(self, course: ag_models.Course) -> bool:
+        return self.get_user_roles(course)['is_student']
+
+    def is_group_member(self, group: ag_models.Group) -> bool:
+        """
+        Returns True if the user is a member of the given group.
+        The pks of all the user's groups in the group's project are
+        loaded with one query the first time this is called for a
+        project.
+        """
+        if not self.user.is_authenticated:
+            return False
+
+        if group.project_id not in self._group_pks_by_project:
+            self._group_pks_by_project[group.project_id] = frozenset(
+                ag_models.Group.objects.filter(
+                    project=group.project_id, members=self.user
+                ).values_list('pk', flat=True))
+
+        return group.pk in self._group_pks_by_project[group.project_id]
+
+
+def get_auth_context(request) -> AuthorizationContext:
+    """
+    Returns the AuthorizationContext for the given request's user,
+    creating it the first time it's requested.
+    """
+    # The context is stored on Django's HttpRequest, which the DRF
+    # Request passed to permission classes and views wraps.
+    http_request = getattr(request, '_request', request)
+    context = getattr(http_request, '_ag_auth_context', None)
+    if context is None or context.user is not request.user:
+        context = AuthorizationContext(request.user)
+        http_request._ag_auth_context = context
+
+    return context
@@ -0,0 +1,47 @@
+import os
+import re
+from typing import BinaryIO, Optional
+
+from django.http import FileResponse, HttpRequest
+from django.utils.cache import patch_vary_headers
+
+from autograder.core.result_output import CompressedOutputFile
+
+# Same check as django.middleware.gzip.GZipMiddleware.
+_ACCEPTS_GZIP_REGEX = re.compile(r'\bgzip\b')
+
+
+def output_file_response(request: HttpRequest, output: BinaryIO, *,
+                         content_type: Optional[str] = None) -> FileResponse:
+    """
+    Returns a FileResponse that streams output, a file object opened
+    with autograder.core.result_output.open_output().
+
+    When output is stored compressed and the client accepts gzip
+    encoding, the compressed data is sent as-is with a
+    Content-Encoding header. Otherwise, it's decompressed as it's
+    streamed. Either way, the response has the same Content-Type and
+    Content-Disposition as uncompressed output does.
+
+    :param content_type: The Content-Type of the response. By default,
+        it's guessed from the output's filename.
+    """
+    if not isinstance(output, CompressedOutputFile):
+        return FileResponse(output, content_type=content_type)
+
+    response_kwargs = {
+        'filename': os.path.basename(output.output_filename),
+        'content_type': content_type or 'application/octet-stream',
+    }
+    if _ACCEPTS_GZIP_REGEX.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+        output.close()
+        response = FileResponse(open(output.compressed_filename, 'rb'), **response_kwargs)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = FileResponse(output, **response_kwargs)
+        # FileResponse sets Content-Length to the size of the
+        # compressed file.
+        response['Content-Length'] = output.size
+
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -9,6 +9,7 @@ from rest_framework import exceptions, permissions
 
 import autograder.core.models as ag_models
 from autograder.core.models.get_ultimate_submissions import get_ultimate_submission
+from autograder.rest_api.auth_context import get_auth_context
 
 GetCourseFnType = Callable[[ag_models.AutograderModel], ag_models.Course]
 GetProjectFnType = Callable[[ag_models.AutograderModel], ag_models.Project]
@@ -111,7 +112,7 @@ def is_admin(get_course_fn: GetCourseFnType=_get_course) -> PermissionClassType:
     class IsAdmin(permissions.BasePermission):
         def has_object_permission(self, request, view, obj):
             course = get_course_fn(obj)
-            return course.is_admin(request.user)
+            return get_auth_context(request).is_admin(course)
 
     return IsAdmin
 
@@ -120,7 +121,7 @@ def is_staff(get_course_fn: GetCourseFnType=_get_course) -> PermissionClassType:
     class IsStaff(permissions.BasePermission):
         def has_object_permission(self, request, view, obj):
             course = get_course_fn(obj)
-            return course.is_staff(request.user)
+            return get_auth_context(request).is_staff(course)
 
     return IsStaff
 
@@ -129,7 +130,7 @@ def is_handgrader(get_course_fn: GetCourseFnType=_get_course) -> PermissionClass
     class IsHandgrader(permissions.BasePermission):
         def has_object_permission(self, request, view, obj):
             course = get_course_fn(obj)
-            return course.is_handgrader(request.user)
+            return get_auth_context(request).is_handgrader(course)
 
     return IsHandgrader
 
@@ -138,7 +139,7 @@ def is_student(get_course_fn: GetCourseFnType=_get_course) -> PermissionClassTyp
     class IsStudent(permissions.BasePermission):
         def has_object_permission(self, request, view, obj):
             course = get_course_fn(obj)
-            return course.is_student(request.user)
+            return get_auth_context(request).is_student(course)
 
     return IsStudent
 
@@ -148,8 +149,8 @@ def is_admin_or_staff_or_handgrader(
     class IsAdminOrStaffOrHandgrader(permissions.BasePermission):
         def has_object_permission(self, request, view, obj):
             course = get_course_fn(obj)
-            return (course.is_admin(request.user) or course.is_staff(request.user)
-                    or course.is_handgrader(request.user))
+            auth = get_auth_context(request)
+            return auth.is_admin(course) or auth.is_staff(course) or auth.is_handgrader(course)
 
     return IsAdminOrStaffOrHandgrader
 
@@ -159,11 +160,12 @@ def is_admin_or_read_only_staff_or_handgrader(
     class IsAdminOrReadOnlyStaffOrHandgrader(permissions.BasePermission):
         def has_object_permission(self, request, view, obj):
             course = get_course_fn(obj)
+            auth = get_auth_context(request)
             is_read_only_staff_or_handgrader = (request.method in permissions.SAFE_METHODS
-                                                and (course.is_staff(request.user)
-                                                     or course.is_handgrader(request.user)))
+                                                and (auth.is_staff(course)
+                                                     or auth.is_handgrader(course)))
 
-            return course.is_admin(request.user) or is_read_only_staff_or_handgrader
+            return auth.is_admin(course) or is_read_only_staff_or_handgrader
 
     return IsAdminOrReadOnlyStaffOrHandgrader
 
@@ -173,9 +175,10 @@ def is_admin_or_read_only_staff(
     class IsAdminOrReadOnlyStaff(permissions.BasePermission):
         def has_object_permission(self, request, view, obj):
             course = get_course_fn(obj)
+            auth = get_auth_context(request)
             is_read_only_staff = (request.method in permissions.SAFE_METHODS
-                                  and course.is_staff(request.user))
-            return course.is_admin(request.user) or is_read_only_staff
+                                  and auth.is_staff(course))
+            return auth.is_admin(course) or is_read_only_staff
 
     return IsAdminOrReadOnlyStaff
 
@@ -186,14 +189,14 @@ def can_view_project(
     class CanViewProject(permissions.BasePermission):
         def has_object_permission(self, request, view, obj):
             project = get_project_fn(obj)
-            if (project.course.is_staff(request.user)
-                    or project.course.is_handgrader(request.user)):
+            auth = get_auth_context(request)
+            if auth.is_staff(project.course) or auth.is_handgrader(project.course):
                 return True
 
             if not project.visible_to_students:
                 return False
 
-            return (project.course.is_student(request.user)
+            return (auth.is_student(project.course)
                     or (project.guests_can_submit
                         and project.course.is_allowed_guest(request.user)))
 
@@ -215,8 +218,8 @@ def is_staff_or_group_member(
     class IsStaffOrGroupMember(permissions.BasePermission):
         def has_object_permission(self, request, view, obj):
             group = get_group_fn(obj)
-            return (group.project.course.is_staff(request.user)
-                    or group.members.filter(pk=request.user.pk).exists())
+            auth = get_auth_context(request)
+            return auth.is_staff(group.project.course) or auth.is_group_member(group)
 
     return IsStaffOrGroupMember
 
@@ -225,7 +228,7 @@ def is_group_member(get_group_fn: GetGroupFnType=_get_group) -> PermissionClassT
     class IsGroupMember(permissions.BasePermission):
         def has_object_permission(self, request, view, obj):
             group = get_group_fn(obj)
-            return group.members.filter(pk=request.user.pk).exists()
+            return get_auth_context(request).is_group_member(group)
 
     return IsGroupMember
 
@@ -250,14 +253,15 @@ def can_request_feedback_category(
             group = submission.group
             project = group.project
             course = project.course
+            auth = get_auth_context(request)
 
-            if course.is_admin(request.user):
+            if auth.is_admin(course):
                 return True
 
             deadline_past = deadline_is_past(group, request.user)
 
-            in_group = group.members.filter(pk=request.user.pk).exists()
-            if course.is_staff(request.user):
+            in_group = auth.is_group_member(group)
+            if auth.is_staff(course):
                 # Staff can always request any feedback category for
                 # their own submissions.
                 if in_group:
@@ -280,7 +284,7 @@ def can_request_feedback_category(
                         and not project.hide_ultimate_submission_fdbk)
 
             # Non-staff users cannot view other groups' submissions
-            if not group.members.filter(pk=request.user.pk).exists():
+            if not in_group:
                 return False
 
             if fdbk_category == ag_models.FeedbackCategory.normal:
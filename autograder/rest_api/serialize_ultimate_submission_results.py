@@ -1,4 +1,4 @@
-from typing import Iterable, List
+from typing import Iterable, Iterator, List
 
 from django.utils import timezone
 
@@ -43,7 +43,18 @@ def serialize_ultimate_submission_results(ultimate_submissions: Iterable[Submiss
         ...
     ]
     """
-    results = []
+    return list(iter_ultimate_submission_results(
+        ultimate_submissions, full_results=full_results, include_handgrading=include_handgrading))
+
+
+def iter_ultimate_submission_results(ultimate_submissions: Iterable[SubmissionResultFeedback],
+                                     *, full_results: bool,
+                                     include_handgrading: bool = False) -> Iterator[dict]:
+    """
+    Like serialize_ultimate_submission_results, but yields the
+    serialized data for each user as ultimate_submissions is consumed
+    rather than building a list.
+    """
     for submission_fdbk in ultimate_submissions:
         submission = submission_fdbk.submission
         group = submission.group
@@ -83,9 +94,7 @@ def serialize_ultimate_submission_results(ultimate_submissions: Iterable[Submiss
             else:
                 user_data['ultimate_submission'] = submission_data
 
-            results.append(user_data)
-
-    return results
+            yield user_data
 
 
 def get_submission_data_with_results(submission_fdbk: SubmissionResultFeedback,
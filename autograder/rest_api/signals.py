@@ -1,9 +1,17 @@
-from django.db.models.signals import post_delete, post_save
+import threading
+from typing import Optional, Set
+
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 
 from autograder.core.caching import clear_submission_results_cache
 import autograder.core.models as ag_models
-from autograder.grading_tasks.tasks import register_project_queues
+from autograder.core.models.submission_score import invalidate_project_submission_scores
+from autograder.core.models.ultimate_submission_entry import (
+    invalidate_project_ultimate_submissions)
+from autograder.grading_tasks.tasks import (
+    queue_project_submission_scores_update, register_project_queues)
 
 
 @receiver(post_save, sender=ag_models.Project)
@@ -17,45 +25,168 @@ def on_project_created(sender, instance, created, **kwargs):
         connection=app.connection())
 
 
+@receiver(pre_delete, sender=ag_models.Project)
+def on_project_pre_delete(sender, instance: ag_models.Project, *args, **kwargs):
+    _get_projects_being_deleted().add(instance.pk)
+
+
+@receiver(post_delete, sender=ag_models.Project)
+def on_project_delete(sender, instance: ag_models.Project, *args, **kwargs):
+    _get_projects_being_deleted().discard(instance.pk)
+
+
+# Fields that only affect how submissions are graded, not the points or
+# feedback of results that already exist. Saves that only change these
+# don't invalidate the project's submission scores.
+_FIELDS_THAT_DONT_AFFECT_SCORES = {
+    ag_models.AGTestSuite: frozenset([
+        'name', 'last_modified', 'instructor_files_needed', 'read_only_instructor_files',
+        'student_files_needed', 'setup_suite_cmd', 'setup_suite_cmd_name',
+        'reject_submission_if_setup_fails', 'sandbox_docker_image', 'old_sandbox_docker_image',
+        'allow_network_access', 'deferred', 'run_test_cases_in_parallel',
+        'batch_test_case_commands', 'reuse_setup_snapshots', 'deterministic',
+    ]),
+    ag_models.AGTestCase: frozenset(['name', 'last_modified']),
+    ag_models.AGTestCommand: frozenset([
+        'name', 'last_modified', 'cmd', 'stdin_source', 'stdin_text', 'stdin_instructor_file',
+        'time_limit', 'stack_size_limit', 'use_virtual_memory_limit', 'virtual_memory_limit',
+        'block_process_spawn', 'process_spawn_limit',
+    ]),
+    ag_models.MutationTestSuite: frozenset([
+        'name', 'last_modified', 'instructor_files_needed', 'read_only_instructor_files',
+        'student_files_needed', 'use_setup_command', 'setup_command',
+        'get_student_test_names_command', 'max_num_student_tests',
+        'student_test_validity_check_command', 'grade_buggy_impl_command', 'deferred',
+        'sandbox_docker_image', 'old_sandbox_docker_image', 'allow_network_access',
+        'run_student_tests_in_parallel',
+    ]),
+}
+
+
+@receiver(pre_save, sender=ag_models.AGTestSuite)
+@receiver(pre_save, sender=ag_models.AGTestCase)
+@receiver(pre_save, sender=ag_models.AGTestCommand)
+@receiver(pre_save, sender=ag_models.MutationTestSuite)
+def on_test_pre_save(sender, instance: models.Model, update_fields=None, **kwargs):
+    if instance.pk is not None:
+        instance._scores_may_change = _scores_may_change(instance, update_fields)
+
+
 @receiver(post_save, sender=ag_models.AGTestSuite)
 def on_ag_test_suite_save(sender, instance: ag_models.AGTestSuite, created, **kwargs):
+    _refresh_grading_queue_route(instance.project_id)
     if not created:
-        clear_submission_results_cache(instance.project_id)
+        _invalidate_project_results(instance.project_id, _pop_scores_may_change(instance))
 
 
 @receiver(post_delete, sender=ag_models.AGTestSuite)
 def on_ag_test_suite_delete(sender, instance: ag_models.AGTestSuite, *args, **kwargs):
-    clear_submission_results_cache(instance.project_id)
+    _on_test_deleted(instance.project_id)
 
 
 @receiver(post_save, sender=ag_models.AGTestCase)
 def on_ag_test_case_save(sender, instance: ag_models.AGTestCase, created, **kwargs):
+    _refresh_grading_queue_route(instance.ag_test_suite.project_id)
     if not created:
-        clear_submission_results_cache(instance.ag_test_suite.project_id)
+        _invalidate_project_results(
+            instance.ag_test_suite.project_id, _pop_scores_may_change(instance))
 
 
 @receiver(post_delete, sender=ag_models.AGTestCase)
 def on_ag_test_case_delete(sender, instance: ag_models.AGTestCase, *args, **kwargs):
-    clear_submission_results_cache(instance.ag_test_suite.project_id)
+    _on_test_deleted(instance.ag_test_suite.project_id)
 
 
 @receiver(post_save, sender=ag_models.AGTestCommand)
 def on_ag_test_command_save(sender, instance: ag_models.AGTestCommand, created, **kwargs):
+    _refresh_grading_queue_route(instance.ag_test_case.ag_test_suite.project_id)
     if not created:
-        clear_submission_results_cache(instance.ag_test_case.ag_test_suite.project_id)
+        _invalidate_project_results(
+            instance.ag_test_case.ag_test_suite.project_id, _pop_scores_may_change(instance))
 
 
 @receiver(post_delete, sender=ag_models.AGTestCommand)
 def on_ag_test_command_delete(sender, instance: ag_models.AGTestCommand, *args, **kwargs):
-    clear_submission_results_cache(instance.ag_test_case.ag_test_suite.project_id)
+    _on_test_deleted(instance.ag_test_case.ag_test_suite.project_id)
 
 
 @receiver(post_save, sender=ag_models.MutationTestSuite)
 def on_mutation_test_suite_save(sender, instance: ag_models.MutationTestSuite, created, **kwargs):
+    _refresh_grading_queue_route(instance.project_id)
     if not created:
-        clear_submission_results_cache(instance.project_id)
+        _invalidate_project_results(instance.project_id, _pop_scores_may_change(instance))
 
 
 @receiver(post_delete, sender=ag_models.MutationTestSuite)
 def on_mutation_test_suite_delete(sender, instance: ag_models.MutationTestSuite, *args, **kwargs):
-    clear_submission_results_cache(instance.project_id)
+    _on_test_deleted(instance.project_id)
+
+
+def _on_test_deleted(project_pk: int):
+    # When a project is deleted, its tests are deleted along with it,
+    # and there's nothing left to update.
+    if project_pk in _get_projects_being_deleted():
+        return
+
+    _refresh_grading_queue_route(project_pk)
+    _invalidate_project_results(project_pk, True)
+
+
+def _refresh_grading_queue_route(project_pk: int):
+    ag_models.GradingQueueRoute.refresh_worst_case_grading_time(project_pk)
+
+
+def _invalidate_project_results(project_pk: int, scores_may_change: bool):
+    # Changing tests or their feedback settings can change the
+    # serialized results, submission scores, and which submissions
+    # are ultimate.
+    clear_submission_results_cache(project_pk)
+    if not scores_may_change:
+        return
+
+    invalidate_project_submission_scores(project_pk)
+    invalidate_project_ultimate_submissions(project_pk)
+    transaction.on_commit(lambda: queue_project_submission_scores_update(project_pk))
+
+
+def _scores_may_change(instance: models.Model, update_fields: Optional[Set[str]]) -> bool:
+    ignored_fields = _FIELDS_THAT_DONT_AFFECT_SCORES[type(instance)]
+    if update_fields is not None:
+        return not ignored_fields.issuperset(update_fields)
+
+    fields = [field for field in instance._meta.concrete_fields
+              if field.name not in ignored_fields]
+    old_values = type(instance).objects.filter(
+        pk=instance.pk
+    ).values(*[field.attname for field in fields]).first()
+    if old_values is None:
+        return True
+
+    return any(
+        _comparable_value(old_values[field.attname])
+        != _comparable_value(field.value_from_object(instance))
+        for field in fields
+    )
+
+
+def _comparable_value(value):
+    # Feedback configs are stored in ValidatedJSONFields, whose values
+    # don't define __eq__.
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+
+    return value
+
+
+def _pop_scores_may_change(instance: models.Model) -> bool:
+    return instance.__dict__.pop('_scores_may_change', True)
+
+
+_thread_local = threading.local()
+
+
+def _get_projects_being_deleted() -> Set[int]:
+    if not hasattr(_thread_local, 'projects_being_deleted'):
+        _thread_local.projects_being_deleted = set()
+
+    return _thread_local.projects_being_deleted
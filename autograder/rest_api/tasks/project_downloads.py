@@ -2,20 +2,20 @@ import csv
 import os
 import traceback
 import uuid
-import zipfile
-from typing import Sequence, Callable, Iterator, Tuple, List
+from typing import Sequence, Callable, Iterator, Tuple
 
 from celery import shared_task
 from django.conf import settings
+from django.db.models import Count, QuerySet
 
 import autograder.core.models as ag_models
 from autograder.core.models.get_ultimate_submissions import get_ultimate_submissions
-import autograder.core.utils as core_ut
-from autograder import utils
+from autograder.core.models.project.download_task import download_progress_counter
+from autograder.core.zip_archive import ArchiveMember, ZipArchiveWriter
 from autograder.core.submission_feedback import (
     SubmissionResultFeedback, AGTestPreLoader, MutationTestSuitePreLoader)
-from autograder.rest_api.views.submission_views.all_ultimate_submission_results_view import (
-    serialize_ultimate_submission_results)
+from autograder.rest_api.serialize_ultimate_submission_results import \
+    iter_ultimate_submission_results
 
 
 @shared_task(queue='project_downloads', acks_late=True)
@@ -26,19 +26,10 @@ def all_submission_files_task(project_pk, task_pk, include_staff, *args, **kwarg
 
 def _get_all_submissions(
         project: ag_models.Project,
-        groups: Sequence[ag_models.Group]) -> Tuple[List[SubmissionResultFeedback], int]:
-    ag_test_loader = AGTestPreLoader(project)
-    mutation_test_suite_loader = MutationTestSuitePreLoader(project)
-    submissions = [
-        SubmissionResultFeedback(
-            submission,
-            ag_models.FeedbackCategory.max,
-            ag_test_loader,
-            mutation_test_suite_loader
-        )
-        for submission in ag_models.Submission.objects.filter(group__in=groups)
-    ]
-    return submissions, len(submissions)
+        groups: Sequence[ag_models.Group]) -> Tuple[Iterator[SubmissionResultFeedback], int]:
+    submissions = ag_models.Submission.objects.select_related(
+        'group__project').filter(group__in=groups)
+    return _iter_max_fdbk(project, submissions), submissions.count()
 
 
 @shared_task(queue='project_downloads', acks_late=True)
@@ -51,25 +42,14 @@ def ultimate_submission_files_task(project_pk, task_pk, include_staff, *args, **
 def all_submission_scores_task(project_pk, task_pk, include_staff, *args, **kwargs):
     def _get_all_finished_grading_submissions(
             project: ag_models.Project, groups: Sequence[ag_models.Group]
-    ) -> Tuple[List[SubmissionResultFeedback], int]:
+    ) -> Tuple[Iterator[SubmissionResultFeedback], int]:
         submissions = ag_models.get_submissions_with_results_queryset(
-            base_manager=ag_models.Submission.objects.filter(
+            base_manager=ag_models.Submission.objects.select_related('group__project').filter(
                 group__in=groups,
                 status=ag_models.Submission.GradingStatus.finished_grading
             )
         )
-        ag_test_loader = AGTestPreLoader(project)
-        mutation_test_suite_loader = MutationTestSuitePreLoader(project)
-        fdbks = [
-            SubmissionResultFeedback(
-                submission,
-                ag_models.FeedbackCategory.max,
-                ag_test_loader,
-                mutation_test_suite_loader
-            )
-            for submission in submissions
-        ]
-        return fdbks, len(submissions)
+        return _iter_max_fdbk(project, submissions), submissions.count()
 
     _make_download_file_task_impl(project_pk, task_pk, include_staff,
                                   _get_all_finished_grading_submissions, _make_scores_csv)
@@ -92,7 +72,44 @@ def _get_ultimate_submissions(
         groups: Sequence[ag_models.Group]) -> Tuple[Iterator[SubmissionResultFeedback], int]:
     submissions = get_ultimate_submissions(
         project, filter_groups=groups, ag_test_preloader=AGTestPreLoader(project))
-    return submissions, len(groups)
+    # Only groups with a finished submission have an ultimate submission.
+    num_submissions = project.groups.filter(
+        pk__in=[group.pk for group in groups],
+        submissions__status=ag_models.Submission.GradingStatus.finished_grading
+    ).distinct().count()
+    return submissions, num_submissions
+
+
+# The number of submissions loaded into memory at once when
+# generating a download.
+_SUBMISSION_CHUNK_SIZE = 100
+
+
+def _iter_max_fdbk(project: ag_models.Project,
+                   submissions: QuerySet) -> Iterator[SubmissionResultFeedback]:
+    ag_test_loader = AGTestPreLoader(project)
+    mutation_test_suite_loader = MutationTestSuitePreLoader(project)
+    for submission in _iter_in_chunks(submissions):
+        yield SubmissionResultFeedback(
+            submission,
+            ag_models.FeedbackCategory.max,
+            ag_test_loader,
+            mutation_test_suite_loader
+        )
+
+
+def _iter_in_chunks(submissions: QuerySet) -> Iterator[ag_models.Submission]:
+    """
+    Yields the submissions in the given queryset, newest first, loading
+    _SUBMISSION_CHUNK_SIZE of them at a time. Unlike
+    QuerySet.iterator(), this respects the queryset's prefetch_related
+    lookups.
+    """
+    submissions = submissions.order_by('-pk')
+    chunk = list(submissions[:_SUBMISSION_CHUNK_SIZE])
+    while chunk:
+        yield from chunk
+        chunk = list(submissions.filter(pk__lt=chunk[-1].pk)[:_SUBMISSION_CHUNK_SIZE])
 
 
 # Given a task, an iterator of SubmissionResultFeedbacks,
@@ -120,18 +137,24 @@ def _make_download_file_task_impl(project_pk, task_pk, include_staff,
     except Exception:
         traceback.print_exc()
         task.error_msg = traceback.format_exc()
-        task.save()
+        # The task's progress is kept up to date separately.
+        task.save(update_fields=['error_msg'])
 
 
 def _get_groups(project, include_staff) -> Sequence[ag_models.Group]:
-    groups = project.groups.all()
-    groups = filter(lambda group: group.submissions.count(), groups)
+    groups = project.groups.annotate(
+        num_submissions=Count('submissions')
+    ).filter(num_submissions__gt=0)
+
     if not include_staff:
-        groups = filter(
-            lambda group: not project.course.is_staff(group.members.first()), groups)
-    groups = list(groups)
+        course = project.course
+        groups = groups.exclude(
+            members__in=course.staff.all()
+        ).exclude(
+            members__in=course.admins.all()
+        )
 
-    return groups
+    return list(groups)
 
 
 def _make_download_result_filename(project: ag_models.project,
@@ -142,31 +165,45 @@ def _make_download_result_filename(project: ag_models.project,
     return os.path.join(downloads_dir, filename)
 
 
-# Download task progress will be updated every _PROGRESS_UPDATE_FREQUENCY
-# submissions processed.
-_PROGRESS_UPDATE_FREQUENCY = 50
+def _track_progress(task: ag_models.DownloadTask,
+                    submission_fdbks: Iterator[SubmissionResultFeedback],
+                    num_submissions: int) -> Iterator[SubmissionResultFeedback]:
+    """
+    Yields the items in submission_fdbks, updating task's live progress
+    (see DownloadTask.live_progress) based on how many of them have
+    been consumed.
+    """
+    progress_counter = download_progress_counter(task.pk)
+    progress = None
+    for index, fdbk in enumerate(submission_fdbks):
+        new_progress = (index * 100) // num_submissions
+        if new_progress != progress:
+            progress = new_progress
+            progress_counter.set(progress)
+            print('Updated task {} progress: {}'.format(task.pk, progress))
+
+        yield fdbk
 
 
 def _make_submission_archive(task: ag_models.DownloadTask,
                              submission_fdbks: Iterator[SubmissionResultFeedback],
                              num_submissions, dest_filename):
+    project_dirname = '{}_{}'.format(task.project.course.name, task.project.name)
+
+    def _get_archive_members() -> Iterator[ArchiveMember]:
+        for fdbk in _track_progress(task, submission_fdbks, num_submissions):
+            submission = fdbk.submission
+            archive_dirname = ('_'.join(submission.group.member_names)
+                               + '-' + submission.timestamp.isoformat())
+            for filename in submission.submitted_filenames:
+                yield ArchiveMember(
+                    source_path=submission.get_file_path(filename),
+                    arcname=os.path.join(project_dirname, archive_dirname, filename))
+
     with open(dest_filename, 'wb') as archive:
-        with zipfile.ZipFile(archive, 'w') as z:
-            for index, fdbk in enumerate(submission_fdbks):
-                submission = fdbk.submission
-                archive_dirname = ('_'.join(submission.group.member_names)
-                                   + '-' + submission.timestamp.isoformat())
-                with utils.ChangeDirectory(core_ut.get_submission_dir(submission)):
-                    for filename in submission.submitted_filenames:
-                        target_name = os.path.join(
-                            '{}_{}'.format(task.project.course.name, task.project.name),
-                            archive_dirname, filename)
-                        z.write(filename, arcname=target_name)
-
-                if index % _PROGRESS_UPDATE_FREQUENCY == 0:
-                    task.progress = (index / num_submissions) * 100
-                    task.save()
-                    print('Updated task {} progress: {}'.format(task.pk, task.progress))
+        with ZipArchiveWriter(
+                archive, num_threads=settings.SUBMISSION_ARCHIVE_NUM_THREADS) as writer:
+            writer.write_members(_get_archive_members())
 
 
 def _make_scores_csv(task: ag_models.DownloadTask,
@@ -188,7 +225,7 @@ def _make_scores_csv(task: ag_models.DownloadTask,
         writer = csv.DictWriter(csv_file, row_headers)
         writer.writeheader()
 
-        for progress_index, fdbk in enumerate(submission_fdbks):
+        for fdbk in _track_progress(task, submission_fdbks, num_submissions):
             submission = fdbk.submission
             row = {timestamp_header: submission.timestamp.isoformat()}
 
@@ -202,11 +239,6 @@ def _make_scores_csv(task: ag_models.DownloadTask,
 
             writer.writerow(row)
 
-            if progress_index % _PROGRESS_UPDATE_FREQUENCY == 0:
-                task.progress = (progress_index / num_submissions) * 100
-                task.save()
-                print('Updated task {} progress: {}'.format(task.pk, task.progress))
-
 
 def _make_ultimate_submission_scores_csv(task: ag_models.DownloadTask,
                                          submission_fdbks: Iterator[SubmissionResultFeedback],
@@ -215,8 +247,9 @@ def _make_ultimate_submission_scores_csv(task: ag_models.DownloadTask,
     if hasattr(task.project, 'handgrading_rubric'):
         project_has_handgrading = True
 
-    results = serialize_ultimate_submission_results(submission_fdbks, full_results=True,
-                                                    include_handgrading=project_has_handgrading)
+    results = iter_ultimate_submission_results(
+        _track_progress(task, submission_fdbks, num_submissions),
+        full_results=True, include_handgrading=project_has_handgrading)
 
     with open(dest_filename, 'w', newline='') as csv_file:
         headers = [
@@ -232,7 +265,7 @@ def _make_ultimate_submission_scores_csv(task: ag_models.DownloadTask,
         writer = csv.DictWriter(csv_file, headers)
         writer.writeheader()
 
-        for progress_index, result in enumerate(results):
+        for result in results:
             if result['ultimate_submission'] is None:
                 continue
 
@@ -256,11 +289,6 @@ def _make_ultimate_submission_scores_csv(task: ag_models.DownloadTask,
 
             writer.writerow(row)
 
-            if progress_index % _PROGRESS_UPDATE_FREQUENCY == 0:
-                task.progress = (progress_index / num_submissions) * 100
-                task.save()
-                print('Updated task {} progress: {}'.format(task.pk, task.progress))
-
 
 AG_SUITE_TOTAL_TMPL = '{} Total'
 AG_SUITE_TOTAL_POSSIBLE_TMPL = '{} Total Possible'
@@ -3,12 +3,16 @@ import datetime
 import itertools
 import os
 import tempfile
+import tracemalloc
 import zipfile
 from collections import OrderedDict
-from typing import Iterator, BinaryIO
+from typing import Iterator, BinaryIO, List
 from unittest import mock
 
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import tag
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
@@ -17,6 +21,8 @@ from rest_framework.test import APIClient
 import autograder.core.models as ag_models
 import autograder.handgrading.models as hg_models
 import autograder.utils.testing.model_obj_builders as obj_build
+from autograder.rest_api import tasks
+from autograder.rest_api.tasks.project_downloads import _get_groups
 from autograder.core.submission_feedback import (
     update_denormalized_ag_test_results, SubmissionResultFeedback, AGTestPreLoader)
 from autograder.core.tests.test_submission_feedback.fdbk_getter_shortcuts import (
@@ -295,16 +301,16 @@ class DownloadAllUltimateSubmissionGradesTestCase(UnitTestBase):
         other_group = obj_build.make_group(project=other_project)
         other_submission = obj_build.make_finished_submission(other_group)
 
-    def test_serialize_ultimate_submission_results_called(self):
-        mock_serialize_ultimate_submission_results = mock.Mock(return_value=[])
+    def test_iter_ultimate_submission_results_called(self):
+        mock_iter_ultimate_submission_results = mock.Mock(return_value=[])
 
         with mock.patch('autograder.rest_api.tasks.project_downloads'
-                        '.serialize_ultimate_submission_results',
-                        new=mock_serialize_ultimate_submission_results):
+                        '.iter_ultimate_submission_results',
+                        new=mock_iter_ultimate_submission_results):
             self.client.force_authenticate(self.admin)
             self.client.post(self.url)
 
-            mock_serialize_ultimate_submission_results.assert_called_once()
+            mock_iter_ultimate_submission_results.assert_called_once()
 
     def test_download_all_ultimate_submission_scores_no_staff(self):
         expected = [
@@ -383,7 +389,7 @@ class DownloadAllUltimateSubmissionGradesTestCase(UnitTestBase):
         self.do_ultimate_submission_scores_csv_test(self.url, expected)
 
     def test_ultimate_submission_for_group_is_none_skip_group(self):
-        mock_serialize_ultimate_submission_results = mock.Mock(
+        mock_iter_ultimate_submission_results = mock.Mock(
             return_value=[
                 {
                     'username': 'waluigi',
@@ -397,8 +403,8 @@ class DownloadAllUltimateSubmissionGradesTestCase(UnitTestBase):
         )
 
         with mock.patch('autograder.rest_api.tasks.project_downloads'
-                        '.serialize_ultimate_submission_results',
-                        new=mock_serialize_ultimate_submission_results):
+                        '.iter_ultimate_submission_results',
+                        new=mock_iter_ultimate_submission_results):
             self.do_ultimate_submission_scores_csv_test(self.url, [])
 
     def test_group_has_extension_not_past_ultimate_submission_is_none(self):
@@ -985,6 +991,151 @@ class DownloadAllSubmissionGradesTestCase(UnitTestBase):
         return expected_result
 
 
+@mock.patch('autograder.rest_api.tasks.project_downloads._PROGRESS_UPDATE_FREQUENCY', new=1000)
+class DownloadNumQueriesTestCase(UnitTestBase):
+    """
+    Makes sure that the number of queries needed to generate downloads
+    doesn't grow with the number of groups or submissions.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.project = obj_build.make_project()
+        ag_models.ExpectedStudentFile.objects.validate_and_create(
+            project=self.project, pattern='*', max_num_matches=3)
+        self.admin = obj_build.make_admin_user(self.project.course)
+
+        self.staff_group = obj_build.make_group(
+            project=self.project, members_role=obj_build.UserRole.staff)
+        obj_build.make_finished_submission(group=self.staff_group)
+        self.admin_group = obj_build.make_group(
+            project=self.project, members_role=obj_build.UserRole.admin)
+        obj_build.make_finished_submission(group=self.admin_group)
+        self.no_submissions_group = obj_build.make_group(project=self.project)
+
+    def test_get_groups_num_queries_independent_of_num_groups(self):
+        student_groups = self._make_student_groups(2)
+        with CaptureQueriesContext(connection) as few_groups_queries:
+            groups = _get_groups(ag_models.Project.objects.get(pk=self.project.pk),
+                                 include_staff=False)
+        self.assertCountEqual(student_groups, groups)
+
+        student_groups += self._make_student_groups(6)
+        with CaptureQueriesContext(connection) as many_groups_queries:
+            groups = _get_groups(ag_models.Project.objects.get(pk=self.project.pk),
+                                 include_staff=False)
+        self.assertCountEqual(student_groups, groups)
+
+        self.assertEqual(len(few_groups_queries), len(many_groups_queries))
+
+        groups = _get_groups(self.project, include_staff=True)
+        self.assertCountEqual(student_groups + [self.staff_group, self.admin_group], groups)
+
+    def test_download_num_queries_independent_of_num_submissions(self):
+        for task_func, download_type in [
+            (tasks.all_submission_files_task, ag_models.DownloadType.all_submission_files),
+            (tasks.all_submission_scores_task, ag_models.DownloadType.all_scores),
+        ]:
+            with self.subTest(download_type=download_type):
+                self._make_student_groups(2)
+                # Fills the cache used to compute submission directories
+                # so that it doesn't affect the query counts.
+                self._run_task(task_func, download_type)
+                few_submissions_queries = self._run_task(task_func, download_type)
+
+                self._make_student_groups(6)
+                many_submissions_queries = self._run_task(task_func, download_type)
+
+                self.assertEqual(few_submissions_queries, many_submissions_queries)
+
+    def _make_student_groups(self, num_groups: int) -> List[ag_models.Group]:
+        groups = []
+        for i in range(num_groups):
+            group = obj_build.make_group(project=self.project)
+            obj_build.make_finished_submission(
+                group=group, submitted_files=[SimpleUploadedFile('file.txt', b'spam')])
+            groups.append(group)
+
+        return groups
+
+    def _run_task(self, task_func, download_type: ag_models.DownloadType) -> int:
+        task = ag_models.DownloadTask.objects.validate_and_create(
+            project=self.project, creator=self.admin, download_type=download_type)
+        with CaptureQueriesContext(connection) as queries:
+            task_func(self.project.pk, task.pk, True)
+
+        task.refresh_from_db()
+        self.assertEqual('', task.error_msg)
+        return len(queries)
+
+
+@tag('slow')
+@mock.patch('autograder.rest_api.tasks.project_downloads._SUBMISSION_CHUNK_SIZE', new=10)
+@mock.patch('autograder.core.models.get_ultimate_submissions.GROUP_CHUNK_SIZE', new=10)
+class ProjectDownloadMemoryBenchmarkTestCase(UnitTestBase):
+    """
+    Checks that the memory needed to generate a scores download doesn't
+    grow with the number of submissions in the project.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.project = obj_build.make_project()
+        self.admin = obj_build.make_admin_user(self.project.course)
+        suite = obj_build.make_ag_test_suite(self.project)
+        case = obj_build.make_ag_test_case(suite)
+        self.cmd = obj_build.make_full_ag_test_command(case)
+
+    def test_scores_download_peak_memory_independent_of_num_submissions(self):
+        tasks_to_check = [
+            (tasks.all_submission_scores_task, ag_models.DownloadType.all_scores),
+            (tasks.ultimate_submission_scores_task,
+             ag_models.DownloadType.final_graded_submission_scores),
+        ]
+
+        self._make_submissions(40)
+        # Warm up so that one-time allocations aren't counted.
+        for task_func, download_type in tasks_to_check:
+            self._get_peak_memory_usage(task_func, download_type)
+
+        small_peaks = [self._get_peak_memory_usage(task_func, download_type)
+                       for task_func, download_type in tasks_to_check]
+
+        self._make_submissions(120)
+        large_peaks = [self._get_peak_memory_usage(task_func, download_type)
+                       for task_func, download_type in tasks_to_check]
+
+        for (task_func, download_type), small_peak, large_peak in zip(
+                tasks_to_check, small_peaks, large_peaks):
+            print(f'{download_type.value}: peak memory with 40 submissions: {small_peak}, '
+                  f'with 160 submissions: {large_peak}')
+            with self.subTest(download_type=download_type):
+                self.assertLess(large_peak, small_peak * 1.5)
+
+    def _make_submissions(self, num_submissions: int):
+        for i in range(num_submissions):
+            submission = obj_build.make_finished_submission(
+                group=obj_build.make_group(project=self.project))
+            obj_build.make_correct_ag_test_command_result(self.cmd, submission=submission)
+            update_denormalized_ag_test_results(submission.pk)
+
+    def _get_peak_memory_usage(self, task_func, download_type: ag_models.DownloadType) -> int:
+        task = ag_models.DownloadTask.objects.validate_and_create(
+            project=self.project, creator=self.admin, download_type=download_type)
+
+        tracemalloc.start()
+        try:
+            task_func(self.project.pk, task.pk, True)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        task.refresh_from_db()
+        self.assertEqual('', task.error_msg)
+        self.assertEqual(100, task.progress)
+        return peak
+
+
 def _check_csv_response(test_fixture: UnitTestBase, response, expected_rows):
     test_fixture.assertEqual(status.HTTP_200_OK, response.status_code)
     test_fixture.assertEqual('text/csv', response['Content-Type'])
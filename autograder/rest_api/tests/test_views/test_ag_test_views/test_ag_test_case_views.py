@@ -1,3 +1,5 @@
+import functools
+
 from django.core.cache import cache
 from django.urls import reverse
 
@@ -185,7 +187,9 @@ class CachedSubmissionResultInvalidationTestCase(UnitTestBase):
         self.ag_test_suite = obj_build.make_ag_test_suite(self.project)
         self.ag_test_case = obj_build.make_ag_test_case(self.ag_test_suite)
 
-        self.key = submission_fdbk_cache_key(
+        # The key changes when the project's cached results are invalidated.
+        self.key = functools.partial(
+            submission_fdbk_cache_key,
             project_pk=self.project.pk, submission_pk=self.submission.pk)
 
         get_cached_submission_feedback(
@@ -219,7 +223,7 @@ class CachedSubmissionResultInvalidationTestCase(UnitTestBase):
 
     def test_create_does_not_invalidate_cache(self):
         url = reverse('ag_test_cases', kwargs={'ag_test_suite_pk': self.ag_test_suite.pk})
-        self.assertIsNotNone(cache.get(self.key))
+        self.assertIsNotNone(cache.get(self.key()))
         response = self.client.post(url, {'name': 'Wee'})
         self.assertEqual(status.HTTP_201_CREATED, response.status_code)
-        self.assertIsNotNone(cache.get(self.key))
+        self.assertIsNotNone(cache.get(self.key()))
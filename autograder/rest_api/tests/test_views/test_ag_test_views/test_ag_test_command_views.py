@@ -1,3 +1,5 @@
+import functools
+
 from django.core.cache import cache
 from django.urls import reverse
 
@@ -192,7 +194,9 @@ class CachedSubmissionResultInvalidationTestCase(UnitTestBase):
                                                                set_arbitrary_points=False,
                                                                set_arbitrary_expected_vals=False)
 
-        self.key = submission_fdbk_cache_key(
+        # The key changes when the project's cached results are invalidated.
+        self.key = functools.partial(
+            submission_fdbk_cache_key,
             project_pk=self.project.pk, submission_pk=self.submission.pk)
 
         get_cached_submission_feedback(
@@ -226,7 +230,7 @@ class CachedSubmissionResultInvalidationTestCase(UnitTestBase):
 
     def test_create_does_not_invalidate_cache(self):
         url = reverse('ag_test_commands', kwargs={'ag_test_case_pk': self.ag_test_case.pk})
-        self.assertIsNotNone(cache.get(self.key))
+        self.assertIsNotNone(cache.get(self.key()))
         response = self.client.post(url, {'name': 'Wee', 'cmd': 'cmdy'})
         self.assertEqual(status.HTTP_201_CREATED, response.status_code)
-        self.assertIsNotNone(cache.get(self.key))
+        self.assertIsNotNone(cache.get(self.key()))
@@ -1,3 +1,4 @@
+import functools
 from contextlib import contextmanager
 
 from django.core.cache import cache
@@ -181,7 +182,9 @@ class CachedSubmissionResultInvalidationTestCase(UnitTestBase):
         self.project = self.submission.group.project
         self.ag_test_suite = obj_build.make_ag_test_suite(self.project)
 
-        self.key = submission_fdbk_cache_key(
+        # The key changes when the project's cached results are invalidated.
+        self.key = functools.partial(
+            submission_fdbk_cache_key,
             project_pk=self.project.pk, submission_pk=self.submission.pk)
 
         get_cached_submission_feedback(
@@ -214,7 +217,7 @@ class CachedSubmissionResultInvalidationTestCase(UnitTestBase):
 
     def test_create_does_not_invalidate_cache(self):
         url = reverse('ag_test_suites', kwargs={'project_pk': self.project.pk})
-        self.assertIsNotNone(cache.get(self.key))
+        self.assertIsNotNone(cache.get(self.key()))
         response = self.client.post(url, {'name': 'Wee'})
         self.assertEqual(status.HTTP_201_CREATED, response.status_code)
-        self.assertIsNotNone(cache.get(self.key))
+        self.assertIsNotNone(cache.get(self.key()))
@@ -0,0 +1,120 @@
+import re
+from typing import List
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+import autograder.core.models as ag_models
+import autograder.utils.testing.model_obj_builders as obj_build
+from autograder.core.submission_feedback import update_denormalized_ag_test_results
+from autograder.rest_api.auth_context import AuthorizationContext
+from autograder.utils.testing import UnitTestBase
+
+
+class AuthorizationContextTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+        self.project = obj_build.make_project()
+        self.course = self.project.course
+        self.group = obj_build.make_group(project=self.project)
+        self.user = self.group.members.first()
+
+    def test_user_roles_loaded_once_per_course(self):
+        context = AuthorizationContext(self.user)
+        self.assertTrue(context.is_student(self.course))
+
+        # Permission classes often get separate Course instances.
+        course = ag_models.Course.objects.get(pk=self.course.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(context.is_student(course))
+            self.assertFalse(context.is_staff(course))
+            self.assertFalse(context.is_admin(course))
+            self.assertFalse(context.is_handgrader(course))
+
+    def test_group_memberships_loaded_once_per_project(self):
+        other_group = obj_build.make_group(project=self.project)
+        other_project_group = ag_models.Group.objects.validate_and_create(
+            members=[self.user], project=obj_build.make_project(course=self.course),
+            check_group_size_limits=False)
+
+        context = AuthorizationContext(self.user)
+        with self.assertNumQueries(1):
+            self.assertTrue(context.is_group_member(self.group))
+            self.assertFalse(context.is_group_member(other_group))
+            self.assertTrue(context.is_group_member(self.group))
+
+        with self.assertNumQueries(1):
+            self.assertTrue(context.is_group_member(other_project_group))
+
+
+class HotEndpointQueryCountTestCase(UnitTestBase):
+    """
+    Requests a student's most frequently used endpoints and checks that
+    each one stays within its query budget, loads the student's course
+    roles from the cache, and checks their group membership at most once.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+        self.project = obj_build.make_project(
+            visible_to_students=True, hide_ultimate_submission_fdbk=False)
+        self.course = self.project.course
+        self.group = obj_build.make_group(project=self.project)
+        self.student = self.group.members.first()
+
+        cmd = obj_build.make_full_ag_test_command(
+            obj_build.make_ag_test_case(obj_build.make_ag_test_suite(self.project)))
+        self.submission = obj_build.make_finished_submission(self.group)
+        obj_build.make_correct_ag_test_command_result(cmd, submission=self.submission)
+        update_denormalized_ag_test_results(self.submission.pk)
+
+    def test_hot_endpoints(self):
+        # Maps each url to the maximum number of queries that a
+        # request to it may run once the user's roles are cached.
+        query_budgets = {
+            reverse('course-detail', kwargs={'pk': self.course.pk}): 2,
+            reverse('course-user-roles', kwargs={'pk': self.course.pk}): 2,
+            reverse('list-create-projects', kwargs={'pk': self.course.pk}): 5,
+            reverse('project-detail', kwargs={'pk': self.project.pk}): 4,
+            reverse('group-detail', kwargs={'pk': self.group.pk}): 7,
+            reverse('group-ultimate-submission', kwargs={'pk': self.group.pk}): 8,
+            reverse('submissions', kwargs={'pk': self.group.pk}): 5,
+            reverse('submission-detail', kwargs={'pk': self.submission.pk}): 4,
+            reverse('submission-results', kwargs={'pk': self.submission.pk})
+            + '?feedback_category=normal': 12,
+            reverse('list-submissions-with-results', kwargs={'pk': self.group.pk}): 15,
+        }
+
+        self.client.force_authenticate(self.student)
+        for url, budget in query_budgets.items():
+            # The first request loads the user's roles into the cache.
+            response = self.client.get(url)
+            self.assertEqual(status.HTTP_200_OK, response.status_code, msg=url)
+
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(status.HTTP_200_OK, response.status_code, msg=url)
+
+            sql = [query['sql'] for query in queries.captured_queries]
+            self.assertLessEqual(len(sql), budget, msg='\n'.join([url] + sql))
+            self.assertEqual([], self._get_user_role_queries(sql), msg=url)
+            self.assertLessEqual(len(self._get_group_membership_queries(sql)), 1, msg=url)
+
+    def _get_user_role_queries(self, sql: List[str]) -> List[str]:
+        return [
+            query for query in sql
+            if re.search(r'"core_course_(admins|staff|students|handgraders)"', query)
+        ]
+
+    def _get_group_membership_queries(self, sql: List[str]) -> List[str]:
+        return [
+            query for query in sql
+            if '"core_group_members"' in query
+            and re.search(r'"(core_group_members"\."user_id|auth_user"\."id)" = {}\b'.format(
+                self.student.pk), query)
+        ]
@@ -4,6 +4,8 @@ from unittest import mock
 
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
@@ -13,6 +15,7 @@ import autograder.core.models as ag_models
 import autograder.utils.testing.model_obj_builders as obj_build
 from autograder.rest_api.serialize_user import serialize_user
 from autograder.rest_api.tests.test_views.ag_view_test_base import AGViewTestBase
+from autograder.rest_api.views.group_views import GROUPS_MAX_PAGE_SIZE
 from autograder.utils.testing import UnitTestBase
 
 
@@ -127,6 +130,88 @@ class ListGroupsTestCase(AGViewTestBase):
 
         self.assertCountEqual([group1.to_dict(), group2.to_dict()], response.data)
 
+    def test_num_queries_independent_of_num_groups_and_submissions(self):
+        admin = obj_build.make_admin_user(self.course)
+        self.client.force_authenticate(admin)
+
+        def _make_groups(num_groups):
+            for i in range(num_groups):
+                group = obj_build.make_group(project=self.project)
+                obj_build.make_submission(group=group)
+                obj_build.make_submission(
+                    group=group, timestamp=timezone.now() - datetime.timedelta(days=1))
+
+        _make_groups(2)
+        with CaptureQueriesContext(connection) as few_groups_queries:
+            response = self.client.get(self.url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(2, len(response.data))
+
+        _make_groups(4)
+        with CaptureQueriesContext(connection) as many_groups_queries:
+            response = self.client.get(self.url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(6, len(response.data))
+
+        self.assertEqual(len(few_groups_queries), len(many_groups_queries))
+        for group_data in response.data:
+            self.assertEqual(2, group_data['num_submissions'])
+            self.assertEqual(1, group_data['num_submits_towards_limit'])
+
+    def test_list_groups_paginated(self):
+        self.project.validate_and_update(max_group_size=2)
+        groups = [
+            ag_models.Group.objects.validate_and_create(
+                members=[User.objects.create(username=username) for username in usernames],
+                project=self.project)
+            for usernames in [['erin'], ['alice', 'zed'], ['dan'], ['bob'], ['carol', 'frank']]
+        ]
+        groups.sort(key=lambda group: group.member_names)
+        expected = [group.to_dict() for group in groups]
+
+        admin = obj_build.make_admin_user(self.course)
+        self.client.force_authenticate(admin)
+
+        response = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(expected[:2], response.data['results'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(expected[2:4], response.data['results'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(expected[4:], response.data['results'])
+        self.assertIsNone(response.data['next'])
+
+    def test_list_groups_paginated_one_page(self):
+        admin = obj_build.make_admin_user(self.course)
+        self.client.force_authenticate(admin)
+        expected = self.build_groups(self.project)
+
+        response = self.client.get(self.url, {'page_size': 4})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertSequenceEqual(expected, response.data['results'])
+        self.assertIsNone(response.data['next'])
+
+    def test_error_invalid_page_size(self):
+        admin = obj_build.make_admin_user(self.course)
+        self.client.force_authenticate(admin)
+
+        for page_size in ['0', '-1', 'spam', str(GROUPS_MAX_PAGE_SIZE + 1)]:
+            response = self.client.get(self.url, {'page_size': page_size})
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_error_after_group_not_in_project(self):
+        other_group = obj_build.make_group()
+        admin = obj_build.make_admin_user(self.course)
+        self.client.force_authenticate(admin)
+
+        for after in [str(other_group.pk), 'spam']:
+            response = self.client.get(self.url, {'page_size': 2, 'after': after})
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
     def build_groups(self, project):
         project.validate_and_update(guests_can_submit=True)
         obj_build.make_group(members_role=obj_build.UserRole.admin, project=self.project)
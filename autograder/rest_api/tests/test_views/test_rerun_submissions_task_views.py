@@ -1,7 +1,8 @@
+import functools
 from typing import Tuple
 from unittest import mock
 
-from django.test import tag
+from django.test import override_settings, tag
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -9,13 +10,16 @@ from rest_framework.test import APIClient
 import autograder.core.models as ag_models
 import autograder.utils.testing.model_obj_builders as obj_build
 from autograder.core.caching import get_cached_submission_feedback, submission_fdbk_cache_key
+from autograder.core.models.rerun_submissions_task import rerun_task_is_cancelled
 from autograder.core.submission_feedback import AGTestPreLoader, SubmissionResultFeedback
 from autograder.core.tests.test_submission_feedback.fdbk_getter_shortcuts import \
     get_submission_fdbk
 from autograder.grading_tasks import tasks
-from autograder.grading_tasks.tasks.rerun_submission import SubmissionRerunner, rerun_submission
+from autograder.grading_tasks.tasks.rerun_submission import (
+    SubmissionRerunner, rerun_submission, rerun_submissions_batch, split_into_rerun_batches)
+from autograder.grading_tasks.tasks.sandbox_pool import SandboxPool
 from autograder.rest_api.tests.test_views.ag_view_test_base import AGViewTestBase
-from autograder.utils.testing import TransactionUnitTestBase
+from autograder.utils.testing import TransactionUnitTestBase, UnitTestBase
 
 
 class _MockException(Exception):
@@ -413,12 +417,40 @@ class CreateAndGetRerunSubmissionsTasksTestCase(AGViewTestBase):
             self.submission1, ag_models.FeedbackCategory.normal, AGTestPreLoader(self.project))
         get_cached_submission_feedback(self.submission1, fdbk)
 
-        key = submission_fdbk_cache_key(
+        key = functools.partial(
+            submission_fdbk_cache_key,
             project_pk=self.project.pk, submission_pk=self.submission1.pk)
 
         with self.assert_cache_key_invalidated(key):
             self.do_rerun_submissions_test_case({}, (self.submission1, self.total_points_possible))
 
+    @override_settings(RERUN_BATCH_SIZE=1)
+    def test_rerun_one_submission_per_batch(self, *args):
+        self.do_rerun_submissions_test_case(
+            {}, (self.submission1, self.total_points_possible),
+            (self.submission2, self.total_points_possible))
+
+    @override_settings(RERUN_BATCH_SIZE=2, SANDBOX_POOL_SIZE=0)
+    def test_batch_reuses_sandboxes(self, *args):
+        pool_stats = []
+        original_drain = SandboxPool.drain
+
+        def record_stats_and_drain(pool):
+            pool_stats.append(pool.stats.to_dict())
+            original_drain(pool)
+
+        with mock.patch.object(SandboxPool, 'drain', new=record_stats_and_drain):
+            self.do_rerun_submissions_test_case(
+                {}, (self.submission1, self.total_points_possible),
+                (self.submission2, self.total_points_possible))
+
+        # All four suites use the same image, so one sandbox is leased
+        # for each of the two submissions' suites and reset in between.
+        self.assertEqual(1, len(pool_stats))
+        self.assertEqual(1, pool_stats[0]['num_created'])
+        self.assertEqual(8, pool_stats[0]['num_leases'])
+        self.assertEqual(0, pool_stats[0]['num_reset_failures'])
+
     def do_rerun_submissions_test_case(
             self, request_body: dict,
             *expected_submission_points: Tuple[ag_models.Submission, int]):
@@ -432,14 +464,9 @@ class CreateAndGetRerunSubmissionsTasksTestCase(AGViewTestBase):
         )  # type: ag_models.RerunSubmissionsTask
 
         self.assertEqual(100, task.progress)
-        expected_response = task.to_dict()
-
-        if task.num_completed_subtasks != 0:
-            # Unless there were no subtasks,
-            # the response should return progress of 0.
-            expected_response['progress'] = 0
-
-        self.assertEqual(expected_response, response.data)
+        # The rerun finishes before the response is sent because celery
+        # tasks run eagerly in tests, and progress is read live.
+        self.assertEqual(task.to_dict(), response.data)
 
         for submission, expected_total_points in expected_submission_points:
             original_grading_start_time = submission.grading_start_time
@@ -515,6 +542,7 @@ class RerunSubmissionsTaskDetailViewSetTestCase(AGViewTestBase):
         self.rerun_task.refresh_from_db()
         self.assertTrue(self.rerun_task.is_cancelled)
         self.assertEqual(self.rerun_task.to_dict(), response.data)
+        self.assertTrue(rerun_task_is_cancelled(self.rerun_task.pk))
 
     def test_non_admin_cancel_task_permission_denied(self) -> None:
         staff = obj_build.make_staff_user(self.project.course)
@@ -525,6 +553,7 @@ class RerunSubmissionsTaskDetailViewSetTestCase(AGViewTestBase):
         self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
         self.rerun_task.refresh_from_db()
         self.assertFalse(self.rerun_task.is_cancelled)
+        self.assertFalse(rerun_task_is_cancelled(self.rerun_task.pk))
 
 
 @mock.patch('autograder.utils.retry.sleep')
@@ -628,6 +657,110 @@ class RerunCancelledTestCase(TransactionUnitTestBase):
         rerun_task.refresh_from_db()
         self.assertEqual(0, rerun_task.progress)
 
+    def test_cancelled_after_submission_loaded(self, *args) -> None:
+        obj_build.make_ag_test_suite(self.project)
+
+        rerun_task = ag_models.RerunSubmissionsTask.objects.validate_and_create(
+            project=self.project,
+            creator=obj_build.make_user(),
+        )
+        rerunner = SubmissionRerunner(self.submission.pk, rerun_task.pk)
+        rerunner.load_submission()
+        self.assertFalse(rerunner.rerun_is_cancelled())
+
+        rerun_task.is_cancelled = True
+        rerun_task.save()
+        self.assertTrue(rerunner.rerun_is_cancelled())
+
+    @mock.patch('autograder.grading_tasks.tasks.rerun_submission.SubmissionRerunner')
+    def test_batch_stops_when_cancelled(self, rerunner_mock) -> None:
+        other_submission = obj_build.make_finished_submission(
+            group=obj_build.make_group(project=self.project))
+        rerun_task = ag_models.RerunSubmissionsTask.objects.validate_and_create(
+            project=self.project,
+            creator=obj_build.make_user(),
+        )
+        self.assertFalse(rerun_task_is_cancelled(rerun_task.pk))
+
+        rerun_task.is_cancelled = True
+        rerun_task.save()
+        self.assertTrue(rerun_task_is_cancelled(rerun_task.pk))
+
+        rerun_submissions_batch([self.submission.pk, other_submission.pk], rerun_task.pk)
+        rerunner_mock.assert_not_called()
+
+
+@mock.patch('autograder.utils.retry.sleep')
+class RerunBatchesTestCase(UnitTestBase):
+    def setUp(self):
+        super().setUp()
+
+        self.project = obj_build.make_project()
+        [self.admin] = obj_build.make_admin_users(self.project.course, 1)
+        self.submissions = [
+            obj_build.make_finished_submission(group=obj_build.make_group(project=self.project))
+            for i in range(5)
+        ]
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.url = reverse('rerun_submissions_tasks', kwargs={'project_pk': self.project.pk})
+
+    @override_settings(RERUN_BATCH_SIZE=2)
+    def test_split_into_rerun_batches(self, *args) -> None:
+        self.assertEqual([], split_into_rerun_batches([]))
+        self.assertEqual([[1, 2], [3, 4], [5]], split_into_rerun_batches([1, 2, 3, 4, 5]))
+
+    @override_settings(RERUN_BATCH_SIZE=2, SANDBOX_POOL_SIZE=0)
+    def test_submissions_rerun_in_batches(self, *args) -> None:
+        with mock.patch('autograder.grading_tasks.tasks.rerun_submission.SubmissionRerunner',
+                        wraps=SubmissionRerunner) as rerunner_mock:
+            response = self.client.post(self.url, {})
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+
+        self.assertEqual(
+            [submission.pk for submission in self.submissions],
+            [call[0][0] for call in rerunner_mock.call_args_list])
+        # Each batch shares one sandbox pool.
+        sandbox_pools = [call[1]['sandbox_pool'] for call in rerunner_mock.call_args_list]
+        self.assertIs(sandbox_pools[0], sandbox_pools[1])
+        self.assertIsNot(sandbox_pools[1], sandbox_pools[2])
+        self.assertIs(sandbox_pools[2], sandbox_pools[3])
+        self.assertIsNot(sandbox_pools[3], sandbox_pools[4])
+
+    @override_settings(RERUN_BATCH_SIZE=2)
+    def test_batches_use_worker_sandbox_pool(self, *args) -> None:
+        sandbox_pool = SandboxPool(1, max_idle_time=60, max_uses=10)
+        with mock.patch('autograder.grading_tasks.tasks.rerun_submission.get_sandbox_pool',
+                        return_value=sandbox_pool), \
+                mock.patch('autograder.grading_tasks.tasks.rerun_submission.SubmissionRerunner',
+                           wraps=SubmissionRerunner) as rerunner_mock:
+            response = self.client.post(self.url, {})
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+
+        for call in rerunner_mock.call_args_list:
+            self.assertIs(sandbox_pool, call[1]['sandbox_pool'])
+
+    @override_settings(RERUN_BATCH_SIZE=2)
+    def test_results_cache_cleared_once_all_batches_finish(self, *args) -> None:
+        with mock.patch('autograder.grading_tasks.tasks.rerun_submission'
+                        '._clear_cached_submission_results_impl') as clear_cache_mock:
+            response = self.client.post(self.url, {})
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+
+        clear_cache_mock.assert_called_once_with(self.project.pk)
+
+    def test_rerun_submission_task_clears_results_cache(self, *args) -> None:
+        rerun_task = ag_models.RerunSubmissionsTask.objects.validate_and_create(
+            project=self.project,
+            creator=self.admin,
+        )
+        with mock.patch('autograder.grading_tasks.tasks.rerun_submission'
+                        '._clear_cached_submission_results_impl') as clear_cache_mock:
+            rerun_submission(self.submissions[0].pk, rerun_task.pk)
+
+        clear_cache_mock.assert_called_once_with(self.project.pk)
+
 
 @mock.patch('autograder.utils.retry.sleep')
 class RejectSubmissionTestCase(TransactionUnitTestBase):
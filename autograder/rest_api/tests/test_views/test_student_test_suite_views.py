@@ -1,3 +1,5 @@
+import functools
+
 from django.core.cache import cache
 from django.urls import reverse
 from rest_framework import status
@@ -182,7 +184,9 @@ class CachedSubmissionResultInvalidationTestCase(AGViewTestBase):
         self.project = self.submission.group.project
         self.mutation_test_suite = obj_build.make_mutation_test_suite(self.project)
 
-        self.key = submission_fdbk_cache_key(
+        # The key changes when the project's cached results are invalidated.
+        self.key = functools.partial(
+            submission_fdbk_cache_key,
             project_pk=self.project.pk, submission_pk=self.submission.pk)
 
         get_cached_submission_feedback(
@@ -215,7 +219,7 @@ class CachedSubmissionResultInvalidationTestCase(AGViewTestBase):
 
     def test_create_does_not_invalidate_cache(self):
         url = reverse('mutation_test_suites', kwargs={'project_pk': self.project.pk})
-        self.assertIsNotNone(cache.get(self.key))
+        self.assertIsNotNone(cache.get(self.key()))
         response = self.client.post(url, {'name': 'Wee'})
         self.assertEqual(status.HTTP_201_CREATED, response.status_code)
-        self.assertIsNotNone(cache.get(self.key))
+        self.assertIsNotNone(cache.get(self.key()))
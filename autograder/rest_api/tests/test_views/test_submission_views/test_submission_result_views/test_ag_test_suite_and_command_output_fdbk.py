@@ -1,5 +1,7 @@
 import datetime
+import gzip
 import json
+import os
 
 from django.urls import reverse
 from django.utils import timezone
@@ -7,6 +9,7 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 import autograder.core.models as ag_models
+from autograder.core.result_output import COMPRESSED_SUFFIX, open_output
 import autograder.utils.testing.model_obj_builders as obj_build
 from autograder.core.submission_feedback import update_denormalized_ag_test_results
 from autograder.core.tests.test_submission_feedback.fdbk_getter_shortcuts import get_suite_fdbk
@@ -215,9 +218,9 @@ class AGTestCommandOutputFeedbackTestCase(_SetUp):
             expected_stderr_source=ag_models.ExpectedOutputSource.text,
             expected_stderr_text=output,
         )
-        with open(self.staff_result.stdout_filename, 'wb') as f:
+        with open_output(self.staff_result.stdout_filename, 'wb') as f:
             f.write(non_utf_bytes)
-        with open(self.staff_result.stderr_filename, 'wb') as f:
+        with open_output(self.staff_result.stderr_filename, 'wb') as f:
             f.write(non_utf_bytes)
 
         self.client.force_authenticate(self.staff)
@@ -229,7 +232,8 @@ class AGTestCommandOutputFeedbackTestCase(_SetUp):
         expected_diff = ['- ' + output, '+ ' + non_utf_bytes.decode('utf-8', 'surrogateescape')]
         response = self.client.get(url)
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(expected_diff, json.loads(response.content.decode('utf-8')))
+        actual_diff = json.loads(b''.join(response.streaming_content).decode('utf-8'))
+        self.assertEqual(expected_diff, actual_diff)
 
         url = (reverse('ag-test-cmd-result-stderr-diff',
                        kwargs={'pk': self.staff_submission.pk,
@@ -237,7 +241,8 @@ class AGTestCommandOutputFeedbackTestCase(_SetUp):
                + '?feedback_category=max')
         response = self.client.get(url)
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(expected_diff, json.loads(response.content.decode('utf-8')))
+        actual_diff = json.loads(b''.join(response.streaming_content).decode('utf-8'))
+        self.assertEqual(expected_diff, actual_diff)
 
         # Make sure we don't get any errors requesting diff size.
         size_url = make_result_output_url(
@@ -248,6 +253,90 @@ class AGTestCommandOutputFeedbackTestCase(_SetUp):
         response = self.client.get(size_url)
         self.assertEqual(status.HTTP_200_OK, response.status_code)
 
+    def test_cmd_output_sent_compressed_when_client_accepts_gzip(self):
+        output = b'spam\n' * 1000
+        with open_output(self.staff_result.stdout_filename, 'wb') as f:
+            f.write(output)
+
+        self.client.force_authenticate(self.staff)
+        url = make_result_output_url(
+            'ag-test-cmd-result-stdout', self.staff_submission, self.staff_result,
+            ag_models.FeedbackCategory.max)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('gzip', response['Content-Encoding'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual('application/octet-stream', response['Content-Type'])
+        compressed = b''.join(response.streaming_content)
+        self.assertEqual(len(compressed), int(response['Content-Length']))
+        self.assertLess(len(compressed), len(output))
+        self.assertEqual(output, gzip.decompress(compressed))
+
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual('application/octet-stream', response['Content-Type'])
+        self.assertEqual(len(output), int(response['Content-Length']))
+        self.assertEqual(output, b''.join(response.streaming_content))
+
+        size_url = make_result_output_url(
+            'ag-test-cmd-result-output-size', self.staff_submission, self.staff_result,
+            ag_models.FeedbackCategory.max)
+        response = self.client.get(size_url)
+        self.assertEqual(len(output), response.data['stdout_size'])
+
+    def test_stored_cmd_diff_sent_compressed_when_client_accepts_gzip(self):
+        self.ag_test_cmd.validate_and_update(
+            expected_stdout_source=ag_models.ExpectedOutputSource.text,
+            expected_stdout_text='spam\n')
+        diff = ['- spam\n', '+ egg\n']
+        with open_output(self.staff_result.stdout_diff_filename, 'w') as f:
+            json.dump(diff, f)
+        self.staff_result.stdout_correct = False
+        self.staff_result.stdout_diff_size = 13
+        self.staff_result.save()
+
+        self.client.force_authenticate(self.staff)
+        url = make_result_output_url(
+            'ag-test-cmd-result-stdout-diff', self.staff_submission, self.staff_result,
+            ag_models.FeedbackCategory.max)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('gzip', response['Content-Encoding'])
+        self.assertEqual('application/json', response['Content-Type'])
+        compressed = b''.join(response.streaming_content)
+        self.assertEqual(diff, json.loads(gzip.decompress(compressed)))
+
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual('application/json', response['Content-Type'])
+        self.assertEqual(diff, json.loads(b''.join(response.streaming_content)))
+
+    def test_uncompressed_cmd_output_sent_as_is(self):
+        # Output recorded before output was stored compressed.
+        os.remove(self.staff_result.stdout_filename + COMPRESSED_SUFFIX)
+        with open(self.staff_result.stdout_filename, 'wb') as f:
+            f.write(b'legacy output')
+
+        self.client.force_authenticate(self.staff)
+        url = make_result_output_url(
+            'ag-test-cmd-result-stdout', self.staff_submission, self.staff_result,
+            ag_models.FeedbackCategory.max)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(b'legacy output', b''.join(response.streaming_content))
+
+        size_url = make_result_output_url(
+            'ag-test-cmd-result-output-size', self.staff_submission, self.staff_result,
+            ag_models.FeedbackCategory.max)
+        response = self.client.get(size_url)
+        self.assertEqual(len(b'legacy output'), response.data['stdout_size'])
+
     def test_cmd_result_output_or_diff_requested_cmd_doesnt_exist_404(self):
         urls_and_field_names = get_output_and_diff_test_urls(
             self.staff_submission,
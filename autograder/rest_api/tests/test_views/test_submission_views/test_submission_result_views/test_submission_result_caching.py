@@ -7,6 +7,8 @@ from rest_framework.test import APIClient
 
 import autograder.core.models as ag_models
 import autograder.utils.testing.model_obj_builders as obj_build
+from autograder.core.caching import (delete_cached_submission_result,
+                                     get_submission_fdbk_cache_stats)
 from autograder.core.models.ag_test.ag_test_command import AGTestCommandFeedbackConfig
 from autograder.core.submission_feedback import update_denormalized_ag_test_results
 from autograder.core.tests.test_submission_feedback.fdbk_getter_shortcuts import \
@@ -64,11 +66,12 @@ class SubmissionResultsCachingTestCase(UnitTestBase):
                                              ag_models.FeedbackCategory.normal).to_dict(),
                          response.data)
 
-    def test_non_normal_feedback_results_not_cached(self):
+    def test_all_fdbk_categories_cached(self):
         cmd = obj_build.make_full_ag_test_command(
             normal_fdbk_config=AGTestCommandFeedbackConfig.max_fdbk_config(),
             ultimate_submission_fdbk_config=AGTestCommandFeedbackConfig.max_fdbk_config(),
-            past_limit_submission_fdbk_config=AGTestCommandFeedbackConfig.max_fdbk_config())
+            past_limit_submission_fdbk_config=AGTestCommandFeedbackConfig.max_fdbk_config(),
+            staff_viewer_fdbk_config=AGTestCommandFeedbackConfig.max_fdbk_config())
         project = cmd.ag_test_case.ag_test_suite.project
         project.validate_and_update(visible_to_students=True)
 
@@ -80,24 +83,56 @@ class SubmissionResultsCachingTestCase(UnitTestBase):
 
         self.client.force_authenticate(admin_group.members.first())
 
+        old_responses = {}
+        for fdbk_category in ag_models.FeedbackCategory:
+            url = self._make_url(submission, fdbk_category=fdbk_category)
+            response = self.client.get(url)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertEqual(
+                get_submission_fdbk(submission, fdbk_category).to_dict(), response.data)
+            old_responses[fdbk_category] = response.data
+
+        cmd.validate_and_update(
+            points_for_correct_return_code=cmd.points_for_correct_return_code + 1)
+
+        # Each category's results should have been cached separately.
+        for fdbk_category in ag_models.FeedbackCategory:
+            url = self._make_url(submission, fdbk_category=fdbk_category)
+            response = self.client.get(url)
+            self.assertEqual(old_responses[fdbk_category], response.data)
+            self.assertNotEqual(
+                get_submission_fdbk(submission, fdbk_category).to_dict(), response.data)
+
+        stats = get_submission_fdbk_cache_stats()
         for fdbk_category in ag_models.FeedbackCategory:
-            if fdbk_category == ag_models.FeedbackCategory.normal:
-                continue
+            self.assertEqual({'hits': 1, 'misses': 1}, stats[fdbk_category.value])
 
+        # Invalidating the submission's results should clear every category.
+        delete_cached_submission_result(submission)
+        for fdbk_category in ag_models.FeedbackCategory:
             url = self._make_url(submission, fdbk_category=fdbk_category)
-            old_response = self.client.get(url)
+            response = self.client.get(url)
             self.assertEqual(
-                get_submission_fdbk(submission, fdbk_category).to_dict(),
-                old_response.data)
+                get_submission_fdbk(submission, fdbk_category).to_dict(), response.data)
 
-            cmd.validate_and_update(
-                points_for_correct_return_code=cmd.points_for_correct_return_code + 1)
+        stats = get_submission_fdbk_cache_stats()
+        for fdbk_category in ag_models.FeedbackCategory:
+            self.assertEqual({'hits': 1, 'misses': 2}, stats[fdbk_category.value])
+
+    def test_fdbk_cache_not_used_use_cache_false(self):
+        project = obj_build.make_project(visible_to_students=True)
+        admin_group = obj_build.make_group(project=project, members_role=obj_build.UserRole.admin)
+        submission = obj_build.make_finished_submission(group=admin_group)
 
-            new_response = self.client.get(url)
-            self.assertNotEqual(old_response.data, new_response.data)
+        self.client.force_authenticate(admin_group.members.first())
+        url = self._make_url(
+            submission, fdbk_category=ag_models.FeedbackCategory.max, use_cache=False)
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
 
-            self.assertEqual(get_submission_fdbk(submission, fdbk_category).to_dict(),
-                             new_response.data)
+        self.assertEqual(
+            {'hits': 0, 'misses': 0},
+            get_submission_fdbk_cache_stats()[ag_models.FeedbackCategory.max.value])
 
     # In autograder.grading_tasks.tasks.grade_submission.mark_submission_as_finished,
     # the cached submission results will be cleared. This allows us to cache results
@@ -134,8 +134,8 @@ class _FeedbackTestsBase(UnitTestBase):
         if expected is None:
             self.assertIsNone(response.data)
         else:
-            actual = ('' if response.content == b''
-                      else json.loads(response.content.decode('utf-8')))
+            self.assertEqual('application/json', response['Content-Type'])
+            actual = json.loads(b''.join(response.streaming_content).decode('utf-8'))
             self.assertEqual(expected.diff_content, actual)
 
     def do_get_output_and_diff_permission_denied_test(self, client,
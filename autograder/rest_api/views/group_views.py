@@ -5,11 +5,12 @@ import tempfile
 
 from django.contrib.auth.models import User
 from django.db import transaction
-from django.db.models import Prefetch
+from django.db.models import Q
 from django.utils import timezone
 from django.utils.decorators import method_decorator
 from drf_composable_permissions.p import P
 from rest_framework import decorators, mixins, permissions, response, status
+from rest_framework.utils.urls import replace_query_param
 
 import autograder.core.models as ag_models
 import autograder.core.utils as core_ut
@@ -17,6 +18,7 @@ import autograder.utils.testing as test_ut
 from autograder import utils
 from autograder.core.models.get_ultimate_submissions import get_ultimate_submission
 from autograder.rest_api import permissions as ag_permissions
+from autograder.rest_api.auth_context import get_auth_context
 from autograder.rest_api.schema import (AGListViewSchemaMixin, AGRetrieveViewSchemaMixin, APITags,
                                         CustomViewSchema, RequestBody, as_content_obj)
 from autograder.rest_api.views.ag_model_views import (AGModelAPIView, AGModelDetailView,
@@ -48,8 +50,38 @@ class _ListCreateGroupSchema(AGListViewSchemaMixin, CustomViewSchema):
     pass
 
 
+# The maximum number of groups that ListCreateGroupsView will return
+# in one page.
+GROUPS_MAX_PAGE_SIZE = 1000
+
+
 class ListCreateGroupsView(NestedModelView):
     schema = _ListCreateGroupSchema([APITags.groups], api_class=ag_models.Group, data={
+        'GET': {
+            'parameters': [
+                {
+                    'name': 'page_size',
+                    'in': 'query',
+                    'description': (
+                        'When this parameter is given, at most this many groups are '
+                        'returned, and the response is an object with the keys "results" '
+                        '(the list of groups) and "next" (the URL of the next page, or '
+                        'null if this is the last page). Maximum value is {}.'.format(
+                            GROUPS_MAX_PAGE_SIZE)
+                    ),
+                    'schema': {'type': 'integer', 'maximum': GROUPS_MAX_PAGE_SIZE},
+                },
+                {
+                    'name': 'after',
+                    'in': 'query',
+                    'description': (
+                        'The ID of the last group on the previous page. '
+                        'Only used when "page_size" is given.'
+                    ),
+                    'schema': {'type': 'integer'},
+                },
+            ],
+        },
         'POST': {
             'operation_id': 'createGroup',
             'request': _MEMBER_NAMES_REQUEST_BODY,
@@ -72,19 +104,55 @@ class ListCreateGroupsView(NestedModelView):
     nested_field_name = 'groups'
     parent_obj_field_name = 'project'
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        if self.request.method.lower() == 'get':
-            queryset = queryset.prefetch_related(
-                'members',
-                Prefetch('submissions',
-                         ag_models.Submission.objects.defer('denormalized_ag_test_results'))
-            )
+    def get(self, *args, **kwargs):
+        project = self.get_object()
+        groups = ag_models.annotate_submission_counts(
+            project.groups.prefetch_related('members'), project)
 
-        return queryset
+        if 'page_size' not in self.request.query_params:
+            return response.Response([group.to_dict() for group in groups])
 
-    def get(self, *args, **kwargs):
-        return self.do_list()
+        try:
+            page_size = int(self.request.query_params['page_size'])
+        except ValueError:
+            page_size = 0
+        if not 1 <= page_size <= GROUPS_MAX_PAGE_SIZE:
+            return response.Response(
+                data='"page_size" must be an integer between 1 and {}'.format(
+                    GROUPS_MAX_PAGE_SIZE),
+                status=status.HTTP_400_BAD_REQUEST)
+
+        # Groups are listed in order of their member names, and no two
+        # groups in a project share a member, so the member names of the
+        # last group on the previous page mark where the next page starts.
+        # The pk is included in the ordering only as a tie-breaker.
+        groups = groups.order_by('_member_names', 'pk')
+        if 'after' in self.request.query_params:
+            try:
+                after_pk = int(self.request.query_params['after'])
+                after_member_names = project.groups.values_list(
+                    '_member_names', flat=True).get(pk=after_pk)
+            except (ValueError, ag_models.Group.DoesNotExist):
+                return response.Response(
+                    data='"after" must be the ID of a group in this project',
+                    status=status.HTTP_400_BAD_REQUEST)
+
+            groups = groups.filter(
+                Q(_member_names__gt=after_member_names)
+                | Q(_member_names=after_member_names, pk__gt=after_pk))
+
+        # Loading one extra group tells us whether there's a next page.
+        page = list(groups[:page_size + 1])
+        next_url = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            next_url = replace_query_param(
+                self.request.build_absolute_uri(), 'after', page[-1].pk)
+
+        return response.Response({
+            'next': next_url,
+            'results': [group.to_dict() for group in page],
+        })
 
     @convert_django_validation_error
     @transaction.atomic()
@@ -171,10 +239,10 @@ class _UltimateSubmissionPermissions(permissions.BasePermission):
     def has_object_permission(self, request, view, group):
         project = group.project
         course = group.project.course
-        is_staff = course.is_staff(request.user)
+        auth = get_auth_context(request)
 
         # Staff and higher can always view their own ultimate submission
-        if is_staff and group.members.filter(pk=request.user.pk).exists():
+        if auth.is_staff(course) and auth.is_group_member(group):
             return True
 
         return (ag_permissions.deadline_is_past(group, request.user)
@@ -202,7 +270,7 @@ class GroupDetailView(AGModelDetailView):
     permission_classes = [group_permissions]
 
     model_manager = ag_models.Group.objects.select_related(
-        'project__course').prefetch_related('members', 'submissions')
+        'project__course').prefetch_related('members')
 
     def get(self, *args, **kwargs):
         return self.do_get()
@@ -323,7 +323,7 @@ class DownloadTaskResultView(AGModelAPIView):
     def get(self, *args, **kwargs):
         task = self.get_object()
         if task.progress != 100:
-            return response.Response(data={'in_progress': task.progress},
+            return response.Response(data={'in_progress': task.live_progress},
                                      status=status.HTTP_400_BAD_REQUEST)
         if task.error_msg:
             return response.Response(data={'task_error': task.error_msg},
@@ -1,4 +1,5 @@
-from autograder.grading_tasks.tasks.rerun_submission import rerun_submission
+from autograder.grading_tasks.tasks.rerun_submission import (
+    rerun_submissions_batch, split_into_rerun_batches, start_rerun_batches)
 from autograder.core.models import submission
 
 import celery
@@ -55,11 +56,14 @@ class RerunSubmissionsTaskListCreateView(NestedModelView):
                     ]
                 )
 
+            batches = split_into_rerun_batches(
+                list(submissions.order_by('pk').values_list('pk', flat=True)))
+            start_rerun_batches(rerun_task.pk, len(batches))
             signatures = [
-                rerun_submission.s(
-                    submission.pk, rerun_task.pk
+                rerun_submissions_batch.s(
+                    batch, rerun_task.pk
                 ).set(queue=settings.RERUN_QUEUE_TMPL.format(project.pk))
-                for submission in submissions
+                for batch in batches
             ]
             from autograder.celery import app
             celery.group(signatures, app=app).apply_async()
@@ -1,14 +1,13 @@
 from typing import BinaryIO, Callable, Optional
 
-from django.http.response import FileResponse, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.utils.decorators import method_decorator
 from drf_composable_permissions.p import P
 from rest_framework import response, status
 from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
 
 import autograder.core.models as ag_models
-import autograder.core.utils as core_ut
 import autograder.rest_api.permissions as ag_permissions
 from autograder.core.caching import get_cached_submission_feedback
 from autograder.core.models.submission import get_submissions_with_results_queryset
@@ -16,6 +15,7 @@ from autograder.core.submission_feedback import (AGTestCommandResultFeedback, AG
                                                  AGTestSuiteResultFeedback,
                                                  MutationTestSuitePreLoader,
                                                  SubmissionResultFeedback)
+from autograder.rest_api.output_file_response import output_file_response
 from autograder.rest_api.schema import APITags, CustomViewSchema, as_content_obj, as_schema_ref
 from autograder.rest_api.serialize_ultimate_submission_results import \
     get_submission_data_with_results
@@ -88,11 +88,10 @@ class SubmissionResultsView(SubmissionResultsViewBase):
 
     def _make_response(self, submission_fdbk: SubmissionResultFeedback,
                        fdbk_category: ag_models.FeedbackCategory):
-        if (fdbk_category != ag_models.FeedbackCategory.normal
-                or self.request.query_params.get('use_cache', 'true') != 'true'):
+        if self.request.query_params.get('use_cache', 'true') != 'true':
             return response.Response(submission_fdbk.to_dict())
 
-        submission = self.get_object()
+        submission = submission_fdbk.submission
         not_done_enough_to_cache = (
             submission.status != ag_models.Submission.GradingStatus.waiting_for_deferred
             and submission.status != ag_models.Submission.GradingStatus.finished_grading)
@@ -127,7 +126,8 @@ class AGTestSuiteResultStdoutView(SubmissionResultsViewBase):
     def _make_response(self, submission_fdbk: SubmissionResultFeedback,
                        fdbk_category: ag_models.FeedbackCategory):
         suite_result_pk = self.kwargs['result_pk']
-        return _get_setup_output(submission_fdbk,
+        return _get_setup_output(self.request,
+                                 submission_fdbk,
                                  suite_result_pk,
                                  lambda fdbk_calc: fdbk_calc.setup_stdout)
 
@@ -138,7 +138,8 @@ class AGTestSuiteResultStderrView(SubmissionResultsViewBase):
     def _make_response(self, submission_fdbk: SubmissionResultFeedback,
                        fdbk_category: ag_models.FeedbackCategory):
         suite_result_pk = self.kwargs['result_pk']
-        return _get_setup_output(submission_fdbk,
+        return _get_setup_output(self.request,
+                                 submission_fdbk,
                                  suite_result_pk,
                                  lambda fdbk_calc: fdbk_calc.setup_stderr)
 
@@ -197,7 +198,8 @@ class AGTestSuiteResultOutputSizeView(SubmissionResultsViewBase):
 GetOutputFnType = Callable[[AGTestSuiteResultFeedback], str]
 
 
-def _get_setup_output(submission_fdbk: SubmissionResultFeedback,
+def _get_setup_output(request: Request,
+                      submission_fdbk: SubmissionResultFeedback,
                       suite_result_pk: int,
                       get_output_fn: GetOutputFnType):
     suite_fdbk = _find_ag_suite_result(submission_fdbk, suite_result_pk)
@@ -206,7 +208,7 @@ def _get_setup_output(submission_fdbk: SubmissionResultFeedback,
     stream_data = get_output_fn(suite_fdbk)
     if stream_data is None:
         return response.Response(None)
-    return FileResponse(stream_data)
+    return output_file_response(request, stream_data)
 
 
 def _find_ag_suite_result(submission_fdbk: SubmissionResultFeedback,
@@ -234,6 +236,7 @@ class AGTestCommandResultStdoutView(SubmissionResultsViewBase):
                        fdbk_category: ag_models.FeedbackCategory):
         cmd_result_pk = self.kwargs['result_pk']
         return _get_cmd_result_output(
+            self.request,
             submission_fdbk,
             cmd_result_pk,
             lambda fdbk_calc: fdbk_calc.stdout)
@@ -246,6 +249,7 @@ class AGTestCommandResultStderrView(SubmissionResultsViewBase):
                        fdbk_category: ag_models.FeedbackCategory):
         cmd_result_pk = self.kwargs['result_pk']
         return _get_cmd_result_output(
+            self.request,
             submission_fdbk,
             cmd_result_pk,
             lambda fdbk_calc: fdbk_calc.stderr)
@@ -315,7 +319,8 @@ class AGTestCommandResultOutputSizeView(SubmissionResultsViewBase):
 GetCmdOutputFnType = Callable[[AGTestCommandResultFeedback], Optional[BinaryIO]]
 
 
-def _get_cmd_result_output(submission_fdbk: SubmissionResultFeedback,
+def _get_cmd_result_output(request: Request,
+                           submission_fdbk: SubmissionResultFeedback,
                            cmd_result_pk: int,
                            get_output_fn: GetCmdOutputFnType):
     cmd_fdbk = _find_ag_test_cmd_result(submission_fdbk, cmd_result_pk)
@@ -324,7 +329,7 @@ def _get_cmd_result_output(submission_fdbk: SubmissionResultFeedback,
     stream_data = get_output_fn(cmd_fdbk)
     if stream_data is None:
         return response.Response(None)
-    return FileResponse(stream_data)
+    return output_file_response(request, stream_data)
 
 
 class _DiffViewSchema(CustomViewSchema):
@@ -368,9 +373,10 @@ class AGTestCommandResultStdoutDiffView(SubmissionResultsViewBase):
                        fdbk_category: ag_models.FeedbackCategory):
         cmd_result_pk = self.kwargs['result_pk']
         return _get_cmd_result_diff(
+            self.request,
             submission_fdbk,
             cmd_result_pk,
-            lambda fdbk_calc: fdbk_calc.stdout_diff)
+            lambda fdbk_calc: fdbk_calc.get_stdout_diff_json())
 
 
 class AGTestCommandResultStderrDiffView(SubmissionResultsViewBase):
@@ -380,26 +386,28 @@ class AGTestCommandResultStderrDiffView(SubmissionResultsViewBase):
                        fdbk_category: ag_models.FeedbackCategory):
         cmd_result_pk = self.kwargs['result_pk']
         return _get_cmd_result_diff(
+            self.request,
             submission_fdbk,
             cmd_result_pk,
-            lambda fdbk_calc: fdbk_calc.stderr_diff)
+            lambda fdbk_calc: fdbk_calc.get_stderr_diff_json())
 
 
-GetDiffFnType = Callable[[AGTestCommandResultFeedback], core_ut.DiffResult]
+GetDiffFnType = Callable[[AGTestCommandResultFeedback], Optional[BinaryIO]]
 
 
-def _get_cmd_result_diff(submission_fdbk: SubmissionResultFeedback,
+def _get_cmd_result_diff(request: Request,
+                         submission_fdbk: SubmissionResultFeedback,
                          cmd_result_pk: int,
                          get_diff_fn: GetDiffFnType):
     cmd_fdbk = _find_ag_test_cmd_result(submission_fdbk, cmd_result_pk)
     if cmd_fdbk is None:
         return response.Response(None)
 
-    diff = get_diff_fn(cmd_fdbk)
-    if diff is None:
+    diff_json = get_diff_fn(cmd_fdbk)
+    if diff_json is None:
         return response.Response(None)
 
-    return JsonResponse(diff.diff_content, safe=False)
+    return output_file_response(request, diff_json, content_type='application/json')
 
 
 def _find_ag_test_cmd_result(submission_fdbk: SubmissionResultFeedback,
@@ -436,6 +444,7 @@ class MutationTestSuiteResultSetupStdoutView(SubmissionResultsViewBase):
                        fdbk_category: ag_models.FeedbackCategory):
         mutation_suite_result_pk = self.kwargs['result_pk']
         return _get_mutation_suite_result_output_field(
+            self.request,
             submission_fdbk,
             fdbk_category,
             mutation_suite_result_pk,
@@ -449,6 +458,7 @@ class MutationTestSuiteResultSetupStderrView(SubmissionResultsViewBase):
                        fdbk_category: ag_models.FeedbackCategory):
         mutation_suite_result_pk = self.kwargs['result_pk']
         return _get_mutation_suite_result_output_field(
+            self.request,
             submission_fdbk,
             fdbk_category,
             mutation_suite_result_pk,
@@ -462,6 +472,7 @@ class MutationTestSuiteResultGetStudentTestsStdoutView(SubmissionResultsViewBase
                        fdbk_category: ag_models.FeedbackCategory):
         mutation_suite_result_pk = self.kwargs['result_pk']
         return _get_mutation_suite_result_output_field(
+            self.request,
             submission_fdbk,
             fdbk_category,
             mutation_suite_result_pk,
@@ -475,6 +486,7 @@ class MutationTestSuiteResultGetStudentTestsStderrView(SubmissionResultsViewBase
                        fdbk_category: ag_models.FeedbackCategory):
         mutation_suite_result_pk = self.kwargs['result_pk']
         return _get_mutation_suite_result_output_field(
+            self.request,
             submission_fdbk,
             fdbk_category,
             mutation_suite_result_pk,
@@ -488,6 +500,7 @@ class MutationTestSuiteResultValidityCheckStdoutView(SubmissionResultsViewBase):
                        fdbk_category: ag_models.FeedbackCategory):
         mutation_suite_result_pk = self.kwargs['result_pk']
         return _get_mutation_suite_result_output_field(
+            self.request,
             submission_fdbk,
             fdbk_category,
             mutation_suite_result_pk,
@@ -501,6 +514,7 @@ class MutationTestSuiteResultValidityCheckStderrView(SubmissionResultsViewBase):
                        fdbk_category: ag_models.FeedbackCategory):
         mutation_suite_result_pk = self.kwargs['result_pk']
         return _get_mutation_suite_result_output_field(
+            self.request,
             submission_fdbk,
             fdbk_category,
             mutation_suite_result_pk,
@@ -514,6 +528,7 @@ class MutationTestSuiteResultGradeBuggyImplsStdoutView(SubmissionResultsViewBase
                        fdbk_category: ag_models.FeedbackCategory):
         mutation_suite_result_pk = self.kwargs['result_pk']
         return _get_mutation_suite_result_output_field(
+            self.request,
             submission_fdbk,
             fdbk_category,
             mutation_suite_result_pk,
@@ -527,6 +542,7 @@ class MutationTestSuiteResultGradeBuggyImplsStderrView(SubmissionResultsViewBase
                        fdbk_category: ag_models.FeedbackCategory):
         mutation_suite_result_pk = self.kwargs['result_pk']
         return _get_mutation_suite_result_output_field(
+            self.request,
             submission_fdbk,
             fdbk_category,
             mutation_suite_result_pk,
@@ -610,6 +626,7 @@ GetMutationTestSuiteOutputFnType = Callable[
 
 
 def _get_mutation_suite_result_output_field(
+        request: Request,
         submission_fdbk: SubmissionResultFeedback,
         fdbk_category: ag_models.FeedbackCategory,
         mutation_suite_result_pk,
@@ -622,7 +639,7 @@ def _get_mutation_suite_result_output_field(
     if output_stream is None:
         return response.Response(None)
 
-    return FileResponse(output_stream)
+    return output_file_response(request, output_stream)
 
 
 def _find_mutation_suite_result(
@@ -2,6 +2,7 @@ import copy
 import datetime
 from typing import List, Optional
 
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction
@@ -17,6 +18,9 @@ import autograder.utils.testing as test_ut
 from autograder.core.submission_email_receipts import send_submission_received_email
 from autograder.core.submission_feedback import (AGTestPreLoader, MutationTestSuitePreLoader,
                                                  SubmissionResultFeedback)
+from autograder.core.models.submission_queue_index import load_positions_in_queue
+from autograder.grading_tasks.tasks import queue_submission_on_commit
+from autograder.rest_api.auth_context import get_auth_context
 from autograder.rest_api.schema import (AGDetailViewSchemaGenerator,
                                         AGListCreateViewSchemaGenerator, AGListViewSchemaMixin,
                                         APITags, CustomViewDict, CustomViewSchema, as_content_obj,
@@ -87,7 +91,9 @@ class ListCreateSubmissionView(NestedModelView):
     parent_obj_field_name = 'group'
 
     def get(self, *args, **kwargs):
-        return self.do_list()
+        submissions = list(self.get_nested_manager().all())
+        load_positions_in_queue(submissions)
+        return response.Response([self.serialize_object(submission) for submission in submissions])
 
     @convert_django_validation_error
     def post(self, request, *args, **kwargs):
@@ -110,6 +116,8 @@ class ListCreateSubmissionView(NestedModelView):
             test_ut.mocking_hook()
 
             submission = self._create_submission_if_allowed(request, group, timestamp)
+            if settings.QUEUE_SUBMISSIONS_ON_CREATE:
+                queue_submission_on_commit(submission)
 
         if group.project.send_email_on_submission_received:
             send_submission_received_email(group, submission)
@@ -143,8 +151,8 @@ class ListCreateSubmissionView(NestedModelView):
 
         # Provided they don't have a submission being processed, staff
         # should always be able to submit.
-        if (group.project.course.is_staff(request.user)
-                and group.members.filter(pk=request.user.pk).exists()):
+        auth = get_auth_context(request)
+        if auth.is_staff(group.project.course) and auth.is_group_member(group):
             return self._create_submission(
                 group, timestamp,
                 is_past_daily_limit=is_past_daily_limit,
@@ -277,7 +285,7 @@ class ListSubmissionsWithResults(AGModelAPIView):
     def get(self, *args, **kwargs):
         group = self.get_object()
 
-        user_roles = group.project.course.get_user_roles(self.request.user)
+        user_roles = get_auth_context(self.request).get_user_roles(group.project.course)
         is_group_member = self.request.user.username in group.member_names
         feedback_category = None
 
@@ -294,6 +302,9 @@ class ListSubmissionsWithResults(AGModelAPIView):
         ag_test_preloader = AGTestPreLoader(group.project)
         mutation_test_suite_preloader = MutationTestSuitePreLoader(group.project)
 
+        submissions_queryset = list(submissions_queryset)
+        load_positions_in_queue(submissions_queryset)
+
         submissions = []
         for submission in submissions_queryset:
             if feedback_category is not None:
@@ -233,9 +233,60 @@ LOGGING = {
         },
     }
 }
+# Cached submission results and user roles are invalidated by bumping
+# a per-project or per-course version rather than deleting the cached
+# entries, so entries are given a timeout (in seconds) to make sure the
+# orphaned ones get cleaned up.
+SUBMISSION_RESULTS_CACHE_TIMEOUT = int(
+    os.environ.get('AG_SUBMISSION_RESULTS_CACHE_TIMEOUT', str(60 * 60 * 24 * 7)))
+USER_ROLES_CACHE_TIMEOUT = int(
+    os.environ.get('AG_USER_ROLES_CACHE_TIMEOUT', str(60 * 60 * 24 * 7)))
+# Each process also keeps recently loaded user roles in memory for this
+# many seconds, so a change to a course's roles can take this long to
+# be seen by other processes. Set to 0 to disable the in-process cache.
+USER_ROLES_LOCAL_CACHE_TIMEOUT = float(
+    os.environ.get('AG_USER_ROLES_LOCAL_CACHE_TIMEOUT', '5'))
+# The maximum number of (course, user) roles each process keeps in memory.
+USER_ROLES_LOCAL_CACHE_SIZE = int(os.environ.get('AG_USER_ROLES_LOCAL_CACHE_SIZE', '1000'))
+
 
 SANDBOX_IMAGE_REGISTRY_HOST = os.environ.get(
     'SANDBOX_IMAGE_REGISTRY_HOST', '127.0.0.1')
 SANDBOX_IMAGE_REGISTRY_PORT = os.environ.get('SANDBOX_IMAGE_REGISTRY_PORT', '5001')
 
+# The maximum number of idle, started sandboxes each grading worker
+# process keeps around for reuse. 0 disables sandbox pooling.
+SANDBOX_POOL_SIZE = int(os.environ.get('AG_SANDBOX_POOL_SIZE', '0'))
+# Idle pooled sandboxes are destroyed after this many seconds.
+SANDBOX_POOL_MAX_IDLE_TIME = int(os.environ.get('AG_SANDBOX_POOL_MAX_IDLE_TIME', '600'))
+# Pooled sandboxes are destroyed after being leased this many times.
+SANDBOX_POOL_MAX_USES = int(os.environ.get('AG_SANDBOX_POOL_MAX_USES', '50'))
+
+# The maximum total size, in bytes, of the post-setup sandbox snapshots
+# cached for suites with reuse_setup_snapshots set to True. The least
+# recently used snapshots are evicted first.
+SETUP_SNAPSHOT_CACHE_MAX_SIZE = int(
+    os.environ.get('AG_SETUP_SNAPSHOT_CACHE_MAX_SIZE', str(10 * 1024 ** 3)))
+
+# The maximum number of test cases to run at the same time for suites
+# with run_test_cases_in_parallel set to True.
+AG_TEST_CASE_MAX_PARALLELISM = int(os.environ.get('AG_TEST_CASE_MAX_PARALLELISM', '4'))
+# The maximum number of student test validity checks or buggy
+# implementation commands to run at the same time for mutation test
+# suites with run_student_tests_in_parallel set to True.
+MUTATION_TEST_MAX_PARALLELISM = int(os.environ.get('AG_MUTATION_TEST_MAX_PARALLELISM', '4'))
+
+# While a submission is being graded, updates to its denormalized test
+# results are written in batches of at most this many test case results...
+DENORMALIZED_RESULTS_MAX_BUFFERED = int(
+    os.environ.get('AG_DENORMALIZED_RESULTS_MAX_BUFFERED', '20'))
+# ...or after this many seconds, whichever comes first. Pending updates
+# are always written when a suite finishes.
+DENORMALIZED_RESULTS_MAX_FLUSH_DELAY = float(
+    os.environ.get('AG_DENORMALIZED_RESULTS_MAX_FLUSH_DELAY', '2'))
+
+# The number of threads used to compress files when building
+# submission file downloads.
+SUBMISSION_ARCHIVE_NUM_THREADS = int(os.environ.get('AG_SUBMISSION_ARCHIVE_NUM_THREADS', '4'))
+
 from autograder.settings.celery_settings import *  # noqa
@@ -26,13 +26,38 @@ CELERYBEAT_SCHEDULE = {
     'queue-submissions': {
         'task': 'autograder.grading_tasks.tasks.queueing.queue_submissions',
         'schedule': datetime.timedelta(
-            seconds=int(os.environ.get('AG_SUBMISSION_LISTENER_INTERVAL', '5'))),
+            seconds=int(os.environ.get('AG_SUBMISSION_LISTENER_INTERVAL', '30'))),
         'options': {
             'queue': 'periodic_tasks'
         }
     },
 }
 
+# When True, submissions are queued for grading as soon as they are
+# created. Otherwise, they are queued by the periodic queue_submissions
+# task, which also picks up any submissions that failed to be queued
+# when they were created.
+QUEUE_SUBMISSIONS_ON_CREATE = (
+    os.environ.get('AG_QUEUE_SUBMISSIONS_ON_CREATE', 'true').lower() == 'true')
+
+# Submissions to projects that take longer than this many seconds to
+# grade are sent to the slow (SUBMISSION_QUEUE_TMPL) queue.
+# See autograder.core.models.GradingQueueRoute
+SLOW_QUEUE_GRADING_TIME_THRESHOLD = int(
+    os.environ.get('AG_SLOW_QUEUE_GRADING_TIME_THRESHOLD', '600'))
+# The number of recently graded submissions used to compute a project's
+# median grading time.
+GRADING_TIME_NUM_SAMPLES = int(os.environ.get('AG_GRADING_TIME_NUM_SAMPLES', '50'))
+# Until a project has this many graded submissions, its worst-case
+# grading time is used to pick a queue instead of its median.
+GRADING_TIME_MIN_SAMPLES = int(os.environ.get('AG_GRADING_TIME_MIN_SAMPLES', '5'))
+
+# Submissions being rerun are graded in batches of this many submissions
+# per task. Sandboxes are reused across the submissions in a batch and
+# are reset between submissions. When sandbox pooling is enabled
+# (SANDBOX_POOL_SIZE > 0), the batch leases them from the worker's pool.
+RERUN_BATCH_SIZE = int(os.environ.get('AG_RERUN_BATCH_SIZE', '20'))
+
 SUBMISSION_WORKER_PREFIX = 'submission_grader'
 FAST_GRADER_WORKER_PREFIX = 'fast_submission_grader'
 DEFERRED_WORKER_PREFIX = 'deferred'
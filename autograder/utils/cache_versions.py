@@ -0,0 +1,61 @@
+"""
+Namespace versions for invalidating groups of cache entries in O(1).
+
+Cache keys that belong to a namespace embed the namespace's current
+version. Bumping the version makes every existing key in the
+namespace unreachable, and the orphaned entries are left to expire.
+"""
+
+import time
+from typing import Dict, Sequence
+
+from django.core.cache import cache
+
+
+def get_cache_version(version_key: str) -> int:
+    """
+    Returns the current version stored under version_key, initializing
+    it if needed.
+    """
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, _initial_version(), timeout=None)
+        version = cache.get(version_key)
+
+    return version
+
+
+def get_cache_versions(version_keys: Sequence[str]) -> Dict[str, int]:
+    """
+    Like get_cache_version, but loads the versions for all of the
+    given keys with a single cache request when they're initialized.
+    """
+    versions = cache.get_many(version_keys)
+    for version_key in version_keys:
+        if version_key not in versions:
+            versions[version_key] = get_cache_version(version_key)
+
+    return versions
+
+
+def bump_cache_version(version_key: str) -> int:
+    """
+    Atomically increments the version stored under version_key and
+    returns the new version.
+    """
+    try:
+        return cache.incr(version_key)
+    except ValueError:
+        # The version hasn't been initialized yet (or was evicted).
+        # add() is a no-op if another process initialized it in the
+        # meantime.
+        cache.add(version_key, _initial_version(), timeout=None)
+        return cache.incr(version_key)
+
+
+def _initial_version() -> int:
+    # If a version is evicted, starting over from a small number could
+    # make stale entries reachable again. Starting from the current
+    # time in microseconds puts the new version past any version that
+    # was in use before.
+    return int(time.time() * 1000000)
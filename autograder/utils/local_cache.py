@@ -0,0 +1,63 @@
+"""
+A small, thread-safe, in-process LRU cache with expiring entries.
+
+Entries in a process-local cache can't be invalidated by other
+processes, so only data that is acceptable to serve a few seconds out
+of date should be stored in one. It is meant to sit in front of the
+shared cache for values that are read many times per request.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Tuple
+
+
+class LocalLRUCache:
+    def __init__(self, maxsize: int, timeout: float):
+        """
+        :param maxsize: The maximum number of entries to keep. The least
+            recently used entry is evicted when this is exceeded.
+        :param timeout: The number of seconds after which an entry
+            expires. If this is zero or negative, nothing is cached.
+        """
+        self._maxsize = maxsize
+        self._timeout = timeout
+        self._entries = OrderedDict()  # type: OrderedDict[Hashable, Tuple[float, Any]]
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any=None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self._timeout <= 0 or self._maxsize <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -8,6 +8,7 @@ from typing import Sequence, Optional
 
 import autograder.core.models as ag_models
 from autograder.core import utils as core_ut
+from autograder.core.result_output import open_output
 
 
 def get_unique_id() -> str:
@@ -456,10 +457,10 @@ def make_correct_ag_test_command_result(ag_test_command: ag_models.AGTestCommand
     kwargs.update(result_kwargs)
 
     result = ag_models.AGTestCommandResult.objects.validate_and_create(**kwargs)
-    with open(result.stdout_filename, 'w') as f:
+    with open_output(result.stdout_filename, 'w') as f:
         f.write(stdout)
 
-    with open(result.stderr_filename, 'w') as f:
+    with open_output(result.stderr_filename, 'w') as f:
         f.write(stderr)
 
     return result
@@ -485,15 +486,21 @@ def make_incorrect_ag_test_command_result(ag_test_command: ag_models.AGTestComma
     result.stderr_correct = False
     result.save()
 
-    with open(result.stdout_filename, 'a') as f:
-        f.write('laksdjhnflkajhdflkas')
-
-    with open(result.stderr_filename, 'a') as f:
-        f.write('ncbsljksdkfjas')
+    _append_to_output(result.stdout_filename, 'laksdjhnflkajhdflkas')
+    _append_to_output(result.stderr_filename, 'ncbsljksdkfjas')
 
     return result
 
 
+def _append_to_output(filename: str, text: str) -> None:
+    # Compressed output can't be appended to in place.
+    with open_output(filename, 'r') as f:
+        text = f.read() + text
+
+    with open_output(filename, 'w') as f:
+        f.write(text)
+
+
 def make_mutation_test_suite(project: ag_models.Project=None,
                              **mutation_test_suite_kwargs) -> ag_models.MutationTestSuite:
     if project is None:
@@ -3,6 +3,7 @@ import os
 import shutil
 import unittest
 from contextlib import contextmanager
+from typing import Callable, Union
 from unittest import mock
 
 from django.conf import settings
@@ -43,7 +44,11 @@ class _CustomAssertsMixin:
         def __exit__(self, *args):
             self.test_case_object.assertEqual(self.original_count, self.queryset.count())
 
-    def assert_cache_key_invalidated(self, cache_key: str):
+    def assert_cache_key_invalidated(self, cache_key: Union[str, Callable[[], str]]):
+        """
+        cache_key can also be a function that returns the key. Use this
+        for keys that change when they are invalidated.
+        """
         return _assert_cache_key_invalidated(cache_key)
 
     @property
@@ -52,14 +57,16 @@ class _CustomAssertsMixin:
 
 
 @contextmanager
-def _assert_cache_key_invalidated(cache_key: str):
-    if cache.get(cache_key) is None:
-        raise AssertionError(f'Cache key "{cache_key}" not present before expected invalidation.')
+def _assert_cache_key_invalidated(cache_key: Union[str, Callable[[], str]]):
+    get_key = cache_key if callable(cache_key) else lambda: cache_key
+
+    if cache.get(get_key()) is None:
+        raise AssertionError(f'Cache key "{get_key()}" not present before expected invalidation.')
 
     yield
 
-    if cache.get(cache_key) is not None:
-        raise AssertionError(f'Cache key "{cache_key}" unexpectedly present.')
+    if cache.get(get_key()) is not None:
+        raise AssertionError(f'Cache key "{get_key()}" unexpectedly present.')
 
 
 # Adapted from: http://stackoverflow.com/questions/25851183/
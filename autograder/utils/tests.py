@@ -1,9 +1,14 @@
 import os
+from unittest import mock
 
 from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase
 
 from autograder import utils
 import autograder.utils.testing as test_ut
+from autograder.utils.cache_versions import bump_cache_version, get_cache_version
+from autograder.utils.local_cache import LocalLRUCache
 
 
 class TestFileSystemNavigationUtils(test_ut.UnitTestBase):
@@ -31,3 +36,77 @@ class TestFileSystemNavigationUtils(test_ut.UnitTestBase):
                 os.getcwd())
 
         self.assertEqual(os.getcwd(), settings.MEDIA_ROOT)
+
+
+class CacheVersionsTestCase(test_ut.UnitTestBase):
+    def test_version_initialized_on_first_get(self):
+        version = get_cache_version('spam_version')
+        self.assertEqual(version, get_cache_version('spam_version'))
+
+    def test_bump_version(self):
+        version = get_cache_version('spam_version')
+        self.assertEqual(version + 1, bump_cache_version('spam_version'))
+        self.assertEqual(version + 1, get_cache_version('spam_version'))
+
+        # Other versions are unaffected.
+        egg_version = get_cache_version('egg_version')
+        bump_cache_version('spam_version')
+        self.assertEqual(egg_version, get_cache_version('egg_version'))
+
+    def test_bump_uninitialized_version(self):
+        version = bump_cache_version('spam_version')
+        self.assertEqual(version, get_cache_version('spam_version'))
+
+    def test_evicted_version_not_reused(self):
+        old_version = get_cache_version('spam_version')
+        cache.delete('spam_version')
+        self.assertGreater(get_cache_version('spam_version'), old_version)
+
+
+class LocalLRUCacheTestCase(SimpleTestCase):
+    def test_get_and_set(self):
+        local_cache = LocalLRUCache(maxsize=10, timeout=60)
+        self.assertIsNone(local_cache.get('spam'))
+        self.assertEqual('default', local_cache.get('spam', 'default'))
+
+        local_cache.set('spam', 42)
+        self.assertEqual(42, local_cache.get('spam'))
+
+        local_cache.delete('spam')
+        self.assertIsNone(local_cache.get('spam'))
+
+    def test_least_recently_used_entry_evicted(self):
+        local_cache = LocalLRUCache(maxsize=2, timeout=60)
+        local_cache.set('spam', 1)
+        local_cache.set('egg', 2)
+        local_cache.get('spam')
+        local_cache.set('sausage', 3)
+
+        self.assertEqual(2, len(local_cache))
+        self.assertEqual(1, local_cache.get('spam'))
+        self.assertIsNone(local_cache.get('egg'))
+        self.assertEqual(3, local_cache.get('sausage'))
+
+    def test_entries_expire(self):
+        local_cache = LocalLRUCache(maxsize=10, timeout=60)
+        with mock.patch('autograder.utils.local_cache.time.monotonic', return_value=1000):
+            local_cache.set('spam', 42)
+
+        with mock.patch('autograder.utils.local_cache.time.monotonic', return_value=1059):
+            self.assertEqual(42, local_cache.get('spam'))
+
+        with mock.patch('autograder.utils.local_cache.time.monotonic', return_value=1060):
+            self.assertIsNone(local_cache.get('spam'))
+        self.assertEqual(0, len(local_cache))
+
+    def test_zero_timeout_disables_cache(self):
+        local_cache = LocalLRUCache(maxsize=10, timeout=0)
+        local_cache.set('spam', 42)
+        self.assertIsNone(local_cache.get('spam'))
+
+    def test_clear(self):
+        local_cache = LocalLRUCache(maxsize=10, timeout=60)
+        local_cache.set('spam', 42)
+        local_cache.set('egg', 43)
+        local_cache.clear()
+        self.assertEqual(0, len(local_cache))